@@ -0,0 +1,69 @@
+"""
+Compare two benchmark results created by benchmarks/run.py.
+
+Usage:
+    python -m benchmarks.compare baseline.json current.json [--fail-threshold 10]
+
+Prints the change in throughput and latency percentiles for each scenario. With
+--fail-threshold, exits with a status of 1 if the p95 latency of any scenario
+increased by more than that percentage.
+"""
+import argparse
+import json
+import sys
+
+
+METRICS = ['requests_per_second', 'p50_ms', 'p95_ms', 'p99_ms']
+
+
+def percent_change(baseline: float, current: float) -> float:
+    if not baseline:
+        return 0.0
+    return (current - baseline) / baseline * 100.0
+
+
+def compare(baseline: dict, current: dict) -> dict:
+    """Return {scenario: {metric: (baseline, current, percent change)}} for the common scenarios."""
+    comparison = {}
+    for scenario, current_result in current['results'].items():
+        baseline_result = baseline['results'].get(scenario)
+        if baseline_result is None:
+            continue
+        comparison[scenario] = {
+            metric: (baseline_result.get(metric, 0.0), current_result.get(metric, 0.0),
+                     percent_change(baseline_result.get(metric, 0.0), current_result.get(metric, 0.0)))
+            for metric in METRICS
+        }
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--fail-threshold', type=float, help='maximum allowed increase (%%) of the p95 latency')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+
+    print(f'Baseline: {baseline["commit"]} ({baseline["timestamp"]})   '
+          f'Current: {current["commit"]} ({current["timestamp"]})')
+    regressions = []
+    for scenario, metrics in compare(baseline, current).items():
+        print(f'\n{scenario}')
+        for metric, (baseline_value, current_value, change) in metrics.items():
+            print(f'    {metric:<22} {baseline_value:>10.2f} -> {current_value:>10.2f}   ({change:+.1f}%)')
+        if args.fail_threshold is not None and metrics['p95_ms'][2] > args.fail_threshold:
+            regressions.append(scenario)
+
+    if regressions:
+        print(f'\nRegression of the p95 latency above {args.fail_threshold}%: {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,20 @@
+"""
+Configuration of the Flask application for the benchmarks.
+
+The database and the Alpha Vantage URL are read from environment variables,
+which are set by benchmarks/run.py before the application is created.
+"""
+from config import Config
+import os
+
+
+class BenchmarkConfig(Config):
+    SECRET_KEY = 'benchmark-secret-key'
+    SQLALCHEMY_DATABASE_URI = os.environ['BENCHMARK_DATABASE_URL']
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_BINDS = {}
+    WTF_CSRF_ENABLED = False
+    MAIL_SUPPRESS_SEND = True
+    LOG_REQUEST_CALLBACK_SAMPLE_RATE = 0.0
+    ALPHA_VANTAGE_API_KEY = 'benchmark'
+    ALPHA_VANTAGE_BASE_URL = os.environ['BENCHMARK_ALPHA_VANTAGE_URL']
@@ -0,0 +1,40 @@
+"""
+Seeded databases for the benchmarks.
+
+One database contains both populations that are benchmarked:
+    * many users with a typical portfolio (default: 1,000 users x 50 lots)
+    * one user with a very large portfolio (default: 1 user x 10,000 lots)
+
+The rows are generated by project/stocks/seed.py (the same generator as the
+`flask stocks seed` command) with a fixed random seed, so the datasets are
+identical between commits.
+"""
+from project import database
+from project.models import Stock
+from project.stocks.seed import generate_lots, insert_in_batches, seed_users
+import random
+
+
+PASSWORD = 'BenchmarkPassword123'
+LARGE_PORTFOLIO_EMAIL = 'large-portfolio0@example.com'
+
+
+def user_email(index: int) -> str:
+    return f'user{index}@example.com'
+
+
+def seed_database(num_users: int = 1000, lots_per_user: int = 50, large_portfolio_lots: int = 10000,
+                  seed: int = 42, batch_size: int = 10000) -> int:
+    """Create the tables, insert the users and the stock lots, and return the ID of the large portfolio user."""
+    random_generator = random.Random(seed)
+    database.drop_all()
+    database.create_all()
+
+    user_ids = seed_users(num_users, PASSWORD, 'user', batch_size)
+    large_portfolio_user_id = seed_users(1, PASSWORD, 'large-portfolio', batch_size)[0]
+    lots = generate_lots(random_generator, user_ids, lots_per_user, vary_lot_count=False)
+    lots.extend(generate_lots(random_generator, [large_portfolio_user_id], large_portfolio_lots,
+                              vary_lot_count=False))
+    insert_in_batches(Stock, lots, batch_size)
+    database.session.commit()
+    return large_portfolio_user_id
@@ -0,0 +1,142 @@
+"""
+Local fake of the Alpha Vantage API for the benchmarks.
+
+Supports the GLOBAL_QUOTE and TIME_SERIES_WEEKLY_ADJUSTED functions with
+deterministic prices for each symbol. Each response can be delayed by a fixed
+latency, and the API rate limit can be simulated by returning the 'Note'
+response (as Alpha Vantage does) once more than `rate_limit_per_minute` calls
+have been made in the last minute.
+
+It can also be run on its own:
+    python -m benchmarks.fake_alpha_vantage --port 8081 --latency-ms 150 --rate-limit 75
+"""
+from collections import deque
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import argparse
+import json
+import threading
+import time
+import zlib
+
+
+RATE_LIMIT_NOTE = {'Note': 'Thank you for using Alpha Vantage! Our standard API call frequency is '
+                           '5 calls per minute and 500 calls per day.'}
+
+
+def base_price(symbol: str) -> float:
+    """Deterministic share price between $10 and $500 for a symbol."""
+    return 10.0 + (zlib.crc32(symbol.encode()) % 49000) / 100.0
+
+
+def global_quote(symbol: str) -> dict:
+    return {
+        'Global Quote': {
+            '01. symbol': symbol,
+            '05. price': f'{base_price(symbol):.4f}',
+            '07. latest trading day': date.today().isoformat()
+        }
+    }
+
+
+def weekly_adjusted(symbol: str, weeks: int) -> dict:
+    # Latest week first, as returned by Alpha Vantage
+    price = base_price(symbol)
+    last_friday = date.today() - timedelta(days=(date.today().weekday() - 4) % 7)
+    series = {}
+    for week in range(weeks):
+        close = price * (1.0 + 0.02 * ((zlib.crc32(f'{symbol}{week}'.encode()) % 100) - 50) / 50.0)
+        series[(last_friday - timedelta(weeks=week)).isoformat()] = {
+            '4. close': f'{close:.4f}',
+            '5. adjusted close': f'{close:.4f}',
+            '7. dividend amount': '0.0000'
+        }
+    return {
+        'Meta Data': {'2. Symbol': symbol, '3. Last Refreshed': last_friday.isoformat()},
+        'Weekly Adjusted Time Series': series
+    }
+
+
+class FakeAlphaVantageServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0, rate_limit_per_minute: int = 0, weeks: int = 1000):
+        super().__init__(address, FakeAlphaVantageHandler)
+        self.latency = latency
+        self.rate_limit_per_minute = rate_limit_per_minute
+        self.weeks = weeks
+        self.call_count = 0
+        self.rate_limited_count = 0
+        self._call_times = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.server_address[0]}:{self.server_address[1]}/query'
+
+    def is_rate_limited(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self.call_count += 1
+            if not self.rate_limit_per_minute:
+                return False
+            while self._call_times and now - self._call_times[0] > 60.0:
+                self._call_times.popleft()
+            if len(self._call_times) >= self.rate_limit_per_minute:
+                self.rate_limited_count += 1
+                return True
+            self._call_times.append(now)
+            return False
+
+    def start_in_background(self):
+        threading.Thread(target=self.serve_forever, name='fake-alpha-vantage', daemon=True).start()
+        return self
+
+
+class FakeAlphaVantageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        function = query.get('function', [''])[0]
+        symbol = query.get('symbol', [''])[0]
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if self.server.is_rate_limited():
+            body = RATE_LIMIT_NOTE
+        elif function == 'GLOBAL_QUOTE':
+            body = global_quote(symbol)
+        elif function == 'TIME_SERIES_WEEKLY_ADJUSTED':
+            body = weekly_adjusted(symbol, self.server.weeks)
+        else:
+            self.send_error(400, f'Unsupported function: {function}')
+            return
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Don't log every request to stderr during the benchmarks
+        pass
+
+
+def start_fake_server(latency: float = 0.0, rate_limit_per_minute: int = 0, port: int = 0) -> FakeAlphaVantageServer:
+    """Start the fake server in a background thread (port 0 picks a free port)."""
+    return FakeAlphaVantageServer(('127.0.0.1', port), latency, rate_limit_per_minute).start_in_background()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=0, help='calls per minute (0 = unlimited)')
+    args = parser.parse_args()
+
+    server = FakeAlphaVantageServer(('127.0.0.1', args.port), args.latency_ms / 1000, args.rate_limit)
+    print(f'Fake Alpha Vantage API listening on {server.base_url}')
+    server.serve_forever()
@@ -0,0 +1,113 @@
+"""
+Benchmark of the fixed-point money amounts (project/money.py) against the float path that they replaced.
+
+For a set of positions with Alpha Vantage quotes ('05. price' with four decimal
+places), each path parses the quotes and the purchase prices, and computes the
+position values and the total value of the portfolio:
+    * float - int(float(price) * 100) cents, and the total summed as float dollars
+      (the path of `Stock.get_stock_data()` and `list_stocks()` before the change)
+    * fixed_point - `to_units()` parsed with Decimal, and integer products and sums
+The time of the parsing and of the aggregation is reported separately, along with
+the number of positions whose float value differs from the exact value and the
+error of the float total.
+
+Usage (from the top-level folder of the project):
+    python -m benchmarks.money --positions 10000 --repeat 5
+    python -m benchmarks.money --output money.json
+"""
+from benchmarks.run import git_commit
+from datetime import datetime
+from decimal import Decimal
+from project.money import format_amount, to_units, UNITS
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+
+def generate_positions(count: int, seed: int) -> list:
+    """(quote text with four decimal places, purchase price text, number of shares) of `count` positions."""
+    random_generator = random.Random(seed)
+    return [(f'{random_generator.randint(1_0000, 5000_0000) / 10000:.4f}',
+             f'{random_generator.randint(100, 50000) / 100:.2f}',
+             random_generator.randint(1, 5000)) for _ in range(count)]
+
+
+def float_path(positions: list) -> tuple:
+    start = time.perf_counter()
+    prices = [int(float(quote) * 100) for quote, _, _ in positions]
+    purchase_prices = [int(float(purchase_price) * 100) for _, purchase_price, _ in positions]
+    parsed = time.perf_counter()
+    values = [price * shares for price, (_, _, shares) in zip(prices, positions)]
+    total = sum(float(value / 100) for value in values)
+    cost = sum(float(purchase_price * shares / 100) for purchase_price, (_, _, shares) in zip(purchase_prices, positions))
+    aggregated = time.perf_counter()
+    return parsed - start, aggregated - parsed, values, round(total, 2), round(cost, 2)
+
+
+def fixed_point_path(positions: list) -> tuple:
+    start = time.perf_counter()
+    prices = [to_units(quote) for quote, _, _ in positions]
+    purchase_prices = [to_units(purchase_price) for _, purchase_price, _ in positions]
+    parsed = time.perf_counter()
+    values = [price * shares for price, (_, _, shares) in zip(prices, positions)]
+    total = sum(values)
+    cost = sum(purchase_price * shares for purchase_price, (_, _, shares) in zip(purchase_prices, positions))
+    aggregated = time.perf_counter()
+    return parsed - start, aggregated - parsed, values, total, cost
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--positions', type=int, default=10000, help='positions in the portfolio')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each path (the fastest run is reported)')
+    parser.add_argument('--seed', type=int, default=42, help='seed of the random positions')
+    parser.add_argument('--output', help='file for the JSON results (default: stdout)')
+    args = parser.parse_args(argv)
+
+    positions = generate_positions(args.positions, args.seed)
+    exact_values = [Decimal(quote) * shares for quote, _, shares in positions]
+    exact_total = sum(exact_values)
+
+    results = {}
+    for name, path in (('float', float_path), ('fixed_point', fixed_point_path)):
+        runs = [path(positions) for _ in range(args.repeat)]
+        parse_seconds = min(run[0] for run in runs)
+        aggregate_seconds = min(run[1] for run in runs)
+        _, _, values, total, cost = runs[0]
+        if name == 'float':
+            mismatched = sum(Decimal(value) / 100 != exact for value, exact in zip(values, exact_values))
+            total_error = abs(Decimal(str(total)) - exact_total)
+            total_text = f'{total:.2f}'
+        else:
+            mismatched = sum(Decimal(value) / UNITS != exact for value, exact in zip(values, exact_values))
+            total_error = abs(Decimal(total) / UNITS - exact_total)
+            total_text = format_amount(total)
+        results[name] = {'parse_ms': round(parse_seconds * 1000, 3),
+                         'aggregate_ms': round(aggregate_seconds * 1000, 3),
+                         'total': total_text,
+                         'mismatched_positions': mismatched,
+                         'total_error': f'{total_error:f}'}
+        print(f'{name:>12}   parse {results[name]["parse_ms"]:>9.3f} ms   '
+              f'aggregate {results[name]["aggregate_ms"]:>9.3f} ms   '
+              f'{mismatched} of {len(positions)} positions inexact   total error {total_error:f}', file=sys.stderr)
+
+    output = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'parameters': vars(args),
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+    return output
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Load test and benchmark of the hot endpoints of the Flask Stock Portfolio App.
+
+The application is served by a threaded WSGI server on a local port, with a
+fake Alpha Vantage API (benchmarks/fake_alpha_vantage.py) and a seeded SQLite
+database (benchmarks/datasets.py). Each scenario is run with a number of
+concurrent clients, and the throughput (requests/second) and the latency
+percentiles (p50/p95/p99) are reported as JSON so that runs can be compared
+between commits with benchmarks/compare.py.
+
+Usage (from the top-level folder of the project):
+    python -m benchmarks.run --output bench_output.json
+    python -m benchmarks.run --users 100 --large-lots 1000 --requests 50   # quick run
+    python -m benchmarks.compare baseline.json bench_output.json
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse
+import json
+import os
+import platform
+import requests
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def percentile_summary(latencies: list, elapsed: float, errors: int) -> dict:
+    """Summarize the latencies (in seconds) of one scenario."""
+    summary = {'requests': len(latencies), 'errors': errors,
+               'requests_per_second': round(len(latencies) / elapsed, 2) if elapsed else 0.0}
+    if len(latencies) >= 2:
+        cut_points = statistics.quantiles(latencies, n=100, method='inclusive')
+        summary.update({'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+                        'p50_ms': round(cut_points[49] * 1000, 2),
+                        'p95_ms': round(cut_points[94] * 1000, 2),
+                        'p99_ms': round(cut_points[98] * 1000, 2),
+                        'max_ms': round(max(latencies) * 1000, 2)})
+    return summary
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class Client(object):
+    """HTTP client with its own session (cookies), like a browser."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def get(self, path: str):
+        return self.session.get(self.base_url + path, allow_redirects=False)
+
+    def post(self, path: str, data: dict):
+        return self.session.post(self.base_url + path, data=data, allow_redirects=False)
+
+    def log_in(self, email: str, password: str):
+        response = self.post('/users/login', {'email': email, 'password': password})
+        if response.status_code != 302:
+            raise RuntimeError(f'Unable to log in as {email} (status code: {response.status_code})')
+        return self
+
+
+def run_scenario(name: str, make_client, request_function, num_requests: int, concurrency: int,
+                 warmup_requests: int) -> dict:
+    """
+    Run `request_function(client, index)` `num_requests` times from `concurrency` threads.
+
+    Each thread uses its own client created by `make_client(thread_index)`. Responses
+    with a status code of 400 or more (or exceptions) are counted as errors.
+    """
+    clients = [make_client(index) for index in range(concurrency)]
+    for index in range(warmup_requests):
+        request_function(clients[index % concurrency], index)
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(thread_index):
+        nonlocal errors
+        client = clients[thread_index]
+        for index in range(thread_index, num_requests, concurrency):
+            start = time.perf_counter()
+            try:
+                failed = request_function(client, index).status_code >= 400
+            except Exception:
+                failed = True
+            duration = time.perf_counter() - start
+            with lock:
+                latencies.append(duration)
+                errors += int(failed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    summary = percentile_summary(latencies, elapsed, errors)
+    print(f'{name:<32} {summary["requests_per_second"]:>9.1f} req/s   '
+          f'p50 {summary.get("p50_ms", 0):>8.1f} ms   p95 {summary.get("p95_ms", 0):>8.1f} ms   '
+          f'p99 {summary.get("p99_ms", 0):>8.1f} ms   errors {errors}', file=sys.stderr)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000, help='number of users with a typical portfolio')
+    parser.add_argument('--lots', type=int, default=50, help='stock lots per typical user')
+    parser.add_argument('--large-lots', type=int, default=10000, help='stock lots of the large portfolio user')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='concurrent clients per scenario')
+    parser.add_argument('--warmup', type=int, default=4, help='requests before measuring each scenario')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='latency of the fake Alpha Vantage API')
+    parser.add_argument('--rate-limit', type=int, default=0,
+                        help='calls per minute allowed by the fake Alpha Vantage API (0 = unlimited)')
+    parser.add_argument('--scenarios', default='all', help='comma-separated scenario names')
+    parser.add_argument('--output', help='file for the JSON results (default: stdout)')
+    args = parser.parse_args(argv)
+
+    from benchmarks.fake_alpha_vantage import start_fake_server
+    fake_server = start_fake_server(args.latency_ms / 1000, args.rate_limit)
+
+    # The benchmark configuration is read when the application is created
+    database_folder = tempfile.mkdtemp(prefix='stock-portfolio-benchmark-')
+    os.environ['BENCHMARK_DATABASE_URL'] = f"sqlite:///{os.path.join(database_folder, 'benchmark.db')}"
+    os.environ['BENCHMARK_ALPHA_VANTAGE_URL'] = fake_server.base_url
+    os.environ['CONFIG_TYPE'] = 'benchmarks.config.BenchmarkConfig'
+
+    from benchmarks import datasets
+    from project import create_app, database
+    from project.models import Stock
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    app = create_app()
+    with app.app_context():
+        seed_start = time.perf_counter()
+        large_portfolio_user_id = datasets.seed_database(args.users, args.lots, args.large_lots)
+        seed_seconds = time.perf_counter() - seed_start
+        query = database.select(Stock.id).where(Stock.user_id == large_portfolio_user_id)
+        large_portfolio_stock_ids = database.session.execute(query).scalars().all()
+
+    app_server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=app_server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{app_server.server_port}'
+
+    def typical_user_client(thread_index):
+        return Client(base_url).log_in(datasets.user_email(thread_index % max(args.users, 1)), datasets.PASSWORD)
+
+    def large_portfolio_client(thread_index):
+        return Client(base_url).log_in(datasets.LARGE_PORTFOLIO_EMAIL, datasets.PASSWORD)
+
+    def anonymous_client(thread_index):
+        return Client(base_url)
+
+    def add_stock(client, index):
+        return client.post('/add_stock', {'stock_symbol': datasets.SYMBOLS[index % len(datasets.SYMBOLS)],
+                                          'number_of_shares': '10',
+                                          'purchase_price': '123.45',
+                                          'purchase_date': '2020-07-01'})
+
+    def log_in(client, index):
+        client.session.cookies.clear()
+        return client.post('/users/login', {'email': datasets.user_email(index % max(args.users, 1)),
+                                            'password': datasets.PASSWORD})
+
+    scenarios = {
+        'list_stocks': (typical_user_client, lambda client, index: client.get('/stocks/')),
+        'list_stocks_large_portfolio': (large_portfolio_client, lambda client, index: client.get('/stocks/')),
+        'stock_details': (large_portfolio_client, lambda client, index: client.get(
+            f'/stocks/{large_portfolio_stock_ids[index % len(large_portfolio_stock_ids)]}')),
+        'login': (anonymous_client, log_in),
+        'add_stock': (typical_user_client, add_stock),
+    }
+    selected = list(scenarios) if args.scenarios == 'all' else args.scenarios.split(',')
+    if 'stock_details' in selected and not large_portfolio_stock_ids:
+        selected.remove('stock_details')
+
+    results = {}
+    for name in selected:
+        make_client, request_function = scenarios[name]
+        results[name] = run_scenario(name, make_client, request_function, args.requests,
+                                     args.concurrency, args.warmup)
+    app_server.shutdown()
+    fake_server.shutdown()
+
+    output = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'parameters': vars(args),
+        'dataset': {'users': args.users, 'lots_per_user': args.lots,
+                    'large_portfolio_lots': args.large_lots, 'seed_seconds': round(seed_seconds, 2)},
+        'fake_alpha_vantage': {'calls': fake_server.call_count,
+                               'rate_limited': fake_server.rate_limited_count},
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+    return output
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark of the upstream cost of the watchlists as the number of watchers grows.
+
+Every user watches the same symbols, and each round starts with no stored
+quotes: N users request their watchlist page at the same time, and the number
+of calls to the (fake) Alpha Vantage API is counted. As the quotes are shared
+by all users and refreshed once per symbol by the quote refresher, the number
+of upstream calls stays equal to the number of symbols however many users
+watch them, while the latency of the page stays flat (it is served from the
+stored quotes with one query).
+
+Usage (from the top-level folder of the project):
+    python -m benchmarks.watchlists --watchers 10,100,1000 --symbols 20
+    python -m benchmarks.watchlists --latency-ms 150 --output watchlists.json
+"""
+from benchmarks.run import Client, git_commit, percentile_summary
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+
+PASSWORD = 'BenchmarkPassword123'
+
+
+def watcher_email(index: int) -> str:
+    return f'watcher{index}@example.com'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--watchers', default='10,100,1000', help='comma-separated numbers of watchers per round')
+    parser.add_argument('--symbols', type=int, default=20, help='symbols in every watchlist')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='latency of the fake Alpha Vantage API')
+    parser.add_argument('--output', help='file for the JSON results (default: stdout)')
+    args = parser.parse_args(argv)
+    watcher_counts = [int(count) for count in args.watchers.split(',')]
+
+    from benchmarks.fake_alpha_vantage import start_fake_server
+    fake_server = start_fake_server(args.latency_ms / 1000)
+
+    # The benchmark configuration is read when the application is created
+    database_folder = tempfile.mkdtemp(prefix='stock-portfolio-benchmark-')
+    os.environ['BENCHMARK_DATABASE_URL'] = f"sqlite:///{os.path.join(database_folder, 'benchmark.db')}"
+    os.environ['BENCHMARK_ALPHA_VANTAGE_URL'] = fake_server.base_url
+    os.environ['CONFIG_TYPE'] = 'benchmarks.config.BenchmarkConfig'
+
+    from project import create_app, database
+    from project.models import Quote, WatchlistItem
+    from project.stocks.seed import SYMBOLS, insert_in_batches, seed_users
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    symbols = SYMBOLS[:args.symbols]
+    app = create_app()
+    with app.app_context():
+        database.drop_all()
+        database.create_all()
+        user_ids = seed_users(max(watcher_counts), PASSWORD, 'watcher')
+        insert_in_batches(WatchlistItem, [{'user_id': user_id, 'stock_symbol': symbol, 'added_on': datetime.now()}
+                                          for user_id in user_ids for symbol in symbols], 10000)
+        database.session.commit()
+
+    app_server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=app_server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{app_server.server_port}'
+    quote_refresher = app.extensions['quote_refresher']
+
+    results = {}
+    for watchers in watcher_counts:
+        # Start each round without any stored quotes
+        with app.app_context():
+            database.session.execute(database.delete(Quote))
+            database.session.commit()
+        quote_refresher.last_refreshed.clear()
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            clients = list(executor.map(lambda index: Client(base_url).log_in(watcher_email(index), PASSWORD),
+                                        range(watchers)))
+        calls_before = fake_server.call_count
+        latencies = []
+        errors = 0
+        lock = threading.Lock()
+
+        def view_watchlist(client):
+            nonlocal errors
+            request_start = time.perf_counter()
+            failed = client.get('/stocks/watchlist').status_code >= 400
+            with lock:
+                latencies.append(time.perf_counter() - request_start)
+                errors += int(failed)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(view_watchlist, clients))
+        elapsed = time.perf_counter() - start
+
+        # Wait for the background refresh of the quotes
+        deadline = time.monotonic() + 60
+        while quote_refresher.in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        summary = percentile_summary(latencies, elapsed, errors)
+        summary['upstream_calls'] = fake_server.call_count - calls_before
+        summary['upstream_calls_per_watcher'] = round(summary['upstream_calls'] / watchers, 4)
+        results[f'watchers_{watchers}'] = summary
+        print(f'{watchers:>6} watchers   {summary["upstream_calls"]:>5} upstream calls '
+              f'({summary["upstream_calls_per_watcher"]:.4f} per watcher)   '
+              f'p50 {summary.get("p50_ms", 0):>8.1f} ms   p95 {summary.get("p95_ms", 0):>8.1f} ms   '
+              f'errors {errors}', file=sys.stderr)
+    app_server.shutdown()
+    fake_server.shutdown()
+
+    output = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'parameters': vars(args),
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+    return output
+
+
+if __name__ == '__main__':
+    main()
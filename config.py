@@ -6,16 +6,67 @@ from datetime import timedelta
 BASEDIR = os.path.abspath(os.path.dirname(__file__))
 
 
+def get_database_url(environment_variable):
+    database_url = os.getenv(environment_variable)
+    if database_url:
+        return database_url.replace("postgres://", "postgresql://", 1)
+    return None
+
+
+def build_engine_options(database_uri):
+    """
+    Build the SQLAlchemy engine options for a PostgreSQL database.
+
+    Each gunicorn worker process has its own connection pool, so the pool is sized
+    for the number of threads in a worker (GUNICORN_THREADS). If DB_MAX_CONNECTIONS
+    is set, the connections of all of the workers (WEB_CONCURRENCY) are limited to
+    that number, as the database server rejects connections above its limit.
+
+    SQLite databases use the default options.
+    """
+    if not database_uri.startswith('postgresql'):
+        return {}
+
+    workers = int(os.getenv('WEB_CONCURRENCY', default=1))
+    threads = int(os.getenv('GUNICORN_THREADS', default=4))
+    pool_size = int(os.getenv('DB_POOL_SIZE', default=threads))
+    max_overflow = int(os.getenv('DB_MAX_OVERFLOW', default=threads))
+    if os.getenv('DB_MAX_CONNECTIONS'):
+        connections_per_worker = max(1, int(os.getenv('DB_MAX_CONNECTIONS')) // workers)
+        pool_size = min(pool_size, connections_per_worker)
+        max_overflow = min(max_overflow, connections_per_worker - pool_size)
+
+    statement_timeout = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', default=5000))
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', default=10)),
+        # Check that a connection is still alive before using it, and replace
+        # connections before the server (or a proxy) closes idle connections
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', default=1800)),
+        # Have the database server cancel any statement that runs too long
+        'connect_args': {'options': f'-c statement_timeout={statement_timeout}',
+                         'application_name': 'flask-stock-portfolio'}
+    }
+
+
 class Config(object):
     FLASK_ENV = 'development'
     DEBUG = False
     TESTING = False
     SECRET_KEY = os.getenv('SECRET_KEY')
-    if os.getenv('DATABASE_URL'):
-        SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL').replace("postgres://", "postgresql://", 1)
-    else:
-        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(BASEDIR, 'instance', 'app.db')}"
+    SQLALCHEMY_DATABASE_URI = (get_database_url('DATABASE_URL') or
+                               f"sqlite:///{os.path.join(BASEDIR, 'instance', 'app.db')}")
+    SQLALCHEMY_ENGINE_OPTIONS = build_engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Optional read replica for the read-only views (see project/db.py)
+    SQLALCHEMY_BINDS = {}
+    if get_database_url('DATABASE_REPLICA_URL'):
+        SQLALCHEMY_BINDS['replica'] = {'url': get_database_url('DATABASE_REPLICA_URL'),
+                                       **build_engine_options(get_database_url('DATABASE_REPLICA_URL'))}
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=5))
     WTF_CSRF_ENABLED = True
     REMEMBER_COOKIE_DURATION = timedelta(days=14)
     
@@ -30,9 +81,77 @@ class Config(object):
     
     # Logging
     LOG_WITH_GUNICORN = os.getenv('LOG_WITH_GUNICORN', default=False)
+    LOG_FILE_MAX_BYTES = int(os.getenv('LOG_FILE_MAX_BYTES', default=10 * 1024 * 1024))
+    LOG_FILE_BACKUP_COUNT = int(os.getenv('LOG_FILE_BACKUP_COUNT', default=10))
+    # Fraction of the before/after/teardown request callback log messages to keep
+    LOG_REQUEST_CALLBACK_SAMPLE_RATE = float(os.getenv('LOG_REQUEST_CALLBACK_SAMPLE_RATE', default=0.01))
+    
+    # Metrics ('/metrics' endpoint in the Prometheus text format)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', default='False').lower() in ('true', '1')
+    METRICS_AUTH_TOKEN = os.getenv('METRICS_AUTH_TOKEN')
+    
+    # Profiling of slow requests (written to the 'instance/profiles' folder by default)
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', default='False').lower() in ('true', '1')
+    PROFILING_FOLDER = os.getenv('PROFILING_FOLDER')
+    PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL', default=0.005))
+    PROFILING_SLOW_REQUEST_THRESHOLD = float(os.getenv('PROFILING_SLOW_REQUEST_THRESHOLD', default=1.0))
+    PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', default=0.0))
+    PROFILING_USER_IDS = [user_id for user_id in os.getenv('PROFILING_USER_IDS', default='').split(',') if user_id]
+    PROFILING_MAX_DISK_BYTES = int(os.getenv('PROFILING_MAX_DISK_BYTES', default=50 * 1024 * 1024))
+    
+    # Market data provider: 'alpha_vantage' or 'local' (price files in MARKET_DATA_PATH, see project/market_data)
+    MARKET_DATA_PROVIDER = os.getenv('MARKET_DATA_PROVIDER', default='alpha_vantage')
+    MARKET_DATA_PATH = os.getenv('MARKET_DATA_PATH', default=os.path.join(BASEDIR, 'instance', 'market_data'))
+    # Seconds to wait for the market data provider to connect or to send data (the requests run on background workers)
+    MARKET_DATA_TIMEOUT = float(os.getenv('MARKET_DATA_TIMEOUT', default=10))
+    
+    # Number of the latest transactions of the ledger displayed (see project/stocks/ledger.py)
+    TRANSACTIONS_PER_PAGE = int(os.getenv('TRANSACTIONS_PER_PAGE', default=50))
+    
+    # Listed symbols and company names for the symbol search (see project/stocks/symbols.py)
+    SYMBOL_LISTING_PATH = os.getenv('SYMBOL_LISTING_PATH', default=os.path.join(BASEDIR, 'instance', 'symbols.csv'))
+    SYMBOL_INDEX_PATH = os.getenv('SYMBOL_INDEX_PATH', default=os.path.join(BASEDIR, 'instance', 'symbols.idx'))
     
     # Alpha Vantage API Key
     ALPHA_VANTAGE_API_KEY = os.getenv('ALPHA_VANTAGE_API_KEY')
+    ALPHA_VANTAGE_BASE_URL = os.getenv('ALPHA_VANTAGE_BASE_URL', default='https://www.alphavantage.co/query')
+    
+    # Background refresh of the stale prices of the list of stocks (see project/stocks/quotes.py)
+    QUOTE_REFRESH_WORKERS = int(os.getenv('QUOTE_REFRESH_WORKERS', default=2))
+    QUOTE_REFRESH_RETRY_SECONDS = float(os.getenv('QUOTE_REFRESH_RETRY_SECONDS', default=60))
+    
+    # The in-memory index of the price alerts is reloaded to pick up the changes of other processes
+    ALERT_INDEX_RELOAD_SECONDS = float(os.getenv('ALERT_INDEX_RELOAD_SECONDS', default=300))
+    
+    # Live price stream of the list of stocks (see project/stocks/stream.py)
+    STREAM_HEARTBEAT_SECONDS = float(os.getenv('STREAM_HEARTBEAT_SECONDS', default=15))
+    STREAM_REFRESH_SECONDS = float(os.getenv('STREAM_REFRESH_SECONDS', default=60))
+    # Streams are closed after this long (the browser reconnects), so they are spread across the workers
+    STREAM_MAX_SECONDS = float(os.getenv('STREAM_MAX_SECONDS', default=300))
+    # Each open stream holds a thread of a worker, so only half of the threads of a worker serve streams
+    STREAM_MAX_PER_WORKER = int(os.getenv('STREAM_MAX_PER_WORKER',
+                                          default=max(1, int(os.getenv('GUNICORN_THREADS', default=4)) // 2)))
+    STREAM_BUSY_RETRY_SECONDS = float(os.getenv('STREAM_BUSY_RETRY_SECONDS', default=30))
+    
+    # Charts of weekly prices (see project/stocks/charts.py)
+    CHART_DEFAULT_WIDTH = int(os.getenv('CHART_DEFAULT_WIDTH', default=500))
+    CHART_MAX_WIDTH = int(os.getenv('CHART_MAX_WIDTH', default=2000))
+    CHART_CACHE_SECONDS = int(os.getenv('CHART_CACHE_SECONDS', default=3600))
+    CHART_CACHE_MAX_ENTRIES = int(os.getenv('CHART_CACHE_MAX_ENTRIES', default=1024))
+    COMPARE_MAX_SYMBOLS = int(os.getenv('COMPARE_MAX_SYMBOLS', default=8))
+    COMPARE_MAX_POINTS = int(os.getenv('COMPARE_MAX_POINTS', default=1000))
+    # Stored weekly prices older than this are refreshed from Alpha Vantage
+    PRICE_HISTORY_MAX_AGE_DAYS = int(os.getenv('PRICE_HISTORY_MAX_AGE_DAYS', default=7))
+    # Total returns of the portfolios, cached until new weekly prices are stored (see project/stocks/returns.py)
+    RETURNS_CACHE_MAX_ENTRIES = int(os.getenv('RETURNS_CACHE_MAX_ENTRIES', default=1024))
+    # Stored exchange rates are reloaded by each process after this long (see project/stocks/fx.py)
+    FX_CACHE_SECONDS = int(os.getenv('FX_CACHE_SECONDS', default=300))
+    
+    # Tiered store of intraday/daily/weekly prices (see project/stocks/timeseries.py)
+    PRICE_BARS_INTRADAY_RETENTION_DAYS = int(os.getenv('PRICE_BARS_INTRADAY_RETENTION_DAYS', default=7))
+    PRICE_BARS_DAILY_RETENTION_DAYS = int(os.getenv('PRICE_BARS_DAILY_RETENTION_DAYS', default=730))
+    # Minimum number of points of a chart when picking the resolution for a range
+    CHART_MIN_POINTS = int(os.getenv('CHART_MIN_POINTS', default=20))
     
         
 class ProductionConfig(Config):
@@ -46,6 +165,16 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_BINDS = {}
     WTF_CSRF_ENABLED = False
     MAIL_SUPPRESS_SEND = True
+    METRICS_ENABLED = True
+    METRICS_AUTH_TOKEN = None
+    CHART_CACHE_SECONDS = 0
+    QUOTE_REFRESH_WORKERS = 0
+    QUOTE_REFRESH_RETRY_SECONDS = 0
+    STREAM_MAX_SECONDS = 0
+    SYMBOL_LISTING_PATH = None
+    SYMBOL_INDEX_PATH = None
     
\ No newline at end of file
@@ -0,0 +1,34 @@
+"""
+Gunicorn configuration for the Flask Stock Portfolio App.
+
+When the PROMETHEUS_MULTIPROC_DIR environment variable is set, each worker
+writes its metrics to that directory so that '/metrics' can aggregate the
+metrics from all of the workers. The files of a worker that exits need to be
+marked as dead so that its gauges are no longer included.
+
+The database schema is upgraded once by the master process before the workers
+are started (see project/schema.py), so the workers never serve requests with
+an outdated schema and do not run the migrations concurrently.
+"""
+from prometheus_client import multiprocess
+import os
+import subprocess
+import sys
+
+
+# The database connection pools are sized from the same settings (see config.py)
+workers = int(os.getenv('WEB_CONCURRENCY', default=1))
+threads = int(os.getenv('GUNICORN_THREADS', default=4))
+
+# Each live price stream (/stocks/stream) holds a thread while it is open, so the
+# workers are threaded and a worker only serves STREAM_MAX_PER_WORKER streams
+worker_class = 'gthread'
+
+
+def on_starting(server):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db', 'upgrade'], check=True)
+
+
+def child_exit(server, worker):
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,60 @@
+"""Baseline schema: users and stocks
+
+Revision ID: 35493138c9c3
+Revises: 
+Create Date: 2026-10-19 09:00:00.000000
+
+The databases created before the migrations were added already have these
+tables (created by `database.create_all()`), so they are only created if they
+are missing, and upgrading such a database starts from this revision.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '35493138c9c3'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def has_table(table_name):
+    return sa.inspect(op.get_bind()).has_table(table_name)
+
+
+def upgrade():
+    if not has_table('users'):
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('email', sa.String(), nullable=True),
+            sa.Column('password_hashed', sa.String(length=256), nullable=True),
+            sa.Column('registered_on', sa.DateTime(), nullable=True),
+            sa.Column('email_confirmation_sent_on', sa.DateTime(), nullable=True),
+            sa.Column('email_confirmed', sa.Boolean(), nullable=True),
+            sa.Column('email_confirmed_on', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id', name='pk_users'),
+            sa.UniqueConstraint('email', name='uq_users_email')
+        )
+    if not has_table('stocks'):
+        op.create_table(
+            'stocks',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('stock_symbol', sa.String(), nullable=True),
+            sa.Column('number_of_shares', sa.Integer(), nullable=True),
+            sa.Column('purchase_price', sa.Integer(), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('purchase_date', sa.DateTime(), nullable=True),
+            sa.Column('current_price', sa.Integer(), nullable=True),
+            sa.Column('current_price_date', sa.DateTime(), nullable=True),
+            sa.Column('position_value', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_stocks_user_id_users'),
+            sa.PrimaryKeyConstraint('id', name='pk_stocks')
+        )
+
+
+def downgrade():
+    op.drop_table('stocks')
+    op.drop_table('users')
@@ -0,0 +1,48 @@
+"""Store the number of shares of the stocks in units of 1/1,000,000 in a BigInteger column
+
+Revision ID: 7bf59f04b176
+Revises: a26d0bd4838b
+Create Date: 2026-10-19 09:40:00.000000
+
+The number of shares of the stocks was stored in whole shares in an Integer
+column, and it is now stored in units of 1/1,000,000 of a share (see
+project/money.py) in a BigInteger column, so it is multiplied by 1,000,000
+once, when the column is changed to BigInteger (the position values are in
+money units, so they are unchanged). As for the amounts of money, a column that
+is already a BigInteger (in a database that was not stamped) is left as it is.
+
+The transactions and the tax lots of the ledger hold whole shares, so they are
+not changed.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7bf59f04b176'
+down_revision = 'a26d0bd4838b'
+branch_labels = None
+depends_on = None
+
+
+SHARE_UNITS = 1_000_000
+
+
+def is_big_integer(table_name, column_name):
+    column_types = {column['name']: column['type'] for column in sa.inspect(op.get_bind()).get_columns(table_name)}
+    return isinstance(column_types[column_name], sa.BigInteger)
+
+
+def upgrade():
+    if is_big_integer('stocks', 'number_of_shares'):
+        return
+    op.execute(f'UPDATE stocks SET number_of_shares = number_of_shares * {SHARE_UNITS}')
+    with op.batch_alter_table('stocks') as batch_op:
+        batch_op.alter_column('number_of_shares', existing_type=sa.Integer(), type_=sa.BigInteger())
+
+
+def downgrade():
+    op.execute(f'UPDATE stocks SET number_of_shares = number_of_shares / {SHARE_UNITS}')
+    with op.batch_alter_table('stocks') as batch_op:
+        batch_op.alter_column('number_of_shares', existing_type=sa.BigInteger(), type_=sa.Integer())
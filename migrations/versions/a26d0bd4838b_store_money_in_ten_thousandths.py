@@ -0,0 +1,64 @@
+"""Store the amounts of money in units of 1/10,000 in BigInteger columns
+
+Revision ID: a26d0bd4838b
+Revises: b30b3dcb6f8f
+Create Date: 2026-10-19 09:30:00.000000
+
+The amounts of money were stored in cents in Integer columns, and they are now
+stored in units of 1/10,000 of their currency (see project/money.py) in
+BigInteger columns, so the amounts are multiplied by 100 once, when their
+column is changed to BigInteger.
+
+The revision in the alembic_version table records that the amounts were
+converted. A database that was created by `database.create_all()` after the
+amounts were changed (but before the migrations were added) is not stamped, so
+a column that is already a BigInteger is left as it is.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a26d0bd4838b'
+down_revision = 'b30b3dcb6f8f'
+branch_labels = None
+depends_on = None
+
+
+# Columns of the amounts of money of each table
+MONEY_COLUMNS = {
+    'stocks': ['purchase_price', 'current_price', 'position_value'],
+    'price_history': ['close', 'dividend'],
+    'price_bars': ['close'],
+    'quotes': ['price'],
+    'price_alerts': ['threshold', 'reference_price', 'triggered_price'],
+    'transactions': ['price'],
+    'tax_lots': ['cost'],
+    'realized_gains': ['proceeds', 'cost', 'gain'],
+}
+
+
+def integer_columns(table_name, column_names):
+    """Return the columns of a table that are not BigInteger columns yet."""
+    column_types = {column['name']: column['type'] for column in sa.inspect(op.get_bind()).get_columns(table_name)}
+    return [name for name in column_names if not isinstance(column_types[name], sa.BigInteger)]
+
+
+def upgrade():
+    for table_name, column_names in MONEY_COLUMNS.items():
+        columns = integer_columns(table_name, column_names)
+        if not columns:
+            continue
+        op.execute(f'UPDATE {table_name} SET ' + ', '.join(f'{name} = {name} * 100' for name in columns))
+        with op.batch_alter_table(table_name) as batch_op:
+            for name in columns:
+                batch_op.alter_column(name, existing_type=sa.Integer(), type_=sa.BigInteger())
+
+
+def downgrade():
+    for table_name, column_names in MONEY_COLUMNS.items():
+        op.execute(f'UPDATE {table_name} SET ' + ', '.join(f'{name} = ROUND({name} / 100.0)' for name in column_names))
+        with op.batch_alter_table(table_name) as batch_op:
+            for name in column_names:
+                batch_op.alter_column(name, existing_type=sa.BigInteger(), type_=sa.Integer())
@@ -0,0 +1,54 @@
+"""Add the currencies of the stocks and users, and the exchange rates
+
+Revision ID: b30b3dcb6f8f
+Revises: bc18d99ab9eb
+Create Date: 2026-10-19 09:20:00.000000
+
+The prices of the existing stocks and the portfolios of the existing users are
+in US dollars, so the new currency columns are set to 'USD'.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b30b3dcb6f8f'
+down_revision = 'bc18d99ab9eb'
+branch_labels = None
+depends_on = None
+
+
+def has_table(table_name):
+    return sa.inspect(op.get_bind()).has_table(table_name)
+
+
+def has_column(table_name, column_name):
+    return column_name in [column['name'] for column in sa.inspect(op.get_bind()).get_columns(table_name)]
+
+
+def upgrade():
+    if not has_table('fx_rates'):
+        op.create_table(
+            'fx_rates',
+            sa.Column('currency', sa.String(length=3), nullable=False),
+            sa.Column('rate', sa.Float(), nullable=True),
+            sa.Column('rate_date', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('currency', name='pk_fx_rates')
+        )
+
+    if not has_column('stocks', 'currency'):
+        op.add_column('stocks', sa.Column('currency', sa.String(length=3), nullable=True))
+    op.execute("UPDATE stocks SET currency = 'USD' WHERE currency IS NULL")
+
+    if not has_column('users', 'base_currency'):
+        op.add_column('users', sa.Column('base_currency', sa.String(length=3), nullable=True))
+    op.execute("UPDATE users SET base_currency = 'USD' WHERE base_currency IS NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('base_currency')
+    with op.batch_alter_table('stocks') as batch_op:
+        batch_op.drop_column('currency')
+    op.drop_table('fx_rates')
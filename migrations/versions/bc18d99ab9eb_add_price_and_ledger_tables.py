@@ -0,0 +1,185 @@
+"""Add the price history, price bars, quotes, alerts, watchlist, ledger and corporate action tables
+
+Revision ID: bc18d99ab9eb
+Revises: 35493138c9c3
+Create Date: 2026-10-19 09:10:00.000000
+
+The tables (and the `dividend` column of the price history) are only created if
+they are missing, as a database may already have some of them. The amounts are
+in cents, as they were when these tables were added.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bc18d99ab9eb'
+down_revision = '35493138c9c3'
+branch_labels = None
+depends_on = None
+
+
+def has_table(table_name):
+    return sa.inspect(op.get_bind()).has_table(table_name)
+
+
+def has_column(table_name, column_name):
+    return column_name in [column['name'] for column in sa.inspect(op.get_bind()).get_columns(table_name)]
+
+
+def upgrade():
+    if not has_table('price_history'):
+        op.create_table(
+            'price_history',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('stock_symbol', sa.String(), nullable=True),
+            sa.Column('date', sa.Date(), nullable=True),
+            sa.Column('close', sa.Integer(), nullable=True),
+            sa.Column('dividend', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id', name='pk_price_history'),
+            sa.UniqueConstraint('stock_symbol', 'date', name='uq_price_history_stock_symbol')
+        )
+    elif not has_column('price_history', 'dividend'):
+        op.add_column('price_history', sa.Column('dividend', sa.Integer(), nullable=True))
+    op.execute('UPDATE price_history SET dividend = 0 WHERE dividend IS NULL')
+
+    if not has_table('price_bars'):
+        op.create_table(
+            'price_bars',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('stock_symbol', sa.String(), nullable=True),
+            sa.Column('resolution', sa.String(length=8), nullable=True),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+            sa.Column('close', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id', name='pk_price_bars'),
+            sa.UniqueConstraint('stock_symbol', 'resolution', 'timestamp', name='uq_price_bars_stock_symbol')
+        )
+
+    if not has_table('price_alerts'):
+        op.create_table(
+            'price_alerts',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('stock_symbol', sa.String(), nullable=True),
+            sa.Column('kind', sa.String(length=8), nullable=True),
+            sa.Column('threshold', sa.Integer(), nullable=True),
+            sa.Column('percent', sa.Float(), nullable=True),
+            sa.Column('reference_price', sa.Integer(), nullable=True),
+            sa.Column('created_on', sa.DateTime(), nullable=True),
+            sa.Column('triggered_on', sa.DateTime(), nullable=True),
+            sa.Column('triggered_price', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_price_alerts_user_id_users'),
+            sa.PrimaryKeyConstraint('id', name='pk_price_alerts')
+        )
+
+    if not has_table('quotes'):
+        op.create_table(
+            'quotes',
+            sa.Column('stock_symbol', sa.String(), nullable=False),
+            sa.Column('price', sa.Integer(), nullable=True),
+            sa.Column('price_date', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('stock_symbol', name='pk_quotes')
+        )
+
+    if not has_table('watchlist_items'):
+        op.create_table(
+            'watchlist_items',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('stock_symbol', sa.String(), nullable=True),
+            sa.Column('added_on', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_watchlist_items_user_id_users'),
+            sa.PrimaryKeyConstraint('id', name='pk_watchlist_items'),
+            sa.UniqueConstraint('user_id', 'stock_symbol', name='uq_watchlist_items_user_id')
+        )
+
+    if not has_table('transactions'):
+        op.create_table(
+            'transactions',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('stock_symbol', sa.String(), nullable=True),
+            sa.Column('kind', sa.String(length=8), nullable=True),
+            sa.Column('date', sa.DateTime(), nullable=True),
+            sa.Column('quantity', sa.Integer(), nullable=True),
+            sa.Column('price', sa.Integer(), nullable=True),
+            sa.Column('split_numerator', sa.Integer(), nullable=True),
+            sa.Column('split_denominator', sa.Integer(), nullable=True),
+            sa.Column('lot_method', sa.String(length=8), nullable=True),
+            sa.Column('lot_transaction_id', sa.Integer(), nullable=True),
+            sa.Column('created_on', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_transactions_user_id_users'),
+            sa.ForeignKeyConstraint(['lot_transaction_id'], ['transactions.id'],
+                                    name='fk_transactions_lot_transaction_id_transactions'),
+            sa.PrimaryKeyConstraint('id', name='pk_transactions'),
+            sa.UniqueConstraint('user_id', 'stock_symbol', 'date', 'id', name='uq_transactions_user_id')
+        )
+
+    if not has_table('tax_lots'):
+        op.create_table(
+            'tax_lots',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('stock_symbol', sa.String(), nullable=True),
+            sa.Column('transaction_id', sa.Integer(), nullable=True),
+            sa.Column('acquired_on', sa.DateTime(), nullable=True),
+            sa.Column('quantity', sa.Integer(), nullable=True),
+            sa.Column('cost', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_tax_lots_user_id_users'),
+            sa.ForeignKeyConstraint(['transaction_id'], ['transactions.id'],
+                                    name='fk_tax_lots_transaction_id_transactions'),
+            sa.PrimaryKeyConstraint('id', name='pk_tax_lots'),
+            sa.UniqueConstraint('user_id', 'stock_symbol', 'transaction_id', name='uq_tax_lots_user_id')
+        )
+
+    if not has_table('realized_gains'):
+        op.create_table(
+            'realized_gains',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('stock_symbol', sa.String(), nullable=True),
+            sa.Column('transaction_id', sa.Integer(), nullable=True),
+            sa.Column('lot_transaction_id', sa.Integer(), nullable=True),
+            sa.Column('kind', sa.String(length=8), nullable=True),
+            sa.Column('date', sa.DateTime(), nullable=True),
+            sa.Column('quantity', sa.Integer(), nullable=True),
+            sa.Column('proceeds', sa.Integer(), nullable=True),
+            sa.Column('cost', sa.Integer(), nullable=True),
+            sa.Column('gain', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_realized_gains_user_id_users'),
+            sa.ForeignKeyConstraint(['transaction_id'], ['transactions.id'],
+                                    name='fk_realized_gains_transaction_id_transactions'),
+            sa.ForeignKeyConstraint(['lot_transaction_id'], ['transactions.id'],
+                                    name='fk_realized_gains_lot_transaction_id_transactions'),
+            sa.PrimaryKeyConstraint('id', name='pk_realized_gains'),
+            sa.UniqueConstraint('user_id', 'stock_symbol', 'transaction_id', 'lot_transaction_id',
+                                name='uq_realized_gains_user_id')
+        )
+
+    if not has_table('corporate_actions'):
+        op.create_table(
+            'corporate_actions',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('stock_symbol', sa.String(), nullable=True),
+            sa.Column('ex_date', sa.Date(), nullable=True),
+            sa.Column('kind', sa.String(length=8), nullable=True),
+            sa.Column('numerator', sa.Integer(), nullable=True),
+            sa.Column('denominator', sa.Integer(), nullable=True),
+            sa.Column('created_on', sa.DateTime(), nullable=True),
+            sa.Column('applied_on', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id', name='pk_corporate_actions'),
+            sa.UniqueConstraint('stock_symbol', 'ex_date', 'kind', name='uq_corporate_actions_stock_symbol')
+        )
+
+
+def downgrade():
+    op.drop_table('corporate_actions')
+    op.drop_table('realized_gains')
+    op.drop_table('tax_lots')
+    op.drop_table('transactions')
+    op.drop_table('watchlist_items')
+    op.drop_table('quotes')
+    op.drop_table('price_alerts')
+    op.drop_table('price_bars')
+    op.drop_table('price_history')
@@ -1,4 +1,4 @@
-from flask import Flask, render_template
+from flask import Flask, g, render_template, request
 from flask.logging import default_handler
 from flask_wtf.csrf import CSRFProtect
 from flask_login import LoginManager
@@ -9,6 +9,13 @@ import os
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData
 from flask_migrate import Migrate
+from project.db import RoutingSession, get_pool_stats
+from project.logs import JsonFormatter, add_queue_handler, set_sampling_filter
+from project.instrumentation import RequestTimings, init_instrumentation
+from project.market_data import init_market_data
+from project.metrics import REQUEST_LATENCY, init_metrics
+from project.profiling import init_profiling
+from project.schema import init_schema
 
 
 ########################
@@ -26,11 +33,14 @@ convention = {
 }
 metadata = MetaData(naming_convention=convention)
 
+# Folder of the database migrations (see project/schema.py)
+MIGRATIONS_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+
 # Create the instances of the Flask extensions in the global scope,
 # but without any arguments passed in. These instances are not
 # attached to the Flask application at this point.
-database = SQLAlchemy(metadata=metadata)
-db_migration = Migrate()
+database = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
+db_migration = Migrate(directory=MIGRATIONS_FOLDER, render_as_batch=True)
 csrf_protection = CSRFProtect()
 login = LoginManager()
 login.login_view = "users.login" # type: ignore
@@ -54,25 +64,14 @@ def create_app():
     register_blueprints(app)
     configure_logging(app)
     register_app_callbacks(app)
+    init_profiling(app)
     register_error_pages(app)
     
-    ##############################################################################
-    # This section is only necessary in production when a command-line interface #
-    # is NOT available for running commands to initialize the database.          #
-    ##############################################################################
-    import sqlalchemy as sa
-    #from project.models import database as db
-
-    # Check if the database needs to be initialized
-    engine = sa.create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
-    inspector = sa.inspect(engine)
-    if not inspector.has_table("users"):
-        with app.app_context():
-            database.drop_all()
-            database.create_all()
-            app.logger.info('Initialized the database!')
-    else:
-        app.logger.info('Database already contains the users table.')
+    # Create the tables of a new database, or check that an existing database
+    # has been migrated to the latest revision (see project/schema.py)
+    with app.app_context():
+        init_schema(app, database)
+        app.logger.info(f'Database connection pools: {get_pool_stats(database.engines)}')
     return app
 
 
@@ -89,6 +88,8 @@ def initialize_extensions(app):
     csrf_protection.init_app(app)
     login.init_app(app)
     mail.init_app(app)
+    init_metrics(app)
+    init_market_data(app)
     print("MAIL_DEFAULT_SENDER:", app.config.get('MAIL_DEFAULT_SENDER'))
     print("MAIL_PASSWORD:", app.config.get('MAIL_PASSWORD'))
     
@@ -114,6 +115,10 @@ def register_blueprints(app):
 
 
 def configure_logging(app):
+    # Only log a sample of the records from the request callbacks, as these
+    # are logged multiple times for every request
+    set_sampling_filter(app.logger, app.config['LOG_REQUEST_CALLBACK_SAMPLE_RATE'])
+
     # Logging Configuration
     if app.config['LOG_WITH_GUNICORN']:
         gunicorn_error_logger = logging.getLogger('gunicorn.error')
@@ -124,15 +129,15 @@ def configure_logging(app):
         instance_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'instance')
         os.makedirs(instance_folder, exist_ok=True)
 
+        # The file handler is only ever called from the background thread of the
+        # queue listener, so requests never wait on writing to the log file
         log_file = os.path.join(instance_folder, 'flask-stock-portfolio.log')
-        file_handler = RotatingFileHandler('instance/flask-stock-portfolio.log',
-                                    maxBytes=16384,
-                                    backupCount=20)
-        file_formatter = logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(filename)s:%(lineno)d]')
-        file_handler.setFormatter(file_formatter)
+        file_handler = RotatingFileHandler(log_file,
+                                           maxBytes=app.config['LOG_FILE_MAX_BYTES'],
+                                           backupCount=app.config['LOG_FILE_BACKUP_COUNT'])
+        file_handler.setFormatter(JsonFormatter())
         file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
+        add_queue_handler(app.logger, file_handler)
         
         # Remove the default Logger configured by Flask
         app.logger.removeHandler(default_handler)
@@ -142,22 +147,35 @@ def configure_logging(app):
     
     
 def register_app_callbacks(app):
+    init_instrumentation(app)
+
     @app.before_request
     def app_before_request():
-        app.logger.info('Calling before_request() for the Flask application...')
+        # Start recording where the time is spent while processing this request
+        g.request_timings = RequestTimings()
         
     @app.after_request
     def app_after_request(response):
-        app.logger.info('Calling after_request() for the Flask Application...')
+        request_timings = g.get('request_timings')
+        if request_timings is not None:
+            response.headers['Server-Timing'] = request_timings.server_timing_header()
+            REQUEST_LATENCY.labels(request.endpoint or 'unknown', request.method).observe(
+                request_timings.elapsed())
+            app.logger.info(f'Processed request for {request.path}',
+                            extra={'endpoint': request.endpoint,
+                                   'status': response.status_code,
+                                   'timings': request_timings.as_dict()})
         return response
     
     @app.teardown_request
     def app_teardown_request(error=None):
-        app.logger.info('Calling teardown_request() for the Flask application...')
+        app.logger.info('Calling teardown_request() for the Flask application...',
+                        extra={'sampled': True})
         
     @app.teardown_appcontext
     def app_teardown_appcontext(error=None):
-        app.logger.info('Calling teardown_appcontext() for the Flask application...')
+        app.logger.info('Calling teardown_appcontext() for the Flask application...',
+                        extra={'sampled': True})
         
 
 def register_error_pages(app):
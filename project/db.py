@@ -0,0 +1,113 @@
+"""
+Database session routing and connection pool statistics.
+
+When a read replica is configured (the 'replica' bind in SQLALCHEMY_BINDS),
+SELECT statements from views decorated with `@use_read_replica` are sent to the
+replica. Everything else is sent to the primary database, including:
+    * all writes (INSERT/UPDATE/DELETE)
+    * any reads after the session has written in the current request
+    * any reads for `REPLICA_STICKY_SECONDS` after the user's last write, so
+      that users always see their own changes despite replication lag
+
+A write is either a flush of the ORM objects or a statement other than a
+SELECT (such as the bulk UPDATE statements of project/stocks/quotes.py), and
+the time of the user's last write is only stored in the session cookie when a
+replica is configured.
+"""
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import Select, event
+from sqlalchemy.pool import QueuePool
+import functools
+import time
+
+
+REPLICA_BIND_KEY = 'replica'
+
+
+class RoutingSession(Session):
+    """Session that sends the reads of read-only views to the read replica."""
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self.has_written = False
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if clause is not None and not isinstance(clause, Select):
+            # Statements such as session.execute(update(...)) do not flush the session
+            record_write(self)
+        elif (bind is None and
+                isinstance(clause, Select) and
+                not self._flushing and
+                not self.has_written and
+                REPLICA_BIND_KEY in self._db.engines and
+                replica_requested()):
+            return self._db.engines[REPLICA_BIND_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def record_write(db_session: RoutingSession):
+    """Send the reads of the session, and of the user for a few seconds, to the primary database."""
+    db_session.has_written = True
+    if REPLICA_BIND_KEY in db_session._db.engines and has_request_context():
+        session['db_last_write'] = time.time()
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(db_session, flush_context):
+    record_write(db_session)
+
+
+def replica_requested() -> bool:
+    if not has_request_context() or not g.get('use_read_replica', False):
+        return False
+    last_write = session.get('db_last_write', 0)
+    return time.time() - last_write > current_app.config['REPLICA_STICKY_SECONDS']
+
+
+def use_read_replica(view):
+    """Decorator for views whose reads can be served by the read replica."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def get_pool_stats(engines) -> dict:
+    """
+    Return the connection pool statistics for each engine as:
+        {bind key: {'size': ..., 'checked_in': ..., 'checked_out': ..., 'overflow': ...}}
+
+    The default bind (the primary database) is reported as 'primary'. Only a
+    QueuePool keeps these statistics, so the other pools (such as the StaticPool
+    of an in-memory SQLite database) are reported without any.
+    """
+    pool_stats = {}
+    for bind_key, engine in engines.items():
+        pool = engine.pool
+        stats = {}
+        if isinstance(pool, QueuePool):
+            stats = {'size': pool.size(),
+                     'checked_in': pool.checkedin(),
+                     'checked_out': pool.checkedout(),
+                     'overflow': pool.overflow()}
+        pool_stats[bind_key or 'primary'] = stats
+    return pool_stats
+
+
+class PoolStatsCollector(object):
+    """Prometheus collector for the connection pool statistics of this process."""
+
+    def __init__(self, engines):
+        self.engines = engines
+
+    def collect(self):
+        gauge = GaugeMetricFamily('db_pool_connections',
+                                  'Connections in the database connection pool of this process',
+                                  labels=['bind', 'state'])
+        for bind_key, stats in get_pool_stats(self.engines).items():
+            for state, value in stats.items():
+                gauge.add_metric([bind_key, state], value)
+        yield gauge
@@ -0,0 +1,122 @@
+"""
+Per-request instrumentation for the Flask Stock Portfolio App.
+
+The time spent (and the number of calls made) in each part of a request is
+recorded in a `RequestTimings` object stored in `flask.g`:
+    * db - SQL statements executed (via SQLAlchemy engine events)
+    * market-data - HTTP calls to the market data provider
+    * cache-hit / cache-miss - lookups of stock prices that are cached
+    * template - rendering of Jinja templates
+
+The results are returned to the client in the `Server-Timing` response header
+and logged as a structured log record at the end of each request.
+"""
+from contextlib import contextmanager
+from flask import before_render_template, g, has_app_context, template_rendered
+from project.metrics import QUOTE_CACHE_LOOKUPS
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from time import perf_counter
+
+
+class RequestTimings(object):
+    """Accumulates the wall time and the number of calls for each metric of a request."""
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.metrics = {}
+
+    def record(self, name: str, duration: float = 0.0):
+        count, total = self.metrics.get(name, (0, 0.0))
+        self.metrics[name] = (count + 1, total + duration)
+
+    def count(self, name: str) -> int:
+        return self.metrics.get(name, (0, 0.0))[0]
+
+    def duration(self, name: str) -> float:
+        return self.metrics.get(name, (0, 0.0))[1]
+
+    def elapsed(self) -> float:
+        return perf_counter() - self.start
+
+    def as_dict(self) -> dict:
+        """Return the metrics as {name: {'count': N, 'ms': X}} for logging."""
+        timings = {name: {'count': count, 'ms': round(total * 1000, 2)}
+                   for name, (count, total) in self.metrics.items()}
+        timings['total'] = {'count': 1, 'ms': round(self.elapsed() * 1000, 2)}
+        return timings
+
+    def server_timing_header(self) -> str:
+        """Format the metrics for the `Server-Timing` HTTP response header."""
+        entries = [f'{name};dur={total * 1000:.2f};desc="{count}"'
+                   for name, (count, total) in self.metrics.items()]
+        entries.append(f'total;dur={self.elapsed() * 1000:.2f}')
+        return ', '.join(entries)
+
+
+def get_request_timings():
+    """Return the RequestTimings for the current request, or None if outside of a request."""
+    if not has_app_context():
+        return None
+    return g.get('request_timings')
+
+
+def record_timing(name: str, duration: float = 0.0):
+    request_timings = get_request_timings()
+    if request_timings is not None:
+        request_timings.record(name, duration)
+
+
+@contextmanager
+def timed(name: str):
+    """Context manager that records the wall time of its body for the current request."""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, perf_counter() - start)
+
+
+def record_cache_lookup(hit: bool):
+    record_timing('cache-hit' if hit else 'cache-miss')
+    QUOTE_CACHE_LOOKUPS.labels('hit' if hit else 'miss').inc()
+
+
+#######################
+### Event Listeners ###
+#######################
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_times', []).append(perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info['query_start_times'].pop()
+    record_timing('db', perf_counter() - start)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    # Discard the start time of the failed statement
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_start_times'):
+        connection.info['query_start_times'].pop()
+
+
+def _before_render_template(sender, template, context, **extra):
+    g.setdefault('template_start_times', []).append(perf_counter())
+
+
+def _template_rendered(sender, template, context, **extra):
+    start_times = g.get('template_start_times')
+    if start_times:
+        record_timing('template', perf_counter() - start_times.pop())
+
+
+def init_instrumentation(app):
+    """Connect the signals used to time the rendering of templates."""
+    before_render_template.connect(_before_render_template, app)
+    template_rendered.connect(_template_rendered, app)
@@ -0,0 +1,144 @@
+"""
+Logging helpers for the Flask Stock Portfolio App.
+
+Log records are placed on an in-memory queue by a `QueueHandler` and are
+written to the log file by a `QueueListener` running in a background thread,
+so logging from a request never has to wait on the file system.
+"""
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import threading
+
+
+# Attributes that are present on every LogRecord; anything else on a record
+# was passed in via `extra=` and is included as a structured field
+STANDARD_RECORD_ATTRIBUTES = frozenset(
+    vars(logging.LogRecord('', logging.INFO, '', 0, '', None, None)).keys()
+) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each log record as a single line of JSON."""
+
+    def format(self, record):
+        log_entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'file': record.filename,
+            'line': record.lineno,
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_RECORD_ATTRIBUTES and not key.startswith('_'):
+                log_entry[key] = value
+        if record.exc_info:
+            log_entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(log_entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes only a fraction of the log records that are marked as sampled.
+
+    Records are marked by logging them with `extra={'sampled': True}`, which
+    is used for the high-volume request callbacks. All other records pass.
+    """
+
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False):
+            return True
+        return random.random() < self.sample_rate
+
+
+class LocalQueueHandler(QueueHandler):
+    """
+    QueueHandler for a queue in the same process, which passes the records to the
+    listener without formatting them, so that the formatter of the target handler
+    (such as JsonFormatter) still has the `exc_info` of the records.
+    """
+
+    def prepare(self, record):
+        # The message is merged with its arguments (which may not be safe to use from
+        # the listener thread), but the exception is left for the target formatter
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+class BackgroundQueueListener(QueueListener):
+    """QueueListener that can be stopped more than once (every running listener is stopped at exit)."""
+
+    running = set()
+    lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            super().start()
+            self.running.add(self)
+
+    def stop(self):
+        with self.lock:
+            if self not in self.running:
+                return
+            self.running.discard(self)
+        super().stop()
+
+    @classmethod
+    def stop_all(cls):
+        for listener in list(cls.running):
+            listener.stop()
+
+
+# Flush any queued records to the log files when the interpreter exits
+atexit.register(BackgroundQueueListener.stop_all)
+
+
+def add_queue_handler(logger: logging.Logger, file_handler: logging.Handler) -> QueueListener:
+    """
+    Attach a QueueHandler to `logger` that forwards records to `file_handler`
+    from a background QueueListener thread.
+
+    Any queue handler installed by a previous call (for example, when the
+    application factory is called more than once by the tests) is stopped
+    and removed first.
+    """
+    remove_queue_handlers(logger)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LocalQueueHandler(log_queue)
+    queue_handler.setLevel(file_handler.level)
+    listener = BackgroundQueueListener(log_queue, file_handler, respect_handler_level=True)
+    queue_handler.listener = listener
+    logger.addHandler(queue_handler)
+    listener.start()
+    return listener
+
+
+def remove_queue_handlers(logger: logging.Logger):
+    for handler in list(logger.handlers):
+        if isinstance(handler, QueueHandler):
+            if getattr(handler, 'listener', None) is not None:
+                handler.listener.stop()
+                for target_handler in handler.listener.handlers:
+                    target_handler.close()
+            logger.removeHandler(handler)
+
+
+def set_sampling_filter(logger: logging.Logger, sample_rate: float):
+    """Install (or replace) the SamplingFilter on `logger`."""
+    for log_filter in list(logger.filters):
+        if isinstance(log_filter, SamplingFilter):
+            logger.removeFilter(log_filter)
+    logger.addFilter(SamplingFilter(sample_rate))
@@ -0,0 +1,68 @@
+"""
+Providers of market data (current prices and price histories of stocks).
+
+The provider is selected with the MARKET_DATA_PROVIDER configuration variable:
+    * 'alpha_vantage' (default) - Alpha Vantage API (see alpha_vantage.py)
+    * 'local' - price files (Parquet, CSV, or SQLite) in MARKET_DATA_PATH (see local.py),
+      for running the application offline or from a nightly data dump
+
+Every provider returns the same data:
+    * quotes - current price of a stock in dollars as an exact Decimal, or 0 if it is unavailable
+    * histories - list of (datetime, closing price in money units) bars, oldest first,
+      at a resolution of INTRADAY (5-minute), DAILY, or WEEKLY bars, or None if
+      it is unavailable
+    * dividends - {datetime of a weekly bar: dividend per share in money units} of the weeks
+      when a dividend was paid (returned with the weekly bars by `get_weekly_history()`,
+      and empty for the providers without dividend data)
+    * exchange rates - {currency: US dollars per unit of the currency} (the currencies
+      whose rate is unavailable are not included)
+"""
+from decimal import Decimal
+from flask import current_app
+
+
+INTRADAY = 'intraday'
+DAILY = 'daily'
+WEEKLY = 'weekly'
+
+
+class MarketDataProvider(object):
+    """Interface of the market data providers."""
+
+    def get_quote(self, symbol: str) -> Decimal:
+        raise NotImplementedError
+
+    def get_quotes(self, symbols: list) -> dict:
+        """Return the current prices of the symbols as {symbol: price}."""
+        return {symbol: self.get_quote(symbol) for symbol in symbols}
+
+    def get_history(self, symbol: str, resolution: str):
+        raise NotImplementedError
+
+    def get_weekly_history(self, symbol: str):
+        """Return the (weekly bars, dividends) of a symbol, or None if they are unavailable."""
+        bars = self.get_history(symbol, WEEKLY)
+        return (bars, {}) if bars is not None else None
+
+    def get_fx_rates(self, currencies: list) -> dict:
+        """Return the exchange rates of the currencies to US dollars (none for the providers without rates)."""
+        return {}
+
+
+def create_provider(app) -> MarketDataProvider:
+    name = app.config['MARKET_DATA_PROVIDER']
+    if name == 'alpha_vantage':
+        from project.market_data.alpha_vantage import AlphaVantageProvider
+        return AlphaVantageProvider()
+    if name == 'local':
+        from project.market_data.local import LocalProvider
+        return LocalProvider(app.config['MARKET_DATA_PATH'])
+    raise ValueError(f'Unknown market data provider: {name}')
+
+
+def init_market_data(app):
+    app.extensions['market_data'] = create_provider(app)
+
+
+def get_provider() -> MarketDataProvider:
+    return current_app.extensions['market_data']
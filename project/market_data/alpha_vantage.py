@@ -0,0 +1,212 @@
+"""
+Market data provider for the Alpha Vantage API (https://www.alphavantage.co).
+
+The API key and the base URL are read from the ALPHA_VANTAGE_API_KEY and
+ALPHA_VANTAGE_BASE_URL configuration variables on each call. Each request
+times out after MARKET_DATA_TIMEOUT seconds (it runs on a background worker of
+the quote refresher or of the chart downloads, which a hung connection would
+tie up), and a timeout is handled like a network problem.
+"""
+from datetime import datetime
+from decimal import Decimal
+from flask import current_app
+from project.instrumentation import timed
+from project.market_data import DAILY, INTRADAY, WEEKLY, MarketDataProvider
+from project.metrics import (BAD_STATUS, CONNECTION_ERROR, MARKET_DATA_FAILURES, MARKET_DATA_LATENCY, TIMEOUT,
+                             classify_missing_key)
+from project.money import to_units
+import requests
+
+
+########################
+### HELPER FUNCTIONS ###
+########################
+
+def create_alpha_vantage_url_quote(symbol: str) -> str:
+    return '{}?function={}&symbol={}&apikey={}'.format(
+        current_app.config['ALPHA_VANTAGE_BASE_URL'],
+        'GLOBAL_QUOTE',
+        symbol,
+        current_app.config['ALPHA_VANTAGE_API_KEY']
+    )
+
+
+def create_alpha_vantage_url_fx(currency: str) -> str:
+    return '{}?function={}&from_currency={}&to_currency=USD&apikey={}'.format(
+        current_app.config['ALPHA_VANTAGE_BASE_URL'],
+        'CURRENCY_EXCHANGE_RATE',
+        currency,
+        current_app.config['ALPHA_VANTAGE_API_KEY']
+    )
+
+
+def create_alpha_vantage_get_url_weekly(symbol: str) -> str:
+    return '{}?function={}&symbol={}&apikey={}'.format(
+        current_app.config['ALPHA_VANTAGE_BASE_URL'],
+        'TIME_SERIES_WEEKLY_ADJUSTED',
+        symbol,
+        current_app.config['ALPHA_VANTAGE_API_KEY']
+    )
+
+
+def create_alpha_vantage_url_daily(symbol: str) -> str:
+    return '{}?function={}&symbol={}&outputsize=full&apikey={}'.format(
+        current_app.config['ALPHA_VANTAGE_BASE_URL'],
+        'TIME_SERIES_DAILY',
+        symbol,
+        current_app.config['ALPHA_VANTAGE_API_KEY']
+    )
+
+
+def create_alpha_vantage_url_intraday(symbol: str) -> str:
+    return '{}?function={}&symbol={}&interval=5min&apikey={}'.format(
+        current_app.config['ALPHA_VANTAGE_BASE_URL'],
+        'TIME_SERIES_INTRADAY',
+        symbol,
+        current_app.config['ALPHA_VANTAGE_API_KEY']
+    )
+
+
+def get(url: str):
+    """Send a GET request to Alpha Vantage, which raises a requests.exceptions.Timeout after MARKET_DATA_TIMEOUT."""
+    return requests.get(url, timeout=current_app.config['MARKET_DATA_TIMEOUT'])
+
+
+def failure_reason(error: requests.exceptions.RequestException) -> str:
+    return TIMEOUT if isinstance(error, requests.exceptions.Timeout) else CONNECTION_ERROR
+
+
+def parse_bars(series: dict) -> list:
+    """Convert an Alpha Vantage time series to a list of (datetime, close in money units), oldest first."""
+    return sorted((datetime.fromisoformat(element), to_units(values['4. close']))
+                  for element, values in series.items())
+
+
+def parse_dividends(series: dict) -> dict:
+    """Return the dividends of an Alpha Vantage adjusted time series as {datetime: dividend per share in money units}."""
+    dividends = {}
+    for element, values in series.items():
+        dividend = to_units(values.get('7. dividend amount', '0'))
+        if dividend:
+            dividends[datetime.fromisoformat(element)] = dividend
+    return dividends
+
+
+# URL builder, function (for the metrics), key of the time series, and description of each resolution
+TIME_SERIES = {
+    INTRADAY: (create_alpha_vantage_url_intraday, 'TIME_SERIES_INTRADAY', 'Time Series (5min)', 'intraday'),
+    DAILY: (create_alpha_vantage_url_daily, 'TIME_SERIES_DAILY', 'Time Series (Daily)', 'daily'),
+    WEEKLY: (create_alpha_vantage_get_url_weekly, 'TIME_SERIES_WEEKLY_ADJUSTED', 'Weekly Adjusted Time Series',
+             'weekly'),
+}
+
+
+class AlphaVantageProvider(MarketDataProvider):
+    """Retrieves the market data from the Alpha Vantage API (one HTTP request per symbol)."""
+
+    def get_quote(self, symbol: str) -> Decimal:
+        url = create_alpha_vantage_url_quote(symbol)
+
+        # Attempt the GET call to Alpha Vantage and check that a ConnectionError does not
+        # occur, which happens when the GET call fails due to a network issue
+        try:
+            with timed('market-data'), MARKET_DATA_LATENCY.labels('GLOBAL_QUOTE').time():
+                r = get(url)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            current_app.logger.error(
+                f'Error! Network problem preventing retrieving the stock data ({symbol})!'
+            )
+            MARKET_DATA_FAILURES.labels('GLOBAL_QUOTE', failure_reason(e)).inc()
+            return Decimal(0)
+
+        # Status code returned from Alpha Vantage needs to be 200 (OK) to process stock data
+        if r.status_code != 200:
+            current_app.logger.warning(f'Error! Received unexpected status code ({r.status_code}) '
+                                       f'when retrieving daily stock data ({symbol})!')
+            MARKET_DATA_FAILURES.labels('GLOBAL_QUOTE', BAD_STATUS).inc()
+            return Decimal(0)
+
+        stock_data = r.json()
+
+        # The key of 'Global Quote' needs to be present in order to process the stock data.
+        # Typically, this key will not be present if the API rate limit has b een exceeded.
+        if 'Global Quote' not in stock_data:
+            current_app.logger.warning(f'Could not find the Global Quote key when retrieving '
+                                       f'the daily stock data ({symbol})!')
+            MARKET_DATA_FAILURES.labels('GLOBAL_QUOTE', classify_missing_key(stock_data)).inc()
+            return Decimal(0)
+
+        # The price is parsed from its text, so its four decimal places are kept exactly
+        return Decimal(stock_data['Global Quote']['05. price'])
+
+    def get_fx_rates(self, currencies: list) -> dict:
+        # Alpha Vantage returns the rate of one currency per request
+        rates = {}
+        for currency in currencies:
+            try:
+                with timed('market-data'), MARKET_DATA_LATENCY.labels('CURRENCY_EXCHANGE_RATE').time():
+                    r = get(create_alpha_vantage_url_fx(currency))
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                current_app.logger.error(f'Error! Network problem preventing retrieving the exchange rate ({currency})!')
+                MARKET_DATA_FAILURES.labels('CURRENCY_EXCHANGE_RATE', failure_reason(e)).inc()
+                continue
+
+            if r.status_code != 200:
+                current_app.logger.warning(f'Error! Received unexpected status code ({r.status_code}) '
+                                           f'when retrieving the exchange rate ({currency})!')
+                MARKET_DATA_FAILURES.labels('CURRENCY_EXCHANGE_RATE', BAD_STATUS).inc()
+                continue
+
+            rate_data = r.json()
+            if 'Realtime Currency Exchange Rate' not in rate_data:
+                current_app.logger.warning(f'Could not find the Realtime Currency Exchange Rate key when retrieving '
+                                           f'the exchange rate ({currency})!')
+                MARKET_DATA_FAILURES.labels('CURRENCY_EXCHANGE_RATE', classify_missing_key(rate_data)).inc()
+                continue
+
+            rates[currency] = float(rate_data['Realtime Currency Exchange Rate']['5. Exchange Rate'])
+        return rates
+
+    def get_history(self, symbol: str, resolution: str):
+        series = self.get_time_series(symbol, resolution)
+        return parse_bars(series) if series is not None else None
+
+    def get_weekly_history(self, symbol: str):
+        # The weekly adjusted time series includes the dividend of each week, so one request returns both
+        series = self.get_time_series(symbol, WEEKLY)
+        return (parse_bars(series), parse_dividends(series)) if series is not None else None
+
+    def get_time_series(self, symbol: str, resolution: str):
+        """
+        Retrieve a time series of a stock from Alpha Vantage, for example the 'Weekly Adjusted Time Series'
+        data ({'YYYY-MM-DD': {'4. close': '123.4500', ...}}, latest first), or None if it could not be retrieved.
+        """
+        create_url, function, series_key, description = TIME_SERIES[resolution]
+        try:
+            with timed('market-data'), MARKET_DATA_LATENCY.labels(function).time():
+                r = get(create_url(symbol))
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            current_app.logger.info(
+                f'Error! Network problem preventing retieving the {description} stock data ({symbol})!'
+            )
+            MARKET_DATA_FAILURES.labels(function, failure_reason(e)).inc()
+            return None
+
+        # Status code returned from Alpha Vantage needs to be 200 (OK) to process stock data
+        if r.status_code != 200:
+            current_app.logger.warning(f'Error! Received unexpected status code ({r.status_code}) '
+                                       f'when retrieving {description} stock data ({symbol})!')
+            MARKET_DATA_FAILURES.labels(function, BAD_STATUS).inc()
+            return None
+
+        series_data = r.json()
+
+        # The key of the time series needs to be present in order to process the stock data
+        # Typically, this key will not be present if the API rate limit has been exceeded.
+        if series_key not in series_data:
+            current_app.logger.warning(f'Could not find the {series_key} key when retrieving '
+                                       f'the {description} stock data ({symbol})!')
+            MARKET_DATA_FAILURES.labels(function, classify_missing_key(series_data)).inc()
+            return None
+
+        return series_data[series_key]
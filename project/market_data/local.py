@@ -0,0 +1,126 @@
+"""
+Market data provider that reads the prices from local files (no network calls).
+
+MARKET_DATA_PATH is either:
+    * a directory with one file per resolution ('intraday', 'daily', 'weekly'), as
+      Parquet ('daily.parquet') or CSV ('daily.csv') files with the columns:
+          symbol, timestamp (ISO 8601 date or date and time), close (in dollars)
+      A file is loaded into memory when it is first used, and reloaded when it changes.
+    * a SQLite database ('.db', '.sqlite', or '.sqlite3') with the table:
+          prices (symbol TEXT, resolution TEXT, timestamp TEXT, close REAL)
+      which is queried for each call (with an index on (symbol, resolution, timestamp),
+      this suits data dumps that are too large to be loaded into memory).
+
+The current price of a stock is the latest closing price of the finest resolution
+that has prices for the stock. Reading Parquet files requires the pyarrow package.
+"""
+from contextlib import closing
+from datetime import date, datetime
+from decimal import Decimal
+from project.market_data import DAILY, INTRADAY, WEEKLY, MarketDataProvider
+from project.money import to_decimal, to_units
+import csv
+import os
+import sqlite3
+import threading
+
+
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+def to_bar(timestamp, close) -> tuple:
+    """Convert a row of a price file to a (datetime, close in money units) bar."""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    elif isinstance(timestamp, date) and not isinstance(timestamp, datetime):
+        timestamp = datetime.combine(timestamp, datetime.min.time())
+    return timestamp, to_units(close)
+
+
+def read_csv_file(file_path: str):
+    with open(file_path, newline='') as file:
+        for row in csv.DictReader(file):
+            yield row['symbol'].upper(), row['timestamp'], row['close']
+
+
+def read_parquet_file(file_path: str):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError(f'Reading Parquet price files ({file_path}) requires the pyarrow package')
+    columns = pq.read_table(file_path, columns=['symbol', 'timestamp', 'close']).to_pydict()
+    for symbol, timestamp, close in zip(columns['symbol'], columns['timestamp'], columns['close']):
+        yield symbol.upper(), timestamp, close
+
+
+class LocalProvider(MarketDataProvider):
+    """Reads the market data from a directory of Parquet/CSV price files or from a SQLite database."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.is_sqlite = path.endswith(SQLITE_EXTENSIONS)
+        # {resolution: (modification time of the file, {symbol: [(datetime, close in money units), ...]})}
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def get_quote(self, symbol: str) -> Decimal:
+        return self.get_quotes([symbol]).get(symbol, Decimal(0))
+
+    def get_quotes(self, symbols: list) -> dict:
+        quotes = {}
+        for resolution in (INTRADAY, DAILY, WEEKLY):
+            missing = [symbol for symbol in symbols if symbol not in quotes]
+            if not missing:
+                break
+            quotes.update(self.latest_closes(missing, resolution))
+        return {symbol: quotes.get(symbol, Decimal(0)) for symbol in symbols}
+
+    def get_history(self, symbol: str, resolution: str):
+        if self.is_sqlite:
+            with closing(self.connect()) as connection:
+                rows = connection.execute('SELECT timestamp, close FROM prices WHERE symbol = ? AND resolution = ? '
+                                          'ORDER BY timestamp', (symbol, resolution)).fetchall()
+            bars = [to_bar(timestamp, close) for timestamp, close in rows]
+        else:
+            bars = self.load_file(resolution).get(symbol, [])
+        return bars or None
+
+    def latest_closes(self, symbols: list, resolution: str) -> dict:
+        """Return the latest closing prices (Decimal dollars) of the symbols that have prices at a resolution."""
+        if self.is_sqlite:
+            # SQLite returns the close of the row with the maximum timestamp of each group
+            placeholders = ', '.join('?' * len(symbols))
+            with closing(self.connect()) as connection:
+                rows = connection.execute(f'SELECT symbol, close, max(timestamp) FROM prices WHERE resolution = ? '
+                                          f'AND symbol IN ({placeholders}) GROUP BY symbol',
+                                          [resolution, *symbols]).fetchall()
+            return {symbol: to_decimal(to_units(close)) for symbol, close, _ in rows}
+
+        bars = self.load_file(resolution)
+        return {symbol: to_decimal(bars[symbol][-1][1]) for symbol in symbols if bars.get(symbol)}
+
+    def connect(self):
+        return sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+
+    def load_file(self, resolution: str) -> dict:
+        """Return the bars of a resolution as {symbol: bars}, (re)loading the price file if it changed."""
+        for extension, read_file in (('.parquet', read_parquet_file), ('.csv', read_csv_file)):
+            file_path = os.path.join(self.path, resolution + extension)
+            if os.path.exists(file_path):
+                break
+        else:
+            return {}
+
+        modified = os.path.getmtime(file_path)
+        with self.lock:
+            loaded = self.files.get(resolution)
+            if loaded is not None and loaded[0] == modified:
+                return loaded[1]
+
+            bars = {}
+            for symbol, timestamp, close in read_file(file_path):
+                bars.setdefault(symbol, []).append(to_bar(timestamp, close))
+            for symbol_bars in bars.values():
+                symbol_bars.sort()
+            self.files[resolution] = (modified, bars)
+            return bars
@@ -0,0 +1,132 @@
+"""
+Prometheus metrics for the Flask Stock Portfolio App.
+
+The metrics are exported in the Prometheus text format by the `/metrics`
+endpoint, which is only available when `METRICS_ENABLED` is set (and, if
+`METRICS_AUTH_TOKEN` is set, requires an 'Authorization: Bearer <token>'
+header).
+
+When running with multiple gunicorn workers, set the PROMETHEUS_MULTIPROC_DIR
+environment variable to an empty directory that all workers can write to; the
+metrics of every worker are then written to that directory and aggregated when
+`/metrics` is scraped (see gunicorn.conf.py).
+"""
+from flask import Response, abort, current_app, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from project.db import PoolStatsCollector
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+import hmac
+import os
+
+
+###############
+### Metrics ###
+###############
+
+REQUEST_LATENCY = Histogram(
+    'flask_request_duration_seconds',
+    'Time spent processing each request',
+    ['endpoint', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+MARKET_DATA_LATENCY = Histogram(
+    'alpha_vantage_request_duration_seconds',
+    'Time spent on each call to the Alpha Vantage API (the _count is the number of calls)',
+    ['function'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+MARKET_DATA_FAILURES = Counter(
+    'alpha_vantage_failures_total',
+    'Calls to the Alpha Vantage API that did not return usable data',
+    ['function', 'reason']
+)
+
+QUOTE_CACHE_LOOKUPS = Counter(
+    'quote_cache_lookups_total',
+    'Lookups of the cached stock prices (hit ratio = hit / (hit + miss))',
+    ['result']
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    'db_pool_connections_checked_out',
+    'Database connections currently checked out of the connection pool',
+    multiprocess_mode='livesum'
+)
+
+EMAIL_QUEUE_DEPTH = Gauge(
+    'email_queue_depth',
+    'Emails waiting to be sent by a background thread',
+    multiprocess_mode='livesum'
+)
+
+
+# Failure reasons for calls to the Alpha Vantage API
+BAD_STATUS = 'bad_status'
+CONNECTION_ERROR = 'connection_error'
+TIMEOUT = 'timeout'
+MISSING_KEY = 'missing_key'
+RATE_LIMITED = 'rate_limited'
+
+
+def classify_missing_key(data: dict) -> str:
+    """
+    Determine why the expected key was missing from an Alpha Vantage response.
+
+    When the API rate limit is exceeded, Alpha Vantage returns a 'Note' or an
+    'Information' message instead of the requested data.
+    """
+    if 'Note' in data or 'Information' in data:
+        return RATE_LIMITED
+    return MISSING_KEY
+
+
+#######################
+### Event Listeners ###
+#######################
+
+
+@event.listens_for(Pool, 'checkout')
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+
+
+@event.listens_for(Pool, 'checkin')
+def _pool_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+################
+### Endpoint ###
+################
+
+
+def metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+
+    auth_token = current_app.config['METRICS_AUTH_TOKEN']
+    if auth_token:
+        expected_header = f'Bearer {auth_token}'
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected_header):
+            abort(403)
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        # Aggregate the metrics written by every worker process
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    # The connection pool statistics are for the process that handles this request
+    pool_registry = CollectorRegistry()
+    pool_registry.register(PoolStatsCollector(current_app.extensions['sqlalchemy'].engines))
+    return Response(generate_latest(registry) + generate_latest(pool_registry),
+                    mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    app.add_url_rule('/metrics', 'metrics', metrics)
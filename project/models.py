@@ -1,61 +1,14 @@
 from project import database
-from sqlalchemy import Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import BigInteger, Integer, String, Date, DateTime, Boolean, Float, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import mapped_column, relationship
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
+import math
 from flask import current_app
 import flask_login
-import requests
-
-
-########################
-### HELPER FUNCTIONS ###
-########################
-
-def create_alpha_vantage_url_quote(symbol: str) -> str:
-    return 'https://www.alphavantage.co/query?function={}&symbol={}&apikey={}'.format(
-        'GLOBAL_QUOTE',
-        symbol,
-        current_app.config['ALPHA_VANTAGE_API_KEY']
-    ) 
-    
-
-def create_alpha_vantage_get_url_weekly(symbol: str) -> str:
-    return 'https://www.alphavantage.co/query?function={}&symbol={}&apikey={}'.format(
-        'TIME_SERIES_WEEKLY_ADJUSTED',
-        symbol,
-        current_app.config['ALPHA_VANTAGE_API_KEY']
-    )
-
-
-def get_current_stock_price(symbol: str) -> float:
-    url = create_alpha_vantage_url_quote(symbol)
-    
-    # Attempt the GET call to Alpha Vantage and check that a ConnectionError does not
-    # occur, which happens when the GET call fails due to a network issue
-    try:
-        r = requests.get(url)
-    except requests.exceptions.ConnectionError:
-        current_app.logger.error(
-            f'Error! Network problem preventing retrieving the stock data ({symbol})!'
-        )
-        
-    # Status code returned from Alpha Vantage needs to be 200 (OK) to process stock data
-    if r.status_code != 200:
-        current_app.logger.warning(f'Error! Received unexpected status code ({r.status_code}) '
-                                   f'when retrieving daily stock data ({symbol})!')
-        return 0.0
-    
-    stock_data = r.json()
-    
-    # The key of 'Global Quote' needs to be present in order to process the stock data.
-    # Typically, this key will not be present if the API rate limit has b een exceeded.
-    if 'Global Quote' not in stock_data:
-        current_app.logger.warning(f'Could not find the Global Quote key when retrieving '
-                                   f'the daily stock data ({symbol})!')
-        return 0.0
-    
-    return float(stock_data['Global Quote']['05. price'])
+from project.instrumentation import record_cache_lookup
+from project.market_data import get_provider
+from project.money import format_amount, format_shares, position_value, to_decimal, to_share_units, to_units
 
 
 class Stock(database.Model):
@@ -71,79 +24,74 @@ class Stock(database.Model):
         current price (type: integer)
         date when current price was retreived from the Alpha Vantage API (type: datetime)
         position value = current price * number of shares (type: integer)
+        currency of the prices, as an ISO 4217 code such as 'USD' (type: string)
         
-    Note: Due to a limitation in the data types supported by SQLite, the
-          purchase price is stored as an integer:
-            $24.10 -> 2410
-            $100.00 -> 10000
-            $87.65 -> 8765
+    Note: The prices and the position value are stored as fixed-point integers
+          with four decimal places (see project/money.py):
+            $24.10 -> 241000
+            $100.00 -> 1000000
+            $87.6543 -> 876543
+          and the number of shares as a fixed-point integer with six decimal places:
+            27 shares -> 27000000
+            0.125 shares -> 125000
     """
     
     __tablename__ = 'stocks'
     
     id = mapped_column(Integer(), primary_key=True)
     stock_symbol = mapped_column(String())
-    number_of_shares = mapped_column(Integer())
-    purchase_price = mapped_column(Integer())
+    number_of_shares = mapped_column(BigInteger())
+    purchase_price = mapped_column(BigInteger())
     user_id = mapped_column(ForeignKey('users.id'))
     purchase_date = mapped_column(DateTime())
-    current_price = mapped_column(Integer())
+    current_price = mapped_column(BigInteger())
     current_price_date = mapped_column(DateTime())
-    position_value = mapped_column(Integer())
+    position_value = mapped_column(BigInteger())
+    currency = mapped_column(String(3), default='USD')
     
     # Define the relationship to the 'User' class
     user_relationship = relationship('User', back_populates='stocks_relationship')
     
     def __init__(self, stock_symbol: str, number_of_shares: str, purchase_price: str, user_id: int,
-                 purchase_date=None):
+                 purchase_date=None, currency: str = 'USD'):
         self.stock_symbol = stock_symbol
-        self.number_of_shares = int(number_of_shares)
-        self.purchase_price = int(float(purchase_price) * 100)
+        self.number_of_shares = to_share_units(number_of_shares)
+        self.purchase_price = to_units(purchase_price)
         self.user_id = user_id
         self.purchase_date = purchase_date
         self.current_price = 0
         self.current_price_date = None
         self.position_value = 0
+        self.currency = currency
         
+    def is_price_current(self) -> bool:
+        # The current price is cached in the database for the rest of the day
+        return self.current_price_date is not None and self.current_price_date.date() == datetime.now().date()
+
     def get_stock_data(self):
-        if self.current_price_date is None or self.current_price_date.date() != datetime.now().date():
-            current_price = get_current_stock_price(self.stock_symbol)
-            if current_price > 0.0:
-                self.current_price = int(current_price * 100)
+        price_is_current = self.is_price_current()
+        record_cache_lookup(hit=price_is_current)
+        if not price_is_current:
+            current_price = get_provider().get_quote(self.stock_symbol)
+            if current_price > 0:
+                self.current_price = to_units(current_price)
                 self.current_price_date = datetime.now()
-                self.position_value = self.current_price * self.number_of_shares
-                current_app.logger.debug(f'Retrieved current price {self.current_price / 100} '
+                self.position_value = position_value(self.current_price, self.number_of_shares)
+                current_app.logger.debug(f'Retrieved current price {format_amount(self.current_price)} '
                                          f'for the stock data ({self.stock_symbol})!')
                 
-    def get_stock_position_value(self) -> float:
-        return float(self.position_value / 100)
+    def get_stock_position_value(self) -> str:
+        return format_amount(self.position_value)
     
-    def get_weekly_stock_data(self):
+    def get_weekly_stock_data(self, weekly_prices: list):
+        """
+        Return the (title, labels, values) of the chart of the weekly prices ([(datetime, close in money units), ...],
+        oldest first, as stored by project/stocks/timeseries.py) since the purchase of the stock.
+        """
         title = 'Stock chart is unavailable.'
         labels = []
         values = []
-        url = create_alpha_vantage_get_url_weekly(self.stock_symbol)
-        
-        try:
-            r = requests.get(url)
-        except requests.exceptions.ConnectionError:
-            current_app.logger.info(
-                f'Error! Network problem preventing retieving the weekly stock data ({self.stock_symbol})!'
-            )
-        
-        # Status code returned from Alpha Vantage needs to be 200 (OK) to process stock data
-        if r.status_code != 200:
-            current_app.logger.warning(f'Error! Received unexpected status code ({r.status_code}) '
-                                   f'when retrieving weekly stock data ({self.stock_symbol})!')
-            return title, '', ''
-        
-        weekly_data = r.json()
-        
-        # The key of 'Weekly Adjusted Time Series' needs to be present in order to process the stock data
-        # Typically, this key will not be present if the API rate limit has been exceeded.
-        if 'Weekly Adjusted Time Series' not in weekly_data:
-            current_app.logger.warning(f'Could not find the Weekly Adjusted Time Series key when retrieving '
-                                   f'the weekly stock data ({self.stock_symbol})!')
+        if not weekly_prices:
             return title, '', ''
 
         title = f'Weekly Prices ({self.stock_symbol})'
@@ -155,20 +103,461 @@ class Stock(database.Model):
         if (datetime.now() - self.purchase_date) < timedelta(weeks=12):
             start_date = datetime.now() - timedelta(weeks=12)
             
-        for element in weekly_data['Weekly Adjusted Time Series']:
-            date = datetime.fromisoformat(element)
+        for date, close in weekly_prices:
             if date.date() > start_date.date():
                 labels.append(date)
-                values.append(weekly_data['Weekly Adjusted Time Series'][element]['4. close'])
-                 
-        # Reverse the elements as the data from Alpha Vantage is read in latest to older
-        labels.reverse()
-        values.reverse()
+                values.append(str(to_decimal(close)))
         
         return title, labels, values
         
     def __repr__(self):
-        return f'{self.stock_symbol} - {self.number_of_shares} shares purchased at ${self.purchase_price / 100}'
+        return f'{self.stock_symbol} - {format_shares(self.number_of_shares)} shares purchased at ${format_amount(self.purchase_price)}'
+
+
+class PriceHistory(database.Model):
+    """
+    Class that represents the closing price of a stock for one week.
+    
+    The following attributes of a price are stored in this table:
+        stock symbol (type: string)
+        date of the last trading day of the week (type: date)
+        closing price (type: integer)
+        dividend per share paid during the week, or 0 (type: integer)
+        
+    Note: The closing price and the dividend are stored as integers, like the prices in the Stock table:
+            $24.10 -> 241000
+    """
+    
+    __tablename__ = 'price_history'
+    # The unique constraint also serves as the index for looking up the prices of a symbol
+    __table_args__ = (UniqueConstraint('stock_symbol', 'date'),)
+    
+    id = mapped_column(Integer(), primary_key=True)
+    stock_symbol = mapped_column(String())
+    date = mapped_column(Date())
+    close = mapped_column(BigInteger())
+    dividend = mapped_column(BigInteger(), default=0)
+    
+    def __repr__(self):
+        return f'{self.stock_symbol} closed at ${format_amount(self.close)} on {self.date}'
+
+
+class PriceBar(database.Model):
+    """
+    Class that represents the closing price of a stock for an intraday (5-minute) or daily bar.
+
+    The following attributes of a price are stored in this table:
+        stock symbol (type: string)
+        resolution of the bar - 'intraday' or 'daily' (type: string)
+        start of the bar (type: datetime)
+        closing price (type: integer)
+
+    The weekly bars are stored in the PriceHistory table. Each resolution is kept for a
+    different period of time (see project/stocks/timeseries.py).
+    """
+
+    __tablename__ = 'price_bars'
+    # The unique constraint also serves as the index for looking up the bars of a symbol
+    __table_args__ = (UniqueConstraint('stock_symbol', 'resolution', 'timestamp'),)
+
+    id = mapped_column(Integer(), primary_key=True)
+    stock_symbol = mapped_column(String())
+    resolution = mapped_column(String(8))
+    timestamp = mapped_column(DateTime())
+    close = mapped_column(BigInteger())
+
+    def __repr__(self):
+        return f'{self.stock_symbol} closed at ${format_amount(self.close)} at {self.timestamp} ({self.resolution})'
+
+
+class Quote(database.Model):
+    """
+    Class that represents the latest price of a stock symbol, shared by all users.
+
+    The following attributes of a quote are stored in this table:
+        stock symbol (type: string)
+        latest price (type: integer)
+        date and time when the price was retrieved (type: datetime)
+
+    The quotes are stored for every symbol that is refreshed (see project/stocks/quotes.py),
+    so the symbols that are watched without a position (WatchlistItem) are served from this table.
+    The price is stored as an integer, like the prices in the Stock table.
+    """
+
+    __tablename__ = 'quotes'
+
+    stock_symbol = mapped_column(String(), primary_key=True)
+    price = mapped_column(BigInteger())
+    price_date = mapped_column(DateTime())
+
+    def is_price_current(self) -> bool:
+        # A quote is current for the rest of the day, like the current price of a stock
+        return self.price_date is not None and self.price_date.date() == datetime.now().date()
+
+    def __repr__(self):
+        return f'{self.stock_symbol} at ${format_amount(self.price)} on {self.price_date}'
+
+
+class FxRate(database.Model):
+    """
+    Class that represents the exchange rate of a currency to US dollars.
+
+    The following attributes of an exchange rate are stored in this table:
+        currency, as an ISO 4217 code such as 'EUR' (type: string)
+        US dollars per unit of the currency (type: float)
+        date and time when the rate was retrieved (type: datetime)
+
+    The rates are refreshed for all the currencies at once (see project/stocks/fx.py).
+    """
+
+    __tablename__ = 'fx_rates'
+
+    currency = mapped_column(String(3), primary_key=True)
+    rate = mapped_column(Float())
+    rate_date = mapped_column(DateTime())
+
+    def __repr__(self):
+        return f'<FxRate: 1 {self.currency} = {self.rate} USD>'
+
+
+class WatchlistItem(database.Model):
+    """
+    Class that represents a stock symbol that a user watches (without a position).
+
+    The following attributes of a watched symbol are stored in this table:
+        primary key of User that watches the symbol (type: integer)
+        stock symbol (type: string)
+        date and time when the symbol was added to the watchlist (type: datetime)
+    """
+
+    __tablename__ = 'watchlist_items'
+    # The unique constraint also serves as the index for looking up the watchlist of a user
+    __table_args__ = (UniqueConstraint('user_id', 'stock_symbol'),)
+
+    id = mapped_column(Integer(), primary_key=True)
+    user_id = mapped_column(ForeignKey('users.id'))
+    stock_symbol = mapped_column(String())
+    added_on = mapped_column(DateTime())
+
+    def __init__(self, stock_symbol: str, user_id: int):
+        self.stock_symbol = stock_symbol
+        self.user_id = user_id
+        self.added_on = datetime.now()
+
+    def __repr__(self):
+        return f'<WatchlistItem: {self.stock_symbol}>'
+
+
+class PriceAlert(database.Model):
+    """
+    Class that represents an alert for when the price of a stock crosses a threshold.
+
+    The following attributes of an alert are stored in this table:
+        primary key of User that created the alert (type: integer)
+        stock symbol (type: string)
+        kind of alert - 'above', 'below', or 'change' (type: string)
+        threshold price for 'above' and 'below' alerts (type: integer)
+        percent change for 'change' alerts (type: float)
+        reference price that the percent change is relative to (type: integer)
+        date and time when the alert was created (type: datetime)
+        date and time when the alert was triggered, or None while it is active (type: datetime)
+        price that triggered the alert (type: integer)
+
+    An alert is triggered once: an 'above' alert when the price rises to the threshold or
+    higher, a 'below' alert when the price falls to the threshold or lower, and a 'change'
+    alert when the price moves up or down by the percent change from the reference price.
+    An alert that the current price already reaches is not created, so an alert is only
+    triggered by a price that crosses its threshold.
+    The prices are stored as integers, like the prices in the Stock table.
+    """
+
+    __tablename__ = 'price_alerts'
+
+    ABOVE = 'above'
+    BELOW = 'below'
+    CHANGE = 'change'
+    KINDS = (ABOVE, BELOW, CHANGE)
+
+    id = mapped_column(Integer(), primary_key=True)
+    user_id = mapped_column(ForeignKey('users.id'))
+    stock_symbol = mapped_column(String())
+    kind = mapped_column(String(8))
+    threshold = mapped_column(BigInteger())
+    percent = mapped_column(Float())
+    reference_price = mapped_column(BigInteger())
+    created_on = mapped_column(DateTime())
+    triggered_on = mapped_column(DateTime())
+    triggered_price = mapped_column(BigInteger())
+
+    def __init__(self, stock_symbol: str, kind: str, user_id: int, threshold: float = None, percent: float = None,
+                 reference_price: int = None):
+        self.stock_symbol = stock_symbol
+        self.kind = kind
+        self.user_id = user_id
+        self.threshold = to_units(threshold) if threshold is not None else None
+        self.percent = percent
+        self.reference_price = reference_price
+        self.created_on = datetime.now()
+        self.triggered_on = None
+        self.triggered_price = None
+
+    def bounds(self) -> tuple:
+        """
+        Return the (rising, falling) thresholds of the alert in money units: the alert is triggered when the
+        price rises to the rising threshold or falls to the falling threshold (None if not applicable).
+        """
+        if self.kind == self.ABOVE:
+            return self.threshold, None
+        if self.kind == self.BELOW:
+            return None, self.threshold
+        change = self.reference_price * self.percent / 100
+        return math.ceil(self.reference_price + change), math.floor(self.reference_price - change)
+
+    def is_triggered_by(self, price: int) -> bool:
+        """Return True if the price (in money units) reaches one of the thresholds of the alert."""
+        rising, falling = self.bounds()
+        return (rising is not None and price >= rising) or (falling is not None and price <= falling)
+
+    def describe(self) -> str:
+        if self.kind == self.CHANGE:
+            return f'{self.stock_symbol} moves {self.percent:g}% from ${format_amount(self.reference_price)}'
+        return f'{self.stock_symbol} {self.kind} ${format_amount(self.threshold)}'
+
+    def __repr__(self):
+        return f'<PriceAlert: {self.describe()}>'
+
+
+class CorporateAction(database.Model):
+    """
+    Class that represents a corporate action that changes the shares of a stock, such as a split.
+
+    The following attributes of a corporate action are stored in this table:
+        stock symbol (type: string)
+        kind of action - 'split' (type: string)
+        ex-date, the first trading day at the new number of shares (type: date)
+        ratio of the split as new shares (numerator) for old shares (denominator) (type: integer)
+            4-for-1 split -> 4 / 1
+            1-for-10 reverse split -> 1 / 10
+        date and time when the action was recorded (type: datetime)
+        date and time when the action was applied, or None until it is applied (type: datetime)
+
+    An action is applied once (by `flask stocks apply-actions`) to the lots, prices, and
+    alerts that are dated before its ex-date. Once it is applied, the prices of the symbol
+    that are downloaded are also adjusted (see `split_adjust()`), so that every chart uses
+    the same split-adjusted closes.
+    """
+
+    __tablename__ = 'corporate_actions'
+    # The unique constraint also serves as the index for looking up the actions of a symbol
+    __table_args__ = (UniqueConstraint('stock_symbol', 'ex_date', 'kind'),)
+
+    SPLIT = 'split'
+    KINDS = (SPLIT,)
+
+    id = mapped_column(Integer(), primary_key=True)
+    stock_symbol = mapped_column(String())
+    ex_date = mapped_column(Date())
+    kind = mapped_column(String(8))
+    numerator = mapped_column(Integer())
+    denominator = mapped_column(Integer())
+    created_on = mapped_column(DateTime())
+    applied_on = mapped_column(DateTime())
+
+    def __init__(self, stock_symbol: str, ex_date, numerator: int, denominator: int, kind: str = SPLIT):
+        self.stock_symbol = stock_symbol
+        self.ex_date = ex_date
+        self.kind = kind
+        self.numerator = int(numerator)
+        self.denominator = int(denominator)
+        self.created_on = datetime.now()
+        self.applied_on = None
+
+    def adjust_price(self, price: int) -> int:
+        """Adjust a price (in money units) from before the ex-date to the new shares (rounded half up)."""
+        return (2 * price * self.denominator + self.numerator) // (2 * self.numerator)
+
+    @classmethod
+    def split_adjust(cls, symbol: str, bars: list) -> list:
+        """
+        Adjust the closes of a list of (datetime, close in money units) bars of a symbol for the splits
+        that were applied after each bar (the prices from the market data providers are not adjusted).
+        """
+        query = (database.select(cls)
+                 .where(cls.stock_symbol == symbol, cls.kind == cls.SPLIT, cls.applied_on.is_not(None))
+                 .order_by(cls.ex_date))
+        splits = database.session.execute(query).scalars().all()
+        if not splits:
+            return bars
+
+        adjusted_bars = []
+        for timestamp, close in bars:
+            for split in splits:
+                if timestamp.date() < split.ex_date:
+                    close = split.adjust_price(close)
+            adjusted_bars.append((timestamp, close))
+        return adjusted_bars
+
+    @classmethod
+    def last_applied_on(cls, symbols: list = None):
+        """
+        Return the date and time when the last action (of the symbols) was applied, or None. The actions
+        are applied by `flask stocks apply-actions` in another process, so this is the version of the
+        split-adjusted data that the web workers cache.
+        """
+        query = database.select(database.func.max(cls.applied_on))
+        if symbols is not None:
+            query = query.where(cls.stock_symbol.in_(symbols))
+        return database.session.execute(query).scalar()
+
+    def describe(self) -> str:
+        return f'{self.stock_symbol} {self.numerator}-for-{self.denominator} split on {self.ex_date}'
+
+    def __repr__(self):
+        return f'<CorporateAction: {self.describe()}>'
+
+
+class Transaction(database.Model):
+    """
+    Class that represents a transaction in the ledger of a user.
+
+    The following attributes of a transaction are stored in this table:
+        primary key of User that made the transaction (type: integer)
+        stock symbol (type: string)
+        kind of transaction - 'buy', 'sell', 'dividend', or 'split' (type: string)
+        date of the transaction (type: datetime)
+        number of whole shares bought or sold (type: integer)
+        price per share of a buy or sell, or dividend per share (type: integer)
+        ratio of a split - for example 3-for-2 is stored as 3 and 2 (type: integer and integer)
+        method for matching the lots of a sell - 'fifo', 'lifo', or 'specific' (type: string)
+        primary key of the buy Transaction of the lot sold by a 'specific' sell (type: integer)
+        date and time when the transaction was recorded (type: datetime)
+
+    The lots and the realized gains of the transactions are maintained in the TaxLot
+    and RealizedGain tables (see project/stocks/ledger.py). The prices are stored as
+    integers, like the prices in the Stock table.
+    """
+
+    __tablename__ = 'transactions'
+    # The unique constraint also serves as the index for looking up the transactions of a user's symbol in order
+    __table_args__ = (UniqueConstraint('user_id', 'stock_symbol', 'date', 'id'),)
+
+    BUY = 'buy'
+    SELL = 'sell'
+    DIVIDEND = 'dividend'
+    SPLIT = 'split'
+    KINDS = (BUY, SELL, DIVIDEND, SPLIT)
+
+    FIFO = 'fifo'
+    LIFO = 'lifo'
+    SPECIFIC = 'specific'
+    LOT_METHODS = (FIFO, LIFO, SPECIFIC)
+
+    id = mapped_column(Integer(), primary_key=True)
+    user_id = mapped_column(ForeignKey('users.id'))
+    stock_symbol = mapped_column(String())
+    kind = mapped_column(String(8))
+    date = mapped_column(DateTime())
+    quantity = mapped_column(Integer())
+    price = mapped_column(BigInteger())
+    split_numerator = mapped_column(Integer())
+    split_denominator = mapped_column(Integer())
+    lot_method = mapped_column(String(8))
+    lot_transaction_id = mapped_column(ForeignKey('transactions.id'))
+    created_on = mapped_column(DateTime())
+
+    def __init__(self, stock_symbol: str, kind: str, user_id: int, date: datetime, quantity: int = None,
+                 price: str = None, split_numerator: int = None, split_denominator: int = None,
+                 lot_method: str = None, lot_transaction_id: int = None):
+        self.stock_symbol = stock_symbol
+        self.kind = kind
+        self.user_id = user_id
+        self.date = date
+        self.quantity = int(quantity) if quantity is not None else None
+        self.price = to_units(price) if price is not None else None
+        self.split_numerator = split_numerator
+        self.split_denominator = split_denominator
+        self.lot_method = lot_method if kind == self.SELL else None
+        self.lot_transaction_id = lot_transaction_id
+        self.created_on = datetime.now()
+
+    def describe(self) -> str:
+        if self.kind == self.SPLIT:
+            return f'{self.stock_symbol} {self.split_numerator}-for-{self.split_denominator} split'
+        if self.kind == self.DIVIDEND:
+            return f'{self.stock_symbol} dividend of ${format_amount(self.price)} per share'
+        return f'{self.kind.capitalize()} {self.quantity} shares of {self.stock_symbol} at ${format_amount(self.price)}'
+
+    def __repr__(self):
+        return f'<Transaction: {self.describe()} on {self.date.date()}>'
+
+
+class TaxLot(database.Model):
+    """
+    Class that represents the shares of a buy Transaction that are still held.
+
+    The following attributes of a lot are stored in this table:
+        primary key of User that holds the lot (type: integer)
+        stock symbol (type: string)
+        primary key of the buy Transaction (type: integer)
+        date when the shares were acquired (type: datetime)
+        number of shares still held, adjusted for splits (type: integer)
+        cost basis of the shares still held (type: integer)
+    """
+
+    __tablename__ = 'tax_lots'
+    # The unique constraint also serves as the index for looking up the lots of a user's symbol
+    __table_args__ = (UniqueConstraint('user_id', 'stock_symbol', 'transaction_id'),)
+
+    id = mapped_column(Integer(), primary_key=True)
+    user_id = mapped_column(ForeignKey('users.id'))
+    stock_symbol = mapped_column(String())
+    transaction_id = mapped_column(ForeignKey('transactions.id'))
+    acquired_on = mapped_column(DateTime())
+    quantity = mapped_column(Integer())
+    cost = mapped_column(BigInteger())
+
+    def __repr__(self):
+        return f'<TaxLot: {self.quantity} shares of {self.stock_symbol} acquired on {self.acquired_on.date()}>'
+
+
+class RealizedGain(database.Model):
+    """
+    Class that represents a gain realized by a sell (per lot sold) or a dividend Transaction.
+
+    The following attributes of a realized gain are stored in this table:
+        primary key of User that realized the gain (type: integer)
+        stock symbol (type: string)
+        primary key of the sell or dividend Transaction (type: integer)
+        primary key of the buy Transaction of the lot that was sold, or None for a dividend (type: integer)
+        kind of gain - 'sale' or 'dividend' (type: string)
+        date of the transaction (type: datetime)
+        number of shares sold, or held for a dividend (type: integer)
+        proceeds of the sale, or amount of the dividend (type: integer)
+        cost basis of the shares sold, or zero for a dividend (type: integer)
+        gain = proceeds - cost (type: integer)
+    """
+
+    __tablename__ = 'realized_gains'
+    # The unique constraint also serves as the index for looking up the gains of a user
+    __table_args__ = (UniqueConstraint('user_id', 'stock_symbol', 'transaction_id', 'lot_transaction_id'),)
+
+    SALE = 'sale'
+    DIVIDEND = 'dividend'
+
+    id = mapped_column(Integer(), primary_key=True)
+    user_id = mapped_column(ForeignKey('users.id'))
+    stock_symbol = mapped_column(String())
+    transaction_id = mapped_column(ForeignKey('transactions.id'))
+    lot_transaction_id = mapped_column(ForeignKey('transactions.id'))
+    kind = mapped_column(String(8))
+    date = mapped_column(DateTime())
+    quantity = mapped_column(Integer())
+    proceeds = mapped_column(BigInteger())
+    cost = mapped_column(BigInteger())
+    gain = mapped_column(BigInteger())
+
+    def __repr__(self):
+        return f'<RealizedGain: ${format_amount(self.gain)} on {self.stock_symbol} ({self.kind})>'
 
 
 class User(flask_login.UserMixin, database.Model):
@@ -182,6 +571,7 @@ class User(flask_login.UserMixin, database.Model):
         * email_confirmation_sent_on - date and time when the email confirmation was sent
         * email_confirmed - flag indicating whether the user has confirmed their email address
         * email_confirmed_on - date and time when the user confirmed their email address
+        * base_currency - currency that the value of the portfolio is displayed in (ISO 4217 code)
         
     REMEMBER: Never store the plaintext password in a database!
     """
@@ -194,6 +584,7 @@ class User(flask_login.UserMixin, database.Model):
     email_confirmation_sent_on = mapped_column(DateTime())
     email_confirmed = mapped_column(Boolean(), default=False)
     email_confirmed_on = mapped_column(DateTime())
+    base_currency = mapped_column(String(3), default='USD')
     
     # Define the relationship to the 'Stock' class
     stocks_relationship = relationship('Stock', back_populates='user_relationship')
@@ -210,6 +601,7 @@ class User(flask_login.UserMixin, database.Model):
         self.email_confirmation_sent_on = datetime.now()
         self.email_confirmed = False
         self.email_confirmed_on = None
+        self.base_currency = 'USD'
         
     def set_password(self, password_plaintext: str):
         self.password_hashed = self._generate_password_hash(password_plaintext)
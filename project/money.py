@@ -0,0 +1,110 @@
+"""
+Fixed-point amounts of money and quantities of shares.
+
+Every amount of money (prices, values, costs, gains, and dividends) is stored
+and computed as an integer number of units of 1/10,000 of its currency, that
+is, with four decimal places (like the quotes of Alpha Vantage and the MONEY
+type of SQL Server), in BigInteger columns:
+    $301.23    -> 3012300
+    $148.3412  -> 1483412
+    $0.0001    -> 1
+
+The amounts are only converted at the edges of the application:
+    * parsing (`to_units()`) - the amounts of the forms, the market data, and the
+      files are parsed from their text with Decimal (never through a binary
+      float), and rounded half up to the nearest unit
+    * display (`format_amount()`, `to_decimal()`) - the templates and the JSON
+      responses show the amounts with two decimal places, or with up to four for
+      the sub-cent prices
+so the sums and products of the hot paths (position values, totals, lots, and
+gains) are exact integer arithmetic, in Python and in SQL.
+
+The number of shares of a stock is stored in the same way, as an integer number
+of units of 1/1,000,000 of a share (the fractional shares of the brokers have up
+to six decimal places):
+    27 shares       -> 27000000
+    0.125 shares    -> 125000
+    3.141593 shares -> 3141593
+and the value of a position is rounded half up to the nearest unit of money by
+`position_value()`, which is the same integer expression in Python and in SQL.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+
+# Units of money per dollar (or per unit of any currency)
+UNITS = 10_000
+PLACES = 4
+CENT = Decimal('0.01')
+
+# Units of quantity per share
+SHARE_UNITS = 1_000_000
+SHARE_PLACES = 6
+
+
+def to_fixed_point(value, units: int, name: str) -> int:
+    """Convert a number (text, Decimal, int, or float) to an integer number of 1/`units`, rounded half up."""
+    if isinstance(value, int):
+        return value * units
+    if isinstance(value, float):
+        # The shortest representation of the float ('0.1', not 0.1000000000000000055...)
+        value = repr(value)
+    try:
+        number = Decimal(value.strip() if isinstance(value, str) else value)
+    except InvalidOperation:
+        raise ValueError(f'Invalid {name}: {value!r}')
+    if not number.is_finite():
+        raise ValueError(f'Invalid {name}: {value!r}')
+    return int((number * units).to_integral_value(ROUND_HALF_UP))
+
+
+def to_units(amount) -> int:
+    """
+    Convert an amount ('301.23', Decimal, int, or float) to units, rounded half up to four decimal places.
+    Raises a ValueError if the amount is not a number.
+    """
+    return to_fixed_point(amount, UNITS, 'amount of money')
+
+
+def to_decimal(units: int) -> Decimal:
+    """Convert units to an exact Decimal amount (for example, 3012300 -> Decimal('301.2300'))."""
+    return Decimal(units).scaleb(-PLACES)
+
+
+def format_amount(units: int) -> str:
+    """Format units as an amount with two decimal places, or up to four for a sub-cent amount ('301.23', '0.1234')."""
+    amount = to_decimal(units)
+    if amount == amount.quantize(CENT):
+        return f'{amount.quantize(CENT)}'
+    return f'{amount.normalize():f}'
+
+
+def to_json(units: int) -> float:
+    """Convert units to the amount of a JSON response (JSON numbers are floats, so this is done last)."""
+    return float(to_decimal(units)) if units is not None else None
+
+
+def to_share_units(quantity) -> int:
+    """
+    Convert a number of shares ('27', '0.125', Decimal, int, or float) to share units, rounded half up to six
+    decimal places. Raises a ValueError if the number of shares is not a number.
+    """
+    return to_fixed_point(quantity, SHARE_UNITS, 'number of shares')
+
+
+def format_shares(share_units: int) -> str:
+    """Format share units as a number of shares without trailing zeros ('27', '0.125')."""
+    quantity = Decimal(share_units).scaleb(-SHARE_PLACES)
+    return f'{quantity.normalize():f}'
+
+
+def position_value(price, share_units):
+    """
+    Value of a position (in units of money, rounded half up) from its price (in units of money) and its
+    number of shares (in share units). Either argument can be a SQL expression, such as `Stock.number_of_shares`.
+
+    The whole shares and the fraction of a share are multiplied separately, so the products stay within
+    a 64-bit integer in SQL: a price of $1,000,000 (10**10 units) times 10**6 share units of the fraction
+    is 10**16, where the product with all the share units of a large position would overflow.
+    """
+    return (price * (share_units // SHARE_UNITS)
+            + (price * (share_units % SHARE_UNITS) + SHARE_UNITS // 2) // SHARE_UNITS)
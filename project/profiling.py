@@ -0,0 +1,131 @@
+"""
+Opt-in sampling profiler for slow requests.
+
+When `PROFILING_ENABLED` is set, a background thread samples the call stack of
+each thread that is processing a request every `PROFILING_INTERVAL` seconds.
+At the end of a request, the samples are written to the 'profiles' folder in
+the instance folder if:
+    * the request took longer than `PROFILING_SLOW_REQUEST_THRESHOLD` seconds
+    * the request was randomly selected (`PROFILING_SAMPLE_RATE`)
+    * the request was made by a user in `PROFILING_USER_IDS`
+
+The files are in the collapsed stack format ('frame;frame;frame count'), which
+can be converted to a flame graph with flamegraph.pl or loaded by speedscope.
+The oldest files are deleted when the folder exceeds `PROFILING_MAX_DISK_BYTES`.
+"""
+from collections import Counter
+from datetime import datetime
+from flask import current_app, g, request
+from flask_login import current_user
+import os
+import random
+import sys
+import threading
+import time
+
+
+class StackSampler(object):
+    """Background thread that periodically samples the stacks of the registered threads."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+            self._thread.start()
+
+    def register_thread(self, thread_id: int):
+        with self._lock:
+            self._samples[thread_id] = Counter()
+
+    def unregister_thread(self, thread_id: int) -> Counter:
+        """Stop sampling the thread and return its samples as {collapsed stack: count}."""
+        with self._lock:
+            return self._samples.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[collapse_stack(frame)] += 1
+
+
+def collapse_stack(frame) -> str:
+    """Convert a stack frame to the collapsed stack format (outermost frame first)."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def write_collapsed_stacks(samples: Counter, file_path: str):
+    with open(file_path, 'w') as file:
+        for stack, count in samples.most_common():
+            file.write(f'{stack} {count}\n')
+
+
+def prune_profiles(profile_folder: str, max_disk_bytes: int):
+    """Delete the oldest profiles until the folder is within `max_disk_bytes`."""
+    profiles = [entry for entry in os.scandir(profile_folder) if entry.is_file()]
+    profiles.sort(key=lambda entry: entry.stat().st_mtime)
+    total_bytes = sum(entry.stat().st_size for entry in profiles)
+    for entry in profiles:
+        if total_bytes <= max_disk_bytes:
+            break
+        total_bytes -= entry.stat().st_size
+        os.remove(entry.path)
+
+
+def get_profile_folder(app) -> str:
+    profile_folder = app.config['PROFILING_FOLDER'] or os.path.join(app.instance_path, 'profiles')
+    os.makedirs(profile_folder, exist_ok=True)
+    return profile_folder
+
+
+def init_profiling(app):
+    sampler = StackSampler(app.config['PROFILING_INTERVAL'])
+
+    @app.before_request
+    def start_profiling():
+        if not current_app.config['PROFILING_ENABLED']:
+            return
+        sampler.start()
+        sampler.register_thread(threading.get_ident())
+        g.profiling_start = time.perf_counter()
+        g.profiling_sampled = random.random() < current_app.config['PROFILING_SAMPLE_RATE']
+
+    @app.teardown_request
+    def finish_profiling(error=None):
+        if 'profiling_start' not in g:
+            return
+        samples = sampler.unregister_thread(threading.get_ident())
+        duration = time.perf_counter() - g.profiling_start
+        user_id = current_user.get_id()
+
+        if (duration < current_app.config['PROFILING_SLOW_REQUEST_THRESHOLD'] and
+                not g.profiling_sampled and
+                user_id not in current_app.config['PROFILING_USER_IDS']):
+            return
+        if not samples:
+            return
+
+        profile_folder = get_profile_folder(current_app)
+        file_name = '{}-{}-user{}-{}ms.folded'.format(
+            datetime.now().strftime('%Y%m%dT%H%M%S%f'),
+            request.endpoint or 'unknown',
+            user_id or 'anonymous',
+            int(duration * 1000)
+        )
+        write_collapsed_stacks(samples, os.path.join(profile_folder, file_name))
+        prune_profiles(profile_folder, current_app.config['PROFILING_MAX_DISK_BYTES'])
+        current_app.logger.info(f'Wrote profile of {request.path} ({duration:.3f} s) to {file_name}')
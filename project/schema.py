@@ -0,0 +1,45 @@
+"""
+Creation and migration of the database schema.
+
+The schema is changed with the Alembic migrations in the migrations/ folder
+(Flask-Migrate): `flask db upgrade` brings an existing database up to date, and
+it is run once by the gunicorn master before the workers are started (see
+gunicorn.conf.py). Each migration checks what the database already has, so a
+database created by an earlier version of the app can be upgraded whatever
+tables it had.
+
+An empty database (such as a new SQLite file, or the in-memory database of the
+tests) is created from the models and stamped with the latest revision, so the
+migrations only ever run against existing data.
+"""
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+import sqlalchemy as sa
+
+
+def get_script_directory(app) -> ScriptDirectory:
+    """Return the Alembic scripts of the migrations of the app."""
+    migrate = app.extensions['migrate']
+    return ScriptDirectory.from_config(migrate.migrate.get_config(migrate.directory))
+
+
+def init_schema(app, database):
+    """
+    Create the tables of an empty database and stamp it with the latest revision, or log a warning
+    if an existing database is not at the latest revision (it needs `flask db upgrade`).
+    """
+    script = get_script_directory(app)
+    with database.engine.begin() as connection:
+        context = MigrationContext.configure(connection)
+        if not sa.inspect(connection).get_table_names():
+            database.metadata.create_all(connection)
+            context.stamp(script, 'head')
+            app.logger.info('Initialized the database!')
+            return
+
+        revision = context.get_current_revision()
+        if revision != script.get_current_head():
+            app.logger.warning(f'The database schema is at revision {revision} instead of '
+                               f'{script.get_current_head()}, run "flask db upgrade" to upgrade it')
+        else:
+            app.logger.info(f'Database schema is at the latest revision ({revision}).')
@@ -0,0 +1,202 @@
+"""
+Engine that evaluates the price alerts against each refresh of the quotes.
+
+The active alerts are kept in memory in an `AlertIndex` per symbol, with the
+thresholds of the alerts sorted in two lists:
+    * rising - the alerts that are triggered when the price rises to their threshold
+      (stored as the negated thresholds, so the triggered alerts are at the end)
+    * falling - the alerts that are triggered when the price falls to their threshold
+
+When the refresher updates the quote of a symbol, the alerts that the new price
+crossed are found with a binary search (bisect) and popped from the end of the
+lists, so the cost of a price tick is O(log n + triggered alerts), however
+many alerts are stored. A 'change' alert is stored in both lists, and an alert
+that is deleted (or triggered on the other side) is skipped when its entry is
+popped.
+
+The triggered alerts are marked in the database with one UPDATE per symbol
+(only the alerts that are still active, so an alert that is triggered by
+several processes is only notified once), and the users are notified with one
+email each, sent over one connection to the mail server. The index is reloaded
+from the database every ALERT_INDEX_RELOAD_SECONDS to pick up the alerts that
+were created or deleted by other processes, and as soon as a corporate action
+was applied (the split-adjusted thresholds are then reloaded).
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from flask import current_app, render_template
+from flask_mail import Message
+from itertools import groupby
+from project import database, mail
+from project.metrics import EMAIL_QUEUE_DEPTH
+from project.models import CorporateAction, PriceAlert, User
+import threading
+import time
+
+
+class AlertIndex(object):
+    """Thresholds (in money units) of the active alerts of a symbol, sorted for a binary search."""
+
+    def __init__(self, rising: list = (), falling: list = ()):
+        # Sorted (key, alert id) pairs split into parallel lists, with key = -threshold for the rising alerts
+        rising = sorted((-threshold, alert_id) for threshold, alert_id in rising)
+        falling = sorted(falling)
+        self.rising_keys = [key for key, _ in rising]
+        self.rising_ids = [alert_id for _, alert_id in rising]
+        self.falling_keys = [key for key, _ in falling]
+        self.falling_ids = [alert_id for _, alert_id in falling]
+
+    def add(self, alert_id: int, rising: int = None, falling: int = None):
+        if rising is not None:
+            position = bisect_right(self.rising_keys, -rising)
+            self.rising_keys.insert(position, -rising)
+            self.rising_ids.insert(position, alert_id)
+        if falling is not None:
+            position = bisect_right(self.falling_keys, falling)
+            self.falling_keys.insert(position, falling)
+            self.falling_ids.insert(position, alert_id)
+
+    def pop_triggered(self, price: int) -> list:
+        """Remove and return the ids of the alerts whose threshold the price reached."""
+        # Rising alerts with threshold <= price (key >= -price) and falling alerts with threshold >= price
+        rising = bisect_left(self.rising_keys, -price)
+        falling = bisect_left(self.falling_keys, price)
+        triggered = self.rising_ids[rising:] + self.falling_ids[falling:]
+        del self.rising_keys[rising:], self.rising_ids[rising:]
+        del self.falling_keys[falling:], self.falling_ids[falling:]
+        return triggered
+
+    def __len__(self):
+        return len(self.rising_keys) + len(self.falling_keys)
+
+
+class AlertEngine(object):
+    """In-memory index of the active alerts of all the symbols."""
+
+    def __init__(self, reload_seconds: float):
+        self.reload_seconds = reload_seconds
+        self.indexes = {}
+        # Ids of the active alerts (the entries of the other alerts are skipped)
+        self.active = set()
+        self.loaded_at = None
+        # Version of the split-adjusted thresholds that were loaded (see `reload_if_stale()`)
+        self.actions_applied_on = None
+        self.lock = threading.Lock()
+
+    def load(self, alerts):
+        """Replace the index with the (alert id, symbol, rising threshold, falling threshold) of the active alerts."""
+        thresholds = {}
+        active = set()
+        for alert_id, symbol, rising, falling in alerts:
+            symbol_rising, symbol_falling = thresholds.setdefault(symbol, ([], []))
+            if rising is not None:
+                symbol_rising.append((rising, alert_id))
+            if falling is not None:
+                symbol_falling.append((falling, alert_id))
+            active.add(alert_id)
+        indexes = {symbol: AlertIndex(rising, falling) for symbol, (rising, falling) in thresholds.items()}
+        with self.lock:
+            self.indexes = indexes
+            self.active = active
+            self.loaded_at = time.monotonic()
+
+    def load_from_database(self, actions_applied_on=None):
+        query = database.select(PriceAlert).where(PriceAlert.triggered_on.is_(None))
+        alerts = database.session.execute(query).scalars()
+        self.load((alert.id, alert.stock_symbol, *alert.bounds()) for alert in alerts)
+        self.actions_applied_on = actions_applied_on
+
+    def reload_if_stale(self):
+        # The thresholds are adjusted for the splits by `flask stocks apply-actions` (in another process),
+        # so the index is also reloaded as soon as a corporate action was applied since it was loaded
+        actions_applied_on = CorporateAction.last_applied_on()
+        if (self.loaded_at is None or time.monotonic() - self.loaded_at >= self.reload_seconds or
+                actions_applied_on != self.actions_applied_on):
+            self.load_from_database(actions_applied_on)
+
+    def add(self, alert: PriceAlert):
+        with self.lock:
+            self.indexes.setdefault(alert.stock_symbol, AlertIndex()).add(alert.id, *alert.bounds())
+            self.active.add(alert.id)
+
+    def remove(self, alert_id: int):
+        with self.lock:
+            self.active.discard(alert_id)
+
+    def evaluate(self, closes: dict) -> dict:
+        """Remove the alerts triggered by the prices ({symbol: price in money units}) and return {symbol: alert ids}."""
+        triggered = {}
+        with self.lock:
+            for symbol, price in closes.items():
+                index = self.indexes.get(symbol)
+                if not index:
+                    continue
+                alert_ids = [alert_id for alert_id in index.pop_triggered(price) if alert_id in self.active]
+                if alert_ids:
+                    self.active.difference_update(alert_ids)
+                    triggered[symbol] = alert_ids
+        return triggered
+
+
+def mark_triggered(triggered: dict, closes: dict) -> list:
+    """Mark the alerts that are still active as triggered and return their ids."""
+    now = datetime.now()
+    alert_ids = []
+    for symbol, symbol_alert_ids in triggered.items():
+        statement = (database.update(PriceAlert)
+                     .where(PriceAlert.id.in_(symbol_alert_ids), PriceAlert.triggered_on.is_(None))
+                     .values(triggered_on=now, triggered_price=closes[symbol])
+                     .returning(PriceAlert.id))
+        alert_ids.extend(database.session.execute(statement).scalars())
+    return alert_ids
+
+
+def send_alert_emails(alert_ids: list) -> int:
+    """Send one email to each user with the alerts that were triggered. Returns the number of emails sent."""
+    query = (database.select(User.email, PriceAlert)
+             .join(PriceAlert, PriceAlert.user_id == User.id)
+             .where(PriceAlert.id.in_(alert_ids))
+             .order_by(User.email, PriceAlert.stock_symbol))
+    messages = [Message(subject='Flask Stock Portfolio App - Price Alerts',
+                        html=render_template('stocks/email_price_alerts.html',
+                                             alerts=[alert for _, alert in user_alerts]),
+                        recipients=[email])
+                for email, user_alerts in groupby(database.session.execute(query).all(), key=lambda row: row[0])]
+    if not messages:
+        return 0
+
+    EMAIL_QUEUE_DEPTH.inc(len(messages))
+    try:
+        with mail.connect() as connection:
+            for message in messages:
+                connection.send(message)
+    finally:
+        EMAIL_QUEUE_DEPTH.dec(len(messages))
+    return len(messages)
+
+
+def evaluate_price_alerts(closes: dict) -> int:
+    """Trigger the alerts crossed by the refreshed prices ({symbol: price in money units}) and notify their users."""
+    if not closes:
+        return 0
+    alert_engine = get_alert_engine()
+    alert_engine.reload_if_stale()
+    triggered = alert_engine.evaluate(closes)
+    if not triggered:
+        return 0
+
+    alert_ids = mark_triggered(triggered, closes)
+    database.session.commit()
+    if alert_ids:
+        emails = send_alert_emails(alert_ids)
+        current_app.logger.info(f'Triggered {len(alert_ids)} price alerts ({emails} emails)',
+                                extra={'triggered_alerts': len(alert_ids)})
+    return len(alert_ids)
+
+
+def init_alert_engine(app):
+    app.extensions['alert_engine'] = AlertEngine(app.config['ALERT_INDEX_RELOAD_SECONDS'])
+
+
+def get_alert_engine() -> AlertEngine:
+    return current_app.extensions['alert_engine']
@@ -0,0 +1,290 @@
+"""
+Charts of the weekly prices of stocks.
+
+The chart of a single stock (`stock_details`) shows either the weekly prices
+since the purchase date or a range (1D ... MAX), both served by the tiered price
+store in project/stocks/timeseries.py (so the prices are only downloaded when
+the stored prices are stale). It is downsampled with the
+Largest-Triangle-Three-Buckets algorithm to about one point per pixel of the
+requested width, which keeps the shape of the series (peaks and troughs)
+while sending far fewer points to Chart.js. The downsampled charts are cached
+per (symbol, range, width) in each process.
+
+For the comparison chart of multiple stocks, the weekly closing prices of
+each symbol are read from the `price_history` table, and only the symbols without a recent price are downloaded from
+the market data provider (concurrently, one request per symbol). The new prices are
+stored so that the next comparison is served from the database.
+
+The series are aligned on a shared index of weeks and normalized to the
+percent change since a base date with NumPy, then reduced to a target number
+of points so that the data sent to Chart.js stays small.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from flask import current_app
+from project import database
+from project.instrumentation import record_timing, timed
+from project.market_data import WEEKLY
+from project.models import CorporateAction, PriceHistory
+from project.money import UNITS
+from project.stocks.timeseries import BAR_DURATION, claim_download, download_bars, get_price_series, store_bars
+import numpy as np
+import threading
+import time
+
+
+class ChartCache(object):
+    """Thread-safe LRU cache whose entries expire after a number of seconds."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, timeout: float, max_entries: int):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+chart_cache = ChartCache()
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices of the `threshold` points selected by the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are always kept. The other points are split into
+    `threshold` - 2 buckets, and the point of each bucket that forms the largest
+    triangle with the point selected in the previous bucket and the average of
+    the next bucket is selected (the areas of a bucket are computed at once).
+    """
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    bucket_size = (length - 2) / (threshold - 2)
+    edges = np.floor(np.arange(threshold - 1) * bucket_size).astype(np.int64) + 1
+    edges[-1] = length - 1
+    next_edges = np.append(edges[2:], length)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_x = x[end:next_edges[bucket]].mean()
+        next_y = y[end:next_edges[bucket]].mean()
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) -
+                       (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(areas.argmax())
+        selected[bucket + 1] = previous
+    selected[-1] = length - 1
+    return selected
+
+
+def get_weekly_chart(stock, width: int):
+    """
+    Return the (title, labels, values) of the weekly prices of a stock, downsampled to
+    at most `width` points. Successful charts are cached for CHART_CACHE_SECONDS.
+    """
+    # The splits applied by `flask stocks apply-actions` (in another process) adjust the stored closes
+    cache_key = (stock.stock_symbol, stock.purchase_date.date(), date.today(), width,
+                 CorporateAction.last_applied_on([stock.stock_symbol]))
+    chart = chart_cache.get(cache_key)
+    if chart is not None:
+        record_timing('chart-cache-hit')
+        return chart
+    record_timing('chart-cache-miss')
+
+    # The weekly prices are read from the tiered store, which downloads them only when they are stale
+    _, weekly_prices = get_price_series(stock.stock_symbol, 'MAX')
+    title, labels, values = stock.get_weekly_stock_data(weekly_prices)
+    if len(labels) > width:
+        days = np.array(labels, dtype='datetime64[D]').astype(np.float64)
+        indices = lttb_indices(days, np.array(values, dtype=np.float64), width)
+        labels = [labels[index] for index in indices]
+        values = [values[index] for index in indices]
+
+    if labels and current_app.config['CHART_CACHE_SECONDS'] > 0:
+        chart_cache.set(cache_key, (title, labels, values), current_app.config['CHART_CACHE_SECONDS'],
+                        current_app.config['CHART_CACHE_MAX_ENTRIES'])
+    return title, labels, values
+
+
+def get_range_chart(symbol: str, chart_range: str, width: int):
+    """
+    Return the (title, labels, values, resolution) of the prices of a symbol over a chart range
+    (1D, 1W, 1M, 3M, 1Y, 5Y, or MAX), downsampled to at most `width` points.
+    """
+    cache_key = (symbol, chart_range, width, CorporateAction.last_applied_on([symbol]))
+    chart = chart_cache.get(cache_key)
+    if chart is not None:
+        record_timing('chart-cache-hit')
+        return chart
+    record_timing('chart-cache-miss')
+
+    resolution, bars = get_price_series(symbol, chart_range)
+    if not bars:
+        return 'Stock chart is unavailable.', [], [], resolution
+    labels = [timestamp for timestamp, _ in bars]
+    values = [close / UNITS for _, close in bars]
+    if len(labels) > width:
+        indices = lttb_indices(np.array(labels, dtype='datetime64[m]').astype(np.float64),
+                               np.array(values, dtype=np.float64), width)
+        labels = [labels[index] for index in indices]
+        values = [values[index] for index in indices]
+
+    chart = (f'{resolution.capitalize()} Prices ({symbol}, {chart_range})', labels, values, resolution)
+    # An intraday chart is only cached until the next 5-minute bar
+    timeout = min(current_app.config['CHART_CACHE_SECONDS'], BAR_DURATION[resolution].total_seconds())
+    if timeout > 0:
+        chart_cache.set(cache_key, chart, timeout, current_app.config['CHART_CACHE_MAX_ENTRIES'])
+    return chart
+
+
+def get_price_histories(symbols: list) -> dict:
+    """
+    Return the weekly closing prices of each symbol as {symbol: (dates, closes)}, where
+    `dates` is an array of datetime64[D] and `closes` is an array of prices in money units
+    (oldest first). Symbols without any price are not included.
+    """
+    histories = read_price_histories(symbols)
+    oldest_allowed = date.today() - timedelta(days=current_app.config['PRICE_HISTORY_MAX_AGE_DAYS'])
+    stale_symbols = [symbol for symbol in symbols
+                     if symbol not in histories or histories[symbol][0][-1] < np.datetime64(oldest_allowed)]
+    if stale_symbols:
+        refresh_price_histories(stale_symbols)
+        histories.update(read_price_histories(stale_symbols))
+    return histories
+
+
+def read_price_histories(symbols: list) -> dict:
+    """Read the stored weekly prices of all the symbols with one query."""
+    query = (database.select(PriceHistory.stock_symbol, PriceHistory.date, PriceHistory.close)
+             .where(PriceHistory.stock_symbol.in_(symbols))
+             .order_by(PriceHistory.stock_symbol, PriceHistory.date))
+    rows = {}
+    for symbol, week, close in database.session.execute(query):
+        rows.setdefault(symbol, []).append((week, close))
+    return {symbol: (np.array([week for week, _ in prices], dtype='datetime64[D]'),
+                     np.array([close for _, close in prices], dtype=np.int64))
+            for symbol, prices in rows.items()}
+
+
+def refresh_price_histories(symbols: list):
+    """
+    Download the weekly prices of the symbols concurrently and store the new weeks. The symbols that
+    this process downloaded recently are skipped (see `claim_download()`).
+    """
+    symbols = [symbol for symbol in symbols if claim_download(symbol, WEEKLY)]
+    if not symbols:
+        return
+    app = current_app._get_current_object()
+
+    def fetch(symbol):
+        with app.app_context():
+            return download_bars(symbol, WEEKLY)
+
+    # The threads have their own application context, so the total time is recorded here
+    with timed('market-data'), ThreadPoolExecutor(max_workers=min(len(symbols), 8)) as executor:
+        weekly_prices = dict(zip(symbols, executor.map(fetch, symbols)))
+
+    for symbol, (bars, dividends) in weekly_prices.items():
+        if bars is not None:
+            store_bars(symbol, WEEKLY, bars, dividends)
+    database.session.commit()
+
+
+def align_series(histories: dict, symbols: list):
+    """
+    Align the price histories on a shared index of weeks.
+
+    The dates are mapped to the Monday of their week (the last trading day of a week
+    is not always a Friday), and the union of the weeks of all the symbols is used as
+    the index. Returns (weeks, prices), where `prices` has one row per symbol and
+    NaN for the weeks without a price.
+    """
+    week_starts = {symbol: monday_of_week(histories[symbol][0]) for symbol in symbols}
+    if not week_starts:
+        return np.array([], dtype='datetime64[D]'), np.empty((0, 0))
+    weeks = np.unique(np.concatenate(list(week_starts.values())))
+    prices = np.full((len(symbols), len(weeks)), np.nan)
+    for row, symbol in enumerate(symbols):
+        prices[row, np.searchsorted(weeks, week_starts[symbol])] = histories[symbol][1] / UNITS
+    return weeks, prices
+
+
+def monday_of_week(dates: np.ndarray) -> np.ndarray:
+    # 1970-01-01 (day 0) is a Thursday, so Monday is the day where (days + 3) % 7 == 0
+    days = dates.astype('datetime64[D]').astype(np.int64)
+    return (days - (days + 3) % 7).astype('datetime64[D]')
+
+
+def normalize(prices: np.ndarray, base_index: int) -> np.ndarray:
+    """
+    Convert the prices to the percent change since the column `base_index`.
+
+    A series without a price at the base week uses its first price after the base
+    week instead, so that a stock bought later starts at 0% when it first appears.
+    The columns before `base_index` are dropped.
+    """
+    prices = prices[:, base_index:]
+    has_price = ~np.isnan(prices)
+    first_price = has_price.argmax(axis=1)
+    base_prices = prices[np.arange(prices.shape[0]), first_price]
+    base_prices[~has_price.any(axis=1)] = np.nan
+    return (prices / base_prices[:, np.newaxis] - 1.0) * 100.0
+
+
+def downsample_indices(length: int, points: int) -> np.ndarray:
+    """Indices of `points` evenly spaced columns (always including the first and the last column)."""
+    if length <= points:
+        return np.arange(length)
+    return np.unique(np.linspace(0, length - 1, points).round().astype(np.int64))
+
+
+def compare_stocks(symbols: list, base_date: date = None, points: int = 200) -> dict:
+    """
+    Return the data for the comparison chart of the symbols:
+        labels - dates of the weeks (YYYY-MM-DD)
+        series - [{'symbol': ..., 'values': [percent change or None, ...]}, ...]
+        base_date - date of the first week (YYYY-MM-DD)
+
+    If no base date is given, the first week where every symbol has a price is used.
+    """
+    histories = get_price_histories(symbols)
+    symbols = [symbol for symbol in symbols if symbol in histories]
+    weeks, prices = align_series(histories, symbols)
+    if not symbols:
+        return {'labels': [], 'series': [], 'base_date': None}
+
+    if base_date is None:
+        base_week = max(monday_of_week(histories[symbol][0][:1])[0] for symbol in symbols)
+    else:
+        base_week = monday_of_week(np.array([base_date], dtype='datetime64[D]'))[0]
+    base_index = min(int(np.searchsorted(weeks, base_week)), len(weeks) - 1)
+    changes = normalize(prices, base_index)
+    weeks = weeks[base_index:]
+
+    indices = downsample_indices(len(weeks), points)
+    changes = np.round(changes[:, indices], 2)
+    return {'labels': [str(week) for week in weeks[indices]],
+            'series': [{'symbol': symbol,
+                        'values': [None if np.isnan(value) else float(value) for value in row]}
+                       for symbol, row in zip(symbols, changes)],
+            'base_date': str(weeks[0])}
@@ -0,0 +1,104 @@
+"""
+Adjustment of the portfolios for corporate actions (used by `flask stocks apply-actions`).
+
+The corporate actions (splits) are recorded in the `corporate_actions` table and
+applied once, after their ex-date, to everything that is dated before the
+ex-date, across all the users:
+    * stocks - the number of shares and the purchase price of the lots bought
+      before the ex-date (the cost basis of a lot is unchanged), and the
+      current price that was retrieved before the ex-date
+    * quotes - the shared quotes retrieved before the ex-date
+    * price_history and price_bars - the stored closes (and dividends) before the ex-date
+    * price_alerts - the thresholds of the active alerts created before the ex-date
+
+Each of the tables is adjusted with one UPDATE per action (however many lots
+hold the symbol), and all the actions are applied in one database transaction,
+so a failure leaves every table as it was. The prices that are downloaded
+after an action is applied are adjusted when they are stored (see
+`CorporateAction.split_adjust()`), so the charts of every range use the same
+split-adjusted closes.
+
+The number of shares of a lot is rounded down to the nearest share unit (a
+millionth of a share, see project/money.py), and the prices are rounded to the
+nearest money unit. The transactions of the ledger (project/stocks/ledger.py) are not
+adjusted, as its splits are recorded as transactions.
+"""
+from datetime import date, datetime
+from project import database
+from project.models import CorporateAction, PriceAlert, PriceBar, PriceHistory, Quote, Stock
+from project.money import position_value
+from project.stocks.charts import chart_cache
+
+
+def adjusted(column, action: CorporateAction):
+    """SQL expression of a price column adjusted for a split (rounded half up, like `adjust_price()`)."""
+    return (2 * column * action.denominator + action.numerator) // (2 * action.numerator)
+
+
+def apply_split(action: CorporateAction) -> int:
+    """Adjust the lots, prices, and alerts of a symbol that are dated before the ex-date of a split."""
+    symbol = action.stock_symbol
+    ex_datetime = datetime.combine(action.ex_date, datetime.min.time())
+
+    number_of_shares = Stock.number_of_shares * action.numerator // action.denominator
+    lots = database.session.execute(
+        database.update(Stock)
+        .where(Stock.stock_symbol == symbol, Stock.purchase_date < ex_datetime)
+        .values(number_of_shares=number_of_shares,
+                purchase_price=adjusted(Stock.purchase_price, action),
+                position_value=position_value(Stock.current_price, number_of_shares))
+    ).rowcount
+    # The position value is computed from the number of shares that were adjusted above
+    database.session.execute(
+        database.update(Stock)
+        .where(Stock.stock_symbol == symbol, Stock.current_price_date < ex_datetime)
+        .values(current_price=adjusted(Stock.current_price, action),
+                position_value=position_value(adjusted(Stock.current_price, action), Stock.number_of_shares))
+    )
+    database.session.execute(
+        database.update(Quote)
+        .where(Quote.stock_symbol == symbol, Quote.price_date < ex_datetime)
+        .values(price=adjusted(Quote.price, action))
+    )
+    database.session.execute(
+        database.update(PriceHistory)
+        .where(PriceHistory.stock_symbol == symbol, PriceHistory.date < action.ex_date)
+        .values(close=adjusted(PriceHistory.close, action), dividend=adjusted(PriceHistory.dividend, action))
+    )
+    database.session.execute(
+        database.update(PriceBar)
+        .where(PriceBar.stock_symbol == symbol, PriceBar.timestamp < ex_datetime)
+        .values(close=adjusted(PriceBar.close, action))
+    )
+    database.session.execute(
+        database.update(PriceAlert)
+        .where(PriceAlert.stock_symbol == symbol, PriceAlert.triggered_on.is_(None),
+               PriceAlert.created_on < ex_datetime)
+        .values(threshold=adjusted(PriceAlert.threshold, action),
+                reference_price=adjusted(PriceAlert.reference_price, action))
+    )
+    return lots
+
+
+def apply_corporate_actions(as_of: date = None) -> list:
+    """
+    Apply the corporate actions whose ex-date is on or before `as_of` (today by default) and that
+    were not applied yet, in the order of their ex-dates. Returns the [(action, lots adjusted), ...].
+    """
+    as_of = as_of or date.today()
+    query = (database.select(CorporateAction)
+             .where(CorporateAction.applied_on.is_(None), CorporateAction.ex_date <= as_of)
+             .order_by(CorporateAction.ex_date, CorporateAction.id))
+    applied = []
+    try:
+        for action in database.session.execute(query).scalars().all():
+            applied.append((action, apply_split(action)))
+            action.applied_on = datetime.now()
+        database.session.commit()
+    except Exception:
+        database.session.rollback()
+        raise
+
+    if applied:
+        chart_cache.clear()
+    return applied
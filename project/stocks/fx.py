@@ -0,0 +1,124 @@
+"""
+Conversion of the values of the stocks to the base currency of each user.
+
+The price of a stock is stored in the currency of its listing (`Stock.currency`),
+and the exchange rates of all the currencies to US dollars are stored in the
+`fx_rates` table. The rates are refreshed in bulk, with one upsert for all the
+currencies, by `flask stocks refresh-fx` (to be run on a schedule, for example
+hourly from cron).
+
+Each process keeps an `FxMatrix` of the conversion factors between every pair
+of currencies, built from the stored rates and reloaded every FX_CACHE_SECONDS.
+A page converts the values of all its stocks with one vectorized multiply by
+the column of the base currency (the currencies are mapped to the rows of the
+matrix once per distinct currency, not once per stock). The matrix is not
+loaded at all for a portfolio that is entirely in the base currency.
+"""
+from datetime import datetime
+from flask import current_app
+from project import database
+from project.market_data import get_provider
+from project.models import FxRate, Stock, User
+from sqlalchemy.dialects import postgresql, sqlite
+import numpy as np
+import threading
+import time
+
+
+class FxMatrix(object):
+    """Conversion factors between the currencies: matrix[i, j] is the units of currency j per unit of currency i."""
+
+    def __init__(self, rates: dict):
+        # {currency: US dollars per unit of the currency}
+        rates = {'USD': 1.0, **rates}
+        self.currencies = sorted(rates)
+        self.indexes = {currency: index for index, currency in enumerate(self.currencies)}
+        usd_rates = np.array([rates[currency] for currency in self.currencies], dtype=np.float64)
+        self.matrix = usd_rates[:, np.newaxis] / usd_rates[np.newaxis, :]
+
+    def factors(self, currencies: list, base_currency: str) -> np.ndarray:
+        """Return the conversion factor of each currency to the base currency (NaN for the currencies without a rate)."""
+        if base_currency not in self.indexes:
+            return np.full(len(currencies), np.nan)
+        distinct, inverse = np.unique(np.array(currencies, dtype=str), return_inverse=True)
+        rows = np.array([self.indexes.get(currency, -1) for currency in distinct], dtype=np.int64)[inverse]
+        factors = self.matrix[rows, self.indexes[base_currency]]
+        factors[rows < 0] = np.nan
+        return factors
+
+
+class FxRates(object):
+    """Matrix of the stored exchange rates of a process, reloaded every `reload_seconds`."""
+
+    def __init__(self, reload_seconds: float):
+        self.reload_seconds = reload_seconds
+        self.matrix = None
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def get_matrix(self) -> FxMatrix:
+        with self.lock:
+            if self.matrix is None or time.monotonic() - self.loaded_at >= self.reload_seconds:
+                rates = database.session.execute(database.select(FxRate.currency, FxRate.rate)).all()
+                self.matrix = FxMatrix({currency: rate for currency, rate in rates if rate})
+                self.loaded_at = time.monotonic()
+            return self.matrix
+
+    def invalidate(self):
+        with self.lock:
+            self.matrix = None
+
+
+def conversion_factors(currencies: list, base_currency: str) -> tuple:
+    """
+    Return the (conversion factor of each currency to the base currency as a NumPy array, currencies
+    without an exchange rate), where the factors of the currencies without a rate are NaN.
+    """
+    if all(currency == base_currency for currency in currencies):
+        return np.ones(len(currencies)), []
+    factors = get_fx_rates().get_matrix().factors(currencies, base_currency)
+    missing = sorted({currency for currency, factor in zip(currencies, factors) if np.isnan(factor)})
+    return factors, missing
+
+
+def portfolio_value(stocks: list, base_currency: str) -> tuple:
+    """Return the (total value in money units of the base currency, currencies without a rate) of the stocks."""
+    if all(stock.currency == base_currency for stock in stocks):
+        return sum(stock.position_value for stock in stocks), []
+    factors, missing = conversion_factors([stock.currency for stock in stocks], base_currency)
+    values = np.array([stock.position_value for stock in stocks], dtype=np.float64) * factors
+    return int(round(np.nansum(values))), missing
+
+
+def store_fx_rates(rates: dict, rate_date: datetime):
+    """Insert or replace the exchange rates ({currency: US dollars per unit}) with one statement."""
+    insert = postgresql.insert if database.engine.dialect.name == 'postgresql' else sqlite.insert
+    statement = insert(FxRate)
+    statement = statement.on_conflict_do_update(index_elements=['currency'],
+                                                set_={'rate': statement.excluded.rate,
+                                                      'rate_date': statement.excluded.rate_date})
+    database.session.execute(statement, [{'currency': currency, 'rate': rate, 'rate_date': rate_date}
+                                         for currency, rate in rates.items()])
+
+
+def refresh_fx_rates() -> dict:
+    """Retrieve and store the exchange rates of the currencies of all the stocks and users. Returns the rates."""
+    stock_currencies = database.select(Stock.currency).distinct()
+    user_currencies = database.select(User.base_currency).distinct()
+    currencies = sorted(set(database.session.execute(stock_currencies.union(user_currencies)).scalars())
+                        - {None, 'USD'})
+    rates = {currency: rate for currency, rate in get_provider().get_fx_rates(currencies).items() if rate > 0.0}
+    if rates:
+        store_fx_rates(rates, datetime.now())
+        database.session.commit()
+        get_fx_rates().invalidate()
+    current_app.logger.info(f'Refreshed the exchange rates of {len(rates)} of {len(currencies)} currencies')
+    return rates
+
+
+def init_fx_rates(app):
+    app.extensions['fx_rates'] = FxRates(app.config['FX_CACHE_SECONDS'])
+
+
+def get_fx_rates() -> FxRates:
+    return current_app.extensions['fx_rates']
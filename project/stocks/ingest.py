@@ -0,0 +1,143 @@
+"""
+Bulk ingestion of end-of-day prices (used by `flask stocks ingest-eod <file>`).
+
+The end-of-day file is a CSV file (optionally compressed with gzip, bzip2, or
+xz) with a header row that includes the columns 'symbol', 'date', and 'close'
+(in dollars); any other columns are ignored. The file is streamed, so files
+with millions of rows across all tickers are processed in constant memory:
+
+    1. The rows of the symbols that are not held in the `stocks` table are skipped.
+    2. The closes are adjusted for the splits that were applied after their date (like
+       the downloaded prices, see `CorporateAction.split_adjust()`), and upserted into
+       the daily bars (price_bars) in large batches.
+    3. The weekly bars of the ingested symbols are rolled up from the daily bars
+       (and the daily bars older than their retention are then deleted).
+    4. The current price and position value of every held stock are updated
+       with one UPDATE statement from the latest close of each symbol.
+"""
+from datetime import date, datetime
+from flask import current_app
+from project import database
+from project.market_data import DAILY, WEEKLY
+from project.models import CorporateAction, PriceBar, Stock
+from project.money import to_units
+from project.stocks.quotes import update_current_prices
+from project.stocks.timeseries import prune_bars, roll_up
+from sqlalchemy.dialects import postgresql, sqlite
+import bz2
+import csv
+import gzip
+import io
+import lzma
+import time
+
+
+OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+
+def open_eod_file(path: str):
+    """Open a (compressed) CSV file as text, based on its extension."""
+    for extension, open_compressed in OPENERS.items():
+        if path.endswith(extension):
+            return open_compressed(path, 'rt', newline='')
+    return io.open(path, 'r', newline='')
+
+
+def applied_splits(symbols: set) -> dict:
+    """Return the applied splits of the symbols as {symbol: [CorporateAction, ...]}, in the order of their ex-dates."""
+    query = (database.select(CorporateAction)
+             .where(CorporateAction.stock_symbol.in_(symbols), CorporateAction.kind == CorporateAction.SPLIT,
+                    CorporateAction.applied_on.is_not(None))
+             .order_by(CorporateAction.ex_date))
+    splits = {}
+    for split in database.session.execute(query).scalars():
+        splits.setdefault(split.stock_symbol, []).append(split)
+    return splits
+
+
+def read_eod_rows(file, symbols: set, statistics: dict, splits: dict = None):
+    """
+    Yield the (symbol, date, close in money units) of the rows of the symbols in `symbols`, with the
+    closes adjusted for the splits (see `applied_splits()`) that were applied after their date.
+
+    The number of rows in the file is stored in statistics['rows_read'] once all the rows are read.
+    """
+    reader = csv.reader(file)
+    header = [column.strip().lower() for column in next(reader)]
+    try:
+        symbol_column, date_column, close_column = (header.index(name) for name in ('symbol', 'date', 'close'))
+    except ValueError:
+        raise ValueError(f'The end-of-day file must have the columns symbol, date, and close (found: {header})')
+
+    splits = splits or {}
+    for row in reader:
+        symbol = row[symbol_column].strip().upper()
+        if symbol in symbols:
+            day = date.fromisoformat(row[date_column].strip())
+            close = to_units(row[close_column])
+            for split in splits.get(symbol, ()):
+                if day < split.ex_date:
+                    close = split.adjust_price(close)
+            yield symbol, day, close
+    statistics['rows_read'] = reader.line_num - 1
+
+
+def upsert_daily_bars(rows: list):
+    """Insert the daily bars, replacing the close of the bars that are already stored."""
+    insert = postgresql.insert if database.engine.dialect.name == 'postgresql' else sqlite.insert
+    statement = insert(PriceBar)
+    statement = statement.on_conflict_do_update(index_elements=['stock_symbol', 'resolution', 'timestamp'],
+                                                set_={'close': statement.excluded.close})
+    database.session.execute(statement, [{'stock_symbol': symbol, 'resolution': DAILY,
+                                          'timestamp': datetime.combine(day, datetime.min.time()), 'close': close}
+                                         for symbol, day, close in rows])
+
+
+def ingest_eod_file(path: str, batch_size: int = 50000) -> dict:
+    """
+    Ingest an end-of-day file and return the statistics of the run:
+        rows_read - number of rows in the file
+        rows - number of rows ingested (rows of held symbols)
+        symbols - number of symbols ingested
+        stocks - number of stocks whose current price was updated
+        seconds - duration of the run
+    """
+    start = time.perf_counter()
+    held_symbols = set(database.session.execute(database.select(Stock.stock_symbol).distinct()).scalars())
+    splits = applied_splits(held_symbols)
+
+    # {symbol: (date, close)} of the latest and {symbol: date} of the earliest row of each symbol
+    latest_closes = {}
+    earliest_dates = {}
+    statistics = {'rows_read': 0}
+    rows_ingested = 0
+    batch = []
+    with open_eod_file(path) as file:
+        for symbol, day, close in read_eod_rows(file, held_symbols, statistics, splits):
+            batch.append((symbol, day, close))
+            if symbol not in latest_closes or day >= latest_closes[symbol][0]:
+                latest_closes[symbol] = (day, close)
+            if symbol not in earliest_dates or day < earliest_dates[symbol]:
+                earliest_dates[symbol] = day
+            if len(batch) >= batch_size:
+                upsert_daily_bars(batch)
+                rows_ingested += len(batch)
+                batch = []
+    if batch:
+        upsert_daily_bars(batch)
+        rows_ingested += len(batch)
+
+    # Old daily bars (of a backfill) are rolled up into the weekly bars before they are pruned
+    for symbol, earliest_date in earliest_dates.items():
+        roll_up(symbol, DAILY, WEEKLY, datetime.combine(earliest_date, datetime.min.time()))
+        prune_bars(symbol)
+    stocks_updated = update_current_prices({symbol: close for symbol, (_, close) in latest_closes.items()})
+    database.session.commit()
+
+    statistics.update(rows=rows_ingested, symbols=len(latest_closes), stocks=stocks_updated,
+                      seconds=time.perf_counter() - start)
+    current_app.logger.info(f'Ingested {rows_ingested} of {statistics["rows_read"]} end-of-day prices from {path} '
+                            f'in {statistics["seconds"]:.2f} s '
+                            f'({statistics["rows_read"] / statistics["seconds"]:,.0f} rows/s)',
+                            extra={'eod_ingestion': statistics})
+    return statistics
@@ -0,0 +1,225 @@
+"""
+Ledger of the transactions of the users (buy, sell, dividend, and split), and the
+lot-matching engine that maintains their tax lots and realized gains.
+
+The state of the ledger of each (user, symbol) is stored in two tables:
+    * tax_lots - the shares of each buy that are still held, with their cost basis
+    * realized_gains - the gain of each lot sold by a sell, and the income of each dividend
+
+A sell is matched against the lots of its symbol by its lot method:
+    * fifo - the lots acquired first are sold first
+    * lifo - the lots acquired last are sold first
+    * specific - the lot of a given buy transaction is sold
+and the cost basis of the shares sold is taken pro rata from each lot. A split
+multiplies the shares of the lots (the cost basis is unchanged), and a dividend
+is paid on the shares held on its date.
+
+The ledger holds whole shares, unlike the stocks of the portfolio (which hold
+millionths of a share, see project/money.py), so a split that would leave a
+fractional share in a lot is rejected.
+
+Recording a transaction is incremental: a transaction that is dated on or after
+the latest transaction of its symbol is applied to the open lots of the symbol
+only, and only to the lots that it changes (a sell loads the lots that it
+sells, and a split or a dividend is applied with one UPDATE or SUM), so the cost
+does not grow with the length of the history. Only a
+back-dated transaction replays the transactions of its symbol (not the whole
+ledger of the user), with the realized gains written with bulk inserts.
+
+The gains of a user are computed with one aggregate query per table, with the
+unrealized gains valued at the shared quotes (see project/stocks/quotes.py).
+"""
+from project import database
+from project.models import Quote, RealizedGain, TaxLot, Transaction
+
+
+def gain_row(transaction: Transaction, kind: str, quantity: int, proceeds: int, cost: int,
+             lot_transaction_id: int = None) -> dict:
+    return {'user_id': transaction.user_id, 'stock_symbol': transaction.stock_symbol,
+            'transaction_id': transaction.id, 'lot_transaction_id': lot_transaction_id, 'kind': kind,
+            'date': transaction.date, 'quantity': quantity, 'proceeds': proceeds, 'cost': cost,
+            'gain': proceeds - cost}
+
+
+def match_lots(transaction: Transaction, lots: list) -> list:
+    """Return the lots that a sell is matched against, in the order that they are sold."""
+    if transaction.lot_method == Transaction.SPECIFIC:
+        return [lot for lot in lots if lot.transaction_id == transaction.lot_transaction_id]
+    if transaction.lot_method == Transaction.LIFO:
+        return lots[::-1]
+    return lots
+
+
+def fractional_split_error(transaction: Transaction) -> ValueError:
+    return ValueError(f'The {transaction.describe()} on {transaction.date.date()} would leave fractional shares '
+                      f'(the ledger holds whole shares)')
+
+
+def apply_transaction(transaction: Transaction, lots: list) -> tuple:
+    """
+    Apply a transaction to the open lots of its symbol (TaxLot objects in the order of acquisition,
+    which are updated in place). Returns the (new lots, realized gains as rows of RealizedGain).
+
+    Raises a ValueError if a sell is for more shares than the matched lots hold, or if a split
+    would leave a fractional share in a lot.
+    """
+    if transaction.kind == Transaction.BUY:
+        lot = TaxLot(user_id=transaction.user_id, stock_symbol=transaction.stock_symbol,
+                     transaction_id=transaction.id, acquired_on=transaction.date,
+                     quantity=transaction.quantity, cost=transaction.quantity * transaction.price)
+        lots.append(lot)
+        return [lot], []
+
+    if transaction.kind == Transaction.SPLIT:
+        if any(lot.quantity * transaction.split_numerator % transaction.split_denominator for lot in lots):
+            raise fractional_split_error(transaction)
+        for lot in lots:
+            lot.quantity = lot.quantity * transaction.split_numerator // transaction.split_denominator
+        return [], []
+
+    if transaction.kind == Transaction.DIVIDEND:
+        held = sum(lot.quantity for lot in lots)
+        if not held:
+            return [], []
+        return [], [gain_row(transaction, RealizedGain.DIVIDEND, held, held * transaction.price, 0)]
+
+    matched_lots = match_lots(transaction, lots)
+    available = sum(lot.quantity for lot in matched_lots)
+    if available < transaction.quantity:
+        raise ValueError(f'Only {available} shares of {transaction.stock_symbol} can be sold '
+                         f'on {transaction.date.date()} ({transaction.quantity} requested)')
+
+    gains = []
+    remaining = transaction.quantity
+    for lot in matched_lots:
+        if remaining == 0:
+            break
+        sold = min(lot.quantity, remaining)
+        cost = lot.cost * sold // lot.quantity
+        lot.quantity -= sold
+        lot.cost -= cost
+        remaining -= sold
+        gains.append(gain_row(transaction, RealizedGain.SALE, sold, sold * transaction.price, cost,
+                              lot.transaction_id))
+    return [], gains
+
+
+def lots_to_sell(transaction: Transaction, batch_size: int = 100) -> list:
+    """Return the open lots that a sell is matched against, in the order that they are sold (only as many as needed)."""
+    query = database.select(TaxLot).where(TaxLot.user_id == transaction.user_id,
+                                          TaxLot.stock_symbol == transaction.stock_symbol)
+    if transaction.lot_method == Transaction.SPECIFIC:
+        return list(database.session.execute(query.where(TaxLot.transaction_id == transaction.lot_transaction_id))
+                    .scalars())
+    if transaction.lot_method == Transaction.LIFO:
+        query = query.order_by(TaxLot.acquired_on.desc(), TaxLot.transaction_id.desc())
+    else:
+        query = query.order_by(TaxLot.acquired_on, TaxLot.transaction_id)
+
+    lots = []
+    held = 0
+    while held < transaction.quantity:
+        batch = list(database.session.execute(query.offset(len(lots)).limit(batch_size)).scalars())
+        lots.extend(batch)
+        held += sum(lot.quantity for lot in batch)
+        if len(batch) < batch_size:
+            break
+    return lots
+
+
+def record_transaction(transaction: Transaction):
+    """
+    Add a transaction to the ledger and update the lots and realized gains of its symbol
+    (the caller commits). Raises a ValueError if a sell is for more shares than are held,
+    or if a split would leave a fractional share in a lot.
+    """
+    database.session.add(transaction)
+    database.session.flush()
+
+    query = (database.select(Transaction.id)
+             .where(Transaction.user_id == transaction.user_id, Transaction.stock_symbol == transaction.stock_symbol,
+                    Transaction.date > transaction.date)
+             .limit(1))
+    if database.session.execute(query).first() is not None:
+        rebuild_ledger(transaction.user_id, transaction.stock_symbol)
+        return
+
+    symbol_lots = (TaxLot.user_id == transaction.user_id, TaxLot.stock_symbol == transaction.stock_symbol)
+    if transaction.kind == Transaction.SPLIT:
+        split_remainder = TaxLot.quantity * transaction.split_numerator % transaction.split_denominator
+        query = database.select(TaxLot.id).where(*symbol_lots, split_remainder != 0).limit(1)
+        if database.session.execute(query).first() is not None:
+            raise fractional_split_error(transaction)
+        # The lots are split with one UPDATE (the cost basis is unchanged)
+        database.session.execute(database.update(TaxLot).where(*symbol_lots).values(
+            quantity=TaxLot.quantity * transaction.split_numerator // transaction.split_denominator))
+        return
+    if transaction.kind == Transaction.DIVIDEND:
+        held = database.session.execute(database.select(database.func.sum(TaxLot.quantity)).where(*symbol_lots)).scalar()
+        # The dividend is paid on the shares held, so the lots are summed rather than loaded
+        lots = [TaxLot(quantity=held)] if held else []
+    elif transaction.kind == Transaction.SELL:
+        # A sell consumes the lots in order, so only the lots that are sold are loaded
+        lots = lots_to_sell(transaction)
+    else:
+        lots = []
+
+    new_lots, gains = apply_transaction(transaction, lots)
+    database.session.add_all(new_lots)
+    for lot in lots:
+        if lot.quantity == 0:
+            database.session.delete(lot)
+    if gains:
+        database.session.execute(database.insert(RealizedGain), gains)
+
+
+def rebuild_ledger(user_id: int, symbol: str):
+    """Replay the transactions of a user's symbol to rebuild its lots and realized gains."""
+    database.session.execute(database.delete(TaxLot).where(TaxLot.user_id == user_id, TaxLot.stock_symbol == symbol))
+    database.session.execute(database.delete(RealizedGain).where(RealizedGain.user_id == user_id,
+                                                                 RealizedGain.stock_symbol == symbol))
+    query = (database.select(Transaction)
+             .where(Transaction.user_id == user_id, Transaction.stock_symbol == symbol)
+             .order_by(Transaction.date, Transaction.id))
+    lots = []
+    gains = []
+    for transaction in database.session.execute(query).scalars():
+        _, transaction_gains = apply_transaction(transaction, lots)
+        gains.extend(transaction_gains)
+        lots = [lot for lot in lots if lot.quantity > 0]
+
+    rows = [{'user_id': lot.user_id, 'stock_symbol': lot.stock_symbol, 'transaction_id': lot.transaction_id,
+             'acquired_on': lot.acquired_on, 'quantity': lot.quantity, 'cost': lot.cost} for lot in lots]
+    if rows:
+        database.session.execute(database.insert(TaxLot), rows)
+    if gains:
+        database.session.execute(database.insert(RealizedGain), gains)
+
+
+def get_gains(user_id: int) -> list:
+    """
+    Return the gains of each symbol of a user's ledger as a list of dictionaries (in money units):
+        stock_symbol, shares, cost, price (None if there is no quote), market_value, unrealized,
+        realized (gains of the sales), and dividends
+    """
+    lots_query = (database.select(TaxLot.stock_symbol, database.func.sum(TaxLot.quantity),
+                                  database.func.sum(TaxLot.cost), Quote.price)
+                  .outerjoin(Quote, Quote.stock_symbol == TaxLot.stock_symbol)
+                  .where(TaxLot.user_id == user_id)
+                  .group_by(TaxLot.stock_symbol, Quote.price))
+    gains_query = (database.select(RealizedGain.stock_symbol, RealizedGain.kind, database.func.sum(RealizedGain.gain))
+                   .where(RealizedGain.user_id == user_id)
+                   .group_by(RealizedGain.stock_symbol, RealizedGain.kind))
+
+    gains = {}
+    for symbol, shares, cost, price in database.session.execute(lots_query):
+        market_value = shares * price if price is not None else None
+        gains[symbol] = {'stock_symbol': symbol, 'shares': shares, 'cost': cost, 'price': price,
+                         'market_value': market_value,
+                         'unrealized': market_value - cost if market_value is not None else None,
+                         'realized': 0, 'dividends': 0}
+    for symbol, kind, gain in database.session.execute(gains_query):
+        symbol_gains = gains.setdefault(symbol, {'stock_symbol': symbol, 'shares': 0, 'cost': 0, 'price': None,
+                                                 'market_value': 0, 'unrealized': 0, 'realized': 0, 'dividends': 0})
+        symbol_gains['realized' if kind == RealizedGain.SALE else 'dividends'] = gain
+    return sorted(gains.values(), key=lambda symbol_gains: symbol_gains['stock_symbol'])
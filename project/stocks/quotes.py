@@ -0,0 +1,131 @@
+"""
+Stale-while-revalidate serving of the current prices of stocks.
+
+`list_stocks` (and the watchlist) renders immediately from the last known
+prices (the prices that are not from today are marked as stale), and the
+stale symbols are refreshed in the background by a `QuoteRefresher`:
+    * the quotes of all the stale symbols of a request are retrieved with one
+      batch call to the market data provider (`get_quotes`)
+    * the quotes are stored in the `quotes` table (shared by all users), and
+      the current price and position value of every stock of those symbols
+      (of all users) are updated with one UPDATE statement
+    * a symbol is not refreshed again while a refresh is in flight, or for
+      QUOTE_REFRESH_RETRY_SECONDS after a refresh (so failing or rate-limited
+      calls to the provider are not retried on every page view)
+
+The new prices are published to the clients of the live price stream
+(`project.stocks.stream`) and evaluated against the price alerts
+(`project.stocks.alerts`), and the page otherwise picks them up from
+`/api/stocks/prices`, or on the next view. With QUOTE_REFRESH_WORKERS set to 0,
+the refresh runs in the request instead (which is used for testing).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from project import database
+from project.market_data import get_provider
+from project.models import Quote, Stock
+from project.money import position_value, to_units
+from project.stocks.alerts import evaluate_price_alerts
+from project.stocks.stream import PriceBroadcaster
+from sqlalchemy.dialects import postgresql, sqlite
+import threading
+import time
+
+
+def store_quotes(closes: dict, price_date: datetime):
+    """Insert or replace the quotes of the symbols in `closes` ({symbol: price in money units}) with one statement."""
+    insert = postgresql.insert if database.engine.dialect.name == 'postgresql' else sqlite.insert
+    statement = insert(Quote)
+    statement = statement.on_conflict_do_update(index_elements=['stock_symbol'],
+                                                set_={'price': statement.excluded.price,
+                                                      'price_date': statement.excluded.price_date})
+    database.session.execute(statement, [{'stock_symbol': symbol, 'price': close, 'price_date': price_date}
+                                         for symbol, close in closes.items()])
+
+
+def update_current_prices(closes: dict) -> int:
+    """
+    Store the quotes of the symbols in `closes` ({symbol: price in money units}), and set the current price and
+    the position value of every stock of the symbols with one UPDATE statement. Returns the number of stocks.
+    """
+    if not closes:
+        return 0
+    store_quotes(closes, datetime.now())
+    current_price = database.case(closes, value=Stock.stock_symbol)
+    statement = (database.update(Stock)
+                 .where(Stock.stock_symbol.in_(closes))
+                 .values(current_price=current_price,
+                         position_value=position_value(current_price, Stock.number_of_shares),
+                         current_price_date=datetime.now())
+                 .execution_options(synchronize_session=False))
+    return database.session.execute(statement).rowcount
+
+
+def refresh_quotes(symbols: list) -> dict:
+    """Retrieve the quotes of the symbols and update their stocks. Returns the prices that were updated."""
+    closes = {symbol: to_units(price) for symbol, price in get_provider().get_quotes(symbols).items() if price > 0}
+    if closes:
+        update_current_prices(closes)
+        database.session.commit()
+    current_app.logger.info(f'Refreshed the quotes of {len(closes)} of {len(symbols)} symbols',
+                            extra={'refreshed_symbols': sorted(closes)})
+    return closes
+
+
+class QuoteRefresher(object):
+    """Refreshes the quotes of stale symbols in a pool of background threads."""
+
+    def __init__(self, workers: int, retry_seconds: float, broadcaster: PriceBroadcaster = None):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='quote-refresher') \
+            if workers > 0 else None
+        self.retry_seconds = retry_seconds
+        self.broadcaster = broadcaster if broadcaster is not None else PriceBroadcaster()
+        self.in_flight = set()
+        # {symbol: time.monotonic() of the last refresh}
+        self.last_refreshed = {}
+        self.lock = threading.Lock()
+
+    def refresh(self, symbols) -> set:
+        """Schedule a refresh of the symbols that are not already being refreshed. Returns the scheduled symbols."""
+        now = time.monotonic()
+        with self.lock:
+            scheduled = {symbol for symbol in symbols
+                         if symbol not in self.in_flight
+                         and now - self.last_refreshed.get(symbol, float('-inf')) >= self.retry_seconds}
+            self.in_flight.update(scheduled)
+        if not scheduled:
+            return scheduled
+
+        if self.executor is None:
+            self.run(sorted(scheduled))
+        else:
+            self.executor.submit(self.run_in_app_context, current_app._get_current_object(), sorted(scheduled))
+        return scheduled
+
+    def run_in_app_context(self, app, symbols: list):
+        with app.app_context():
+            self.run(symbols)
+
+    def run(self, symbols: list):
+        try:
+            closes = refresh_quotes(symbols)
+            self.broadcaster.publish(closes)
+            evaluate_price_alerts(closes)
+        except Exception:
+            database.session.rollback()
+            current_app.logger.exception(f'Error! Unable to refresh the quotes ({", ".join(symbols)})!')
+        finally:
+            with self.lock:
+                self.in_flight.difference_update(symbols)
+                now = time.monotonic()
+                self.last_refreshed.update((symbol, now) for symbol in symbols)
+
+
+def init_quote_refresher(app):
+    app.extensions['quote_refresher'] = QuoteRefresher(app.config['QUOTE_REFRESH_WORKERS'],
+                                                       app.config['QUOTE_REFRESH_RETRY_SECONDS'])
+
+
+def get_quote_refresher() -> QuoteRefresher:
+    return current_app.extensions['quote_refresher']
@@ -0,0 +1,147 @@
+"""
+Total return of the lots of a portfolio (price return plus reinvested dividends).
+
+The weekly history of each symbol (price_history) stores the close and the
+dividend per share of each week. The total return assumes that each dividend
+is reinvested at the close of its week, so the shares of a lot grow by
+(1 + dividend / close) in each week after the purchase date:
+    total value = number of shares * growth since the purchase * latest close
+    total return = total value / (number of shares * purchase price) - 1
+
+The histories of the symbols of a portfolio are concatenated into one set of
+arrays (ordered by symbol and date) and the cumulative sum of
+log(1 + dividend / close) is computed once, so the growth of every lot is the
+difference of two of its elements, found with one binary search
+(np.searchsorted) for all the lots at once.
+
+The results are cached per portfolio, keyed by its lots and by the number of
+weekly rows and the latest week of each of its symbols (and the latest split
+applied to them), so a cached result is only invalidated when new weekly rows
+are added (or the lots change).
+"""
+from datetime import date, timedelta
+from flask import current_app
+from project import database
+from project.instrumentation import record_timing
+from project.models import CorporateAction, PriceHistory, Stock
+from project.money import SHARE_UNITS
+from project.stocks.charts import ChartCache, refresh_price_histories
+import math
+import numpy as np
+
+
+# Keys of the rows of the concatenated histories: symbol index * KEY_SPAN + days since 1970-01-01
+KEY_SPAN = 1 << 32
+
+returns_cache = ChartCache()
+
+
+def read_weekly_histories(symbols: list) -> dict:
+    """Read the weekly history of the symbols as {symbol: (dates, closes, dividends)}, oldest first."""
+    query = (database.select(PriceHistory.stock_symbol, PriceHistory.date, PriceHistory.close, PriceHistory.dividend)
+             .where(PriceHistory.stock_symbol.in_(symbols))
+             .order_by(PriceHistory.stock_symbol, PriceHistory.date))
+    rows = {}
+    for symbol, week, close, dividend in database.session.execute(query):
+        rows.setdefault(symbol, []).append((week, close, dividend or 0))
+    return {symbol: (np.array([week for week, _, _ in weeks], dtype='datetime64[D]'),
+                     np.array([close for _, close, _ in weeks], dtype=np.float64),
+                     np.array([dividend for _, _, dividend in weeks], dtype=np.float64))
+            for symbol, weeks in rows.items()}
+
+
+def compute_total_returns(lots: list, histories: dict) -> dict:
+    """
+    Compute the returns of the lots [(stock id, symbol, purchase date, number of shares, purchase price), ...]
+    from the weekly histories {symbol: (dates, closes, dividends)} (prices in money units, shares in share units):
+        lots - [{'id', 'stock_symbol', 'value', 'total_value', 'price_return', 'total_return'}, ...]
+               (the returns in percent, and None for the lots without a history or a purchase date)
+        portfolio - {'cost', 'value', 'total_value', 'price_return', 'total_return'} of the lots with returns
+    """
+    symbols = sorted(histories)
+    symbol_indexes = {symbol: index for index, symbol in enumerate(symbols)}
+    priced = [lot for lot in lots if lot[1] in symbol_indexes and lot[2] is not None]
+
+    results = {lot[0]: {'id': lot[0], 'stock_symbol': lot[1], 'value': None, 'total_value': None,
+                        'price_return': None, 'total_return': None} for lot in lots}
+    portfolio = {'cost': 0, 'value': 0, 'total_value': 0, 'price_return': None, 'total_return': None}
+    if priced:
+        lengths = np.array([len(histories[symbol][0]) for symbol in symbols])
+        ends = np.cumsum(lengths)
+        dates = np.concatenate([histories[symbol][0] for symbol in symbols]).astype(np.int64)
+        closes = np.concatenate([histories[symbol][1] for symbol in symbols])
+        dividends = np.concatenate([histories[symbol][2] for symbol in symbols])
+        keys = np.repeat(np.arange(len(symbols), dtype=np.int64), lengths) * KEY_SPAN + dates
+
+        # growth[i] is the sum of log(1 + dividend / close) of the rows before row i
+        reinvested = np.divide(dividends, closes, out=np.zeros_like(closes), where=closes > 0)
+        growth = np.concatenate(([0.0], np.cumsum(np.log1p(reinvested))))
+
+        lot_symbols = np.array([symbol_indexes[lot[1]] for lot in priced], dtype=np.int64)
+        purchase_days = np.array([lot[2] for lot in priced], dtype='datetime64[D]').astype(np.int64)
+        shares = np.array([lot[3] for lot in priced], dtype=np.float64) / SHARE_UNITS
+        costs = shares * np.array([lot[4] for lot in priced], dtype=np.float64)
+
+        # The dividends of the weeks after the purchase date (up to the latest week of the symbol) are reinvested
+        first = np.searchsorted(keys, lot_symbols * KEY_SPAN + purchase_days, side='right')
+        last = ends[lot_symbols]
+        values = shares * closes[last - 1]
+        total_values = values * np.exp(growth[last] - growth[first])
+
+        def percent(value, cost):
+            return np.round(np.divide(value, cost, out=np.ones_like(value), where=cost > 0) * 100.0 - 100.0, 2)
+
+        for lot, value, total_value, price_return, total_return in zip(
+                priced, values, total_values, percent(values, costs), percent(total_values, costs)):
+            results[lot[0]].update({'value': int(round(value)), 'total_value': int(round(total_value)),
+                                    'price_return': float(price_return), 'total_return': float(total_return)})
+
+        cost, value, total_value = costs.sum(), values.sum(), total_values.sum()
+        portfolio = {'cost': int(round(cost)), 'value': int(round(value)), 'total_value': int(round(total_value)),
+                     'price_return': round((value / cost - 1.0) * 100.0, 2) if cost > 0 else None,
+                     'total_return': round((total_value / cost - 1.0) * 100.0, 2) if cost > 0 else None}
+    return {'lots': list(results.values()), 'portfolio': portfolio}
+
+
+def history_versions(symbols: list) -> dict:
+    """
+    Return the (number of weekly rows, latest week, total of the dividends) of the symbols with a weekly history
+    (the dividends of the stored weeks are updated when the weekly history is downloaded again).
+    """
+    query = (database.select(PriceHistory.stock_symbol, database.func.count(PriceHistory.id),
+                             database.func.max(PriceHistory.date), database.func.sum(PriceHistory.dividend))
+             .where(PriceHistory.stock_symbol.in_(symbols))
+             .group_by(PriceHistory.stock_symbol))
+    return {symbol: (count, latest, dividends) for symbol, count, latest, dividends in database.session.execute(query)}
+
+
+def get_total_returns(user_id: int) -> dict:
+    """Return the total returns of the lots of a user's portfolio (see `compute_total_returns()`)."""
+    query = (database.select(Stock.id, Stock.stock_symbol, Stock.purchase_date, Stock.number_of_shares,
+                             Stock.purchase_price)
+             .where(Stock.user_id == user_id)
+             .order_by(Stock.id))
+    lots = [tuple(row) for row in database.session.execute(query)]
+    symbols = sorted({symbol for _, symbol, _, _, _ in lots})
+    if not symbols:
+        return compute_total_returns(lots, {})
+
+    versions = history_versions(symbols)
+    oldest_allowed = date.today() - timedelta(days=current_app.config['PRICE_HISTORY_MAX_AGE_DAYS'])
+    stale_symbols = [symbol for symbol in symbols if symbol not in versions or versions[symbol][1] < oldest_allowed]
+    if stale_symbols:
+        refresh_price_histories(stale_symbols)
+        versions.update(history_versions(stale_symbols))
+    # The splits adjust the stored closes without adding weekly rows
+    latest_split = CorporateAction.last_applied_on(symbols)
+
+    cache_key = (tuple(lots), tuple(sorted(versions.items())), latest_split)
+    total_returns = returns_cache.get(cache_key)
+    if total_returns is not None:
+        record_timing('returns-cache-hit')
+        return total_returns
+    record_timing('returns-cache-miss')
+
+    total_returns = compute_total_returns(lots, read_weekly_histories(symbols))
+    returns_cache.set(cache_key, total_returns, math.inf, current_app.config['RETURNS_CACHE_MAX_ENTRIES'])
+    return total_returns
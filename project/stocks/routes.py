@@ -1,11 +1,31 @@
 from . import stocks_blueprint
-from flask import current_app, render_template, request, session, flash, redirect, url_for, flash, abort
+from flask import (current_app, render_template, request, session, flash, redirect, url_for, flash, abort, jsonify,
+                   Response)
 from flask_login import login_required, current_user
-from pydantic import BaseModel, field_validator, ValidationError
-from project.models import Stock
+from pydantic import BaseModel, field_validator, model_validator, ValidationError
+from project.models import CorporateAction, PriceAlert, Quote, Stock, Transaction, WatchlistItem
 from project import database
-from datetime import datetime
+from project.money import format_amount, format_shares, SHARE_PLACES, SHARE_UNITS, to_json, to_units
+from project.db import use_read_replica
+from project.stocks.alerts import get_alert_engine, init_alert_engine
+from project.stocks.charts import compare_stocks, get_range_chart, get_weekly_chart
+from project.stocks.timeseries import CHART_RANGES, INTRADAY
+from project.instrumentation import record_cache_lookup
+from project.stocks.corporate_actions import apply_corporate_actions
+from project.stocks.fx import conversion_factors, init_fx_rates, portfolio_value, refresh_fx_rates
+from project.stocks.ingest import ingest_eod_file
+from project.stocks.ledger import get_gains, record_transaction
+from project.stocks.quotes import get_quote_refresher, init_quote_refresher
+from project.stocks.rebalance import get_holdings, rebalance_portfolio
+from project.stocks.returns import get_total_returns
+from project.stocks.seed import seed as seed_portfolios
+from project.stocks.stream import get_stream_limiter, init_stream_limiter, stream_prices
+from project.stocks.symbols import get_symbol_index, write_symbol_index
+from datetime import date, datetime
+from decimal import Decimal
 import click
+import math
+import time
 
 
 # --------------
@@ -15,8 +35,110 @@ import click
 class StockModel(BaseModel):
     """Class for parsing new stock data from a form."""
     stock_symbol: str
-    number_of_shares: int
-    purchase_price: float
+    number_of_shares: Decimal
+    purchase_price: Decimal
+    currency: str = 'USD'
+
+    @field_validator('stock_symbol')
+    def stock_symbol_check(cls, value):
+        if not value.isalpha() or len(value) > 5:
+            raise ValueError('Stock symbol must be 1-5 characters')
+        return value.upper()
+
+    @field_validator('number_of_shares')
+    def number_of_shares_check(cls, value):
+        if value <= 0:
+            raise ValueError('Number of shares must be positive')
+        if (value * SHARE_UNITS) % 1:
+            raise ValueError(f'Number of shares must have at most {SHARE_PLACES} decimal places')
+        return value
+
+    @field_validator('currency')
+    def currency_check(cls, value):
+        if not value.isalpha() or len(value) != 3:
+            raise ValueError('Currency must be a 3-letter code (such as USD)')
+        return value.upper()
+
+
+class PriceAlertModel(BaseModel):
+    """Class for parsing a new price alert from a form."""
+    stock_symbol: str
+    kind: str
+    value: float
+
+    @field_validator('stock_symbol')
+    def stock_symbol_check(cls, value):
+        if not value.isalpha() or len(value) > 5:
+            raise ValueError('Stock symbol must be 1-5 characters')
+        return value.upper()
+
+    @field_validator('kind')
+    def kind_check(cls, value):
+        if value not in PriceAlert.KINDS:
+            raise ValueError(f'Alert must be one of: {", ".join(PriceAlert.KINDS)}')
+        return value
+
+    @field_validator('value')
+    def value_check(cls, value):
+        if value <= 0.0:
+            raise ValueError('Price or percent change must be positive')
+        return value
+
+
+class TransactionModel(BaseModel):
+    """Class for parsing a transaction of the ledger from a form."""
+    stock_symbol: str
+    kind: str
+    date: date
+    quantity: Decimal | None = None
+    price: Decimal | None = None
+    split_numerator: int | None = None
+    split_denominator: int | None = None
+    lot_method: str = Transaction.FIFO
+    lot_transaction_id: int | None = None
+
+    @field_validator('stock_symbol')
+    def stock_symbol_check(cls, value):
+        if not value.isalpha() or len(value) > 5:
+            raise ValueError('Stock symbol must be 1-5 characters')
+        return value.upper()
+
+    @field_validator('kind')
+    def kind_check(cls, value):
+        if value not in Transaction.KINDS:
+            raise ValueError(f'Transaction must be one of: {", ".join(Transaction.KINDS)}')
+        return value
+
+    @field_validator('quantity')
+    def quantity_check(cls, value):
+        # The ledger holds whole shares (the stocks of the portfolio can hold fractional shares)
+        if value is not None and value % 1:
+            raise ValueError('Number of shares must be a whole number')
+        return int(value) if value is not None else None
+
+    @field_validator('lot_method')
+    def lot_method_check(cls, value):
+        if value not in Transaction.LOT_METHODS:
+            raise ValueError(f'Lot method must be one of: {", ".join(Transaction.LOT_METHODS)}')
+        return value
+
+    @model_validator(mode='after')
+    def fields_of_kind_check(self):
+        if self.kind in (Transaction.BUY, Transaction.SELL) and (not self.quantity or self.quantity <= 0):
+            raise ValueError('Number of shares must be positive')
+        if self.kind != Transaction.SPLIT and (self.price is None or self.price < 0.0):
+            raise ValueError('Price must not be negative')
+        if self.kind == Transaction.SPLIT and (not self.split_numerator or not self.split_denominator
+                                               or self.split_numerator <= 0 or self.split_denominator <= 0):
+            raise ValueError('Split ratio must be positive')
+        if self.kind == Transaction.SELL and self.lot_method == Transaction.SPECIFIC and not self.lot_transaction_id:
+            raise ValueError('The buy transaction of the lot must be selected')
+        return self
+
+
+class WatchlistItemModel(BaseModel):
+    """Class for parsing a watched stock symbol from a form."""
+    stock_symbol: str
 
     @field_validator('stock_symbol')
     def stock_symbol_check(cls, value):
@@ -25,6 +147,100 @@ class StockModel(BaseModel):
         return value.upper()
     
     
+
+# ----------------
+# Helper Functions
+# ----------------
+
+def parse_compare_arguments():
+    """
+    Parse the query string of the comparison chart:
+        symbols - comma-separated stock symbols (default: the first symbols of the user's stocks)
+        base - base date (YYYY-MM-DD) of the comparison (default: first week with all the prices)
+        points - maximum number of points for each symbol (default: 200)
+    Raises a ValueError if an argument is invalid.
+    """
+    max_symbols = current_app.config['COMPARE_MAX_SYMBOLS']
+    if request.args.get('symbols'):
+        symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in request.args['symbols'].split(',')
+                                     if symbol.strip()))
+        if any(not symbol.isalpha() or len(symbol) > 5 for symbol in symbols):
+            raise ValueError('Stock symbols must be 1-5 characters')
+        if len(symbols) > max_symbols:
+            raise ValueError(f'At most {max_symbols} stocks can be compared')
+    else:
+        query = (database.select(Stock.stock_symbol).where(Stock.user_id == current_user.id)
+                 .distinct().order_by(Stock.stock_symbol).limit(max_symbols))
+        symbols = database.session.execute(query).scalars().all()
+
+    try:
+        base_date = date.fromisoformat(request.args['base']) if request.args.get('base') else None
+        points = int(request.args.get('points', 200))
+    except ValueError:
+        raise ValueError('Invalid base date or number of points') from None
+    points = max(2, min(points, current_app.config['COMPARE_MAX_POINTS']))
+    return symbols, base_date, points
+
+
+def parse_rebalance_arguments():
+    """
+    Parse the query string of a rebalance:
+        targets - comma-separated target weights in percent of symbols or asset classes (for example SAM:60,BONDS:40)
+        classes - comma-separated asset classes of symbols (for example TLT:BONDS,AGG:BONDS)
+        cash - cash to invest (default: 0)
+        whole_shares - 0 to trade fractional shares (default: 1)
+        sells - 0 to only buy (default: 1)
+    Raises a ValueError if an argument is invalid.
+    """
+    def pairs(name: str) -> list:
+        items = [item.split(':') for item in request.args.get(name, '').split(',') if item.strip()]
+        if any(len(item) != 2 or not item[0].strip() or not item[1].strip() for item in items):
+            raise ValueError(f'The {name} must be comma-separated KEY:VALUE pairs')
+        return [(key.strip().upper(), value.strip()) for key, value in items]
+
+    target_pairs = pairs('targets')
+    try:
+        targets = {key: float(percent) / 100.0 for key, percent in target_pairs}
+        cash = to_units(request.args.get('cash', '0'))
+    except ValueError:
+        raise ValueError('Invalid target weight or cash') from None
+    if not targets:
+        raise ValueError('At least one target weight is required')
+    if any(not 0.0 <= weight <= 1.0 for weight in targets.values()) or sum(targets.values()) > 1.0 + 1e-9:
+        raise ValueError('The target weights must be between 0 and 100 percent, and add up to at most 100 percent')
+    if cash < 0:
+        raise ValueError('The cash must not be negative')
+    asset_classes = {symbol: asset_class.upper() for symbol, asset_class in pairs('classes')}
+    whole_shares = request.args.get('whole_shares', '1') != '0'
+    allow_sells = request.args.get('sells', '1') != '0'
+    return targets, asset_classes, cash, whole_shares, allow_sells
+
+
+def get_watchlist() -> list:
+    """
+    Return the (WatchlistItem, Quote or None) of the user's watched symbols, read with one query
+    from the shared quotes, and schedule a refresh of the symbols whose quote is stale.
+    """
+    query = (database.select(WatchlistItem, Quote)
+             .outerjoin(Quote, Quote.stock_symbol == WatchlistItem.stock_symbol)
+             .where(WatchlistItem.user_id == current_user.id)
+             .order_by(WatchlistItem.stock_symbol))
+    watchlist = database.session.execute(query).all()
+
+    stale_symbols = set()
+    for item, quote in watchlist:
+        quote_is_current = quote is not None and quote.is_price_current()
+        record_cache_lookup(hit=quote_is_current)
+        if not quote_is_current:
+            stale_symbols.add(item.stock_symbol)
+
+    quote_refresher = get_quote_refresher()
+    if quote_refresher.refresh(stale_symbols) and quote_refresher.executor is None:
+        # The quotes were refreshed during this request
+        watchlist = database.session.execute(query.execution_options(populate_existing=True)).all()
+    return watchlist
+
+
 ####################
 ### CLI Commands ###
 ####################
@@ -52,22 +268,133 @@ def create(symbol, number_of_shares, purchase_price):
     database.session.add(stock)
     database.session.commit()
 
+
+
+@stocks_blueprint.cli.command('seed')
+@click.option('--users', default=100, show_default=True, help='Number of users to create')
+@click.option('--lots-per-user', default=20, show_default=True, help='Average number of stock lots per user')
+@click.option('--history-weeks', default=0, show_default=True,
+              help='Weeks of synthetic weekly prices to create for each symbol (0 for none)')
+@click.option('--password', default='FlaskIsAwesome123', show_default=True, help='Password of every user')
+@click.option('--email-prefix', default='seed-user', show_default=True,
+              help='Prefix of the email addresses ({prefix}{n}@example.com)')
+@click.option('--random-seed', default=42, show_default=True, help='Seed for reproducible datasets')
+@click.option('--batch-size', default=10000, show_default=True, help='Rows per bulk insert')
+def seed(users, lots_per_user, history_weeks, password, email_prefix, random_seed, batch_size):
+    """Create users with synthetic portfolios (and price histories) for testing at scale"""
+    start = time.perf_counter()
+    row_counts = seed_portfolios(users, lots_per_user, history_weeks, password, email_prefix,
+                                 random_seed, batch_size)
+    elapsed = time.perf_counter() - start
+    total_rows = sum(row_counts.values())
+    click.echo(f'Inserted {row_counts["users"]} users, {row_counts["stocks"]} stocks, and '
+               f'{row_counts["price_history"]} weekly prices in {elapsed:.2f} s '
+               f'({total_rows / elapsed:,.0f} rows/s)')
+
+
+@stocks_blueprint.cli.command('ingest-eod')
+@click.argument('file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=50000, show_default=True, help='Rows per bulk upsert')
+def ingest_eod(file, batch_size):
+    """Ingest a (compressed) CSV file of end-of-day prices (columns: symbol, date, close)"""
+    statistics = ingest_eod_file(file, batch_size)
+    click.echo(f'Ingested {statistics["rows"]} of {statistics["rows_read"]} rows '
+               f'({statistics["symbols"]} symbols, {statistics["stocks"]} stocks updated) '
+               f'in {statistics["seconds"]:.2f} s ({statistics["rows_read"] / statistics["seconds"]:,.0f} rows/s)')
+
+
+@stocks_blueprint.cli.command('build-symbol-index')
+@click.option('--listing', type=click.Path(exists=True, dir_okay=False),
+              help='Listing file (default: SYMBOL_LISTING_PATH)')
+@click.option('--output', type=click.Path(dir_okay=False), help='Index file (default: SYMBOL_INDEX_PATH)')
+def build_symbol_index(listing, output):
+    """Build the symbol search index from a listing file (columns: symbol, name)"""
+    listing = listing or current_app.config['SYMBOL_LISTING_PATH']
+    output = output or current_app.config['SYMBOL_INDEX_PATH']
+    start = time.perf_counter()
+    count = write_symbol_index(listing, output)
+    click.echo(f'Indexed {count} symbols from {listing} in {time.perf_counter() - start:.2f} s ({output})')
+
+
+@stocks_blueprint.cli.command('add-split')
+@click.argument('symbol')
+@click.argument('ex_date', type=click.DateTime(formats=['%Y-%m-%d']))
+@click.argument('ratio')
+def add_split(symbol, ex_date, ratio):
+    """Record a split of a stock (RATIO is new:old shares, for example 4:1 or 1:10)"""
+    try:
+        numerator, denominator = (int(part) for part in ratio.split(':'))
+    except ValueError:
+        raise click.BadParameter('The ratio must be two integers (new:old), for example 4:1', param_hint='RATIO')
+    if numerator <= 0 or denominator <= 0 or numerator == denominator:
+        raise click.BadParameter('The ratio must be two different positive integers', param_hint='RATIO')
+
+    action = CorporateAction(symbol.upper(), ex_date.date(), numerator, denominator)
+    database.session.add(action)
+    database.session.commit()
+    click.echo(f'Recorded the {action.describe()} (apply it with `flask stocks apply-actions`)')
+
+
+@stocks_blueprint.cli.command('apply-actions')
+@click.option('--as-of', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Apply the actions with an ex-date up to this date (default: today)')
+def apply_actions(as_of):
+    """Adjust the lots, prices, and alerts of all the users for the corporate actions that are due"""
+    start = time.perf_counter()
+    applied = apply_corporate_actions(as_of.date() if as_of else None)
+    for action, lots in applied:
+        click.echo(f'Applied the {action.describe()} ({lots} lots adjusted)')
+    click.echo(f'Applied {len(applied)} corporate actions in {time.perf_counter() - start:.2f} s')
+
+
+@stocks_blueprint.cli.command('refresh-fx')
+def refresh_fx():
+    """Retrieve the exchange rates of the currencies of the stocks and the users"""
+    rates = refresh_fx_rates()
+    for currency, rate in sorted(rates.items()):
+        click.echo(f'{currency}: {rate} USD')
+    click.echo(f'Refreshed the exchange rates of {len(rates)} currencies')
+
 # -----------------
 # Request Callbacks
 # -----------------
 
+@stocks_blueprint.record_once
+def init_stocks_blueprint(state):
+    init_quote_refresher(state.app)
+    init_stream_limiter(state.app)
+    init_alert_engine(state.app)
+    init_fx_rates(state.app)
+
+
+@stocks_blueprint.app_template_filter('money')
+def money(units: int, currency: str = 'USD') -> str:
+    """Format an amount (in money units, see project/money.py) as '$12.34' for US dollars, or as '12.34 EUR'."""
+    amount = format_amount(units)
+    return f'${amount}' if currency == 'USD' else f'{amount} {currency}'
+
+
+@stocks_blueprint.app_template_filter('shares')
+def shares(share_units: int) -> str:
+    """Format a number of shares (in share units, see project/money.py) as '27' or '0.125'."""
+    return format_shares(share_units)
+
+
 @stocks_blueprint.before_request
 def stocks_before_request():
-    current_app.logger.info('Calling before_request() for the stocks blueprint...')
+    current_app.logger.info('Calling before_request() for the stocks blueprint...',
+                            extra={'sampled': True})
     
 @stocks_blueprint.after_request
 def stocks_after_request(response):
-    current_app.logger.info('Calling after_request() for the stocks blueprint...')
+    current_app.logger.info('Calling after_request() for the stocks blueprint...',
+                            extra={'sampled': True})
     return response
     
 @stocks_blueprint.teardown_request
 def stocks_teardown_request(error=None):
-    current_app.logger.info('Calling teardown_request() for the stocks blueprint...')
+    current_app.logger.info('Calling teardown_request() for the stocks blueprint...',
+                            extra={'sampled': True})
 
 # ------
 # Routes
@@ -81,19 +408,83 @@ def index():
 
 @stocks_blueprint.route('/stocks/')
 @login_required
+@use_read_replica
 def list_stocks():
+    # Read before the prices are refreshed, as the commit of the refresh expires the user
+    base_currency = current_user.base_currency
     query = database.select(Stock).where(Stock.user_id == current_user.id).order_by(Stock.id)
     stocks = database.session.execute(query).scalars().all()
     
-    current_account_value = 0.0
+    # Render from the last known prices and refresh the stale prices in the background
+    stale_symbols = set()
     for stock in stocks:
-        stock.get_stock_data()
-        database.session.add(stock)
-        current_account_value += stock.get_stock_position_value()
-        
-    database.session.commit()
+        price_is_current = stock.is_price_current()
+        record_cache_lookup(hit=price_is_current)
+        if not price_is_current:
+            stale_symbols.add(stock.stock_symbol)
+    
+    quote_refresher = get_quote_refresher()
+    if quote_refresher.refresh(stale_symbols) and quote_refresher.executor is None:
+        # The prices were refreshed during this request, so reload the stocks with one query
+        stocks = database.session.execute(query).scalars().all()
     
-    return render_template('stocks/stocks.html', stocks=stocks, value=round(current_account_value, 2))
+    # The positions are valued in the currency of each stock, and the total in the user's base currency
+    current_account_value, missing_currencies = portfolio_value(stocks, base_currency)
+    any_stale = any(not stock.is_price_current() for stock in stocks)
+    return render_template('stocks/stocks.html', stocks=stocks, value=current_account_value,
+                           base_currency=base_currency, missing_currencies=missing_currencies,
+                           any_stale=any_stale)
+
+
+@stocks_blueprint.route('/api/stocks/prices')
+@login_required
+def api_stock_prices():
+    """Last known prices of the user's stocks"""
+    query = database.select(Stock).where(Stock.user_id == current_user.id).order_by(Stock.id)
+    stocks = database.session.execute(query).scalars().all()
+    value, missing_currencies = portfolio_value(stocks, current_user.base_currency)
+    return jsonify({'stocks': [{'id': stock.id,
+                                'currency': stock.currency,
+                                'current_price': to_json(stock.current_price),
+                                'position_value': to_json(stock.position_value),
+                                'current_price_date': stock.current_price_date.isoformat()
+                                if stock.current_price_date else None,
+                                'stale': not stock.is_price_current()} for stock in stocks],
+                    'value': to_json(value),
+                    'currency': current_user.base_currency,
+                    'missing_currencies': missing_currencies})
+
+
+@stocks_blueprint.route('/stocks/stream')
+@login_required
+def stream_stock_prices():
+    """Server-Sent Events of the price changes of the user's stocks (see project/stocks/stream.py)"""
+    query = database.select(Stock).where(Stock.user_id == current_user.id).order_by(Stock.id)
+    stocks = database.session.execute(query).scalars().all()
+    holdings = {stock.id: (stock.stock_symbol, stock.number_of_shares, stock.current_price) for stock in stocks}
+    # The stocks without an exchange rate are left out of the total value (like on the page)
+    factors, _ = conversion_factors([stock.currency for stock in stocks], current_user.base_currency)
+    factors = {stock.id: 0.0 if math.isnan(factor) else float(factor) for stock, factor in zip(stocks, factors)}
+
+    # The stream runs outside of the request context, so it does not keep the session (and its database
+    # connection) checked out while it is open
+    database.session.remove()
+
+    stream_limiter = get_stream_limiter()
+    if not stream_limiter.acquire():
+        # The browser reconnects after the retry delay (an error status would stop it from reconnecting)
+        retry_milliseconds = int(current_app.config['STREAM_BUSY_RETRY_SECONDS'] * 1000)
+        return Response(f'retry: {retry_milliseconds}\n\n', mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+    events = stream_prices(holdings, current_app._get_current_object(), get_quote_refresher(),
+                           heartbeat_seconds=current_app.config['STREAM_HEARTBEAT_SECONDS'],
+                           refresh_seconds=current_app.config['STREAM_REFRESH_SECONDS'],
+                           max_seconds=current_app.config['STREAM_MAX_SECONDS'],
+                           factors=factors)
+    response = Response(events, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(stream_limiter.release)
+    return response
 
 
 @stocks_blueprint.route('/add_stock', methods=['GET', 'POST'])
@@ -104,16 +495,24 @@ def add_stock():
             stock_data = StockModel(
                 stock_symbol=request.form['stock_symbol'],
                 number_of_shares=request.form['number_of_shares'],
-                purchase_price=request.form['purchase_price']
+                purchase_price=request.form['purchase_price'],
+                currency=request.form.get('currency') or 'USD'
             )
             print(stock_data)
 
+            # Reject the symbols that are not listed (unless no listing is available)
+            symbol_index = get_symbol_index()
+            if len(symbol_index) and stock_data.stock_symbol not in symbol_index:
+                flash(f'Error! {stock_data.stock_symbol} is not a listed stock symbol', 'error')
+                return render_template('stocks/add_stock.html')
+
             # Save the form data to the session object
             new_stock = Stock(stock_data.stock_symbol,
                               stock_data.number_of_shares,
                               stock_data.purchase_price,
                               current_user.id,
-                              datetime.fromisoformat(request.form['purchase_date']))
+                              datetime.fromisoformat(request.form['purchase_date']),
+                              stock_data.currency)
             database.session.add(new_stock)
             database.session.commit()
             
@@ -129,6 +528,227 @@ def add_stock():
     return render_template('stocks/add_stock.html')
 
 
+@stocks_blueprint.route('/stocks/transactions', methods=['GET', 'POST'])
+@login_required
+def transactions():
+    if request.method == 'POST':
+        try:
+            # The fields that do not apply to the kind of transaction are left empty
+            transaction_data = TransactionModel(**{name: value for name, value in request.form.items()
+                                                   if name in TransactionModel.model_fields and value != ''})
+        except ValidationError as e:
+            flash(f'Error! Invalid transaction ({e.errors()[0]["msg"]})', 'error')
+            return redirect(url_for('stocks.transactions'))
+
+        new_transaction = Transaction(transaction_data.stock_symbol, transaction_data.kind, current_user.id,
+                                      datetime.combine(transaction_data.date, datetime.min.time()),
+                                      quantity=transaction_data.quantity, price=transaction_data.price,
+                                      split_numerator=transaction_data.split_numerator,
+                                      split_denominator=transaction_data.split_denominator,
+                                      lot_method=transaction_data.lot_method,
+                                      lot_transaction_id=transaction_data.lot_transaction_id)
+        try:
+            record_transaction(new_transaction)
+        except ValueError as e:
+            database.session.rollback()
+            flash(f'Error! {e}', 'error')
+            return redirect(url_for('stocks.transactions'))
+        database.session.commit()
+
+        flash(f'Recorded transaction ({new_transaction.describe()})!', 'success')
+        current_app.logger.info(f'Recorded transaction ({new_transaction.describe()})!')
+        return redirect(url_for('stocks.transactions'))
+
+    gains = get_gains(current_user.id)
+    get_quote_refresher().refresh({symbol_gains['stock_symbol'] for symbol_gains in gains
+                                   if symbol_gains['shares'] and symbol_gains['price'] is None})
+    query = (database.select(Transaction).where(Transaction.user_id == current_user.id)
+             .order_by(Transaction.date.desc(), Transaction.id.desc())
+             .limit(current_app.config['TRANSACTIONS_PER_PAGE']))
+    recent_transactions = database.session.execute(query).scalars().all()
+    return render_template('stocks/transactions.html', gains=gains, transactions=recent_transactions)
+
+
+@stocks_blueprint.route('/api/gains')
+@login_required
+def api_gains():
+    """Realized and unrealized gains of each symbol in the user's ledger (in dollars)"""
+    gains = [{name: to_json(value) if name not in ('stock_symbol', 'shares') else value
+              for name, value in symbol_gains.items()} for symbol_gains in get_gains(current_user.id)]
+    return jsonify({'gains': gains})
+
+
+@stocks_blueprint.route('/api/returns')
+@login_required
+def api_returns():
+    """Price and total returns (with the dividends reinvested) of each stock and of the portfolio (in dollars)"""
+    total_returns = get_total_returns(current_user.id)
+
+    def in_dollars(values: dict) -> dict:
+        return {name: to_json(value) if name in ('cost', 'value', 'total_value') else value
+                for name, value in values.items()}
+
+    return jsonify({'stocks': [in_dollars(lot) for lot in total_returns['lots']],
+                    'portfolio': in_dollars(total_returns['portfolio'])})
+
+
+@stocks_blueprint.route('/api/rebalance')
+@login_required
+def api_rebalance():
+    """Trades that rebalance the user's portfolio to target weights (see project/stocks/rebalance.py)"""
+    try:
+        targets, asset_classes, cash, whole_shares, allow_sells = parse_rebalance_arguments()
+        rebalance = rebalance_portfolio(get_holdings(current_user.id), targets, asset_classes,
+                                        current_user.base_currency, cash, whole_shares, allow_sells)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def in_dollars(trade: dict) -> dict:
+        return {**trade, 'shares': trade['shares'] / SHARE_UNITS, 'price': to_json(trade['price']),
+                'value': to_json(trade['value']),
+                **{name: round(trade[name] * 100.0, 2) for name in ('weight', 'target_weight', 'new_weight')}}
+
+    return jsonify({'trades': [in_dollars(trade) for trade in rebalance['trades']],
+                    'value': to_json(rebalance['value']),
+                    'cash': to_json(rebalance['cash']),
+                    'currency': current_user.base_currency,
+                    'excluded': rebalance['excluded'],
+                    'missing_currencies': rebalance['missing_currencies']})
+
+
+@stocks_blueprint.route('/api/symbols')
+@login_required
+def api_symbols():
+    """Listed symbols whose symbol or company name starts with ?q= (for the autocomplete of the symbols)"""
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    return jsonify({'symbols': get_symbol_index().search(request.args.get('q', ''), limit)})
+
+
+@stocks_blueprint.route('/stocks/alerts', methods=['GET', 'POST'])
+@login_required
+def price_alerts():
+    if request.method == 'POST':
+        try:
+            alert_data = PriceAlertModel(stock_symbol=request.form['stock_symbol'],
+                                         kind=request.form['kind'],
+                                         value=request.form['value'])
+        except ValidationError as e:
+            flash(f'Error! Invalid price alert ({e.errors()[0]["msg"]})', 'error')
+            return redirect(url_for('stocks.price_alerts'))
+
+        # Alerts are for the stocks in the user's portfolio ('change' alerts are relative to their current price)
+        query = (database.select(Stock.current_price)
+                 .where(Stock.user_id == current_user.id, Stock.stock_symbol == alert_data.stock_symbol)
+                 .order_by(Stock.current_price_date.desc()).limit(1))
+        current_price = database.session.execute(query).scalar()
+        if current_price is None:
+            flash(f'Error! {alert_data.stock_symbol} is not in your portfolio', 'error')
+            return redirect(url_for('stocks.price_alerts'))
+        if alert_data.kind == PriceAlert.CHANGE and not current_price:
+            flash(f'Error! The current price of {alert_data.stock_symbol} is not known yet', 'error')
+            return redirect(url_for('stocks.price_alerts'))
+
+        if alert_data.kind == PriceAlert.CHANGE:
+            new_alert = PriceAlert(alert_data.stock_symbol, alert_data.kind, current_user.id,
+                                   percent=alert_data.value, reference_price=current_price)
+        else:
+            new_alert = PriceAlert(alert_data.stock_symbol, alert_data.kind, current_user.id,
+                                   threshold=alert_data.value)
+            # The alert would be triggered by the next refresh, although the price did not cross its threshold
+            if current_price and new_alert.is_triggered_by(current_price):
+                flash(f'Error! The current price of {alert_data.stock_symbol} (${format_amount(current_price)}) '
+                      f'is already {alert_data.kind} ${format_amount(new_alert.threshold)}', 'error')
+                return redirect(url_for('stocks.price_alerts'))
+        database.session.add(new_alert)
+        database.session.commit()
+        get_alert_engine().add(new_alert)
+
+        flash(f'Added price alert ({new_alert.describe()})!', 'success')
+        current_app.logger.info(f'Added price alert ({new_alert.describe()})!')
+        return redirect(url_for('stocks.price_alerts'))
+
+    query = (database.select(PriceAlert).where(PriceAlert.user_id == current_user.id)
+             .order_by(PriceAlert.triggered_on.is_not(None), PriceAlert.id.desc()))
+    alerts = database.session.execute(query).scalars().all()
+    return render_template('stocks/alerts.html', alerts=alerts)
+
+
+@stocks_blueprint.route('/stocks/alerts/<id>/delete', methods=['POST'])
+@login_required
+def delete_price_alert(id):
+    query = database.select(PriceAlert).where(PriceAlert.id == id)
+    alert = database.session.execute(query).scalar_one_or_none()
+
+    if alert is None:
+        abort(404)
+
+    if alert.user_id != current_user.id:
+        abort(403)
+
+    database.session.delete(alert)
+    database.session.commit()
+    get_alert_engine().remove(alert.id)
+    flash(f'Deleted price alert ({alert.describe()})!', 'success')
+    return redirect(url_for('stocks.price_alerts'))
+
+
+@stocks_blueprint.route('/stocks/watchlist', methods=['GET', 'POST'])
+@login_required
+def watchlist():
+    if request.method == 'POST':
+        try:
+            item_data = WatchlistItemModel(stock_symbol=request.form['stock_symbol'])
+        except ValidationError as e:
+            flash(f'Error! Invalid stock symbol ({e.errors()[0]["msg"]})', 'error')
+            return redirect(url_for('stocks.watchlist'))
+
+        query = database.select(WatchlistItem.id).where(WatchlistItem.user_id == current_user.id,
+                                                        WatchlistItem.stock_symbol == item_data.stock_symbol)
+        if database.session.execute(query).first() is not None:
+            flash(f'{item_data.stock_symbol} is already in your watchlist', 'error')
+            return redirect(url_for('stocks.watchlist'))
+
+        database.session.add(WatchlistItem(item_data.stock_symbol, current_user.id))
+        database.session.commit()
+        flash(f'Added {item_data.stock_symbol} to your watchlist!', 'success')
+        current_app.logger.info(f'Added {item_data.stock_symbol} to a watchlist!')
+        return redirect(url_for('stocks.watchlist'))
+
+    watchlist = get_watchlist()
+    any_stale = any(quote is None or not quote.is_price_current() for _, quote in watchlist)
+    return render_template('stocks/watchlist.html', watchlist=watchlist, any_stale=any_stale)
+
+
+@stocks_blueprint.route('/stocks/watchlist/<id>/delete', methods=['POST'])
+@login_required
+def delete_watchlist_item(id):
+    query = database.select(WatchlistItem).where(WatchlistItem.id == id)
+    item = database.session.execute(query).scalar_one_or_none()
+
+    if item is None:
+        abort(404)
+
+    if item.user_id != current_user.id:
+        abort(403)
+
+    database.session.delete(item)
+    database.session.commit()
+    flash(f'Removed {item.stock_symbol} from your watchlist!', 'success')
+    return redirect(url_for('stocks.watchlist'))
+
+
+@stocks_blueprint.route('/api/watchlist')
+@login_required
+def api_watchlist():
+    """Latest prices of the user's watched symbols"""
+    return jsonify({'watchlist': [{'id': item.id,
+                                   'stock_symbol': item.stock_symbol,
+                                   'price': to_json(quote.price) if quote is not None else None,
+                                   'price_date': quote.price_date.isoformat() if quote is not None else None,
+                                   'stale': quote is None or not quote.is_price_current()}
+                                  for item, quote in get_watchlist()]})
+
+
 @stocks_blueprint.route("/chartjs_demo1")
 def chartjs_demo1():
     return render_template('stocks/chartjs_demo1.html')
@@ -159,6 +779,7 @@ def chartjs_demo3():
 
 @stocks_blueprint.route("/stocks/<id>")
 @login_required
+@use_read_replica
 def stock_details(id):
     query = database.select(Stock).where(Stock.id == id)
     stock = database.session.execute(query).scalar_one_or_none()
@@ -169,5 +790,39 @@ def stock_details(id):
     if stock.user_id != current_user.id:
         abort(403)
         
-    title, labels, values = stock.get_weekly_stock_data()
-    return render_template('stocks/stock_details.html', stock=stock, title=title, labels=labels, values=values)
\ No newline at end of file
+    # Downsample the chart to about one point per pixel of the chart (?width=)
+    width = request.args.get('width', current_app.config['CHART_DEFAULT_WIDTH'], type=int)
+    width = max(10, min(width, current_app.config['CHART_MAX_WIDTH']))
+    
+    # Chart a range (?range=1D ... MAX) at the cheapest resolution, or the weekly prices since the purchase
+    chart_range = request.args.get('range', '').upper()
+    label_format = '%m/%d/%Y'
+    if chart_range in CHART_RANGES:
+        title, labels, values, resolution = get_range_chart(stock.stock_symbol, chart_range, width)
+        if resolution == INTRADAY:
+            label_format = '%m/%d/%Y %H:%M'
+    else:
+        title, labels, values = get_weekly_chart(stock, width)
+    return render_template('stocks/stock_details.html', stock=stock, title=title, labels=labels, values=values,
+                           chart_ranges=CHART_RANGES, label_format=label_format)
+
+
+@stocks_blueprint.route('/stocks/compare')
+@login_required
+def compare():
+    try:
+        symbols, base_date, points = parse_compare_arguments()
+    except ValueError as e:
+        abort(400, str(e))
+    chart = compare_stocks(symbols, base_date, points)
+    return render_template('stocks/compare.html', chart=chart, symbols=symbols)
+
+
+@stocks_blueprint.route('/api/stocks/compare')
+@login_required
+def api_compare():
+    try:
+        symbols, base_date, points = parse_compare_arguments()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(compare_stocks(symbols, base_date, points))
@@ -0,0 +1,176 @@
+"""
+Generator of synthetic portfolios and price histories (used by `flask stocks seed`).
+
+The symbols of the stock lots follow a Zipf-like popularity distribution (a few
+symbols are held by most users), the purchase dates are spread over the last
+years, and the optional weekly price histories are geometric random walks. The
+rows are written with bulk (executemany) inserts in batches.
+
+Seeding again with the same email prefix or weeks of history skips the users and
+the weekly prices that already exist (only the new users get stock lots), so an
+interrupted or repeated seed does not fail on the unique constraints.
+"""
+from datetime import date, datetime, timedelta
+from project import database
+from project.models import PriceHistory, Stock, User
+from project.money import position_value, SHARE_UNITS, UNITS, to_units
+from sqlalchemy.dialects import postgresql, sqlite
+import itertools
+import math
+import random
+
+
+# Popular symbols, roughly in order of popularity (the first symbol is the most popular)
+SYMBOLS = ['AAPL', 'MSFT', 'AMZN', 'NVDA', 'GOOGL', 'TSLA', 'META', 'BRKB', 'JPM', 'V',
+           'JNJ', 'UNH', 'XOM', 'PG', 'MA', 'HD', 'DIS', 'KO', 'PEP', 'COST',
+           'WMT', 'BAC', 'NFLX', 'ADBE', 'CRM', 'AMD', 'INTC', 'CSCO', 'ORCL', 'PFE',
+           'MRK', 'ABT', 'NKE', 'MCD', 'SBUX', 'T', 'VZ', 'CVX', 'QCOM', 'TXN',
+           'IBM', 'GS', 'MS', 'CAT', 'BA', 'MMM', 'GE', 'F', 'GM', 'HON',
+           'LOW', 'TGT', 'UPS', 'FDX', 'LMT', 'RTX', 'DE', 'AMGN', 'GILD', 'BMY',
+           'CVS', 'LLY', 'ABBV', 'TMO', 'DHR', 'MDT', 'ISRG', 'SYK', 'BKNG', 'ABNB',
+           'UBER', 'LYFT', 'SNAP', 'PINS', 'SHOP', 'SQ', 'PYPL', 'COIN', 'PLTR', 'SNOW',
+           'ZM', 'DOCU', 'ROKU', 'SPOT', 'EA', 'TTWO', 'ATVI', 'SONY', 'NTDOY', 'BABA',
+           'JD', 'PDD', 'NIO', 'TSM', 'ASML', 'SAP', 'TM', 'HMC', 'SAM', 'TWTR']
+
+
+def zipf_cumulative_weights(count: int, exponent: float = 1.1) -> list:
+    """Cumulative weights where the item of rank r has a weight proportional to 1 / r^exponent."""
+    return list(itertools.accumulate(1.0 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def random_walk(random_generator: random.Random, start_price: float, weeks: int,
+                drift: float = 0.0015, volatility: float = 0.035) -> list:
+    """Weekly closing prices (in money units) of a geometric random walk, oldest first."""
+    prices = []
+    log_price = math.log(start_price)
+    for _ in range(weeks):
+        log_price += random_generator.gauss(drift, volatility)
+        prices.append(max(1, to_units(round(math.exp(log_price), 2))))
+    return prices
+
+
+def week_dates(weeks: int, end: date) -> list:
+    """The Friday of each of the last `weeks` weeks up to `end`, oldest first."""
+    last_friday = end - timedelta(days=(end.weekday() - 4) % 7)
+    return [last_friday - timedelta(weeks=week) for week in range(weeks - 1, -1, -1)]
+
+
+def insert_statement(model, conflict_columns: list = None):
+    """INSERT statement for the model that skips the rows that conflict on `conflict_columns` (if any)."""
+    if not conflict_columns:
+        return database.insert(model)
+    insert = postgresql.insert if database.engine.dialect.name == 'postgresql' else sqlite.insert
+    return insert(model).on_conflict_do_nothing(index_elements=conflict_columns)
+
+
+def insert_in_batches(model, rows: list, batch_size: int, conflict_columns: list = None):
+    statement = insert_statement(model, conflict_columns)
+    for start in range(0, len(rows), batch_size):
+        database.session.execute(statement, rows[start:start + batch_size])
+
+
+def seed_users(count: int, password: str, email_prefix: str, batch_size: int = 10000) -> list:
+    """Insert `count` confirmed users, skipping the email addresses that already exist, and return the new IDs."""
+    # Hash the password once, as hashing it for every user would dominate the seeding time
+    password_hashed = User._generate_password_hash(password)
+    now = datetime.now()
+    users = [{'email': f'{email_prefix}{index}@example.com',
+              'password_hashed': password_hashed,
+              'registered_on': now,
+              'email_confirmation_sent_on': now,
+              'email_confirmed': True,
+              'email_confirmed_on': now} for index in range(count)]
+    user_ids = []
+    for start in range(0, len(users), batch_size):
+        statement = insert_statement(User, ['email']).returning(User.id)
+        user_ids.extend(database.session.scalars(statement, users[start:start + batch_size]).all())
+    return user_ids
+
+
+def seed_price_history(random_generator: random.Random, symbols: list, weeks: int,
+                       batch_size: int = 10000) -> tuple:
+    """
+    Insert a weekly price history for each symbol and return the (histories, number of
+    weekly prices inserted), where the histories are {symbol: (list of dates, list of
+    closing prices in money units)}.
+
+    The weekly prices that are already stored are kept (and returned) instead of
+    the generated ones, and only the missing weeks are inserted.
+    """
+    dates = week_dates(weeks, date.today())
+    query = (database.select(PriceHistory.stock_symbol, PriceHistory.date, PriceHistory.close)
+             .where(PriceHistory.stock_symbol.in_(symbols), PriceHistory.date >= dates[0]))
+    stored = {(symbol, week): close for symbol, week, close in database.session.execute(query)}
+
+    histories = {}
+    rows = []
+    for symbol in symbols:
+        closes = random_walk(random_generator, random_generator.uniform(10.0, 400.0), weeks)
+        closes = [stored.get((symbol, week), close) for week, close in zip(dates, closes)]
+        histories[symbol] = (dates, closes)
+        rows.extend({'stock_symbol': symbol, 'date': week, 'close': close}
+                    for week, close in zip(dates, closes) if (symbol, week) not in stored)
+    insert_in_batches(PriceHistory, rows, batch_size, conflict_columns=['stock_symbol', 'date'])
+    return histories, len(rows)
+
+
+def generate_lots(random_generator: random.Random, user_ids: list, lots_per_user: int,
+                  histories: dict = None, max_age_days: int = 3650, vary_lot_count: bool = True) -> list:
+    """
+    Generate the stock lots for each user (between 1 and 2 * `lots_per_user` - 1
+    lots per user, so `lots_per_user` on average, unless `vary_lot_count` is False).
+
+    If price histories are provided, the purchase price is the closing price of
+    the week of the purchase and the current price is the latest closing price.
+    """
+    cumulative_weights = zipf_cumulative_weights(len(SYMBOLS))
+    now = datetime.now()
+    lots = []
+    for user_id in user_ids:
+        number_of_lots = lots_per_user
+        if vary_lot_count:
+            number_of_lots = random_generator.randint(1, max(1, 2 * lots_per_user - 1))
+        symbols = random_generator.choices(SYMBOLS, cum_weights=cumulative_weights, k=number_of_lots)
+        for symbol in symbols:
+            number_of_shares = random_generator.randint(1, 500) * SHARE_UNITS
+            age_days = random_generator.randint(1, max_age_days)
+            purchase_date = now - timedelta(days=age_days)
+            if histories:
+                dates, closes = histories[symbol]
+                purchase_week = max(0, len(dates) - 1 - age_days // 7)
+                purchase_price = closes[purchase_week]
+                current_price = closes[-1]
+                current_price_date = now
+            else:
+                purchase_price = random_generator.randint(500, 50000) * (UNITS // 100)
+                current_price = 0
+                current_price_date = None
+            lots.append({'stock_symbol': symbol,
+                         'number_of_shares': number_of_shares,
+                         'purchase_price': purchase_price,
+                         'user_id': user_id,
+                         'purchase_date': purchase_date,
+                         'current_price': current_price,
+                         'current_price_date': current_price_date,
+                         'position_value': position_value(current_price, number_of_shares)})
+    return lots
+
+
+def seed(num_users: int, lots_per_user: int, history_weeks: int = 0, password: str = 'FlaskIsAwesome123',
+         email_prefix: str = 'seed-user', random_seed: int = 42, batch_size: int = 10000) -> dict:
+    """
+    Generate and insert the users, stock lots, and (if `history_weeks` > 0) price histories.
+
+    Returns the number of rows inserted into each table (the existing users and weekly prices are skipped).
+    """
+    random_generator = random.Random(random_seed)
+    user_ids = seed_users(num_users, password, email_prefix, batch_size)
+    histories, price_history_count = None, 0
+    if history_weeks:
+        histories, price_history_count = seed_price_history(random_generator, SYMBOLS, history_weeks, batch_size)
+    lots = generate_lots(random_generator, user_ids, lots_per_user, histories,
+                         max_age_days=history_weeks * 7 if history_weeks else 3650)
+    insert_in_batches(Stock, lots, batch_size)
+    database.session.commit()
+    return {'users': len(user_ids), 'stocks': len(lots),
+            'price_history': price_history_count}
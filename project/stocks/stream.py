@@ -0,0 +1,171 @@
+"""
+Live stream of the prices of a user's stocks as Server-Sent Events (`/stocks/stream`).
+
+The prices are fanned out from the shared `QuoteRefresher`: every refresh of a
+set of symbols publishes the new prices to a `PriceBroadcaster`, which passes
+them to the subscriptions of all the connected clients that hold one of the
+symbols. So the quote of a symbol is retrieved once for all the clients,
+however many are connected.
+
+Each subscription buffers the prices that were published since the client was
+last sent an event, coalesced by symbol (only the latest price of a symbol is
+kept), so the buffer of a slow client is bounded by the number of its symbols.
+A client is only sent the stocks whose price changed, and a comment line is
+sent as a heartbeat when there is nothing to send (so proxies keep the
+connection open and disconnected clients are detected). The amounts of an
+event are sent both as numbers (like `/api/stocks/prices`) and as the strings
+that are displayed on the page ('_display', see `format_amount()`).
+
+A stream holds one thread of a gunicorn worker (gthread) for as long as it is
+open, but no database connection: the holdings are copied before the stream
+starts, and each refresh runs in its own application context (so its session
+is removed as soon as the refresh is done). The number of streams of a worker
+is limited to STREAM_MAX_PER_WORKER so that the other threads keep serving the
+pages; the clients above the limit are told to reconnect later.
+"""
+from flask import current_app
+from project.money import format_amount, position_value, to_json
+import json
+import threading
+import time
+
+
+class PriceSubscription(object):
+    """Prices (in money units) published for a set of symbols that were not sent to the client yet."""
+
+    def __init__(self, symbols):
+        self.symbols = frozenset(symbols)
+        self.pending = {}
+        self.condition = threading.Condition()
+
+    def put(self, closes: dict):
+        with self.condition:
+            self.pending.update(closes)
+            self.condition.notify()
+
+    def get(self, timeout: float) -> dict:
+        """Wait up to `timeout` seconds for prices and return them ({} if there are none)."""
+        with self.condition:
+            if not self.pending:
+                self.condition.wait(timeout)
+            pending, self.pending = self.pending, {}
+            return pending
+
+
+class PriceBroadcaster(object):
+    """Fans out the prices that are refreshed to the subscriptions of the symbols."""
+
+    def __init__(self):
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self, symbols) -> PriceSubscription:
+        subscription = PriceSubscription(symbols)
+        with self.lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: PriceSubscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, closes: dict):
+        """Pass the prices ({symbol: price in money units}) to the subscriptions that hold one of the symbols."""
+        if not closes:
+            return
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            subscribed_closes = {symbol: close for symbol, close in closes.items() if symbol in subscription.symbols}
+            if subscribed_closes:
+                subscription.put(subscribed_closes)
+
+
+class StreamLimiter(object):
+    """Limits the number of streams that are open at once in a worker process."""
+
+    def __init__(self, max_streams: int):
+        self.max_streams = max_streams
+        self.open_streams = 0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Count a new stream, unless the limit is reached. Returns True if the stream can be opened."""
+        with self.lock:
+            if self.open_streams >= self.max_streams:
+                return False
+            self.open_streams += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.open_streams -= 1
+
+
+def init_stream_limiter(app):
+    app.extensions['stream_limiter'] = StreamLimiter(app.config['STREAM_MAX_PER_WORKER'])
+
+
+def get_stream_limiter() -> StreamLimiter:
+    return current_app.extensions['stream_limiter']
+
+
+def format_event(event: str, data: dict) -> str:
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def stream_prices(stocks: dict, app, quote_refresher, heartbeat_seconds: float, refresh_seconds: float,
+                  max_seconds: float, factors: dict = None):
+    """
+    Generate the Server-Sent Events of the price changes of `stocks` ({stock id: (symbol, number of
+    shares, current price in money units)}) as a 'prices' event with the stocks whose price changed
+    and the total value, until the stream is `max_seconds` old (the browser then reconnects). The
+    total value is converted to the base currency with the conversion `factors` of the stocks
+    ({stock id: factor}, 1.0 by default).
+
+    The symbols are refreshed every `refresh_seconds` in an application context of `app` (the refresher
+    skips the symbols that are already being refreshed, or were refreshed recently, for any client).
+    """
+    # {stock id: (symbol, number of shares)} and the last prices (in money units) sent to the client
+    holdings = {stock_id: (symbol, number_of_shares) for stock_id, (symbol, number_of_shares, _) in stocks.items()}
+    prices = {stock_id: price for stock_id, (_, _, price) in stocks.items()}
+    factors = factors or {}
+    broadcaster = quote_refresher.broadcaster
+    subscription = broadcaster.subscribe(symbol for symbol, _ in holdings.values())
+
+    try:
+        start = time.monotonic()
+        next_refresh = start
+        while True:
+            now = time.monotonic()
+            if now >= next_refresh:
+                with app.app_context():
+                    quote_refresher.refresh(subscription.symbols)
+                next_refresh = now + refresh_seconds
+
+            closes = subscription.get(timeout=max(min(heartbeat_seconds, next_refresh - time.monotonic()), 0.0))
+            changed = []
+            for stock_id, (symbol, number_of_shares) in holdings.items():
+                if symbol in closes and closes[symbol] != prices[stock_id]:
+                    prices[stock_id] = closes[symbol]
+                    value = position_value(closes[symbol], number_of_shares)
+                    changed.append({'id': stock_id,
+                                    'current_price': to_json(closes[symbol]),
+                                    'current_price_display': format_amount(closes[symbol]),
+                                    'position_value': to_json(value),
+                                    'position_value_display': format_amount(value)})
+            if changed:
+                # The total is an integer sum, unless some of the stocks are converted to the base currency
+                values = {stock_id: position_value(prices[stock_id], number_of_shares)
+                          for stock_id, (_, number_of_shares) in holdings.items()}
+                value = (round(sum(value * factors.get(stock_id, 1.0) for stock_id, value in values.items()))
+                         if factors else sum(values.values()))
+                yield format_event('prices', {'stocks': changed, 'value': to_json(value),
+                                              'value_display': format_amount(value)})
+            else:
+                yield ': heartbeat\n\n'
+
+            if time.monotonic() - start >= max_seconds:
+                break
+    finally:
+        broadcaster.unsubscribe(subscription)
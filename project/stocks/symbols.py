@@ -0,0 +1,208 @@
+"""
+Search of the listed stock symbols (used by the autocomplete of `/api/symbols?q=`).
+
+The symbols and company names are loaded from a listing file (SYMBOL_LISTING_PATH),
+which is a CSV file (or a '|'-delimited file, like the NASDAQ listings) with a
+header row that includes the columns 'symbol' and 'name' (or 'security name').
+
+The listings are stored in a compact index of sorted keys, which is searched
+with a binary search (bisect) for the keys that start with the query:
+    * the symbol keys - the symbol of each listing
+    * the name keys - each word of the company name of each listing
+The symbol matches are returned before the name matches, so 'A' returns 'A'
+(Agilent) first and 'APP' returns Apple (name) after the symbols 'APP...'.
+
+The index is stored as one binary buffer of offset tables and UTF-8 strings,
+so it can be written to a file (`flask stocks build-symbol-index`) that every
+worker maps into memory with mmap: the pages of the index are then shared by
+all the worker processes, and loading the index does not parse anything. When
+there is no index file (SYMBOL_INDEX_PATH), the index is built in memory from
+the listing file.
+
+Layout of the index (the integers are unsigned 32-bit in the native byte order
+of the host that built the index, which is checked when the index is loaded):
+    header: magic (8 bytes), byte order (1 byte: 'l' or 'b'), 3 bytes of padding,
+            number of listings, number of symbol keys, number of name keys
+    listing offsets (listings + 1), then for each of the symbol and name keys:
+    key offsets (keys + 1) and the listing of each key (keys)
+    listing strings ('SYMBOL\\tName') and key strings (upper case)
+"""
+from array import array
+from bisect import bisect_left
+from flask import current_app
+import csv
+import mmap
+import os
+import re
+import struct
+import sys
+
+
+MAGIC = b'SYMIDX01'
+HEADER = struct.Struct('=8sc3xIII')
+WORD_PATTERN = re.compile(r'[A-Z0-9]+')
+
+
+def read_listing_file(path: str) -> list:
+    """Return the (symbol, name) of the listings in a listing file, sorted by symbol."""
+    with open(path, newline='', encoding='utf-8') as file:
+        header = file.readline()
+        delimiter = '|' if '|' in header else ','
+        columns = [column.strip().lower() for column in next(csv.reader([header], delimiter=delimiter))]
+        try:
+            symbol_column = columns.index('symbol')
+            name_column = columns.index('name') if 'name' in columns else columns.index('security name')
+        except ValueError:
+            raise ValueError(f'The listing file must have the columns symbol and name (found: {columns})')
+
+        listings = {}
+        for row in csv.reader(file, delimiter=delimiter):
+            # The NASDAQ listings end with a 'File Creation Time' row
+            if len(row) <= max(symbol_column, name_column) or not row[symbol_column].strip() \
+                    or row[0].startswith('File Creation Time'):
+                continue
+            listings[row[symbol_column].strip().upper()] = row[name_column].strip()
+    return sorted(listings.items())
+
+
+class StringTable(object):
+    """Sequence of the strings at the offsets of a buffer (supports len(), [], and bisect)."""
+
+    def __init__(self, offsets: memoryview, data: memoryview):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return str(self.data[self.offsets[index]:self.offsets[index + 1]], 'utf-8')
+
+
+def build_index(listings: list) -> bytes:
+    """Build the binary index of the (symbol, name) listings."""
+    listing_strings = [f'{symbol}\t{name}'.encode() for symbol, name in listings]
+    symbol_keys = sorted((symbol.upper(), listing) for listing, (symbol, _) in enumerate(listings))
+    name_keys = sorted({(word, listing) for listing, (_, name) in enumerate(listings)
+                        for word in WORD_PATTERN.findall(name.upper())})
+
+    byte_order = b'l' if sys.byteorder == 'little' else b'b'
+    sections = [HEADER.pack(MAGIC, byte_order, len(listings), len(symbol_keys), len(name_keys))]
+    strings = [b''.join(listing_strings)]
+    string_offset = 0
+
+    def add_strings(values: list) -> array:
+        nonlocal string_offset
+        offsets = array('I', [string_offset])
+        for value in values:
+            string_offset += len(value)
+            offsets.append(string_offset)
+        return offsets
+
+    sections.append(add_strings(listing_strings).tobytes())
+    for keys in (symbol_keys, name_keys):
+        key_strings = [key.encode() for key, _ in keys]
+        sections.append(add_strings(key_strings).tobytes())
+        sections.append(array('I', [listing for _, listing in keys]).tobytes())
+        strings.append(b''.join(key_strings))
+    return b''.join(sections) + b''.join(strings)
+
+
+class SymbolIndex(object):
+    """Prefix search over the symbols and company names of the listings in a binary index."""
+
+    def __init__(self, buffer=b''):
+        self.buffer = buffer
+        if not buffer:
+            self.listings = self.symbol_keys = self.name_keys = StringTable(memoryview(array('I', [0])), b'')
+            self.symbol_listings = self.name_listings = ()
+            return
+
+        if len(buffer) < HEADER.size or buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError('The symbol index is not valid (rebuild it with `flask stocks build-symbol-index`)')
+        _, byte_order, listing_count, symbol_count, name_count = HEADER.unpack_from(buffer)
+        if byte_order != (b'l' if sys.byteorder == 'little' else b'b'):
+            raise ValueError('The symbol index was built on a host with a different byte order')
+
+        view = memoryview(buffer)
+        position = HEADER.size
+
+        def integers(count: int) -> memoryview:
+            nonlocal position
+            section = view[position:position + 4 * count].cast('I')
+            position += 4 * count
+            return section
+
+        listing_offsets = integers(listing_count + 1)
+        symbol_offsets, self.symbol_listings = integers(symbol_count + 1), integers(symbol_count)
+        name_offsets, self.name_listings = integers(name_count + 1), integers(name_count)
+        strings = view[position:]
+        self.listings = StringTable(listing_offsets, strings)
+        self.symbol_keys = StringTable(symbol_offsets, strings)
+        self.name_keys = StringTable(name_offsets, strings)
+
+    @classmethod
+    def from_listings(cls, listings: list):
+        return cls(build_index(listings))
+
+    @classmethod
+    def from_file(cls, path: str):
+        """Map an index file into memory (read-only, so the pages are shared by all the processes)."""
+        with open(path, 'rb') as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return len(self.listings)
+
+    def __contains__(self, symbol: str) -> bool:
+        position = bisect_left(self.symbol_keys, symbol)
+        return position < len(self.symbol_keys) and self.symbol_keys[position] == symbol
+
+    def listing(self, listing: int) -> dict:
+        symbol, name = self.listings[listing].split('\t', 1)
+        return {'symbol': symbol, 'name': name}
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """Return the listings whose symbol, or a word of whose name, starts with the query."""
+        prefix = query.strip().upper()
+        if not prefix or not len(self):
+            return []
+
+        found = []
+        for keys, key_listings in ((self.symbol_keys, self.symbol_listings), (self.name_keys, self.name_listings)):
+            position = bisect_left(keys, prefix)
+            while position < len(keys) and len(found) < limit and keys[position].startswith(prefix):
+                if key_listings[position] not in found:
+                    found.append(key_listings[position])
+                position += 1
+        return [self.listing(listing) for listing in found]
+
+
+def load_symbol_index(app) -> SymbolIndex:
+    """Load the index file, or build the index from the listing file (an empty index if there is neither)."""
+    index_path = app.config['SYMBOL_INDEX_PATH']
+    listing_path = app.config['SYMBOL_LISTING_PATH']
+    if index_path and os.path.exists(index_path):
+        return SymbolIndex.from_file(index_path)
+    if listing_path and os.path.exists(listing_path):
+        return SymbolIndex.from_listings(read_listing_file(listing_path))
+    return SymbolIndex()
+
+
+def write_symbol_index(listing_path: str, index_path: str) -> int:
+    """Build the index of a listing file and write it to `index_path`. Returns the number of listings."""
+    listings = read_listing_file(listing_path)
+    temporary_path = f'{index_path}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(build_index(listings))
+    # Replace the index atomically, as other processes may have the previous index mapped
+    os.replace(temporary_path, index_path)
+    return len(listings)
+
+
+def get_symbol_index() -> SymbolIndex:
+    """Return the symbol index of the application, which is loaded on first use."""
+    symbol_index = current_app.extensions.get('symbol_index')
+    if symbol_index is None:
+        symbol_index = current_app.extensions['symbol_index'] = load_symbol_index(current_app)
+    return symbol_index
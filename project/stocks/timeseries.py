@@ -0,0 +1,303 @@
+"""
+Tiered store of the prices of stocks at three resolutions.
+
+    * intraday - 5-minute bars (PriceBar table), kept for PRICE_BARS_INTRADAY_RETENTION_DAYS
+    * daily - daily bars (PriceBar table), kept for PRICE_BARS_DAILY_RETENTION_DAYS
+    * weekly - weekly bars (PriceHistory table), kept forever
+
+Each chart range is served from the coarsest resolution that still has at
+least CHART_MIN_POINTS points in the range (a 1D chart needs intraday bars, a
+3M chart needs daily bars, and a 1Y chart only needs weekly bars), so the
+series that is downloaded and stored is as small as possible.
+
+A resolution is downloaded from the market data provider only when its
+latest bar is older than the duration of a bar (and it was not downloaded
+recently by this process). Only the bars from the period of the latest stored
+bar onwards are stored, replacing the stored bars of the same periods (the
+latest period may not have been over when it was stored), and they are rolled
+up into the coarser resolutions: the days (and weeks) that contain new bars are
+recomputed from the finer bars, so the coarser tiers stay current without
+downloading them again.
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from itertools import groupby
+from project import database
+from project.market_data import DAILY, INTRADAY, WEEKLY, get_provider
+from project.models import CorporateAction, PriceBar, PriceHistory
+from sqlalchemy.dialects import postgresql, sqlite
+import threading
+import time
+
+
+# Resolutions from the coarsest to the finest
+RESOLUTIONS = [WEEKLY, DAILY, INTRADAY]
+
+# Approximate number of bars per calendar day (6.5 trading hours of 5-minute bars, 5 trading days per week)
+BARS_PER_DAY = {INTRADAY: 78.0, DAILY: 5 / 7, WEEKLY: 1 / 7}
+
+# A resolution is refreshed when its latest bar is older than the duration of one bar
+BAR_DURATION = {INTRADAY: timedelta(minutes=5), DAILY: timedelta(days=1), WEEKLY: timedelta(weeks=1)}
+
+# Ranges of the charts (None is the full history)
+CHART_RANGES = {'1D': timedelta(days=1), '1W': timedelta(weeks=1), '1M': timedelta(days=31),
+                '3M': timedelta(days=92), '1Y': timedelta(days=366), '5Y': timedelta(days=5 * 366), 'MAX': None}
+
+# Time when each (symbol, resolution) was last downloaded by this process
+_last_downloads = {}
+_last_downloads_lock = threading.Lock()
+
+
+def retention(resolution: str):
+    """Period of time that the bars of a resolution are kept (None for forever)."""
+    if resolution == INTRADAY:
+        return timedelta(days=current_app.config['PRICE_BARS_INTRADAY_RETENTION_DAYS'])
+    if resolution == DAILY:
+        return timedelta(days=current_app.config['PRICE_BARS_DAILY_RETENTION_DAYS'])
+    return None
+
+
+def pick_resolution(span, min_points: int) -> str:
+    """Return the coarsest resolution with at least `min_points` bars in `span` (None for the full history)."""
+    if span is None:
+        return WEEKLY
+    for resolution in RESOLUTIONS:
+        kept = retention(resolution)
+        if span.total_seconds() / 86400 * BARS_PER_DAY[resolution] >= min_points and (kept is None or span <= kept):
+            return resolution
+    return INTRADAY
+
+
+###############
+### Reading ###
+###############
+
+
+def read_bars(symbol: str, resolution: str, start: datetime = None) -> list:
+    """Read the stored bars of a symbol as a list of (datetime, close in money units), oldest first."""
+    if resolution == WEEKLY:
+        query = database.select(PriceHistory.date, PriceHistory.close).where(PriceHistory.stock_symbol == symbol)
+        if start is not None:
+            query = query.where(PriceHistory.date >= start.date())
+        rows = database.session.execute(query.order_by(PriceHistory.date)).all()
+        return [(datetime.combine(week, datetime.min.time()), close) for week, close in rows]
+
+    query = (database.select(PriceBar.timestamp, PriceBar.close)
+             .where(PriceBar.stock_symbol == symbol, PriceBar.resolution == resolution))
+    if start is not None:
+        query = query.where(PriceBar.timestamp >= start)
+    return [tuple(row) for row in database.session.execute(query.order_by(PriceBar.timestamp)).all()]
+
+
+def latest_bar_time(symbol: str, resolution: str):
+    if resolution == WEEKLY:
+        query = database.select(database.func.max(PriceHistory.date)).where(PriceHistory.stock_symbol == symbol)
+        latest = database.session.execute(query).scalar()
+        return datetime.combine(latest, datetime.min.time()) if latest else None
+    query = (database.select(database.func.max(PriceBar.timestamp))
+             .where(PriceBar.stock_symbol == symbol, PriceBar.resolution == resolution))
+    return database.session.execute(query).scalar()
+
+
+def get_price_series(symbol: str, chart_range: str) -> tuple:
+    """
+    Return the (resolution, bars) for a chart of `symbol` over `chart_range` (a key of CHART_RANGES),
+    where the bars are a list of (datetime, close in money units) ending at the latest bar.
+    """
+    span = CHART_RANGES[chart_range]
+    resolution = pick_resolution(span, current_app.config['CHART_MIN_POINTS'])
+    refresh_if_stale(symbol, resolution)
+
+    latest = latest_bar_time(symbol, resolution)
+    if latest is None:
+        return resolution, []
+    # The range ends at the latest bar, so a 1D chart shows the last trading day during a weekend
+    return resolution, read_bars(symbol, resolution, latest - span if span is not None else None)
+
+
+###############
+### Writing ###
+###############
+
+
+def refresh_if_stale(symbol: str, resolution: str):
+    """Download the bars of a resolution if its latest bar is older than the duration of a bar."""
+    now = datetime.now()
+    latest = latest_bar_time(symbol, resolution)
+    if latest is not None and now - latest < BAR_DURATION[resolution]:
+        return
+
+    if not claim_download(symbol, resolution):
+        return
+
+    bars, dividends = download_bars(symbol, resolution)
+    if bars is not None:
+        store_bars(symbol, resolution, bars, dividends)
+        database.session.commit()
+
+
+def claim_download(symbol: str, resolution: str) -> bool:
+    """
+    Record that the bars of a resolution are being downloaded, unless this process already downloaded them
+    less than the duration of a bar ago (markets are closed at night and during weekends). Returns True if
+    the bars should be downloaded.
+    """
+    with _last_downloads_lock:
+        last_download = _last_downloads.get((symbol, resolution))
+        if last_download is not None and time.monotonic() - last_download < BAR_DURATION[resolution].total_seconds():
+            return False
+        _last_downloads[(symbol, resolution)] = time.monotonic()
+        return True
+
+
+def download_bars(symbol: str, resolution: str) -> tuple:
+    """Download the (bars, dividends) of a resolution (the dividends are only downloaded with the weekly bars)."""
+    if resolution == WEEKLY:
+        history = get_provider().get_weekly_history(symbol)
+        return history if history is not None else (None, {})
+    return get_provider().get_history(symbol, resolution), {}
+
+
+def store_bars(symbol: str, resolution: str, bars: list, dividends: dict = None) -> int:
+    """
+    Store the bars from the period of the latest stored bar (and within the retention of the
+    resolution), roll them up into the coarser resolutions, and delete the expired bars.
+    The dividends ({datetime of a weekly bar: dividend in money units}) are stored with the weekly bars,
+    including the weeks that were already stored (see `update_dividends()`).
+
+    The latest stored bar can be for a period that was not over yet (the current day or week,
+    or a day or week rolled up from the finer bars), so the bars of its period and of the
+    later periods replace the stored bars of the same periods (see `replace_bars()`).
+
+    Returns the number of bars stored.
+    """
+    latest = latest_bar_time(symbol, resolution)
+    since = period_key(latest, resolution) if latest is not None else None
+    kept = retention(resolution)
+    oldest_kept = datetime.now() - kept if kept is not None else None
+    new_bars = [(timestamp, close) for timestamp, close in bars
+                if (since is None or timestamp >= since) and (oldest_kept is None or timestamp >= oldest_kept)]
+
+    # The stored bars are adjusted for the splits that were applied (see project/stocks/corporate_actions.py)
+    if dividends:
+        dividends = dict(CorporateAction.split_adjust(symbol, sorted(dividends.items())))
+        if since is not None:
+            update_dividends(symbol, {timestamp: dividend for timestamp, dividend in dividends.items()
+                                      if timestamp < since})
+    if not new_bars:
+        return 0
+
+    new_bars = CorporateAction.split_adjust(symbol, new_bars)
+    replace_bars(symbol, resolution, new_bars, dividends)
+    if resolution == INTRADAY:
+        roll_up(symbol, INTRADAY, DAILY, new_bars[0][0])
+    if resolution in (INTRADAY, DAILY):
+        roll_up(symbol, DAILY, WEEKLY, new_bars[0][0])
+    prune_bars(symbol)
+    return len(new_bars)
+
+
+def insert_bars(symbol: str, resolution: str, bars: list, dividends: dict = None):
+    """Insert the bars, skipping the bars that were inserted concurrently (by another worker or thread)."""
+    insert = postgresql.insert if database.engine.dialect.name == 'postgresql' else sqlite.insert
+    if resolution == WEEKLY:
+        dividends = dividends or {}
+        rows = [{'stock_symbol': symbol, 'date': timestamp.date(), 'close': close,
+                 'dividend': dividends.get(timestamp, 0)} for timestamp, close in bars]
+        statement = insert(PriceHistory).on_conflict_do_nothing(index_elements=['stock_symbol', 'date'])
+    else:
+        rows = [{'stock_symbol': symbol, 'resolution': resolution, 'timestamp': timestamp, 'close': close}
+                for timestamp, close in bars]
+        statement = insert(PriceBar).on_conflict_do_nothing(index_elements=['stock_symbol', 'resolution',
+                                                                            'timestamp'])
+    database.session.execute(statement, rows)
+
+
+def replace_bars(symbol: str, resolution: str, bars: list, dividends: dict = None):
+    """
+    Store the bars (sorted by time), replacing the stored bars of the same periods (see `period_key()`).
+    A weekly bar keeps the dividend of the bar that it replaces, unless `dividends` has a dividend for it.
+    """
+    first_period = period_key(bars[0][0], resolution)
+    if resolution == WEEKLY:
+        query = database.select(PriceHistory.id, PriceHistory.date, PriceHistory.dividend).where(
+            PriceHistory.stock_symbol == symbol, PriceHistory.date >= first_period.date())
+        model = PriceHistory
+    else:
+        query = database.select(PriceBar.id, PriceBar.timestamp, 0).where(PriceBar.stock_symbol == symbol,
+                                                                          PriceBar.resolution == resolution,
+                                                                          PriceBar.timestamp >= first_period)
+        model = PriceBar
+    new_bars = {period_key(timestamp, resolution): timestamp for timestamp, _ in bars}
+    replaced_ids = []
+    kept_dividends = {}
+    for bar_id, timestamp, dividend in database.session.execute(query):
+        period = period_key(timestamp, resolution)
+        if period in new_bars:
+            replaced_ids.append(bar_id)
+            if dividend:
+                kept_dividends[new_bars[period]] = dividend
+    if replaced_ids:
+        database.session.execute(database.delete(model).where(model.id.in_(replaced_ids)))
+    insert_bars(symbol, resolution, bars, {**kept_dividends, **(dividends or {})})
+
+
+def update_dividends(symbol: str, dividends: dict):
+    """
+    Store the dividends ({datetime of a weekly bar: dividend in money units}) of the weeks that are
+    already stored (the dividend of a week can be paid after its bar was stored), if they changed.
+    """
+    if not dividends:
+        return
+    week_dividends = {period_start(timestamp, WEEKLY): dividend for timestamp, dividend in dividends.items()}
+    query = database.select(PriceHistory.id, PriceHistory.date, PriceHistory.dividend).where(
+        PriceHistory.stock_symbol == symbol, PriceHistory.date >= min(week_dividends).date())
+    rows = []
+    for bar_id, day, stored_dividend in database.session.execute(query):
+        dividend = week_dividends.get(period_start(day, WEEKLY))
+        if dividend is not None and dividend != stored_dividend:
+            rows.append({'id': bar_id, 'dividend': dividend})
+    if rows:
+        database.session.execute(database.update(PriceHistory), rows)
+
+
+def period_start(timestamp, resolution: str) -> datetime:
+    """Start of the daily or weekly (Monday) bar that contains `timestamp` (a date or a datetime)."""
+    day = datetime(timestamp.year, timestamp.month, timestamp.day)
+    return day - timedelta(days=day.weekday()) if resolution == WEEKLY else day
+
+
+def period_key(timestamp: datetime, resolution: str) -> datetime:
+    """Period of a bar: an intraday bar is its own period, and a daily or weekly bar is its day or week."""
+    return timestamp if resolution == INTRADAY else period_start(timestamp, resolution)
+
+
+def roll_up(symbol: str, fine: str, coarse: str, since: datetime):
+    """
+    Recompute the `coarse` bars from the `fine` bars for every period from the one that contains `since`.
+
+    The closing price of a period is the closing price of its last fine bar. A daily bar is
+    stored at midnight, and a weekly bar is stored at the date of the last day of the week.
+    Only the periods that have fine bars are replaced, so the coarse bars of the periods
+    without fine bars (for example, weeks that were downloaded as weekly bars) are kept,
+    and the dividends of the weeks that are replaced are kept (see `replace_bars()`).
+    """
+    first_period = period_start(since, coarse)
+    coarse_bars = {}
+    for period, period_bars in groupby(read_bars(symbol, fine, first_period),
+                                       key=lambda bar: period_start(bar[0], coarse)):
+        timestamp, close = list(period_bars)[-1]
+        coarse_bars[period] = (period_start(timestamp, DAILY), close)
+    if not coarse_bars:
+        return
+
+    replace_bars(symbol, coarse, list(coarse_bars.values()))
+
+
+def prune_bars(symbol: str):
+    """Delete the intraday and daily bars of a symbol that are older than their retention."""
+    now = datetime.now()
+    for resolution in (INTRADAY, DAILY):
+        database.session.execute(database.delete(PriceBar).where(PriceBar.stock_symbol == symbol,
+                                                                 PriceBar.resolution == resolution,
+                                                                 PriceBar.timestamp < now - retention(resolution)))
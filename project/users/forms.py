@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, BooleanField
-from wtforms.validators import DataRequired, Length, Email
+from wtforms.validators import DataRequired, Length, Email, Regexp
 
 
 class RegistrationForm(FlaskForm):
@@ -29,4 +29,9 @@ class PasswordForm(FlaskForm):
 class ChangePasswordForm(FlaskForm):
     current_password = PasswordField('Current Password: ', validators=[DataRequired()])
     new_password = PasswordField('New Password: ', validators=[DataRequired()])
-    submit = SubmitField('Login')
\ No newline at end of file
+    submit = SubmitField('Login')
+
+
+class BaseCurrencyForm(FlaskForm):
+    base_currency = StringField('Base Currency: ', validators=[DataRequired(), Regexp(r'^[A-Za-z]{3}$', message='Currency must be a 3-letter code (such as USD)')])
+    submit = SubmitField('Submit')
@@ -2,9 +2,10 @@ from . import users_blueprint
 from flask import render_template, flash, abort, request, current_app, redirect, url_for, copy_current_request_context
 from flask_login import login_user, current_user, login_required, logout_user
 from flask_mail import Message
-from .forms import RegistrationForm, LoginForm, EmailForm, PasswordForm, ChangePasswordForm
+from .forms import RegistrationForm, LoginForm, EmailForm, PasswordForm, ChangePasswordForm, BaseCurrencyForm
 from project.models import User
 from project import database, mail
+from project.metrics import EMAIL_QUEUE_DEPTH
 from sqlalchemy.exc import IntegrityError
 from markupsafe import escape
 from urllib.parse import urlparse
@@ -47,15 +48,9 @@ def register():
                 flash(f'Thanks for registering, {new_user.email}! Please check your email to confirm your email address.', 'success')
                 current_app.logger.info(f'Registered new user: {form.email.data}!')
                 
-                @copy_current_request_context
-                def send_email(message):
-                    with current_app.app_context():
-                        mail.send(message)
-                
                 # Send an email confirming the new user's registration
                 msg = generate_confirmation_email(form.email.data)
-                email_thread = Thread(target=send_email, args=[msg])
-                email_thread.start()
+                send_email_in_background(msg)
                 
                 return redirect(url_for('users.login'))
             except IntegrityError:
@@ -122,6 +117,21 @@ def user_profile():
     return render_template('users/profile.html')
 
 
+def send_email_in_background(message):
+    """ Send an email from a background thread, tracking the number of emails waiting to be sent """
+    @copy_current_request_context
+    def send_email(email_message):
+        try:
+            with current_app.app_context():
+                mail.send(email_message)
+        finally:
+            EMAIL_QUEUE_DEPTH.dec()
+    
+    EMAIL_QUEUE_DEPTH.inc()
+    email_thread = Thread(target=send_email, args=[message])
+    email_thread.start()
+
+
 def generate_confirmation_email(user_email):
     """ Generate a confirmation email with a unique token """
     confirm_serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
@@ -186,15 +196,9 @@ def password_reset_via_email():
             return render_template('users/password_reset_via_email.html', form=form)
         
         if user.email_confirmed:
-            @copy_current_request_context
-            def send_email(email_message):
-                with current_app.app_context():
-                    mail.send(email_message)
-                    
             # Send an email confirming the password reset request
             message = generate_password_reset_email(form.email.data)
-            email_thread = Thread(target=send_email, args=[message])
-            email_thread.start()
+            send_email_in_background(message)
             
             flash('Please check your email for a password reset link.', 'success')
         else:
@@ -251,18 +255,28 @@ def change_password():
     return render_template('users/change_password.html', form=form)
 
 
+@users_blueprint.route('/base_currency', methods=['GET','POST'])
+@login_required
+def change_base_currency():
+    form = BaseCurrencyForm(base_currency=current_user.base_currency)
+
+    if form.validate_on_submit():
+        # The exchange rate of a new currency is retrieved by the next `flask stocks refresh-fx`
+        current_user.base_currency = form.base_currency.data.upper()
+        database.session.add(current_user)
+        database.session.commit()
+        flash(f'Base currency has been changed to {current_user.base_currency}!', 'success')
+        current_app.logger.info(f'Base currency changed for user: {current_user.email}')
+        return redirect(url_for('users.user_profile'))
+    return render_template('users/change_base_currency.html', form=form)
+
+
 @users_blueprint.route('/resend_email_confirmation')
 @login_required
 def resend_email_confirmation():
-    @copy_current_request_context
-    def send_email(email_message):
-        with current_app.app_context():
-            mail.send(email_message)
-    
     # Send an email to confirm the user's email address
     message = generate_confirmation_email(current_user.email)
-    email_thread = Thread(target=send_email, args=[message])
-    email_thread.start()
+    send_email_in_background(message)
     
     flash('Email sent to confirm your email address. Please check your email!', 'success')
     current_app.logger.info(f'Email re-sent to confirm address for user: {current_user.email}')
@@ -2,9 +2,12 @@ import os
 import pytest
 import requests
 from project import create_app, database
+from tests.query_counter import QueryRecorder
 from project.models import Stock, User
+from project.stocks import timeseries
 from flask import current_app
 from datetime import datetime
+from collections import defaultdict
 
 
 ######################
@@ -70,10 +73,67 @@ class MockSuccessResponseWeekly(object):
 
     
     
+#####################################
+### SQL STATEMENT REPORT (OPTIONS) ###
+#####################################
+
+def pytest_addoption(parser):
+    parser.addoption('--query-report', action='store_true', default=False,
+                     help='Report the slowest and most repeated SQL statements of the test run')
+
+
+def pytest_configure(config):
+    if config.getoption('--query-report'):
+        config.query_recorder = QueryRecorder().__enter__()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    recorder = getattr(config, 'query_recorder', None)
+    if recorder is None:
+        return
+    recorder.__exit__(None, None, None)
+
+    totals = defaultdict(lambda: [0, 0.0, 0.0])   # statement -> [count, total time, max time]
+    for recorded in recorder.statements:
+        total = totals[' '.join(recorded.statement.split())]
+        total[0] += 1
+        total[1] += recorded.duration
+        total[2] = max(total[2], recorded.duration)
+
+    terminalreporter.section('SQL statement report')
+    terminalreporter.write_line(f'{recorder.count} statements, {len(totals)} distinct')
+    terminalreporter.write_line('\nSlowest statements (max ms / count / statement):')
+    for statement, (count, total_time, max_time) in sorted(totals.items(), key=lambda item: -item[1][2])[:10]:
+        terminalreporter.write_line(f'  {max_time * 1000:8.2f} {count:6d}  {statement[:160]}')
+    terminalreporter.write_line('\nMost repeated statements (count / total ms / statement):')
+    for statement, (count, total_time, max_time) in sorted(totals.items(), key=lambda item: -item[1][0])[:10]:
+        terminalreporter.write_line(f'  {count:6d} {total_time * 1000:8.2f}  {statement[:160]}')
+
+    max_per_endpoint = defaultdict(int)
+    for endpoint, count in recorder.statements_per_request():
+        max_per_endpoint[endpoint] = max(max_per_endpoint[endpoint], count)
+    terminalreporter.write_line('\nMaximum statements per request by endpoint:')
+    for endpoint, count in sorted(max_per_endpoint.items(), key=lambda item: -item[1]):
+        terminalreporter.write_line(f'  {count:6d}  {endpoint}')
+
+
+@pytest.fixture(scope='function', autouse=True)
+def reset_downloads(monkeypatch):
+    """Forget the downloads of the previous tests, which would otherwise skip the downloads of this test."""
+    monkeypatch.setattr(timeseries, '_last_downloads', {})
+
+
+@pytest.fixture(scope='function')
+def query_counter():
+    """Records the SQL statements executed during the test (see tests/query_counter.py)."""
+    with QueryRecorder() as recorder:
+        yield recorder
+
+
 @pytest.fixture(scope='function')
 def mock_requests_get_success_quote(monkeypatch):
     # Create a mock for the requests.get() call to prevent making the actual API call
-    def mock_get(url):    
+    def mock_get(url, timeout=None):    
         return MockSuccessResponseQuote(url)
     
     url = 'https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=MSFT&apikey=demo'
@@ -82,7 +142,7 @@ def mock_requests_get_success_quote(monkeypatch):
 
 @pytest.fixture(scope='function')
 def mock_requests_get_api_rate_limited_exceeded(monkeypatch):
-    def mock_get(url):
+    def mock_get(url, timeout=None):
         return MockApiRateLimitExceededResponse(url)
     
     url = 'https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=MSFT&apikey=demo'
@@ -91,7 +151,7 @@ def mock_requests_get_api_rate_limited_exceeded(monkeypatch):
 
 @pytest.fixture(scope='function')
 def mock_requests_get_failure(monkeypatch):
-    def mock_get(url):
+    def mock_get(url, timeout=None):
         return MockFailedResponse(url)
     
     url = 'https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=MSFT&apikey=demo'
@@ -101,7 +161,7 @@ def mock_requests_get_failure(monkeypatch):
 @pytest.fixture(scope='function')
 def mock_requests_get_success_weekly(monkeypatch):
     # Create a mock for the requests.get() call to prevent making the acutal API call
-    def mock_get(url):
+    def mock_get(url, timeout=None):
         return MockSuccessResponseWeekly(url)
     
     url = 'https://www.alphavantage.co/query?function=TIME_SERIES_WEEKLY_ADJUSTED&symbol=MSFT&apikey=demo'
@@ -0,0 +1,133 @@
+"""
+This file (test_alerts.py) contains the functional tests for the price alerts.
+"""
+from datetime import datetime, timedelta
+from project import database, mail
+from project.models import PriceAlert, Stock
+
+
+def make_prices_stale():
+    yesterday = datetime.now() - timedelta(days=1)
+    database.session.execute(database.update(Stock).values(current_price=1400000, current_price_date=yesterday))
+    database.session.commit()
+
+
+def test_get_price_alerts_page(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/stocks/alerts' page is requested (GET)
+    THEN check the response is valid
+    """
+    response = test_client.get('/stocks/alerts')
+    assert response.status_code == 200
+    assert b'Price Alerts' in response.data
+    assert b'Add a Price Alert' in response.data
+
+
+def test_post_price_alert_not_in_portfolio(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN a price alert is added (POST) for a stock that is not in the user's portfolio
+    THEN check that an error message is displayed and the alert is not added
+    """
+    response = test_client.post('/stocks/alerts', data={'stock_symbol': 'IBM', 'kind': 'above', 'value': '200'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Error! IBM is not in your portfolio' in response.data
+    assert database.session.execute(database.select(database.func.count(PriceAlert.id))).scalar() == 0
+
+
+def test_post_price_alert_invalid(test_client, add_stocks_for_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN a price alert with an invalid kind is added (POST)
+    THEN check that an error message is displayed
+    """
+    response = test_client.post('/stocks/alerts', data={'stock_symbol': 'SAM', 'kind': 'sideways', 'value': '2'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Error! Invalid price alert' in response.data
+
+
+def test_post_price_alert_already_reached(test_client, add_stocks_for_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database with a current price of $140.00
+    WHEN price alerts above $100.00 and below $150.00 are added (POST)
+    THEN check that an error message is displayed and the alerts are not added
+    """
+    make_prices_stale()
+    for kind, value in (('above', '100.00'), ('below', '150.00'), ('above', '140.00')):
+        response = test_client.post('/stocks/alerts', data={'stock_symbol': 'SAM', 'kind': kind, 'value': value},
+                                    follow_redirects=True)
+        assert response.status_code == 200
+        assert f'Error! The current price of SAM ($140.00) is already {kind} ${value}'.encode() in response.data
+    assert database.session.execute(database.select(database.func.count(PriceAlert.id))).scalar() == 0
+
+
+def test_price_alerts_triggered_by_refresh(test_client, add_stocks_for_default_user, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and price alerts for stocks with stale prices ($140.00)
+    WHEN the prices are refreshed ($148.34) by requesting the '/stocks/' page
+    THEN check that only the crossed alerts are triggered and the user is sent one email
+    """
+    make_prices_stale()
+    for kind, value in (('above', '145.00'), ('above', '150.00'), ('below', '130.00'), ('change', '5')):
+        response = test_client.post('/stocks/alerts', data={'stock_symbol': 'SAM', 'kind': kind, 'value': value},
+                                    follow_redirects=True)
+        assert b'Added price alert' in response.data
+
+    with mail.record_messages() as outbox:
+        response = test_client.get('/stocks/')
+        assert response.status_code == 200
+
+    assert len(outbox) == 1
+    assert outbox[0].subject == 'Flask Stock Portfolio App - Price Alerts'
+    assert outbox[0].recipients[0] == 'patrick@gmail.com'
+    assert 'SAM above $145.00 (price: $148.34)' in outbox[0].html
+    assert 'SAM moves 5% from $140.00 (price: $148.34)' in outbox[0].html
+    assert '$150.0' not in outbox[0].html
+
+    alerts = database.session.execute(database.select(PriceAlert).order_by(PriceAlert.id)).scalars().all()
+    assert [alert.triggered_price for alert in alerts] == [1483400, None, None, 1483400]
+
+    # The alerts are only triggered once
+    make_prices_stale()
+    with mail.record_messages() as outbox:
+        test_client.get('/stocks/')
+    assert len(outbox) == 0
+
+
+def test_delete_price_alert(test_client, add_stocks_for_default_user, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and a price alert for a stock with a stale price
+    WHEN the alert is deleted (POST) and the prices are refreshed
+    THEN check that the alert is deleted and not triggered
+    """
+    make_prices_stale()
+    test_client.post('/stocks/alerts', data={'stock_symbol': 'COST', 'kind': 'above', 'value': '145.00'})
+    alert = database.session.execute(database.select(PriceAlert).where(PriceAlert.stock_symbol == 'COST')).scalar_one()
+
+    response = test_client.post(f'/stocks/alerts/{alert.id}/delete', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Deleted price alert (COST above $145.00)!' in response.data
+
+    with mail.record_messages() as outbox:
+        test_client.get('/stocks/')
+    assert len(outbox) == 0
+
+
+def test_delete_price_alert_invalid_user(test_client, log_in_second_user):
+    """
+    GIVEN a Flask application configured for testing and a price alert of the default user
+    WHEN the alert is deleted (POST) by the second user
+    THEN check that a 403 error is returned
+    """
+    alert = PriceAlert('TWTR', PriceAlert.BELOW, 1, threshold='10.00')
+    database.session.add(alert)
+    database.session.commit()
+
+    response = test_client.post(f'/stocks/alerts/{alert.id}/delete')
+    assert response.status_code == 403
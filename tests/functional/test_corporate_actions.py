@@ -0,0 +1,180 @@
+"""
+This file (test_corporate_actions.py) contains the functional tests for the corporate actions.
+"""
+from datetime import date, datetime, timedelta
+from project import database
+from project.market_data import DAILY, WEEKLY
+from project.models import CorporateAction, PriceAlert, PriceBar, PriceHistory, Quote, Stock
+from project.stocks.alerts import AlertEngine
+from project.stocks.charts import chart_cache
+from project.stocks.timeseries import store_bars
+
+
+def stock_lots(symbol: str) -> list:
+    query = (database.select(Stock.number_of_shares, Stock.purchase_price)
+             .where(Stock.stock_symbol == symbol).order_by(Stock.purchase_date))
+    return database.session.execute(query).all()
+
+
+def test_cli_add_split_invalid_ratio(test_client):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the 'flask stocks add-split' command is run with invalid ratios
+    THEN check that an error is displayed
+    """
+    runner = test_client.application.test_cli_runner()
+    result = runner.invoke(args=['stocks', 'add-split', 'SAM', '2020-08-03', '3'])
+    assert result.exit_code != 0
+    assert 'The ratio must be two integers (new:old)' in result.output
+    result = runner.invoke(args=['stocks', 'add-split', 'SAM', '2020-08-03', '2:2'])
+    assert result.exit_code != 0
+    assert 'The ratio must be two different positive integers' in result.output
+
+
+def test_cli_apply_split(test_client, add_stocks_for_default_user):
+    """
+    GIVEN a Flask application configured for testing with the default set of stocks, a lot of SAM bought
+          after the ex-date of a split, and the prices and alerts of SAM
+    WHEN a 3-for-1 split of SAM is recorded and the 'flask stocks apply-actions' command is run twice
+    THEN check that only the lots, prices, and alerts dated before the ex-date are adjusted, once
+    """
+    user_id = database.session.execute(database.select(Stock.user_id)).scalars().first()
+    database.session.add(Stock('SAM', '10', '105.00', user_id, datetime(2020, 9, 1)))
+    database.session.execute(database.update(Stock).where(Stock.stock_symbol == 'SAM').values(
+        current_price=3030000, current_price_date=datetime(2020, 7, 31)))
+    database.session.add_all([PriceHistory(stock_symbol='SAM', date=date(2020, 7, 24), close=3000000),
+                              PriceHistory(stock_symbol='SAM', date=date(2020, 8, 7), close=1010000),
+                              Quote(stock_symbol='SAM', price=3030000, price_date=datetime(2020, 7, 31))])
+    alert = PriceAlert('SAM', PriceAlert.ABOVE, user_id, threshold=330)
+    alert.created_on = datetime(2020, 7, 15)
+    database.session.add(alert)
+    database.session.commit()
+
+    runner = test_client.application.test_cli_runner()
+    result = runner.invoke(args=['stocks', 'add-split', 'sam', '2020-08-03', '3:1'])
+    assert result.exit_code == 0
+    assert 'Recorded the SAM 3-for-1 split on 2020-08-03' in result.output
+
+    result = runner.invoke(args=['stocks', 'apply-actions'])
+    assert result.exit_code == 0
+    assert 'Applied the SAM 3-for-1 split on 2020-08-03 (1 lots adjusted)' in result.output
+    result = runner.invoke(args=['stocks', 'apply-actions'])
+    assert 'Applied 0 corporate actions' in result.output
+
+    assert stock_lots('SAM') == [(81_000000, 1004100), (10_000000, 1050000)]
+    query = database.select(Stock.current_price, Stock.position_value).where(Stock.stock_symbol == 'SAM')
+    assert database.session.execute(query).all() == [(1010000, 1010000 * 81), (1010000, 1010000 * 10)]
+    query = database.select(PriceHistory.close).where(PriceHistory.stock_symbol == 'SAM').order_by(PriceHistory.date)
+    assert database.session.execute(query).scalars().all() == [1000000, 1010000]
+    assert database.session.get(Quote, 'SAM').price == 1010000
+    assert database.session.get(PriceAlert, alert.id).threshold == 1100000
+
+
+def test_get_stock_detail_page_split_adjusted(test_client, log_in_default_user, mock_requests_get_success_weekly):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in, a split of SAM applied,
+          and no stored weekly prices of SAM
+    WHEN the chart of the weekly prices of SAM is displayed
+    THEN check that the downloaded prices before the ex-date are stored and displayed adjusted for the split
+    """
+    database.session.execute(database.delete(PriceHistory).where(PriceHistory.stock_symbol == 'SAM'))
+    database.session.commit()
+    stock_id = database.session.execute(database.select(Stock.id).where(Stock.stock_symbol == 'SAM')).scalar()
+    response = test_client.get(f'/stocks/{stock_id}')
+    assert response.status_code == 200
+    assert b'126.4133' in response.data
+    assert b'379.2400' not in response.data
+
+
+def test_cli_apply_splits_in_order(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing with the default set of stocks
+    WHEN a 2-for-1 split and a later 1-for-10 reverse split of TWTR, and a split with a future ex-date,
+         are applied, and then weekly prices of TWTR are downloaded
+    THEN check that the lot is adjusted for both splits (in share units), the future split is not applied,
+         and that the downloaded prices are adjusted when they are stored
+    """
+    database.session.add_all([CorporateAction('TWTR', date(2020, 6, 1), 1, 10),
+                              CorporateAction('TWTR', date(2020, 3, 2), 2, 1),
+                              CorporateAction('COST', date.today() + timedelta(days=7), 2, 1)])
+    database.session.commit()
+
+    result = test_client.application.test_cli_runner().invoke(args=['stocks', 'apply-actions'])
+    assert result.exit_code == 0
+    assert 'Applied 2 corporate actions' in result.output
+    assert stock_lots('TWTR') == [(29_200000, 1728000)]
+    assert stock_lots('COST') == [(76_000000, 146700)]
+
+    store_bars('TWTR', WEEKLY, [(datetime(2020, 2, 28), 400000), (datetime(2020, 5, 29), 200000),
+                                (datetime(2020, 6, 5), 2000000)])
+    database.session.commit()
+    query = database.select(PriceHistory.close).where(PriceHistory.stock_symbol == 'TWTR').order_by(PriceHistory.date)
+    assert database.session.execute(query).scalars().all() == [2000000, 2000000, 2000000]
+
+
+def test_alert_engine_reloads_after_split_applied(test_client, add_stocks_for_default_user):
+    """
+    GIVEN a Flask application configured for testing with an alert of COST loaded in an alert engine
+    WHEN a 2-for-1 split of COST is applied by another process (the 'flask stocks apply-actions' command)
+    THEN check that the engine reloads the split-adjusted threshold before the reload period is over
+    """
+    user_id = database.session.execute(database.select(Stock.user_id)).scalars().first()
+    alert = PriceAlert('COST', PriceAlert.ABOVE, user_id, threshold=200)
+    alert.created_on = datetime(2020, 7, 15)
+    database.session.add_all([alert, CorporateAction('COST', date(2020, 8, 3), 2, 1)])
+    database.session.commit()
+    engine = AlertEngine(reload_seconds=300)
+    engine.reload_if_stale()
+
+    result = test_client.application.test_cli_runner().invoke(args=['stocks', 'apply-actions'])
+    assert result.exit_code == 0
+    engine.reload_if_stale()
+    assert engine.evaluate({'COST': 1500000}) == {'COST': [alert.id]}
+
+
+def test_weekly_chart_not_cached_across_split_applied(test_client, log_in_default_user,
+                                                      mock_requests_get_success_weekly, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in and a cached chart of SAM
+          (adjusted for the 3-for-1 split)
+    WHEN a later 2-for-1 split of SAM is applied by another process (without clearing the charts cached by this process)
+    THEN check that the chart of the weekly prices of SAM is adjusted for the split
+    """
+    monkeypatch.setitem(test_client.application.config, 'CHART_CACHE_SECONDS', 60)
+    chart_cache.clear()
+    stock_id = database.session.execute(database.select(Stock.id).where(Stock.stock_symbol == 'SAM')).scalar()
+    response = test_client.get(f'/stocks/{stock_id}')
+    assert b'126.4133' in response.data
+
+    split = CorporateAction('SAM', date.today(), 2, 1)
+    split.applied_on = datetime.now()
+    database.session.add(split)
+    database.session.execute(database.update(PriceHistory).where(PriceHistory.stock_symbol == 'SAM')
+                             .values(close=(PriceHistory.close + 1) / 2))
+    database.session.commit()
+    response = test_client.get(f'/stocks/{stock_id}')
+    assert b'63.2067' in response.data
+    assert b'126.4133' not in response.data
+    chart_cache.clear()
+
+
+def test_cli_ingest_eod_split_adjusted(test_client, log_in_default_user, tmp_path):
+    """
+    GIVEN a Flask application configured for testing with the default set of stocks and an applied
+          2-for-1 split of TWTR with an ex-date of yesterday
+    WHEN the 'flask stocks ingest-eod' command is run with the closes of TWTR before and on the ex-date
+    THEN check that the daily (and weekly) closes before the ex-date are adjusted for the split
+    """
+    yesterday = date.today() - timedelta(days=1)
+    split = CorporateAction('TWTR', yesterday, 2, 1)
+    split.applied_on = datetime.now()
+    database.session.add(split)
+    database.session.commit()
+    path = tmp_path / 'eod.csv'
+    path.write_text(f'symbol,date,close\nTWTR,{yesterday - timedelta(days=1)},40.00\nTWTR,{yesterday},21.00\n')
+
+    result = test_client.application.test_cli_runner().invoke(args=['stocks', 'ingest-eod', str(path)])
+    assert result.exit_code == 0
+    query = (database.select(PriceBar.close).where(PriceBar.stock_symbol == 'TWTR', PriceBar.resolution == DAILY)
+             .order_by(PriceBar.timestamp))
+    assert database.session.execute(query).scalars().all() == [200000, 210000]
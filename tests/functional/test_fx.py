@@ -0,0 +1,106 @@
+"""
+This file (test_fx.py) contains the functional tests for the multi-currency holdings.
+"""
+from datetime import datetime
+from project import database
+from project.models import FxRate, Stock
+from project.stocks.fx import get_fx_rates
+import requests
+
+
+class MockSuccessResponseFx(object):
+    def __init__(self, url):
+        self.status_code = 200
+        self.url = url
+        self.currency = url.split('from_currency=')[1].split('&')[0]
+
+    def json(self):
+        rates = {'EUR': '1.10000000', 'GBP': '1.25000000'}
+        return {
+            'Realtime Currency Exchange Rate': {
+                '1. From_Currency Code': self.currency,
+                '3. To_Currency Code': 'USD',
+                '5. Exchange Rate': rates[self.currency],
+                '6. Last Refreshed': '2024-03-01 12:00:00'
+            }
+        }
+
+
+def total_value(stocks: list, rates: dict, base_currency: str) -> float:
+    return sum(stock['position_value'] * rates[stock['currency']] / rates[base_currency] for stock in stocks)
+
+
+def test_cli_refresh_fx(test_client, add_stocks_for_default_user, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing with stocks listed in USD, EUR, and GBP
+    WHEN the 'flask stocks refresh-fx' command is run
+    THEN check that the exchange rates of the currencies (other than USD) are stored
+    """
+    test_client.post('/add_stock', data={'stock_symbol': 'SAP', 'number_of_shares': '10', 'purchase_price': '150.00',
+                                         'purchase_date': '2021-03-01', 'currency': 'eur'})
+    test_client.post('/add_stock', data={'stock_symbol': 'VOD', 'number_of_shares': '200', 'purchase_price': '1.20',
+                                         'purchase_date': '2021-03-01', 'currency': 'GBP'})
+    query = database.select(Stock.stock_symbol, Stock.currency).where(Stock.currency != 'USD').order_by(Stock.id)
+    assert database.session.execute(query).all() == [('SAP', 'EUR'), ('VOD', 'GBP')]
+
+    monkeypatch.setattr(requests, 'get', lambda url, timeout=None: MockSuccessResponseFx(url))
+    runner = test_client.application.test_cli_runner()
+    result = runner.invoke(args=['stocks', 'refresh-fx'])
+    assert result.exit_code == 0
+    assert 'EUR: 1.1 USD' in result.output
+    assert 'GBP: 1.25 USD' in result.output
+    assert 'Refreshed the exchange rates of 2 currencies' in result.output
+
+
+def test_list_stocks_in_base_currency(test_client, log_in_default_user, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing, a logged in user with stocks in USD, EUR, and GBP, and the
+          exchange rates of EUR and GBP
+    WHEN the '/stocks/' page is requested (GET) in US dollars and then in euros
+    THEN check that each position is shown in the currency of its stock and the total in the base currency
+    """
+    with test_client.application.app_context():
+        database.session.execute(database.delete(FxRate))
+        database.session.add_all([FxRate(currency='EUR', rate=1.10, rate_date=datetime.now()),
+                                  FxRate(currency='GBP', rate=1.25, rate_date=datetime.now())])
+        database.session.commit()
+        get_fx_rates().invalidate()
+
+    response = test_client.get('/stocks/', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'data-currency="EUR"' in response.data
+    assert b'148.34 EUR' in response.data
+    assert b'$148.34' in response.data
+    rates = {'USD': 1.0, 'EUR': 1.10, 'GBP': 1.25}
+    response = test_client.get('/api/stocks/prices')
+    stocks = response.json['stocks']
+    assert {stock['currency'] for stock in stocks} == {'USD', 'EUR', 'GBP'}
+    assert response.json['currency'] == 'USD'
+    assert abs(response.json['value'] - total_value(stocks, rates, 'USD')) < 0.01
+
+    response = test_client.post('/users/base_currency', data={'base_currency': 'eur'}, follow_redirects=True)
+    assert b'Base currency has been changed to EUR!' in response.data
+    assert b'Base Currency: EUR' in response.data
+    response = test_client.get('/api/stocks/prices')
+    assert response.json['currency'] == 'EUR'
+    assert abs(response.json['value'] - total_value(stocks, rates, 'EUR')) < 0.01
+    response = test_client.get('/stocks/')
+    assert b'id="total-value" data-currency="EUR"' in response.data
+
+    test_client.post('/users/base_currency', data={'base_currency': 'JPY'}, follow_redirects=True)
+    response = test_client.get('/stocks/')
+    assert b'id="missing-rates-note"' in response.data
+    assert b'The total value does not include the stocks in EUR, GBP, USD' in response.data
+    test_client.post('/users/base_currency', data={'base_currency': 'USD'}, follow_redirects=True)
+
+
+def test_post_base_currency_invalid(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing and a logged in user
+    WHEN the '/users/base_currency' page is posted to (POST) with an invalid currency
+    THEN check that an error message is returned to the user
+    """
+    response = test_client.post('/users/base_currency', data={'base_currency': 'EURO'}, follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Base currency has been changed' not in response.data
+    assert b'Currency must be a 3-letter code' in response.data
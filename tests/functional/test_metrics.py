@@ -0,0 +1,47 @@
+"""
+This file (test_metrics.py) contains the functional tests for the '/metrics' endpoint.
+"""
+
+def test_get_metrics(test_client, add_stocks_for_default_user, mock_requests_get_api_rate_limited_exceeded):
+    """
+    GIVEN a Flask application configured for testing with metrics enabled
+    WHEN the '/metrics' page is requested (GET) after the '/stocks/' page was requested
+         and the Alpha Vantage API rate limit was exceeded
+    THEN check that the request latency, Alpha Vantage failures, and cache lookups are reported
+    """
+    test_client.get('/stocks/')
+    response = test_client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert b'flask_request_duration_seconds_bucket{endpoint="stocks.list_stocks"' in response.data
+    assert b'alpha_vantage_failures_total{function="GLOBAL_QUOTE",reason="rate_limited"}' in response.data
+    assert b'quote_cache_lookups_total{result="miss"}' in response.data
+    assert b'db_pool_connections_checked_out' in response.data
+    assert b'# TYPE db_pool_connections gauge' in response.data
+    assert b'email_queue_depth' in response.data
+
+
+def test_get_metrics_disabled(test_client):
+    """
+    GIVEN a Flask application configured for testing with metrics disabled
+    WHEN the '/metrics' page is requested (GET)
+    THEN check that a 404 error is returned
+    """
+    test_client.application.config['METRICS_ENABLED'] = False
+    response = test_client.get('/metrics')
+    test_client.application.config['METRICS_ENABLED'] = True
+    assert response.status_code == 404
+
+
+def test_get_metrics_auth_token(test_client):
+    """
+    GIVEN a Flask application configured for testing with a metrics authorization token
+    WHEN the '/metrics' page is requested (GET) with and without the token
+    THEN check that the metrics are only returned with the valid token
+    """
+    test_client.application.config['METRICS_AUTH_TOKEN'] = 'scrape-token'
+    invalid_response = test_client.get('/metrics')
+    valid_response = test_client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+    test_client.application.config['METRICS_AUTH_TOKEN'] = None
+    assert invalid_response.status_code == 403
+    assert valid_response.status_code == 200
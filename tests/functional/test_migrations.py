@@ -0,0 +1,168 @@
+"""
+This file (test_migrations.py) contains the functional tests for the database migrations.
+"""
+from project import create_app, database
+from project.schema import get_script_directory
+from werkzeug.security import generate_password_hash
+import config
+import pytest
+import sqlalchemy as sa
+import sqlite3
+
+
+# Schema of the database as created by `database.create_all()` before the migrations were added
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL,
+    email VARCHAR,
+    password_hashed VARCHAR(256),
+    registered_on DATETIME,
+    email_confirmation_sent_on DATETIME,
+    email_confirmed BOOLEAN,
+    email_confirmed_on DATETIME,
+    CONSTRAINT pk_users PRIMARY KEY (id),
+    CONSTRAINT uq_users_email UNIQUE (email)
+);
+CREATE TABLE stocks (
+    id INTEGER NOT NULL,
+    stock_symbol VARCHAR,
+    number_of_shares INTEGER,
+    purchase_price INTEGER,
+    user_id INTEGER,
+    purchase_date DATETIME,
+    current_price INTEGER,
+    current_price_date DATETIME,
+    position_value INTEGER,
+    CONSTRAINT pk_stocks PRIMARY KEY (id),
+    CONSTRAINT fk_stocks_user_id_users FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE TABLE price_history (
+    id INTEGER NOT NULL,
+    stock_symbol VARCHAR,
+    date DATE,
+    close INTEGER,
+    CONSTRAINT pk_price_history PRIMARY KEY (id),
+    CONSTRAINT uq_price_history_stock_symbol UNIQUE (stock_symbol, date)
+);
+INSERT INTO users (id, email, password_hashed, registered_on, email_confirmed)
+    VALUES (1, 'baseline@example.com', '{password_hashed}', '2020-07-01 10:00:00.000000', 0);
+INSERT INTO stocks (id, stock_symbol, number_of_shares, purchase_price, user_id, purchase_date,
+                    current_price, current_price_date, position_value)
+    VALUES (1, 'AAPL', 16, 40632, 1, '2020-07-10 00:00:00.000000', 14834, '2020-07-28 10:00:00.000000', 237344);
+INSERT INTO price_history (id, stock_symbol, date, close) VALUES (1, 'AAPL', '2020-07-24', 14834);
+"""
+
+
+@pytest.fixture(scope='function')
+def baseline_app(tmp_path, monkeypatch):
+    """Flask application with a SQLite database file that has the baseline schema and data."""
+    database_path = tmp_path / 'baseline.db'
+    connection = sqlite3.connect(database_path)
+    connection.executescript(BASELINE_SCHEMA.format(password_hashed=generate_password_hash('FlaskIsAwesome123')))
+    connection.close()
+
+    monkeypatch.setenv('CONFIG_TYPE', 'config.TestingConfig')
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{database_path}')
+    flask_app = create_app()
+    yield flask_app
+    with flask_app.app_context():
+        database.engine.dispose()
+
+
+def read_amounts(flask_app) -> list:
+    """Return the number of shares and the amounts of money of the stock, and those of the price history of AAPL."""
+    with flask_app.app_context(), database.engine.connect() as connection:
+        query = sa.text('SELECT number_of_shares, purchase_price, current_price, position_value FROM stocks')
+        return [*connection.execute(query).one(),
+                *connection.execute(sa.text('SELECT close, dividend FROM price_history')).one()]
+
+
+def get_revisions(flask_app) -> tuple:
+    """Return the revision of the database and the latest revision of the migrations."""
+    with flask_app.app_context(), database.engine.connect() as connection:
+        revision = connection.execute(sa.text('SELECT version_num FROM alembic_version')).scalar()
+        return revision, get_script_directory(flask_app).get_current_head()
+
+
+def test_new_database_is_stamped(test_client):
+    """
+    GIVEN a Flask application configured for testing, with an empty database
+    WHEN the application is created
+    THEN check that the tables are created and that the database is at the latest revision
+    """
+    revision, head = get_revisions(test_client.application)
+    assert revision == head
+    with test_client.application.app_context():
+        assert sa.inspect(database.engine).has_table('corporate_actions')
+
+
+def test_upgrade_baseline_database(baseline_app):
+    """
+    GIVEN a Flask application with a database created before the migrations were added
+    WHEN the 'flask db upgrade' command is run twice
+    THEN check that the missing tables and columns are created, the amounts of money are converted from cents
+         to units of 1/10,000 and the shares to units of 1/1,000,000, the user can log in, and that the second
+         upgrade changes nothing
+    """
+    runner = baseline_app.test_cli_runner()
+    result = runner.invoke(args=['db', 'upgrade'])
+    assert result.exit_code == 0, result.output
+    revision, head = get_revisions(baseline_app)
+    assert revision == head
+
+    with baseline_app.app_context():
+        inspector = sa.inspect(database.engine)
+        for table in ['price_history', 'price_bars', 'quotes', 'price_alerts', 'watchlist_items',
+                      'transactions', 'tax_lots', 'realized_gains', 'corporate_actions', 'fx_rates']:
+            assert inspector.has_table(table)
+        # Every column of the models exists in the upgraded database
+        for table in database.metadata.sorted_tables:
+            columns = [column['name'] for column in inspector.get_columns(table.name)]
+            assert set(table.columns.keys()) <= set(columns), table.name
+        with database.engine.connect() as connection:
+            assert connection.execute(sa.text('SELECT stock_symbol, currency FROM stocks')).all() == [('AAPL', 'USD')]
+            assert connection.execute(sa.text('SELECT base_currency FROM users')).scalar() == 'USD'
+        for table in ['stocks', 'price_history']:
+            for column in inspector.get_columns(table):
+                if column['name'] in ['number_of_shares', 'purchase_price', 'current_price', 'position_value',
+                                      'close', 'dividend']:
+                    assert isinstance(column['type'], sa.BigInteger), column['name']
+    assert read_amounts(baseline_app) == [16000000, 4063200, 1483400, 23734400, 1483400, 0]
+
+    response = baseline_app.test_client().post('/users/login', data={'email': 'baseline@example.com',
+                                                                     'password': 'FlaskIsAwesome123'},
+                                               follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Thanks for logging in, baseline@example.com!' in response.data
+
+    result = runner.invoke(args=['db', 'upgrade'])
+    assert result.exit_code == 0, result.output
+    revision, head = get_revisions(baseline_app)
+    assert revision == head
+    assert read_amounts(baseline_app) == [16000000, 4063200, 1483400, 23734400, 1483400, 0]
+
+
+def test_upgrade_unstamped_database(tmp_path, monkeypatch):
+    """
+    GIVEN a database created from the models (with the shares and the amounts of money in units) that was not
+          stamped with a revision, as by `database.create_all()` before the migrations were added
+    WHEN the 'flask db upgrade' command is run
+    THEN check that the shares and the amounts of money are not converted again
+    """
+    monkeypatch.setenv('CONFIG_TYPE', 'config.TestingConfig')
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "models.db"}')
+    flask_app = create_app()
+    with flask_app.app_context(), database.engine.begin() as connection:
+        connection.execute(sa.text('DROP TABLE alembic_version'))
+        connection.execute(sa.text("INSERT INTO stocks (stock_symbol, number_of_shares, purchase_price, current_price, "
+                                   "position_value) VALUES ('AAPL', 16000000, 4063200, 1483400, 23734400)"))
+        connection.execute(sa.text("INSERT INTO price_history (stock_symbol, date, close, dividend) "
+                                   "VALUES ('AAPL', '2020-07-24', 1483400, 0)"))
+
+    result = flask_app.test_cli_runner().invoke(args=['db', 'upgrade'])
+    assert result.exit_code == 0, result.output
+    revision, head = get_revisions(flask_app)
+    assert revision == head
+    assert read_amounts(flask_app) == [16000000, 4063200, 1483400, 23734400, 1483400, 0]
+    with flask_app.app_context():
+        database.engine.dispose()
@@ -0,0 +1,84 @@
+"""
+This file (test_rebalance.py) contains the functional tests for the rebalancing of the portfolios.
+"""
+from tests.query_counter import max_queries
+
+
+def trades_by_symbol(response) -> dict:
+    return {trade['stock_symbol']: trade for trade in response.get_json()['trades']}
+
+
+@max_queries({'stocks.api_rebalance': 2})
+def test_api_rebalance(test_client, add_stocks_for_default_user, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database at the current price of $148.34
+    WHEN the '/api/rebalance' page is requested (GET) with targets of 50% for SAM and COST
+    THEN check that TWTR is sold and that SAM and COST are bought to about half of the value each
+    """
+    test_client.get('/stocks/')
+
+    response = test_client.get('/api/rebalance?targets=SAM:50,cost:50')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['currency'] == 'USD'
+    # 249 shares at $148.34
+    assert data['value'] == 36936.66
+    trades = trades_by_symbol(response)
+    assert trades['TWTR']['shares'] == -146
+    assert trades['TWTR']['target_weight'] == 0.0
+    assert trades['SAM']['shares'] in (97, 98) and trades['COST']['shares'] in (48, 49)
+    assert trades['SAM']['price'] == 148.34
+    assert abs(trades['SAM']['new_weight'] - 50.0) < 0.5 and abs(trades['COST']['new_weight'] - 50.0) < 0.5
+    assert data['cash'] >= 0.0
+    assert data['excluded'] == [] and data['missing_currencies'] == []
+
+
+def test_api_rebalance_without_sells(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in and the default set of stocks
+    WHEN the '/api/rebalance' page is requested (GET) without sells, with $1,000.00 to invest in whole shares
+    THEN check that only the underweight stocks are bought, for at most the cash
+    """
+    response = test_client.get('/api/rebalance?targets=SAM:50,COST:50&sells=0&cash=1000')
+    assert response.status_code == 200
+    trades = trades_by_symbol(response)
+    assert trades['TWTR']['shares'] == 0
+    assert trades['SAM']['shares'] == 6 and trades['COST']['shares'] == 0
+    assert response.get_json()['cash'] == 109.96
+
+
+def test_api_rebalance_asset_classes(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in and the default set of stocks
+    WHEN the '/api/rebalance' page is requested (GET) with COST and TWTR in an asset class, in fractional shares
+    THEN check that the trade of the asset class is split in proportion to the values of its stocks
+    """
+    response = test_client.get('/api/rebalance?targets=SAM:50,RETAIL:50&classes=COST:retail,TWTR:retail'
+                               '&whole_shares=0')
+    assert response.status_code == 200
+    trades = trades_by_symbol(response)
+    assert trades['COST']['group'] == trades['TWTR']['group'] == 'RETAIL'
+    assert trades['COST']['weight'] == trades['TWTR']['weight'] == round(222 / 249 * 100, 2)
+    # The 222 shares of the asset class are reduced to 124.5, keeping the mix of 76 COST to 146 TWTR
+    assert abs(trades['COST']['shares'] - -76 * 97.5 / 222) < 0.00001
+    assert abs(trades['TWTR']['shares'] - -146 * 97.5 / 222) < 0.00001
+    assert abs(trades['SAM']['shares'] - 97.5) < 0.00001
+
+
+def test_api_rebalance_invalid_arguments(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in and the default set of stocks
+    WHEN the '/api/rebalance' page is requested (GET) with invalid or unknown targets
+    THEN check that an error is returned as JSON
+    """
+    for query in ['', 'targets=SAM', 'targets=SAM:abc', 'targets=SAM:60,COST:60', 'targets=SAM:-5',
+                  'targets=SAM:50&cash=-1', 'targets=SAM:50&cash=abc', 'targets=SAM:50&classes=COST']:
+        response = test_client.get(f'/api/rebalance?{query}')
+        assert response.status_code == 400
+        assert response.get_json()['error']
+    response = test_client.get('/api/rebalance?targets=SAM')
+    assert response.get_json() == {'error': 'The targets must be comma-separated KEY:VALUE pairs'}
+    response = test_client.get('/api/rebalance?targets=SAM:50,AAPL:50')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'No priced holdings for the targets: AAPL'}
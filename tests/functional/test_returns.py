@@ -0,0 +1,72 @@
+"""
+This file (test_returns.py) contains the functional tests for the total returns of the portfolios.
+"""
+from datetime import date, timedelta
+from project import database
+from project.models import PriceHistory
+import requests
+
+
+def test_get_returns_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the '/api/returns' page is requested (GET) by a user who is NOT LOGGED in
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/api/returns', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_get_returns_with_dividends(test_client, add_stocks_for_default_user, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in and the default set
+          of stocks, and weekly prices from Alpha Vantage with a dividend of $5 on a close of $100
+    WHEN the returns are requested (GET) three times, with a new weekly price before the third request
+    THEN check that the dividends are stored and reinvested, and that the returns are cached until
+         the new weekly price is stored
+    """
+    calls = []
+    last_friday = date.today() - timedelta(days=(date.today().weekday() - 4) % 7)
+    weeks = [last_friday - timedelta(weeks=week) for week in range(3, -1, -1)]
+
+    class MockWeeklyResponse(object):
+        status_code = 200
+
+        def json(self):
+            return {'Weekly Adjusted Time Series': {
+                week.isoformat(): {'4. close': '110.0000' if week == last_friday else '100.0000',
+                                   '7. dividend amount': '5.0000' if week == weeks[1] else '0.0000'}
+                for week in weeks}}
+
+    def mock_get(url, timeout=None):
+        calls.append(url)
+        return MockWeeklyResponse()
+
+    monkeypatch.setattr(requests, 'get', mock_get)
+    response = test_client.get('/api/returns')
+    assert response.status_code == 200
+    assert len(calls) == 3
+    query = database.select(PriceHistory.dividend).where(PriceHistory.stock_symbol == 'SAM', PriceHistory.date == weeks[1])
+    assert database.session.execute(query).scalar() == 50000
+
+    stocks = {stock['stock_symbol']: stock for stock in response.json['stocks']}
+    assert stocks['SAM']['value'] == 27 * 110.0
+    assert stocks['SAM']['total_value'] == round(27 * 110.0 * 1.05, 2)
+    assert stocks['SAM']['price_return'] == round((110.0 / 301.23 - 1) * 100, 2)
+    assert stocks['SAM']['total_return'] == round((110.0 * 1.05 / 301.23 - 1) * 100, 2)
+    portfolio = response.json['portfolio']
+    assert portfolio['cost'] == round(27 * 301.23 + 76 * 14.67 + 146 * 34.56, 2)
+    assert portfolio['total_value'] == round((27 + 76 + 146) * 110.0 * 1.05, 2)
+    assert 'returns-cache-miss' in response.headers['Server-Timing']
+
+    response = test_client.get('/api/returns')
+    assert 'returns-cache-hit' in response.headers['Server-Timing']
+    assert len(calls) == 3
+
+    database.session.add(PriceHistory(stock_symbol='SAM', date=date.today() + timedelta(days=7), close=1200000))
+    database.session.commit()
+    response = test_client.get('/api/returns')
+    assert 'returns-cache-miss' in response.headers['Server-Timing']
+    stocks = {stock['stock_symbol']: stock for stock in response.json['stocks']}
+    assert stocks['SAM']['value'] == 27 * 120.0
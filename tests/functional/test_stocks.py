@@ -2,7 +2,23 @@
 This file (test_stocks.py) contains the functional tests for the 'stocks' blueprint.
 """
 from app import app
+from project import database
+from project.models import PriceBar, PriceHistory, Stock, User
+from project.money import format_amount, position_value
+from project.stocks import timeseries
+from project.stocks.charts import chart_cache
+from project.stocks.seed import SYMBOLS
+from project.stocks.symbols import SymbolIndex
+from datetime import date, datetime, timedelta
+from tests.query_counter import max_queries
+import gzip
+import json
+import os
+import pytest
+import re
+import time
 import requests
+import sqlalchemy as sa
 
 ######################
 ### HELPER CLASSES ###
@@ -34,13 +50,19 @@ class MockFailedResponse(object):
         return {'error': 'bad'}
 
 
+def clear_price_history():
+    """Delete the weekly prices stored by the previous tests."""
+    database.session.execute(database.delete(PriceHistory))
+    database.session.commit()
+
+
 def test_monkeypatch_get_success(monkeypatch):
     """
     GIVEN a Flask application an da monkeypatched version of requests.get()
     WHEN the HTTP response is set to successful
     THEN check the HTTP response
     """
-    def mock_get(url):
+    def mock_get(url, timeout=None):
         return MockSuccessResponse(url)
     
     url = 'https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=MSFT&apikey=demo'
@@ -59,7 +81,7 @@ def test_monkeypatch_get_failure(monkeypatch):
     WHEN the HTTP response is set to failed
     THEN check the HTTP response
     """
-    def mock_get(url):
+    def mock_get(url, timeout=None):
         return MockFailedResponse(url)
 
     url = 'https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol=MSFT&apikey=demo'
@@ -167,6 +189,9 @@ def test_post_add_stock_page_not_logged_in(test_client):
     assert b'Please log in to access this page.' in response.data
 
 
+# When testing, the stale prices are refreshed in the request: the shared quotes and the stocks are updated,
+# the alert index is loaded (on first use), and the stocks are read again
+@max_queries({'stocks.list_stocks': 6})
 def test_get_stock_list_logged_in(test_client, add_stocks_for_default_user, mock_requests_get_success_quote):
     """
     GIVEN a Flask application configured for testing
@@ -189,6 +214,49 @@ def test_get_stock_list_logged_in(test_client, add_stocks_for_default_user, mock
         assert element in response.data
         
 
+def test_get_stock_list_stale_prices(test_client, add_stocks_for_default_user, mock_requests_get_failure):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database with prices from yesterday
+    WHEN the '/stocks/' page is requested (GET) and the quotes cannot be retrieved
+    THEN check that the last known prices are displayed and marked as stale
+    """
+    yesterday = datetime.now() - timedelta(days=1)
+    database.session.execute(database.update(Stock).values(current_price=123400, position_value=position_value(123400, Stock.number_of_shares),
+                                                           current_price_date=yesterday))
+    database.session.commit()
+
+    response = test_client.get('/stocks/')
+    assert response.status_code == 200
+    assert b'$12.34<span class="stale-price"' in response.data
+    assert b'The price is not current and is being refreshed.' in response.data
+
+    response = test_client.get('/api/stocks/prices')
+    assert response.status_code == 200
+    prices = response.get_json()
+    assert all(stock['stale'] and stock['current_price'] == 12.34 for stock in prices['stocks'])
+
+
+def test_get_stock_list_refreshes_stale_prices(test_client, add_stocks_for_default_user,
+                                               mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing (quotes refreshed in the request), with the default
+          user logged in and the default set of stocks in the database with prices from yesterday
+    WHEN the '/stocks/' page is requested (GET)
+    THEN check that the stale prices are refreshed with the quotes
+    """
+    yesterday = datetime.now() - timedelta(days=1)
+    database.session.execute(database.update(Stock).values(current_price_date=yesterday))
+    database.session.commit()
+
+    response = test_client.get('/stocks/')
+    assert response.status_code == 200
+    assert b'<span class="stale-price"' not in response.data
+    assert b'$148.34' in response.data
+    prices = test_client.get('/api/stocks/prices').get_json()
+    assert not any(stock['stale'] for stock in prices['stocks'])
+
+
 def test_get_list_stocks_not_logged_in(test_client):
     """
     GIVEN a Flask application configured for testing
@@ -201,6 +269,10 @@ def test_get_list_stocks_not_logged_in(test_client):
     assert b'Please log in to access this page.' in response.data
     
     
+# The weekly prices of an uncached chart are downloaded and stored (adjusted for the applied splits of the
+# symbol) when the stored prices are stale, and the chart is cached by the version of the applied splits
+# (they are applied by another process)
+@max_queries({'stocks.stock_details': 13})
 def test_get_stock_detail_page(test_client, add_stocks_for_default_user, mock_requests_get_success_weekly):
     """
     GIVEN a Flask application configured for testing, with the default user logged in
@@ -214,13 +286,87 @@ def test_get_stock_detail_page(test_client, add_stocks_for_default_user, mock_re
     assert b'canvas id="stockChart"' in response.data
     
     
-def test_get_stock_detail_page_failed_response(test_client, add_stocks_for_default_user, mock_requests_get_failure):
+def test_get_stock_detail_page_downsampled_and_cached(test_client, add_stocks_for_default_user, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database
+    WHEN the '/stocks/3' page is retrieved (GET) twice with a width of 50 pixels
+         and Alpha Vantage returns 20 years of weekly prices
+    THEN check that the chart is downsampled to 50 points and Alpha Vantage is called once
+    """
+    clear_price_history()
+    calls = []
+
+    class MockLongHistoryResponse(object):
+        status_code = 200
+
+        def json(self):
+            weeks = [date(2020, 7, 24) - timedelta(weeks=week) for week in range(1040)]
+            return {'Weekly Adjusted Time Series': {week.isoformat(): {'4. close': f'{100 + week.day}.0000'}
+                                                    for week in weeks}}
+
+    def mock_get(url, timeout=None):
+        calls.append(url)
+        return MockLongHistoryResponse()
+
+    monkeypatch.setattr(requests, 'get', mock_get)
+    monkeypatch.setitem(test_client.application.config, 'CHART_CACHE_SECONDS', 60)
+    chart_cache.clear()
+
+    for _ in range(2):
+        response = test_client.get('/stocks/3?width=50')
+        assert response.status_code == 200
+        assert response.data.count(b'"07/24/2020"') == 1
+        assert response.data.count(b'.0000,') == 50
+    assert len(calls) == 1
+    chart_cache.clear()
+
+
+def test_get_stock_detail_page_reads_stored_prices(test_client, add_stocks_for_default_user, monkeypatch):
     """
     GIVEN a Flask application configured for testing, with the default user logged in
           and the default set of stocks in the database
+    WHEN the '/stocks/3' page is retrieved (GET) twice without the chart cache, and Alpha Vantage returns
+         the weekly prices up to the last week
+    THEN check that Alpha Vantage is called once, and that the second chart is read from the stored prices
+    """
+    clear_price_history()
+    calls = []
+    last_friday = date.today() - timedelta(days=(date.today().weekday() - 4) % 7 or 7)
+
+    class MockRecentHistoryResponse(object):
+        status_code = 200
+
+        def json(self):
+            weeks = [last_friday - timedelta(weeks=week) for week in range(20)]
+            return {'Weekly Adjusted Time Series': {week.isoformat(): {'4. close': f'{100 + week.day}.0000'}
+                                                    for week in weeks}}
+
+    def mock_get(url, timeout=None):
+        calls.append(url)
+        return MockRecentHistoryResponse()
+
+    monkeypatch.setattr(requests, 'get', mock_get)
+    charts = []
+    for _ in range(2):
+        # The stored prices are current, so they are not downloaded again (even by a new process)
+        monkeypatch.setattr(timeseries, '_last_downloads', {})
+        response = test_client.get('/stocks/3')
+        assert response.status_code == 200
+        assert last_friday.strftime('"%m/%d/%Y"').encode() in response.data
+        charts.append(response.data[response.data.index(b'labels:'):])
+    assert len(calls) == 1
+    assert charts[0] == charts[1]
+
+
+def test_get_stock_detail_page_failed_response(test_client, add_stocks_for_default_user, mock_requests_get_failure):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database, without stored weekly prices
     WHEN the '/stocks/3' page is retrieved (GET)  but the response from Alpha Vantage failed
     THEN check that the response is valid but the chart is not displayed
     """
+    clear_price_history()
     response = test_client.get('/stocks/3', follow_redirects=True)
     assert response.status_code == 200
     assert b'Stock Details' in response.data
@@ -247,4 +393,441 @@ def test_get_stock_detail_page_invalid_stock(test_client, log_in_default_user):
     """
     response = test_client.get('/stocks/234')
     assert response.status_code == 404
-    assert b'Stock Details' not in response.data
\ No newline at end of file
+    assert b'Stock Details' not in response.data
+
+def test_get_stock_list_server_timing(test_client, add_stocks_for_default_user, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database
+    WHEN the '/stocks/' page is requested (GET)
+    THEN check that the Server-Timing header includes the database, cache, and template timings
+    """
+    response = test_client.get('/stocks/')
+    assert response.status_code == 200
+    server_timing = response.headers['Server-Timing']
+    assert 'db;dur=' in server_timing
+    assert 'template;dur=' in server_timing
+    assert 'cache-' in server_timing
+    assert 'total;dur=' in server_timing
+
+
+def test_get_stock_list_profiled(test_client, add_stocks_for_default_user, monkeypatch, tmp_path):
+    """
+    GIVEN a Flask application configured for testing with profiling of every request enabled
+    WHEN the '/stocks/' page is requested (GET) and retrieving the stock data is slow
+    THEN check that a collapsed stack profile of the request is written
+    """
+    monkeypatch.setattr(Stock, 'is_price_current', lambda stock: time.sleep(0.02) or True)
+    test_client.application.config.update(PROFILING_ENABLED=True,
+                                          PROFILING_FOLDER=str(tmp_path),
+                                          PROFILING_SLOW_REQUEST_THRESHOLD=0.0)
+    response = test_client.get('/stocks/')
+    test_client.application.config.update(PROFILING_ENABLED=False, PROFILING_FOLDER=None)
+    assert response.status_code == 200
+    profiles = os.listdir(tmp_path)
+    assert len(profiles) == 1
+    assert 'stocks.list_stocks' in profiles[0]
+    assert profiles[0].endswith('.folded')
+    assert 'list_stocks (routes.py:' in (tmp_path / profiles[0]).read_text()
+
+
+def test_cli_seed(test_client):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the 'flask stocks seed' command is run with price histories
+    THEN check that the users, stocks, and weekly prices are inserted
+    """
+    query = database.select(database.func.count(PriceHistory.id))
+    price_history_count = database.session.execute(query).scalar()
+
+    runner = test_client.application.test_cli_runner()
+    result = runner.invoke(args=['stocks', 'seed', '--users', '10', '--lots-per-user', '5',
+                                 '--history-weeks', '52', '--email-prefix', 'cli-seed'])
+    assert result.exit_code == 0
+    assert 'Inserted 10 users' in result.output
+    assert 'rows/s' in result.output
+
+    query = database.select(User).where(User.email.startswith('cli-seed'))
+    users = database.session.execute(query).scalars().all()
+    assert len(users) == 10
+    query = database.select(database.func.count(Stock.id)).where(Stock.user_id.in_([user.id for user in users]))
+    assert database.session.execute(query).scalar() >= 10
+    query = database.select(database.func.count(PriceHistory.id))
+    assert database.session.execute(query).scalar() == price_history_count + 52 * len(SYMBOLS)
+
+
+def test_cli_seed_again(test_client):
+    """
+    GIVEN a Flask application configured for testing, with seeded users and price histories
+    WHEN the 'flask stocks seed' command is run again with the same email prefix and weeks of history
+    THEN check that only the new users are inserted and that the existing weekly prices are kept
+    """
+    query = database.select(database.func.count(PriceHistory.id))
+    price_history_count = database.session.execute(query).scalar()
+
+    runner = test_client.application.test_cli_runner()
+    result = runner.invoke(args=['stocks', 'seed', '--users', '12', '--lots-per-user', '5',
+                                 '--history-weeks', '52', '--email-prefix', 'cli-seed'])
+    assert result.exit_code == 0
+    assert 'Inserted 2 users' in result.output
+    assert '0 weekly prices' in result.output
+
+    query = database.select(database.func.count(User.id)).where(User.email.startswith('cli-seed'))
+    assert database.session.execute(query).scalar() == 12
+    query = database.select(database.func.count(PriceHistory.id))
+    assert database.session.execute(query).scalar() == price_history_count
+
+
+def test_get_stock_list_query_count_independent_of_stocks(test_client, log_in_default_user,
+                                                         mock_requests_get_success_quote, query_counter):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/stocks/' page is requested (GET) before and after adding more stocks
+    THEN check that the number of SQL statements does not grow with the number of stocks
+    """
+    test_client.get('/stocks/')
+    for symbol in ['IBM', 'KO', 'PEP', 'NKE', 'SBUX']:
+        test_client.post('/add_stock', data={'stock_symbol': symbol,
+                                             'number_of_shares': '10',
+                                             'purchase_price': '100.00',
+                                             'purchase_date': '2021-03-04'})
+    test_client.get('/stocks/')
+    counts = [count for endpoint, count in query_counter.statements_per_request()
+              if endpoint == 'stocks.list_stocks']
+    assert len(counts) == 2
+    assert counts[1] <= counts[0] + 1
+    assert counts[1] <= 6
+
+
+def test_get_compare_stocks_api(test_client, log_in_default_user, mock_requests_get_success_weekly):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/api/stocks/compare' page is retrieved (GET) for two symbols
+    THEN check that the weekly prices are stored and returned as the percent change since the base week
+    """
+    response = test_client.get('/api/stocks/compare?symbols=qqq,XYZ')
+    assert response.status_code == 200
+    chart = response.get_json()
+    assert chart['base_date'] == '2020-02-24'
+    assert chart['labels'] == ['2020-02-24', '2020-06-08', '2020-07-13', '2020-07-20']
+    assert [series['symbol'] for series in chart['series']] == ['QQQ', 'XYZ']
+    assert chart['series'][0]['values'] == [0.0, -18.16, -16.22, -12.41]
+
+    query = database.select(database.func.count(PriceHistory.id)).where(PriceHistory.stock_symbol == 'QQQ')
+    assert database.session.execute(query).scalar() == 4
+
+    response = test_client.get('/api/stocks/compare?symbols=QQQ&points=2')
+    assert response.get_json()['labels'] == ['2020-02-24', '2020-07-20']
+
+
+def test_get_compare_stocks_api_invalid_symbols(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/api/stocks/compare' page is retrieved (GET) with invalid or too many symbols
+    THEN check that a 400 error is returned as JSON
+    """
+    response = test_client.get('/api/stocks/compare?symbols=AAPL,MSFT1')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Stock symbols must be 1-5 characters'}
+    assert test_client.get('/api/stocks/compare?symbols=' + ','.join(SYMBOLS[:9])).status_code == 400
+    assert test_client.get('/api/stocks/compare?symbols=AAPL&base=yesterday').status_code == 400
+
+
+def test_get_compare_stocks_page(test_client, add_stocks_for_default_user, mock_requests_get_success_weekly):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database
+    WHEN the '/stocks/compare' page is retrieved (GET)
+    THEN check that the chart of the user's stocks is displayed
+    """
+    response = test_client.get('/stocks/compare')
+    assert response.status_code == 200
+    assert b'Compare Stocks' in response.data
+    assert b'canvas id="compareChart"' in response.data
+
+
+def test_get_compare_stocks_page_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the '/stocks/compare' page is retrieved (GET) when the user is not logged in
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/stocks/compare', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Compare Stocks' not in response.data
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_get_stock_detail_page_intraday_range(test_client, add_stocks_for_default_user, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database
+    WHEN the '/stocks/3?range=1D' page is retrieved (GET)
+    THEN check that the chart of the intraday prices is displayed
+    """
+    class MockIntradayResponse(object):
+        status_code = 200
+
+        def json(self):
+            start = datetime.now().replace(hour=9, minute=30, second=0, microsecond=0) - timedelta(days=1)
+            bars = [start + timedelta(minutes=5 * bar) for bar in range(78)]
+            return {'Time Series (5min)': {bar.isoformat(sep=' '): {'4. close': '150.0000'} for bar in bars}}
+
+    monkeypatch.setattr(requests, 'get', lambda url, timeout=None: MockIntradayResponse())
+    response = test_client.get('/stocks/3?range=1d')
+    assert response.status_code == 200
+    assert b'canvas id="stockChart"' in response.data
+    assert b'Intraday Prices' in response.data
+    assert b' 09:30"' in response.data
+
+
+def test_cli_ingest_eod(test_client, add_stocks_for_default_user, tmp_path):
+    """
+    GIVEN a Flask application configured for testing with the default set of stocks in the database
+    WHEN the 'flask stocks ingest-eod' command is run twice with a gzip-compressed end-of-day file
+    THEN check that the closes of the held symbols are upserted and the current prices are updated
+    """
+    yesterday = date.today() - timedelta(days=1)
+    day_before = yesterday - timedelta(days=1)
+    path = str(tmp_path / 'eod.csv.gz')
+
+    def write_eod_file(sam_close):
+        with gzip.open(path, 'wt') as file:
+            file.write('symbol,date,close\n'
+                       f'SAM,{day_before},310.00\n'
+                       f'SAM,{yesterday},{sam_close}\n'
+                       f'COST,{yesterday},20.50\n'
+                       f'NOTHELD,{yesterday},1.00\n')
+
+    runner = test_client.application.test_cli_runner()
+    write_eod_file('315.25')
+    result = runner.invoke(args=['stocks', 'ingest-eod', path])
+    assert result.exit_code == 0
+    assert 'Ingested 3 of 4 rows (2 symbols' in result.output
+    assert 'rows/s' in result.output
+
+    write_eod_file('316.00')
+    result = runner.invoke(args=['stocks', 'ingest-eod', path, '--batch-size', '2'])
+    assert result.exit_code == 0
+
+    query = database.select(PriceBar.close).where(PriceBar.stock_symbol == 'SAM', PriceBar.resolution == 'daily')
+    assert sorted(database.session.execute(query).scalars()) == [3100000, 3160000]
+    query = database.select(PriceBar).where(PriceBar.stock_symbol == 'NOTHELD')
+    assert database.session.execute(query).first() is None
+    query = database.select(PriceHistory.close).where(PriceHistory.stock_symbol == 'COST')
+    assert 205000 in database.session.execute(query).scalars().all()
+
+    query = database.select(Stock).where(Stock.stock_symbol == 'SAM')
+    for stock in database.session.execute(query).scalars():
+        assert stock.current_price == 3160000
+        assert stock.position_value == position_value(3160000, stock.number_of_shares)
+        assert stock.current_price_date.date() == date.today()
+
+
+def test_stream_stock_prices(test_client, add_stocks_for_default_user, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database with prices from yesterday
+    WHEN the '/stocks/stream' page is requested (GET)
+    THEN check that an event with the new prices and position values is sent
+    """
+    yesterday = datetime.now() - timedelta(days=1)
+    database.session.execute(database.update(Stock).values(current_price=123400, current_price_date=yesterday))
+    database.session.commit()
+
+    response = test_client.get('/stocks/stream', buffered=True)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    event, data = response.get_data(as_text=True).strip().split('\n')
+    assert event == 'event: prices'
+    prices = json.loads(data.removeprefix('data: '))
+    assert all(stock['current_price'] == 148.34 for stock in prices['stocks'])
+    stored_prices = test_client.get('/api/stocks/prices').get_json()
+    assert [stock['id'] for stock in prices['stocks']] == [stock['id'] for stock in stored_prices['stocks']]
+    assert [stock['position_value'] for stock in prices['stocks']] == \
+        [stock['position_value'] for stock in stored_prices['stocks']]
+    assert prices['value'] == stored_prices['value']
+
+
+def test_stream_stock_prices_display(test_client, add_stocks_for_default_user, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database with prices from yesterday
+    WHEN the '/stocks/stream' page is requested (GET)
+    THEN check that the amounts of the event are also sent formatted as on the page (with two decimal places)
+    """
+    yesterday = datetime.now() - timedelta(days=1)
+    database.session.execute(database.update(Stock).values(current_price=123400, current_price_date=yesterday))
+    database.session.commit()
+
+    response = test_client.get('/stocks/stream', buffered=True)
+    _, data = response.get_data(as_text=True).strip().split('\n')
+    prices = json.loads(data.removeprefix('data: '))
+    for stock in prices['stocks']:
+        stored_stock = database.session.get(Stock, stock['id'])
+        assert stock['current_price_display'] == '148.34'
+        assert stock['position_value_display'] == format_amount(stored_stock.position_value)
+        assert re.fullmatch(r'\d+\.\d{2}', stock['position_value_display'])
+    total = sum(database.session.get(Stock, stock['id']).position_value for stock in prices['stocks'])
+    assert prices['value_display'] == format_amount(total)
+    assert re.fullmatch(r'\d+\.\d{2}', prices['value_display'])
+
+
+def test_stream_stock_prices_unchanged(test_client, add_stocks_for_default_user, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database with the current prices
+    WHEN the '/stocks/stream' page is requested (GET)
+    THEN check that only a heartbeat is sent
+    """
+    database.session.execute(database.update(Stock).values(current_price=1483400, current_price_date=datetime.now()))
+    database.session.commit()
+
+    response = test_client.get('/stocks/stream', buffered=True)
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == ': heartbeat\n\n'
+
+
+def test_stream_stock_prices_without_database_connection(test_client, add_stocks_for_default_user,
+                                                       mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and the default set of stocks in the database with prices from yesterday
+    WHEN the '/stocks/stream' page is requested (GET) and its events are read
+    THEN check that no database connection is checked out while the stream is open
+    """
+    yesterday = datetime.now() - timedelta(days=1)
+    database.session.execute(database.update(Stock).values(current_price=123400, current_price_date=yesterday))
+    database.session.commit()
+
+    checked_out = set()
+
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_out.add(id(connection_record))
+
+    def checkin(dbapi_connection, connection_record):
+        checked_out.discard(id(connection_record))
+
+    sa.event.listen(database.engine, 'checkout', checkout)
+    sa.event.listen(database.engine, 'checkin', checkin)
+    try:
+        response = test_client.get('/stocks/stream', buffered=False)
+        assert response.status_code == 200
+        assert not checked_out
+        events = []
+        for chunk in response.response:
+            # The quotes are refreshed in the stream, with a connection that is checked in again
+            assert not checked_out
+            events.append(chunk)
+        response.close()
+    finally:
+        sa.event.remove(database.engine, 'checkout', checkout)
+        sa.event.remove(database.engine, 'checkin', checkin)
+    assert b''.join(events).startswith(b'event: prices')
+
+
+def test_stream_stock_prices_limit(test_client, add_stocks_for_default_user, mock_requests_get_success_quote,
+                                   monkeypatch):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and a limit of one stream per worker
+    WHEN the '/stocks/stream' page is requested (GET) while a stream is open, and after it is closed
+    THEN check that the client is told to reconnect later while the stream is open
+    """
+    monkeypatch.setattr(test_client.application.extensions['stream_limiter'], 'max_streams', 1)
+    open_response = test_client.get('/stocks/stream', buffered=False)
+
+    response = test_client.get('/stocks/stream', buffered=True)
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == 'retry: 30000\n\n'
+
+    open_response.close()
+    response = test_client.get('/stocks/stream', buffered=True)
+    assert not response.get_data(as_text=True).startswith('retry:')
+
+
+def test_stream_stock_prices_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing and the user not logged in
+    WHEN the '/stocks/stream' page is requested (GET)
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/stocks/stream', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Please log in to access this page.' in response.data
+
+
+@pytest.fixture(scope='function')
+def symbol_listings(test_client, monkeypatch):
+    listings = [('AAPL', 'Apple Inc.'), ('COST', 'Costco Wholesale Corporation'), ('SAM', 'Boston Beer Company')]
+    monkeypatch.setitem(test_client.application.extensions, 'symbol_index', SymbolIndex.from_listings(listings))
+
+
+def test_get_symbols_api(test_client, log_in_default_user, symbol_listings):
+    """
+    GIVEN a Flask application configured for testing with a symbol listing, with the default user logged in
+    WHEN the '/api/symbols' page is requested (GET) with a prefix of a symbol and of a company name
+    THEN check that the matching listings are returned
+    """
+    response = test_client.get('/api/symbols?q=co')
+    assert response.status_code == 200
+    assert response.get_json() == {'symbols': [{'symbol': 'COST', 'name': 'Costco Wholesale Corporation'},
+                                               {'symbol': 'SAM', 'name': 'Boston Beer Company'}]}
+    assert test_client.get('/api/symbols?q=co&limit=1').get_json()['symbols'][0]['symbol'] == 'COST'
+    assert test_client.get('/api/symbols').get_json() == {'symbols': []}
+
+
+def test_post_add_stock_unlisted_symbol(test_client, log_in_default_user, symbol_listings):
+    """
+    GIVEN a Flask application configured for testing with a symbol listing, with the default user logged in
+    WHEN a stock with a symbol that is not listed is added (POST)
+    THEN check that an error message is displayed and the stock is not added
+    """
+    response = test_client.post('/add_stock', data={'stock_symbol': 'APPL',
+                                                    'number_of_shares': '10',
+                                                    'purchase_price': '150.00',
+                                                    'purchase_date': '2021-03-04'}, follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Error! APPL is not a listed stock symbol' in response.data
+    query = database.select(database.func.count(Stock.id)).where(Stock.stock_symbol == 'APPL')
+    assert database.session.execute(query).scalar() == 0
+
+
+def test_cli_build_symbol_index(test_client, tmp_path):
+    """
+    GIVEN a Flask application configured for testing and a listing file
+    WHEN the 'flask stocks build-symbol-index' command is run
+    THEN check that the index file is written and can be searched
+    """
+    listing_path = tmp_path / 'symbols.csv'
+    listing_path.write_text('symbol,name\nAAPL,Apple Inc.\nMSFT,Microsoft Corporation\n')
+    index_path = str(tmp_path / 'symbols.idx')
+
+    runner = test_client.application.test_cli_runner()
+    result = runner.invoke(args=['stocks', 'build-symbol-index', '--listing', str(listing_path),
+                                 '--output', index_path])
+    assert result.exit_code == 0
+    assert 'Indexed 2 symbols' in result.output
+    assert SymbolIndex.from_file(index_path).search('micro') == [{'symbol': 'MSFT', 'name': 'Microsoft Corporation'}]
+
+
+def test_post_add_stock_page_fractional_shares(test_client, log_in_default_user, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the '/add_stock' page is posted to (POST) with a fractional number of shares
+    THEN check that the number of shares is stored exactly and that the position value is rounded to a money unit
+    """
+    response = test_client.post('/add_stock',
+                                data={'stock_symbol': 'AAPL',
+                                      'number_of_shares': '2.123457',
+                                      'purchase_price': '432.17',
+                                      'purchase_date': '2025-07-10'},
+                                follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Added new stock (AAPL)!' in response.data
+    assert b'2.123457' in response.data
+    stock = database.session.execute(database.select(Stock).where(Stock.number_of_shares == 2123457)).scalar_one()
+    # 2.123457 shares at $148.34 = $314.99361138
+    assert stock.position_value == 3149936
+    assert b'$314.99' in response.data
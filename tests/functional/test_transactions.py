@@ -0,0 +1,153 @@
+"""
+This file (test_transactions.py) contains the functional tests for the transaction ledger.
+"""
+from project import database
+from project.models import RealizedGain, TaxLot, Transaction
+from datetime import datetime, timedelta
+import time
+
+
+def record(test_client, **data):
+    return test_client.post('/stocks/transactions', data=data, follow_redirects=True)
+
+
+def test_get_transactions_page(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/stocks/transactions' page is requested (GET)
+    THEN check the response is valid
+    """
+    response = test_client.get('/stocks/transactions')
+    assert response.status_code == 200
+    assert b'Gains' in response.data
+    assert b'Record a Transaction' in response.data
+
+
+def test_get_transactions_page_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the '/stocks/transactions' page is requested (GET) by a user who is NOT LOGGED in
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/stocks/transactions', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_post_transaction_invalid(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN a buy without a number of shares, a buy of a fractional share, and a sell of shares that are not held,
+         are recorded (POST)
+    THEN check that error messages are displayed and the transactions are not recorded
+    """
+    response = record(test_client, stock_symbol='IBM', kind='buy', date='2023-01-02', price='100')
+    assert b'Error! Invalid transaction (Value error, Number of shares must be positive)' in response.data
+
+    response = record(test_client, stock_symbol='IBM', kind='buy', date='2023-01-02', quantity='2.5', price='100')
+    assert b'Error! Invalid transaction (Value error, Number of shares must be a whole number)' in response.data
+
+    response = record(test_client, stock_symbol='IBM', kind='sell', date='2023-01-02', quantity='5', price='100')
+    assert b'Error! Only 0 shares of IBM can be sold on 2023-01-02 (5 requested)' in response.data
+    assert database.session.execute(database.select(database.func.count(Transaction.id))).scalar() == 0
+
+
+def test_post_transactions_realized_gains(test_client, log_in_default_user, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN two buys, a FIFO sell, and a dividend of IBM are recorded (POST)
+    THEN check the realized gains, the dividends, and the unrealized gain at the stored quote
+    """
+    record(test_client, stock_symbol='ibm', kind='buy', date='2023-01-02', quantity='10', price='100')
+    record(test_client, stock_symbol='IBM', kind='buy', date='2023-02-01', quantity='10', price='120')
+    response = record(test_client, stock_symbol='IBM', kind='sell', date='2023-03-01', quantity='15',
+                      price='130', lot_method='fifo')
+    assert b'Recorded transaction (Sell 15 shares of IBM at $130.00)!' in response.data
+    record(test_client, stock_symbol='IBM', kind='dividend', date='2023-03-10', price='1.5')
+
+    response = test_client.get('/api/gains')
+    assert response.status_code == 200
+    assert response.json['gains'] == [{'stock_symbol': 'IBM', 'shares': 5, 'cost': 600.0, 'price': 148.34,
+                                       'market_value': 741.7, 'unrealized': 141.7, 'realized': 350.0,
+                                       'dividends': 7.5}]
+
+
+def test_post_transaction_back_dated(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in and a ledger of IBM
+    WHEN a 2-for-1 split is recorded (POST) before the sell
+    THEN check that the ledger is replayed, so the sell and the dividend apply to the split shares
+    """
+    response = record(test_client, stock_symbol='IBM', kind='split', date='2023-01-15', split_numerator='2',
+                      split_denominator='1')
+    assert b'Recorded transaction (IBM 2-for-1 split)!' in response.data
+
+    query = database.select(TaxLot.quantity, TaxLot.cost).order_by(TaxLot.acquired_on)
+    assert database.session.execute(query).all() == [(5, 2500000), (10, 12000000)]
+    query = (database.select(RealizedGain.lot_transaction_id, RealizedGain.quantity, RealizedGain.gain)
+             .order_by(RealizedGain.id))
+    assert database.session.execute(query).all() == [(1, 15, 12000000), (None, 15, 225000)]
+
+
+def test_post_transaction_split_fractional_shares(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in and lots of 5 and 10 IBM shares
+    WHEN a 1-for-2 reverse split is recorded (POST)
+    THEN check that an error message is displayed and that the lots are not changed, as the ledger holds whole shares
+    """
+    response = record(test_client, stock_symbol='IBM', kind='split', date='2023-12-01', split_numerator='1',
+                      split_denominator='2')
+    assert b'Error! The IBM 1-for-2 split on 2023-12-01 would leave fractional shares' in response.data
+
+    query = database.select(TaxLot.quantity).order_by(TaxLot.acquired_on)
+    assert database.session.execute(query).scalars().all() == [5, 10]
+
+
+def test_post_transaction_specific_lot(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in and a ledger of IBM
+    WHEN the shares of a specific lot are sold (POST), and then a split is recorded
+    THEN check that only that lot is sold, and that the remaining lot is split
+    """
+    lot_transaction_id = database.session.execute(
+        database.select(Transaction.id).where(Transaction.kind == Transaction.BUY).order_by(Transaction.date.desc())
+    ).scalars().first()
+    response = record(test_client, stock_symbol='IBM', kind='sell', date='2023-04-01', quantity='10', price='100',
+                      lot_method='specific', lot_transaction_id=str(lot_transaction_id))
+    assert b'Recorded transaction (Sell 10 shares of IBM at $100.00)!' in response.data
+    assert b'SPECIFIC (buy ' in response.data
+    query = database.select(TaxLot.transaction_id, TaxLot.quantity, TaxLot.cost)
+    assert database.session.execute(query).all() == [(1, 5, 2500000)]
+
+    response = record(test_client, stock_symbol='IBM', kind='split', date='2023-05-01', split_numerator='3',
+                      split_denominator='1')
+    assert b'Recorded transaction (IBM 3-for-1 split)!' in response.data
+    assert database.session.execute(query).all() == [(1, 15, 2500000)]
+
+
+def test_record_many_transactions(test_client, log_in_default_user, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in and 100,000 buys of MSFT
+    WHEN a sell of MSFT is recorded (POST) and the gains are requested
+    THEN check that the requests are quick, as only the open lots of the symbol are updated
+    """
+    user_id = database.session.execute(database.select(Transaction.user_id)).scalars().first()
+    database.session.execute(database.insert(Transaction), [
+        {'user_id': user_id, 'stock_symbol': 'MSFT', 'kind': Transaction.BUY,
+         'date': datetime(2000, 1, 1) + timedelta(minutes=index), 'quantity': 1, 'price': 1000000}
+        for index in range(100000)])
+    database.session.execute(database.insert(TaxLot).from_select(
+        ['user_id', 'stock_symbol', 'transaction_id', 'acquired_on', 'quantity', 'cost'],
+        database.select(Transaction.user_id, Transaction.stock_symbol, Transaction.id, Transaction.date,
+                        Transaction.quantity, Transaction.price).where(Transaction.stock_symbol == 'MSFT')))
+    database.session.commit()
+
+    start = time.perf_counter()
+    response = record(test_client, stock_symbol='MSFT', kind='sell', date='2001-02-01', quantity='3', price='120',
+                      lot_method='fifo')
+    assert b'Recorded transaction (Sell 3 shares of MSFT at $120.00)!' in response.data
+    response = test_client.get('/api/gains')
+    assert time.perf_counter() - start < 5.0
+    msft_gains = [symbol_gains for symbol_gains in response.json['gains'] if symbol_gains['stock_symbol'] == 'MSFT']
+    assert msft_gains[0]['shares'] == 99997
+    assert msft_gains[0]['realized'] == 60.0
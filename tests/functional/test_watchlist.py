@@ -0,0 +1,124 @@
+"""
+This file (test_watchlist.py) contains the functional tests for the watchlists.
+"""
+from project import database
+from project.models import Quote, User, WatchlistItem
+from tests.conftest import MockSuccessResponseQuote
+from tests.query_counter import max_queries
+import requests
+
+
+def test_get_watchlist_page(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN the '/stocks/watchlist' page is requested (GET)
+    THEN check the response is valid
+    """
+    response = test_client.get('/stocks/watchlist')
+    assert response.status_code == 200
+    assert b'Watchlist' in response.data
+    assert b'Watch a Stock' in response.data
+
+
+def test_get_watchlist_page_not_logged_in(test_client):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the '/stocks/watchlist' page is requested (GET) by a user who is NOT LOGGED in
+    THEN check that the user is redirected to the login page
+    """
+    response = test_client.get('/stocks/watchlist', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Please log in to access this page.' in response.data
+
+
+def test_post_watchlist_item(test_client, log_in_default_user, mock_requests_get_success_quote):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN a symbol is added to the watchlist (POST) twice
+    THEN check that the symbol is displayed with its price, and that it is only added once
+    """
+    response = test_client.post('/stocks/watchlist', data={'stock_symbol': 'nflx'}, follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Added NFLX to your watchlist!' in response.data
+    assert b'$148.34' in response.data
+    assert b'<span class="stale-price"' not in response.data
+
+    response = test_client.post('/stocks/watchlist', data={'stock_symbol': 'NFLX'}, follow_redirects=True)
+    assert b'NFLX is already in your watchlist' in response.data
+    query = database.select(database.func.count(WatchlistItem.id)).where(WatchlistItem.stock_symbol == 'NFLX')
+    assert database.session.execute(query).scalar() == 1
+
+
+def test_post_watchlist_item_invalid(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+    WHEN an invalid symbol is added to the watchlist (POST)
+    THEN check that an error message is displayed
+    """
+    response = test_client.post('/stocks/watchlist', data={'stock_symbol': 'NFLX1'}, follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Error! Invalid stock symbol' in response.data
+
+
+@max_queries({'stocks.watchlist': 2})
+def test_get_watchlist_from_shared_quotes(test_client, log_in_second_user, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing, with the second user logged in
+          and the quote of NFLX retrieved for the default user
+    WHEN NFLX is added to the watchlist of the second user and the watchlist is requested (GET)
+    THEN check that the watchlist is served from the shared quotes (no call to the market data provider)
+    """
+    second_user = database.session.execute(database.select(User).where(User.email == 'patrick@yahoo.com')).scalar_one()
+    database.session.add(WatchlistItem('NFLX', second_user.id))
+    database.session.commit()
+    calls = []
+    monkeypatch.setattr(requests, 'get', lambda url, timeout=None: calls.append(url) or MockSuccessResponseQuote(url))
+
+    response = test_client.get('/stocks/watchlist')
+    assert response.status_code == 200
+    assert b'$148.34' in response.data
+    assert calls == []
+
+
+def test_get_watchlist_api(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and NFLX in the watchlist
+    WHEN the '/api/watchlist' page is requested (GET)
+    THEN check that the price of NFLX is returned
+    """
+    response = test_client.get('/api/watchlist')
+    assert response.status_code == 200
+    watchlist = response.get_json()['watchlist']
+    assert [(item['stock_symbol'], item['price'], item['stale']) for item in watchlist] == [('NFLX', 148.34, False)]
+
+
+def test_delete_watchlist_item(test_client, log_in_default_user):
+    """
+    GIVEN a Flask application configured for testing, with the default user logged in
+          and NFLX in the watchlist
+    WHEN NFLX is removed from the watchlist (POST)
+    THEN check that NFLX is removed, and that its shared quote is kept
+    """
+    response = test_client.get('/api/watchlist')
+    item_id = response.get_json()['watchlist'][0]['id']
+
+    response = test_client.post(f'/stocks/watchlist/{item_id}/delete', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'Removed NFLX from your watchlist!' in response.data
+    assert test_client.get('/api/watchlist').get_json()['watchlist'] == []
+    assert database.session.get(Quote, 'NFLX').price == 1483400
+
+
+def test_delete_watchlist_item_invalid_user(test_client, log_in_second_user):
+    """
+    GIVEN a Flask application configured for testing, with the second user logged in
+    WHEN a watchlist item of another user is removed (POST)
+    THEN check that a 403 error is returned
+    """
+    item = WatchlistItem('AMZN', 1)
+    database.session.add(item)
+    database.session.commit()
+
+    response = test_client.post(f'/stocks/watchlist/{item.id}/delete')
+    assert response.status_code == 403
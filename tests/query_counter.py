@@ -0,0 +1,113 @@
+"""
+Helpers for checking the number of SQL statements executed by each request.
+
+    @max_queries(4)
+    def test_get_stock_list_logged_in(test_client, ...):
+        ...
+
+fails the test if any request made by the test executes more than 4 statements.
+The limit can also be set per endpoint:
+
+    @max_queries({'stocks.list_stocks': 4, 'stocks.stock_details': 3})
+
+Statements executed outside of a request (for example, by the test itself)
+are not counted.
+"""
+from collections import namedtuple
+from flask import request, request_started, request_tearing_down
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from time import perf_counter
+import functools
+import itertools
+import threading
+
+
+RecordedStatement = namedtuple('RecordedStatement', ['request_id', 'endpoint', 'statement', 'duration'])
+
+
+class QueryRecorder(object):
+    """
+    Records every SQL statement executed while it is active, along with the
+    request (and endpoint) that executed it. Used by the tests to check the
+    number of statements executed by each request:
+
+        with QueryRecorder() as recorder:
+            test_client.get('/stocks/')
+        assert recorder.max_statements_per_request('stocks.list_stocks') <= 4
+    """
+
+    def __init__(self):
+        self.statements = []
+        self._start_key = f'query_recorder_{id(self)}'
+        self._request_ids = itertools.count()
+        self._active_request = threading.local()
+
+    def __enter__(self):
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        request_started.connect(self._request_started)
+        request_tearing_down.connect(self._request_tearing_down)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.remove(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        request_started.disconnect(self._request_started)
+        request_tearing_down.disconnect(self._request_tearing_down)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info[self._start_key] = perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = perf_counter() - conn.info.pop(self._start_key, perf_counter())
+        request_id, endpoint = getattr(self._active_request, 'value', (None, None))
+        self.statements.append(RecordedStatement(request_id, endpoint, statement, duration))
+
+    def _request_started(self, sender, **extra):
+        self._active_request.value = (next(self._request_ids), request.endpoint)
+
+    def _request_tearing_down(self, sender, **extra):
+        self._active_request.value = (None, None)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def statements_per_request(self) -> list:
+        """Return a list of (endpoint, number of statements) for each request, in order."""
+        requests = {}
+        for recorded in self.statements:
+            if recorded.request_id is not None:
+                endpoint, count = requests.get(recorded.request_id, (recorded.endpoint, 0))
+                requests[recorded.request_id] = (endpoint, count + 1)
+        return list(requests.values())
+
+    def max_statements_per_request(self, endpoint: str = None) -> int:
+        """Return the largest number of statements executed by a request (to `endpoint`)."""
+        counts = [count for request_endpoint, count in self.statements_per_request()
+                  if endpoint is None or request_endpoint == endpoint]
+        return max(counts, default=0)
+
+
+def check_query_limits(recorder: QueryRecorder, limits):
+    for endpoint, count in recorder.statements_per_request():
+        limit = limits if isinstance(limits, int) else limits.get(endpoint)
+        if limit is not None and count > limit:
+            statements = '\n    '.join(recorded.statement for recorded in recorder.statements
+                                       if recorded.endpoint == endpoint)
+            raise AssertionError(f'A request to {endpoint} executed {count} SQL statements '
+                                 f'(limit: {limit}):\n    {statements}')
+
+
+def max_queries(limits):
+    """Decorator for tests that limits the SQL statements per request (int or {endpoint: int})."""
+    def decorator(test_function):
+        @functools.wraps(test_function)
+        def wrapper(*args, **kwargs):
+            with QueryRecorder() as recorder:
+                result = test_function(*args, **kwargs)
+            check_query_limits(recorder, limits)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,77 @@
+"""
+This file (test_alerts.py) contains the unit tests for the alerts.py file.
+"""
+from project.models import PriceAlert
+from project.stocks.alerts import AlertEngine, AlertIndex
+import time
+
+
+def test_price_alert_bounds():
+    """
+    GIVEN price alerts of each kind
+    WHEN their thresholds are computed
+    THEN check the rising and falling thresholds in money units
+    """
+    assert PriceAlert('AAPL', PriceAlert.ABOVE, 1, threshold='175.50').bounds() == (1755000, None)
+    assert PriceAlert('AAPL', PriceAlert.BELOW, 1, threshold=160).bounds() == (None, 1600000)
+    assert PriceAlert('AAPL', PriceAlert.CHANGE, 1, percent=10, reference_price=1500500).bounds() == (1650550, 1350450)
+
+
+def test_price_alert_is_triggered_by():
+    """
+    GIVEN price alerts above and below $160.00
+    WHEN they are checked against prices on each side of the threshold
+    THEN check that an alert is only triggered by the prices that reach its threshold
+    """
+    above = PriceAlert('AAPL', PriceAlert.ABOVE, 1, threshold=160)
+    below = PriceAlert('AAPL', PriceAlert.BELOW, 1, threshold=160)
+    assert above.is_triggered_by(1600000) and not above.is_triggered_by(1599999)
+    assert below.is_triggered_by(1600000) and not below.is_triggered_by(1600001)
+
+
+def test_alert_index_pops_crossed_thresholds():
+    """
+    GIVEN an alert index with rising and falling thresholds
+    WHEN the price moves up and then down
+    THEN check that only the alerts whose thresholds were reached are returned, once
+    """
+    index = AlertIndex(rising=[(110, 1), (120, 2), (130, 3)], falling=[(90, 4), (80, 5)])
+    index.add(6, rising=115)
+    assert index.pop_triggered(100) == []
+    assert sorted(index.pop_triggered(120)) == [1, 2, 6]
+    assert index.pop_triggered(121) == []
+    assert index.pop_triggered(90) == [4]
+    assert sorted(index.pop_triggered(50)) == [5]
+    assert len(index) == 1
+
+
+def test_alert_engine_skips_inactive_alerts():
+    """
+    GIVEN an alert engine with a 'change' alert and a deleted alert
+    WHEN the prices cross both thresholds of the 'change' alert and the deleted alert
+    THEN check that the 'change' alert is triggered once and the deleted alert is not triggered
+    """
+    engine = AlertEngine(reload_seconds=300)
+    engine.load([(1, 'AAPL', 11000, 9000), (2, 'AAPL', 10500, None), (3, 'MSFT', None, 20000)])
+    engine.remove(2)
+    assert engine.evaluate({'AAPL': 12000, 'IBM': 100}) == {'AAPL': [1]}
+    assert engine.evaluate({'AAPL': 8000}) == {}
+    assert engine.evaluate({'MSFT': 19000}) == {'MSFT': [3]}
+
+
+def test_alert_engine_million_alerts_per_tick():
+    """
+    GIVEN an alert engine with 1,000,000 alerts for one symbol
+    WHEN the price ticks up by one cent 1,000 times
+    THEN check that the alerts are triggered in order at well under a millisecond per tick
+    """
+    engine = AlertEngine(reload_seconds=300)
+    engine.load((alert_id, 'AAPL', 10000 + alert_id, 10000 - alert_id) for alert_id in range(1, 500001))
+    assert len(engine.indexes['AAPL']) == 1000000
+
+    start = time.perf_counter()
+    triggered = [engine.evaluate({'AAPL': 10000 + tick}) for tick in range(1, 1001)]
+    elapsed = time.perf_counter() - start
+    assert triggered[0] == {'AAPL': [1]}
+    assert triggered[-1] == {'AAPL': [1000]}
+    assert elapsed / 1000 < 0.001
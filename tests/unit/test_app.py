@@ -1,6 +1,7 @@
 """
 This file (test_app.py) contains the unit tests for the Flask application
 """
+from decimal import Decimal
 from project.stocks.routes import StockModel
 import pytest
 from pydantic import ValidationError
@@ -18,8 +19,8 @@ def test_validate_stock_data_nominal():
         purchase_price='45.67'
     )
     assert stock_data.stock_symbol == 'SBUX'
-    assert stock_data.number_of_shares == 100
-    assert stock_data.purchase_price == 45.67
+    assert stock_data.number_of_shares == Decimal('100')
+    assert stock_data.purchase_price == Decimal('45.67')
 
 
 def test_validate_stock_data_invalid_stock_symbol():
@@ -45,7 +46,27 @@ def test_validate_stock_data_invalid_number_of_shares():
     with pytest.raises(ValidationError):
         StockModel(
             stock_symbol='SBUX',
-            number_of_shares='100.1231',  # Invalid!
+            number_of_shares='100.1234567',  # Invalid!
+            purchase_price='45.67'
+        )
+
+
+def test_validate_stock_data_fractional_number_of_shares():
+    """
+    GIVEN a helper class to validate the form data
+    WHEN a fractional number of shares (with up to six decimal places) is passed in
+    THEN check that the validation is successful, and that a number of shares that is not positive is rejected
+    """
+    stock_data = StockModel(
+        stock_symbol='SBUX',
+        number_of_shares='0.123456',
+        purchase_price='45.67'
+    )
+    assert stock_data.number_of_shares == Decimal('0.123456')
+    with pytest.raises(ValidationError):
+        StockModel(
+            stock_symbol='SBUX',
+            number_of_shares='0',  # Invalid!
             purchase_price='45.67'
         )
 
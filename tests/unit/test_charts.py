@@ -0,0 +1,125 @@
+"""
+This file (test_charts.py) contains the unit tests for the charts.py file.
+"""
+from project import database
+from project.stocks import timeseries
+from project.stocks.charts import (ChartCache, align_series, downsample_indices, lttb_indices, monday_of_week,
+                                   normalize, read_price_histories, refresh_price_histories)
+import numpy as np
+import requests
+
+
+def test_monday_of_week():
+    """
+    GIVEN dates on a Friday, a Thursday (holiday week), and a Monday
+    WHEN the Monday of their week is calculated
+    THEN check that the dates of the same week are mapped to the same Monday
+    """
+    dates = np.array(['2020-07-24', '2020-07-23', '2020-07-20'], dtype='datetime64[D]')
+    assert monday_of_week(dates).tolist() == np.array(['2020-07-20'] * 3, dtype='datetime64[D]').tolist()
+
+
+def test_align_series():
+    """
+    GIVEN the weekly prices of two stocks with different weeks
+    WHEN the series are aligned
+    THEN check that the union of the weeks is used and the missing weeks are NaN
+    """
+    histories = {'AAPL': (np.array(['2020-07-10', '2020-07-17', '2020-07-24'], dtype='datetime64[D]'),
+                          np.array([1000000, 1100000, 1200000])),
+                 'MSFT': (np.array(['2020-07-16', '2020-07-31'], dtype='datetime64[D]'),
+                          np.array([200000, 250000]))}
+    weeks, prices = align_series(histories, ['AAPL', 'MSFT'])
+    assert [str(week) for week in weeks] == ['2020-07-06', '2020-07-13', '2020-07-20', '2020-07-27']
+    np.testing.assert_array_equal(prices, [[100.0, 110.0, 120.0, np.nan],
+                                           [np.nan, 20.0, np.nan, 25.0]])
+
+
+def test_normalize():
+    """
+    GIVEN aligned prices where one stock has no price at the base week
+    WHEN the prices are normalized to the second week
+    THEN check that each series is the percent change since its first price from the base week
+    """
+    prices = np.array([[100.0, 110.0, 121.0, 99.0],
+                       [np.nan, np.nan, 20.0, 25.0]])
+    np.testing.assert_allclose(normalize(prices, 1), [[0.0, 10.0, -10.0],
+                                                      [np.nan, 0.0, 25.0]])
+
+
+def test_downsample_indices():
+    """
+    GIVEN a series of 1000 weeks
+    WHEN the series is reduced to 100 points (or to more points than the series has)
+    THEN check that the first and last weeks are kept and the indices are increasing
+    """
+    indices = downsample_indices(1000, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+    assert downsample_indices(10, 100).tolist() == list(range(10))
+
+
+def test_lttb_indices_keeps_peaks():
+    """
+    GIVEN a flat series of 1000 points with a single spike and a single dip
+    WHEN the series is downsampled to 20 points with LTTB
+    THEN check that the first and last points, the spike, and the dip are kept
+    """
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[321] = 50.0
+    y[789] = -50.0
+    indices = lttb_indices(x, y, 20)
+    assert len(indices) == 20
+    assert indices[0] == 0 and indices[-1] == 999
+    assert 321 in indices and 789 in indices
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_indices_short_series():
+    """
+    GIVEN a series that is shorter than the requested number of points
+    WHEN the series is downsampled with LTTB
+    THEN check that every point is kept
+    """
+    x = np.arange(5, dtype=np.float64)
+    assert lttb_indices(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_chart_cache_expires_and_evicts(monkeypatch):
+    """
+    GIVEN a chart cache
+    WHEN entries are added beyond the maximum number of entries or are older than their timeout
+    THEN check that the least recently used and the expired entries are not returned
+    """
+    now = [100.0]
+    monkeypatch.setattr('project.stocks.charts.time.monotonic', lambda: now[0])
+    cache = ChartCache()
+    cache.set('a', 1, timeout=10, max_entries=2)
+    cache.set('b', 2, timeout=10, max_entries=2)
+    assert cache.get('a') == 1
+    cache.set('c', 3, timeout=10, max_entries=2)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    now[0] = 111.0
+    assert cache.get('a') is None
+
+
+def test_refresh_price_histories_downloads_once(test_client, mock_requests_get_success_weekly, monkeypatch):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the weekly prices of a stock are refreshed twice
+    THEN check that the prices are only downloaded the first time and are stored once
+    """
+    calls = []
+    mock_get = requests.get
+    monkeypatch.setattr(requests, 'get', lambda url, timeout=None: calls.append(url) or mock_get(url))
+    monkeypatch.setattr(timeseries, '_last_downloads', {})
+    with test_client.application.app_context():
+        for _ in range(2):
+            refresh_price_histories(['TSRH'])
+        assert len(calls) == 1
+        dates, closes = read_price_histories(['TSRH'])['TSRH']
+        assert len(dates) == len(set(dates.tolist())) == 4
+        database.session.rollback()
@@ -0,0 +1,32 @@
+"""
+This file (test_fx.py) contains the unit tests for the fx.py file.
+"""
+from project.stocks.fx import FxMatrix
+import numpy as np
+
+
+def test_fx_matrix_factors():
+    """
+    GIVEN an FxMatrix of the rates of EUR and GBP to US dollars
+    WHEN the conversion factors of a list of currencies to a base currency are computed
+    THEN check that each currency is converted with the cross rate through US dollars
+    """
+    matrix = FxMatrix({'EUR': 1.10, 'GBP': 1.25})
+    assert matrix.currencies == ['EUR', 'GBP', 'USD']
+    np.testing.assert_allclose(matrix.factors(['USD', 'EUR', 'GBP', 'EUR'], 'USD'), [1.0, 1.10, 1.25, 1.10])
+    np.testing.assert_allclose(matrix.factors(['USD', 'EUR', 'GBP'], 'EUR'), [1.0 / 1.10, 1.0, 1.25 / 1.10])
+
+
+def test_fx_matrix_factors_without_rate():
+    """
+    GIVEN an FxMatrix of the rate of EUR to US dollars
+    WHEN the conversion factors of currencies without a rate (or to a base currency without a rate) are computed
+    THEN check that their factors are NaN
+    """
+    matrix = FxMatrix({'EUR': 1.10})
+    factors = matrix.factors(['EUR', 'JPY', 'USD'], 'USD')
+    assert factors[0] == 1.10
+    assert np.isnan(factors[1])
+    assert factors[2] == 1.0
+    assert np.isnan(matrix.factors(['USD', 'EUR'], 'CHF')).all()
+    assert len(matrix.factors([], 'USD')) == 0
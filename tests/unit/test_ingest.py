@@ -0,0 +1,39 @@
+"""
+This file (test_ingest.py) contains the unit tests for the ingest.py file.
+"""
+from datetime import date
+from project.stocks.ingest import open_eod_file, read_eod_rows
+import gzip
+import pytest
+
+
+def test_read_eod_rows_gzip(tmp_path):
+    """
+    GIVEN a gzip-compressed end-of-day file with extra columns and rows of symbols that are not held
+    WHEN the rows are read for the held symbols
+    THEN check that only the rows of the held symbols are returned and all the rows are counted
+    """
+    path = str(tmp_path / 'eod.csv.gz')
+    with gzip.open(path, 'wt') as file:
+        file.write('Date,Symbol,Open,Close\n'
+                   '2020-07-24,AAPL,370.00,379.24\n'
+                   '2020-07-24,IBM,125.00,125.79\n'
+                   '2020-07-24,msft,200.00,201.30\n')
+    statistics = {}
+    with open_eod_file(path) as file:
+        rows = list(read_eod_rows(file, {'AAPL', 'MSFT'}, statistics))
+    assert rows == [('AAPL', date(2020, 7, 24), 3792400), ('MSFT', date(2020, 7, 24), 2013000)]
+    assert statistics['rows_read'] == 3
+
+
+def test_read_eod_rows_missing_column(tmp_path):
+    """
+    GIVEN an end-of-day file without a close column
+    WHEN the rows are read
+    THEN check that a ValueError is raised
+    """
+    path = tmp_path / 'eod.csv'
+    path.write_text('symbol,date,price\nAAPL,2020-07-24,379.24\n')
+    with open_eod_file(str(path)) as file:
+        with pytest.raises(ValueError):
+            list(read_eod_rows(file, {'AAPL'}, {}))
@@ -0,0 +1,36 @@
+"""
+This file (test_instrumentation.py) contains the unit tests for the instrumentation.py file.
+"""
+from project.instrumentation import RequestTimings
+
+
+def test_request_timings_record():
+    """
+    GIVEN a RequestTimings object
+    WHEN multiple calls are recorded for the same metric
+    THEN check that the count and the total duration are accumulated
+    """
+    request_timings = RequestTimings()
+    request_timings.record('db', 0.002)
+    request_timings.record('db', 0.003)
+    request_timings.record('cache-hit')
+    assert request_timings.count('db') == 2
+    assert abs(request_timings.duration('db') - 0.005) < 1e-9
+    assert request_timings.count('cache-hit') == 1
+    assert request_timings.count('market-data') == 0
+
+
+def test_request_timings_server_timing_header():
+    """
+    GIVEN a RequestTimings object with recorded metrics
+    WHEN the Server-Timing header is generated
+    THEN check that each metric and the total time are included
+    """
+    request_timings = RequestTimings()
+    request_timings.record('db', 0.0125)
+    request_timings.record('market-data', 0.250)
+    header = request_timings.server_timing_header()
+    assert 'db;dur=12.50;desc="1"' in header
+    assert 'market-data;dur=250.00;desc="1"' in header
+    assert header.split(', ')[-1].startswith('total;dur=')
+    assert request_timings.as_dict()['db'] == {'count': 1, 'ms': 12.5}
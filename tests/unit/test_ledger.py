@@ -0,0 +1,107 @@
+"""
+This file (test_ledger.py) contains the unit tests for the ledger.py file.
+"""
+from datetime import datetime
+from project.models import RealizedGain, Transaction
+from project.stocks.ledger import apply_transaction
+import pytest
+
+
+def make_transaction(transaction_id: int, kind: str, day: int, **kwargs) -> Transaction:
+    transaction = Transaction('AAPL', kind, 1, datetime(2023, 1, day), **kwargs)
+    transaction.id = transaction_id
+    return transaction
+
+
+def buy_lots() -> list:
+    """Return the open lots of two buys: 10 shares at $100 and 10 shares at $150."""
+    lots = []
+    apply_transaction(make_transaction(1, Transaction.BUY, 2, quantity=10, price='100'), lots)
+    apply_transaction(make_transaction(2, Transaction.BUY, 3, quantity=10, price='150'), lots)
+    return lots
+
+
+def test_sell_fifo():
+    """
+    GIVEN two lots of a symbol
+    WHEN 15 shares are sold first in, first out
+    THEN check that the first lot is sold and then half of the second lot
+    """
+    lots = buy_lots()
+    sell = make_transaction(3, Transaction.SELL, 4, quantity=15, price='200', lot_method=Transaction.FIFO)
+    new_lots, gains = apply_transaction(sell, lots)
+    assert new_lots == []
+    assert [(gain['lot_transaction_id'], gain['quantity'], gain['cost'], gain['gain']) for gain in gains] == \
+        [(1, 10, 10000000, 10000000), (2, 5, 7500000, 2500000)]
+    assert [(lot.quantity, lot.cost) for lot in lots] == [(0, 0), (5, 7500000)]
+
+
+def test_sell_lifo():
+    """
+    GIVEN two lots of a symbol
+    WHEN 15 shares are sold last in, first out
+    THEN check that the second lot is sold and then half of the first lot
+    """
+    lots = buy_lots()
+    sell = make_transaction(3, Transaction.SELL, 4, quantity=15, price='200', lot_method=Transaction.LIFO)
+    _, gains = apply_transaction(sell, lots)
+    assert [(gain['lot_transaction_id'], gain['quantity'], gain['gain']) for gain in gains] == \
+        [(2, 10, 5000000), (1, 5, 5000000)]
+    assert [(lot.quantity, lot.cost) for lot in lots] == [(5, 5000000), (0, 0)]
+
+
+def test_sell_specific_lot():
+    """
+    GIVEN two lots of a symbol
+    WHEN shares of the second lot are sold, and then more shares than the second lot holds
+    THEN check that only the second lot is sold, and that a ValueError is raised for the oversell
+    """
+    lots = buy_lots()
+    sell = make_transaction(3, Transaction.SELL, 4, quantity=4, price='120', lot_method=Transaction.SPECIFIC,
+                            lot_transaction_id=2)
+    _, gains = apply_transaction(sell, lots)
+    assert [(gain['lot_transaction_id'], gain['gain']) for gain in gains] == [(2, -1200000)]
+
+    sell = make_transaction(4, Transaction.SELL, 5, quantity=7, price='120', lot_method=Transaction.SPECIFIC,
+                            lot_transaction_id=2)
+    with pytest.raises(ValueError, match='Only 6 shares of AAPL'):
+        apply_transaction(sell, lots)
+
+
+def test_split_and_dividend():
+    """
+    GIVEN two lots of a symbol
+    WHEN a 3-for-2 split and then a dividend are applied
+    THEN check that the shares are split with the same cost basis, and the dividend is paid on the split shares
+    """
+    lots = buy_lots()
+    apply_transaction(make_transaction(3, Transaction.SPLIT, 4, split_numerator=3, split_denominator=2), lots)
+    assert [(lot.quantity, lot.cost) for lot in lots] == [(15, 10000000), (15, 15000000)]
+
+    _, gains = apply_transaction(make_transaction(4, Transaction.DIVIDEND, 5, price='0.25'), lots)
+    assert [(gain['kind'], gain['quantity'], gain['proceeds'], gain['gain']) for gain in gains] == \
+        [(RealizedGain.DIVIDEND, 30, 75000, 75000)]
+
+
+def test_split_fractional_shares():
+    """
+    GIVEN two lots of 10 shares of a symbol
+    WHEN a 1-for-3 reverse split is applied
+    THEN check that a ValueError is raised and that the lots are not changed, as the ledger holds whole shares
+    """
+    lots = buy_lots()
+    split = make_transaction(3, Transaction.SPLIT, 4, split_numerator=1, split_denominator=3)
+    with pytest.raises(ValueError, match='The AAPL 1-for-3 split on 2023-01-04 would leave fractional shares'):
+        apply_transaction(split, lots)
+    assert [lot.quantity for lot in lots] == [10, 10]
+
+
+def test_sell_more_than_held():
+    """
+    GIVEN no lots of a symbol
+    WHEN shares are sold
+    THEN check that a ValueError is raised
+    """
+    sell = make_transaction(1, Transaction.SELL, 4, quantity=1, price='200', lot_method=Transaction.FIFO)
+    with pytest.raises(ValueError, match='Only 0 shares of AAPL can be sold on 2023-01-04'):
+        apply_transaction(sell, [])
@@ -0,0 +1,97 @@
+"""
+This file (test_logs.py) contains the unit tests for the logs.py file.
+"""
+from project.logs import JsonFormatter, SamplingFilter, add_queue_handler, remove_queue_handlers
+from logging.handlers import QueueHandler
+import json
+import logging
+
+
+def make_record(message, **extra):
+    record = logging.LogRecord('project', logging.INFO, 'routes.py', 42, message, None, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_json_formatter():
+    """
+    GIVEN a JsonFormatter
+    WHEN a log record with an extra field is formatted
+    THEN check that a single line of JSON is created with the message and the extra field
+    """
+    output = JsonFormatter().format(make_record('Added new stock (AAPL)!', user_id=17))
+    assert '\n' not in output
+    log_entry = json.loads(output)
+    assert log_entry['message'] == 'Added new stock (AAPL)!'
+    assert log_entry['level'] == 'INFO'
+    assert log_entry['line'] == 42
+    assert log_entry['user_id'] == 17
+
+
+def test_sampling_filter():
+    """
+    GIVEN a SamplingFilter
+    WHEN records with and without the sampled flag are filtered
+    THEN check that only the sampled records are dropped
+    """
+    assert SamplingFilter(0.0).filter(make_record('Calling before_request()...', sampled=True)) is False
+    assert SamplingFilter(1.0).filter(make_record('Calling before_request()...', sampled=True)) is True
+    assert SamplingFilter(0.0).filter(make_record('Logged in user')) is True
+
+
+def test_queue_handler_writes_in_background():
+    """
+    GIVEN a logger with a queue handler
+    WHEN a message is logged and the queue listener is stopped
+    THEN check that the message was written by the target handler
+    """
+    class ListHandler(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.messages = []
+
+        def emit(self, record):
+            self.messages.append(record.getMessage())
+
+    logger = logging.getLogger('test_queue_handler')
+    target_handler = ListHandler()
+    listener = add_queue_handler(logger, target_handler)
+    logger.warning('Queued message')
+    listener.stop()
+    assert target_handler.messages == ['Queued message']
+
+    remove_queue_handlers(logger)
+    assert not any(isinstance(handler, QueueHandler) for handler in logger.handlers)
+
+
+def test_queue_handler_keeps_exception():
+    """
+    GIVEN a logger with a queue handler whose target handler formats the records as JSON
+    WHEN an exception is logged with logger.exception() and the queue listener is stopped twice
+    THEN check that the traceback is written in the 'exception' field, not in the message
+    """
+    class ListHandler(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.lines = []
+
+        def emit(self, record):
+            self.lines.append(self.format(record))
+
+    logger = logging.getLogger('test_queue_handler_exception')
+    target_handler = ListHandler()
+    target_handler.setFormatter(JsonFormatter())
+    listener = add_queue_handler(logger, target_handler)
+    try:
+        raise ValueError('Invalid price')
+    except ValueError:
+        logger.exception('Could not parse the price of %s', 'AAPL')
+    listener.stop()
+    listener.stop()
+
+    log_entry = json.loads(target_handler.lines[0])
+    assert log_entry['message'] == 'Could not parse the price of AAPL'
+    assert 'Traceback' in log_entry['exception']
+    assert 'ValueError: Invalid price' in log_entry['exception']
+    remove_queue_handlers(logger)
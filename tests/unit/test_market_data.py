@@ -0,0 +1,147 @@
+"""
+This file (test_market_data.py) contains the unit tests for the market data providers (project/market_data).
+"""
+from datetime import datetime
+from decimal import Decimal
+from flask import Flask
+from project.market_data import DAILY, INTRADAY, WEEKLY, create_provider
+from project.market_data.alpha_vantage import AlphaVantageProvider, parse_bars, parse_dividends
+from project.market_data.local import LocalProvider
+import os
+import pytest
+import requests
+import sqlite3
+
+
+def write_csv(path, rows):
+    path.write_text('symbol,timestamp,close\n' + ''.join(f'{row}\n' for row in rows))
+
+
+def test_parse_bars():
+    """
+    GIVEN an Alpha Vantage intraday time series (latest bar first)
+    WHEN the bars are parsed
+    THEN check that the bars are sorted by time and the prices are in money units
+    """
+    series = {'2020-07-24 16:00:00': {'4. close': '379.2400'},
+              '2020-07-24 15:55:00': {'4. close': '379.0100'}}
+    assert parse_bars(series) == [(datetime(2020, 7, 24, 15, 55), 3790100), (datetime(2020, 7, 24, 16, 0), 3792400)]
+
+
+def test_parse_dividends():
+    """
+    GIVEN an Alpha Vantage weekly adjusted time series with a dividend in one week
+    WHEN the dividends are parsed
+    THEN check that only the week with a dividend is returned, in money units
+    """
+    series = {'2020-08-07': {'4. close': '444.4500', '7. dividend amount': '0.8200'},
+              '2020-07-31': {'4. close': '425.0400', '7. dividend amount': '0.0000'},
+              '2020-07-24': {'4. close': '370.4600'}}
+    assert parse_dividends(series) == {datetime(2020, 8, 7): 8200}
+
+
+def test_create_provider():
+    """
+    GIVEN Flask applications configured with each market data provider
+    WHEN the provider is created
+    THEN check that the configured provider is used and an unknown provider is an error
+    """
+    app = Flask(__name__)
+    app.config.update(MARKET_DATA_PROVIDER='alpha_vantage', MARKET_DATA_PATH='prices')
+    assert isinstance(create_provider(app), AlphaVantageProvider)
+    app.config['MARKET_DATA_PROVIDER'] = 'local'
+    assert create_provider(app).path == 'prices'
+    app.config['MARKET_DATA_PROVIDER'] = 'bloomberg'
+    with pytest.raises(ValueError):
+        create_provider(app)
+
+
+def test_alpha_vantage_provider_timeout(monkeypatch):
+    """
+    GIVEN an Alpha Vantage provider and an API that does not respond in time
+    WHEN a quote, exchange rates, and a time series are retrieved
+    THEN check that the requests are sent with the configured timeout and that the timeouts are handled as failures
+    """
+    timeouts = []
+
+    def mock_get(url, timeout=None):
+        timeouts.append(timeout)
+        raise requests.exceptions.ReadTimeout(url)
+
+    monkeypatch.setattr(requests, 'get', mock_get)
+    app = Flask(__name__)
+    app.config.update(ALPHA_VANTAGE_BASE_URL='https://www.alphavantage.co/query', ALPHA_VANTAGE_API_KEY='demo',
+                      MARKET_DATA_TIMEOUT=2.5)
+    provider = AlphaVantageProvider()
+    with app.app_context():
+        assert provider.get_quote('AAPL') == Decimal(0)
+        assert provider.get_fx_rates(['EUR']) == {}
+        assert provider.get_history('AAPL', DAILY) is None
+        assert provider.get_weekly_history('AAPL') is None
+    assert timeouts == [2.5, 2.5, 2.5, 2.5]
+
+
+def test_local_provider_csv_files(tmp_path):
+    """
+    GIVEN a directory with daily and weekly CSV price files
+    WHEN the quotes and the histories are retrieved
+    THEN check that the latest price of the finest resolution is used and the bars are sorted
+    """
+    write_csv(tmp_path / 'daily.csv', ['AAPL,2020-07-24,379.24', 'AAPL,2020-07-23,371.38'])
+    write_csv(tmp_path / 'weekly.csv', ['AAPL,2020-07-17,362.76', 'msft,2020-07-17,202.88'])
+    provider = LocalProvider(str(tmp_path))
+    assert provider.get_quote('AAPL') == Decimal('379.24')
+    assert provider.get_quotes(['AAPL', 'MSFT', 'IBM']) == {'AAPL': Decimal('379.24'), 'MSFT': Decimal('202.88'), 'IBM': 0}
+    assert provider.get_history('AAPL', DAILY) == [(datetime(2020, 7, 23), 3713800), (datetime(2020, 7, 24), 3792400)]
+    assert provider.get_history('AAPL', INTRADAY) is None
+    assert provider.get_history('IBM', WEEKLY) is None
+
+
+def test_local_provider_reloads_changed_file(tmp_path):
+    """
+    GIVEN a directory with a daily CSV price file that has been loaded
+    WHEN the file is replaced by a new data dump
+    THEN check that the new prices are used
+    """
+    write_csv(tmp_path / 'daily.csv', ['AAPL,2020-07-24,379.24'])
+    provider = LocalProvider(str(tmp_path))
+    assert provider.get_quote('AAPL') == Decimal('379.24')
+    write_csv(tmp_path / 'daily.csv', ['AAPL,2020-07-27,384.00'])
+    os.utime(tmp_path / 'daily.csv', (0, os.path.getmtime(tmp_path / 'daily.csv') + 10))
+    assert provider.get_quote('AAPL') == Decimal('384.00')
+
+
+def test_local_provider_sqlite(tmp_path):
+    """
+    GIVEN a SQLite database with intraday and daily prices
+    WHEN the quotes and the histories are retrieved
+    THEN check that the latest intraday price is used as the quote
+    """
+    database_path = str(tmp_path / 'prices.db')
+    with sqlite3.connect(database_path) as connection:
+        connection.execute('CREATE TABLE prices (symbol TEXT, resolution TEXT, timestamp TEXT, close REAL)')
+        connection.executemany('INSERT INTO prices VALUES (?, ?, ?, ?)',
+                               [('AAPL', 'intraday', '2020-07-24 15:55:00', 379.01),
+                                ('AAPL', 'intraday', '2020-07-24 16:00:00', 379.24),
+                                ('AAPL', 'daily', '2020-07-23', 371.38),
+                                ('MSFT', 'daily', '2020-07-23', 202.54)])
+    provider = LocalProvider(database_path)
+    assert provider.get_quotes(['AAPL', 'MSFT', 'IBM']) == {'AAPL': Decimal('379.24'), 'MSFT': Decimal('202.54'), 'IBM': 0}
+    assert provider.get_history('AAPL', INTRADAY) == [(datetime(2020, 7, 24, 15, 55), 3790100),
+                                                      (datetime(2020, 7, 24, 16, 0), 3792400)]
+
+
+def test_local_provider_parquet_file(tmp_path):
+    """
+    GIVEN a directory with a weekly Parquet price file
+    WHEN the history is retrieved
+    THEN check that the dates are converted to bars
+    """
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    table = pa.table({'symbol': ['AAPL', 'AAPL'],
+                      'timestamp': [datetime(2020, 7, 24).date(), datetime(2020, 7, 17).date()],
+                      'close': [379.24, 362.76]})
+    pq.write_table(table, str(tmp_path / 'weekly.parquet'))
+    provider = LocalProvider(str(tmp_path))
+    assert provider.get_history('AAPL', WEEKLY) == [(datetime(2020, 7, 17), 3627600), (datetime(2020, 7, 24), 3792400)]
@@ -1,8 +1,9 @@
 """
 This file (test_models.py) contains the unit tests for the models.py folder
 """
-from project.models import Stock
-from datetime import datetime
+from project.market_data import WEEKLY, get_provider
+from project.models import CorporateAction, Stock
+from datetime import date, datetime
 from freezegun import freeze_time
 
 
@@ -13,8 +14,8 @@ def test_new_stock(new_stock):
     THEN check the symbol, number of shares, purchase price, and user ID fields are defined correctly.
     """
     assert new_stock.stock_symbol == 'AAPL'
-    assert new_stock.number_of_shares == 16
-    assert new_stock.purchase_price == 40678
+    assert new_stock.number_of_shares == 16_000000
+    assert new_stock.purchase_price == 4067800
     assert new_stock.user_id == 17
     assert new_stock.purchase_date.year == 2025
     assert new_stock.purchase_date.month == 7
@@ -39,12 +40,12 @@ def test_get_stock_data_success(new_stock, mock_requests_get_success_quote):
     """
     new_stock.get_stock_data()
     assert new_stock.stock_symbol == 'AAPL'
-    assert new_stock.number_of_shares == 16
-    assert new_stock.purchase_price == 40678    # $406.78
+    assert new_stock.number_of_shares == 16_000000
+    assert new_stock.purchase_price == 4067800    # $406.78
     assert new_stock.purchase_date.date() == datetime(2025, 7, 10).date()
-    assert new_stock.current_price == 14834
+    assert new_stock.current_price == 1483400
     assert new_stock.current_price_date.date() == datetime.now().date()
-    assert new_stock.position_value == (14834 * 16)
+    assert new_stock.position_value == (1483400 * 16)
     
     
 def test_get_stock_data_api_rate_limit_exceeded(new_stock, mock_requests_get_api_rate_limited_exceeded):
@@ -55,8 +56,8 @@ def test_get_stock_data_api_rate_limit_exceeded(new_stock, mock_requests_get_api
     """
     new_stock.get_stock_data()
     assert new_stock.stock_symbol == 'AAPL'
-    assert new_stock.number_of_shares == 16
-    assert new_stock.purchase_price == 40678    # $406.78
+    assert new_stock.number_of_shares == 16_000000
+    assert new_stock.purchase_price == 4067800    # $406.78
     assert new_stock.purchase_date.date() == datetime(2025, 7, 10).date()
     assert new_stock.current_price == 0
     assert new_stock.current_price_date is None
@@ -71,8 +72,8 @@ def test_get_stock_data_failure(new_stock, mock_requests_get_failure):
     """
     new_stock.get_stock_data()
     assert new_stock.stock_symbol == 'AAPL'
-    assert new_stock.number_of_shares == 16
-    assert new_stock.purchase_price == 40678    # $406.78
+    assert new_stock.number_of_shares == 16_000000
+    assert new_stock.purchase_price == 4067800    # $406.78
     assert new_stock.purchase_date.date() == datetime(2025, 7, 10).date()
     assert new_stock.current_price == 0
     assert new_stock.current_price_date is None
@@ -90,13 +91,13 @@ def test_get_stock_data_success_two_calls(new_stock, mock_requests_get_success_q
     assert new_stock.current_price_date is None
     assert new_stock.position_value == 0
     new_stock.get_stock_data()
-    assert new_stock.current_price == 14834  # $148.34 -> integer
+    assert new_stock.current_price == 1483400  # $148.34 -> integer
     assert new_stock.current_price_date.date() == datetime.now().date()
-    assert new_stock.position_value == (14834*16)
+    assert new_stock.position_value == (1483400*16)
     new_stock.get_stock_data()
-    assert new_stock.current_price == 14834  # $148.34 -> integer
+    assert new_stock.current_price == 1483400  # $148.34 -> integer
     assert new_stock.current_price_date.date() == datetime.now().date()
-    assert new_stock.position_value == (14834*16)
+    assert new_stock.position_value == (1483400*16)
     
     
 @freeze_time('2020-07-28')
@@ -106,7 +107,7 @@ def test_get_weekly_stock_data_success(new_stock, mock_requests_get_success_week
     WHEN the HTTP response is set to successful
     THEN check the HTTP response
     """
-    title, labels, values = new_stock.get_weekly_stock_data()
+    title, labels, values = new_stock.get_weekly_stock_data(get_provider().get_history('AAPL', WEEKLY))
     assert title == 'Weekly Prices (AAPL)'
     assert len(labels) == 3
     assert labels[0].date() == datetime(2020, 6, 11).date()
@@ -125,7 +126,19 @@ def test_get_weekly_stock_data_failure(new_stock, mock_requests_get_failure):
     WHEN the HTTP response is set to failed
     THEN check the HTTP response
     """
-    title, labels, values = new_stock.get_weekly_stock_data()
+    title, labels, values = new_stock.get_weekly_stock_data(get_provider().get_history('AAPL', WEEKLY) or [])
     assert title == 'Stock chart is unavailable.'
     assert len(labels) == 0
-    assert len(values) == 0
\ No newline at end of file
+    assert len(values) == 0
+
+def test_corporate_action_adjust_price():
+    """
+    GIVEN a 3-for-1 split and a 1-for-10 reverse split
+    WHEN prices from before their ex-dates are adjusted
+    THEN check that the prices are divided by the ratio of the split and rounded to the nearest money unit
+    """
+    split = CorporateAction('AAPL', date(2020, 8, 31), 3, 1)
+    assert split.adjust_price(30123) == 10041
+    assert split.adjust_price(30124) == 10041
+    assert split.adjust_price(30125) == 10042
+    assert CorporateAction('GE', date(2021, 8, 2), 1, 10).adjust_price(1305) == 13050
@@ -0,0 +1,92 @@
+"""
+This file (test_money.py) contains the unit tests for the money.py file.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from project.money import (format_amount, format_shares, position_value, SHARE_UNITS, to_decimal, to_json,
+                           to_share_units, to_units)
+import pytest
+import random
+
+
+def test_to_units():
+    """
+    GIVEN amounts of money as strings, Decimals, ints, and floats
+    WHEN they are converted to money units
+    THEN check that four decimal places are kept exactly and the rest is rounded half up
+    """
+    assert to_units('301.23') == 3012300
+    assert to_units('148.3412') == 1483412
+    assert to_units(' 0.0001 ') == 1
+    assert to_units('0.00005') == 1
+    assert to_units('-12.5') == -125000
+    assert to_units(Decimal('45.67')) == 456700
+    assert to_units(160) == 1600000
+    # The float 4.35 is 4.3499999999999996... in binary, which int(4.35 * 100) truncates to 434 cents
+    assert to_units(4.35) == 43500
+    assert to_units(0.1) == 1000
+
+
+def test_to_units_invalid():
+    """
+    GIVEN amounts of money that are not numbers
+    WHEN they are converted to money units
+    THEN check that a ValueError is raised
+    """
+    for amount in ['abc', '', '1.2.3', 'NaN', 'Infinity']:
+        with pytest.raises(ValueError):
+            to_units(amount)
+
+
+def test_format_amount():
+    """
+    GIVEN amounts of money in money units
+    WHEN they are formatted
+    THEN check that two decimal places are shown, or up to four for a sub-cent amount
+    """
+    assert format_amount(3012300) == '301.23'
+    assert format_amount(1230000) == '123.00'
+    assert format_amount(1483412) == '148.3412'
+    assert format_amount(1234560) == '123.456'
+    assert format_amount(-5000) == '-0.50'
+    assert format_amount(0) == '0.00'
+    assert to_decimal(3012300) == Decimal('301.23')
+    assert to_json(1483412) == 148.3412
+    assert to_json(None) is None
+
+
+def test_to_share_units():
+    """
+    GIVEN numbers of shares as strings, Decimals, and ints
+    WHEN they are converted to share units and formatted
+    THEN check that six decimal places are kept exactly, and that the trailing zeros are not shown
+    """
+    assert to_share_units('27') == 27_000000
+    assert to_share_units('0.125') == 125000
+    assert to_share_units(Decimal('3.141593')) == 3141593
+    assert to_share_units(5) == 5_000000
+    assert format_shares(27_000000) == '27'
+    assert format_shares(100_000000) == '100'
+    assert format_shares(125000) == '0.125'
+    assert format_shares(1) == '0.000001'
+    with pytest.raises(ValueError):
+        to_share_units('1/2')
+
+
+def test_position_value():
+    """
+    GIVEN prices in money units and numbers of shares in share units
+    WHEN the values of the positions are computed
+    THEN check that they equal the exact products rounded half up, without a product larger than 64 bits
+    """
+    assert position_value(3012300, 27_000000) == 3012300 * 27
+    assert position_value(1483400, 2_500000) == 3708500    # 2.5 shares at $148.34 = $370.85
+    assert position_value(3, 500000) == 2                  # $0.00015 is rounded half up
+    assert position_value(3, 499999) == 1
+
+    random_generator = random.Random(42)
+    for _ in range(1000):
+        price = random_generator.randint(1, 10**10)
+        shares = random_generator.randint(1, 10**13)
+        exact = (Decimal(price) * shares / SHARE_UNITS).to_integral_value(ROUND_HALF_UP)
+        assert position_value(price, shares) == exact
+        assert price * (shares % SHARE_UNITS) < 2**63
@@ -0,0 +1,42 @@
+"""
+This file (test_profiling.py) contains the unit tests for the profiling.py file.
+"""
+from project.profiling import collapse_stack, prune_profiles, write_collapsed_stacks
+from collections import Counter
+import os
+import sys
+
+
+def test_collapse_stack():
+    """
+    GIVEN the current stack frame
+    WHEN the stack is collapsed
+    THEN check that the frames are separated by semicolons with the current function last
+    """
+    collapsed = collapse_stack(sys._getframe())
+    assert collapsed.split(';')[-1].startswith('test_collapse_stack (test_profiling.py:')
+
+
+def test_write_collapsed_stacks(tmp_path):
+    """
+    GIVEN samples of collapsed stacks
+    WHEN the samples are written to a file
+    THEN check that each stack is written with its count, most common first
+    """
+    file_path = tmp_path / 'profile.folded'
+    write_collapsed_stacks(Counter({'main;list_stocks': 3, 'main;render': 7}), str(file_path))
+    assert file_path.read_text() == 'main;render 7\nmain;list_stocks 3\n'
+
+
+def test_prune_profiles(tmp_path):
+    """
+    GIVEN a folder of profiles that exceeds the disk usage limit
+    WHEN the profiles are pruned
+    THEN check that the oldest profiles are deleted
+    """
+    for index in range(5):
+        file_path = tmp_path / f'profile{index}.folded'
+        file_path.write_text('x' * 100)
+        os.utime(file_path, (1000 + index, 1000 + index))
+    prune_profiles(str(tmp_path), 250)
+    assert sorted(os.listdir(tmp_path)) == ['profile3.folded', 'profile4.folded']
@@ -0,0 +1,40 @@
+"""
+This file (test_query_counter.py) contains the unit tests for the SQL statement limits of the tests.
+"""
+from tests.query_counter import QueryRecorder, RecordedStatement, check_query_limits
+import pytest
+
+
+def make_recorder(*requests):
+    recorder = QueryRecorder()
+    for request_id, (endpoint, count) in enumerate(requests):
+        recorder.statements.extend(RecordedStatement(request_id, endpoint, 'SELECT 1', 0.001)
+                                   for _ in range(count))
+    recorder.statements.append(RecordedStatement(None, None, 'SELECT 2', 0.001))
+    return recorder
+
+
+def test_statements_per_request():
+    """
+    GIVEN a QueryRecorder with statements from two requests and one outside of a request
+    WHEN the statements per request are counted
+    THEN check that each request is counted separately and the other statement is ignored
+    """
+    recorder = make_recorder(('stocks.list_stocks', 3), ('stocks.stock_details', 2))
+    assert recorder.count == 6
+    assert recorder.statements_per_request() == [('stocks.list_stocks', 3), ('stocks.stock_details', 2)]
+    assert recorder.max_statements_per_request() == 3
+    assert recorder.max_statements_per_request('stocks.stock_details') == 2
+
+
+def test_check_query_limits():
+    """
+    GIVEN a QueryRecorder with statements from two requests
+    WHEN the limits per endpoint are checked
+    THEN check that an AssertionError is raised only when a limit is exceeded
+    """
+    recorder = make_recorder(('stocks.list_stocks', 3), ('stocks.stock_details', 2))
+    check_query_limits(recorder, {'stocks.list_stocks': 3})
+    check_query_limits(recorder, 3)
+    with pytest.raises(AssertionError, match='stocks.list_stocks executed 3 SQL statements'):
+        check_query_limits(recorder, {'stocks.list_stocks': 2})
@@ -0,0 +1,32 @@
+"""
+This file (test_quotes.py) contains the unit tests for the quotes.py file.
+"""
+from project.stocks import quotes
+from project.stocks.quotes import QuoteRefresher
+
+
+def test_quote_refresher_skips_recently_refreshed_symbols(monkeypatch):
+    """
+    GIVEN a quote refresher that runs in the request and does not retry for 60 seconds
+    WHEN the same symbols are refreshed twice
+    THEN check that the quotes of each symbol are only retrieved once
+    """
+    refreshed = []
+    monkeypatch.setattr(quotes, 'refresh_quotes', lambda symbols: refreshed.append(symbols) or {})
+    quote_refresher = QuoteRefresher(workers=0, retry_seconds=60)
+    assert quote_refresher.refresh({'MSFT', 'AAPL'}) == {'AAPL', 'MSFT'}
+    assert quote_refresher.refresh({'MSFT', 'IBM'}) == {'IBM'}
+    assert refreshed == [['AAPL', 'MSFT'], ['IBM']]
+    assert quote_refresher.in_flight == set()
+
+
+def test_quote_refresher_skips_symbols_in_flight(monkeypatch):
+    """
+    GIVEN a quote refresher with a refresh of a symbol in flight
+    WHEN the symbol is refreshed again
+    THEN check that the refresh is not scheduled
+    """
+    quote_refresher = QuoteRefresher(workers=0, retry_seconds=0)
+    quote_refresher.in_flight.add('MSFT')
+    monkeypatch.setattr(quotes, 'refresh_quotes', lambda symbols: {})
+    assert quote_refresher.refresh({'MSFT'}) == set()
@@ -0,0 +1,85 @@
+"""
+This file (test_rebalance.py) contains the unit tests for the rebalance.py file.
+"""
+from project.stocks.rebalance import compute_rebalance, water_fill
+import numpy as np
+import pytest
+import time
+
+
+def test_water_fill():
+    """
+    GIVEN the shortfalls of groups and less cash than their total
+    WHEN the cash is shared among the groups
+    THEN check that the largest shortfalls are reduced first, and that all the cash is shared
+    """
+    assert water_fill(np.array([500.0, 300.0, -100.0, 100.0]), 400.0).tolist() == [300.0, 100.0, 0.0, 0.0]
+    assert water_fill(np.array([500.0, 300.0]), 1000.0).tolist() == [500.0, 300.0]
+    assert water_fill(np.array([200.0, 200.0]), 100.0).tolist() == [50.0, 50.0]
+
+
+def test_rebalance_with_sells():
+    """
+    GIVEN two positions with equal target weights, one worth twice the other
+    WHEN the trades are computed in whole shares
+    THEN check that the sell is rounded up and the buy down, so that no cash is borrowed
+    """
+    result = compute_rebalance(np.array([10.0, 10.0]), np.array([100.0, 50.0]), np.array([0, 1]),
+                               np.array([0.5, 0.5]))
+    assert result['shares'].tolist() == [-3.0, 5.0]
+    assert result['values'].tolist() == [-300.0, 250.0]
+    assert result['cash'] == 50.0
+
+
+def test_rebalance_without_sells():
+    """
+    GIVEN two positions with equal target weights and cash to invest
+    WHEN the trades are computed without sells
+    THEN check that only the cash is invested, in whole shares, towards the targets
+    """
+    result = compute_rebalance(np.array([10.0, 10.0]), np.array([100.0, 50.0]), np.array([0, 1]),
+                               np.array([0.5, 0.5]), cash=1000.0, allow_sells=False)
+    assert result['shares'].tolist() == [2.0, 15.0]
+    assert result['cash'] == 50.0
+
+    # An overweight position is not sold, so the cash goes to the underweight position only
+    result = compute_rebalance(np.array([10.0, 10.0]), np.array([100.0, 50.0]), np.array([0, 1]),
+                               np.array([0.5, 0.5]), cash=200.0, allow_sells=False)
+    assert result['shares'].tolist() == [0.0, 4.0]
+
+
+def test_rebalance_asset_classes_and_fractional_shares():
+    """
+    GIVEN three positions, two of them in one asset class, and a target of zero for the other position
+    WHEN the trades are computed in fractional shares
+    THEN check that the trade of the asset class keeps the mix of its positions and that the other is sold
+    """
+    result = compute_rebalance(np.array([10.0, 30.0, 5.0]), np.array([10.0, 10.0, 40.0]), np.array([0, 0, 1]),
+                               np.array([1.0, 0.0]), whole_shares=False)
+    assert result['shares'] == pytest.approx([5.0, 15.0, -5.0])
+    assert result['group_values'] == pytest.approx([600.0, 0.0])
+    assert result['cash'] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_rebalance_vectorized():
+    """
+    GIVEN a portfolio of 500 positions in 20 asset classes, random target weights, and cash to invest
+    WHEN the trades are computed with and without sells, many times
+    THEN check that the trades are whole shares within the holdings and the cash, quickly
+    """
+    rng = np.random.default_rng(42)
+    shares = rng.integers(1, 500, 500).astype(np.float64)
+    prices = rng.uniform(10000, 5000000, 500)
+    groups = rng.integers(0, 20, 500)
+    weights = rng.dirichlet(np.ones(20))
+
+    for allow_sells in (True, False):
+        start = time.perf_counter()
+        for _ in range(100):
+            result = compute_rebalance(shares, prices, groups, weights, cash=10000000.0, allow_sells=allow_sells)
+        assert time.perf_counter() - start < 1.0
+
+        assert np.all(result['shares'] == np.round(result['shares']))
+        assert np.all(result['shares'] >= (-shares if allow_sells else 0.0))
+        assert result['cash'] >= 0.0
+        assert result['cash'] < prices.max()
@@ -0,0 +1,84 @@
+"""
+This file (test_returns.py) contains the unit tests for the returns.py file.
+"""
+from datetime import datetime
+from project.stocks.returns import compute_total_returns
+import numpy as np
+import pytest
+import time
+
+
+def weekly_history(dates: list, closes: list, dividends: list) -> tuple:
+    return (np.array(dates, dtype='datetime64[D]'), np.array(closes, dtype=np.float64),
+            np.array(dividends, dtype=np.float64))
+
+
+def test_total_returns_reinvest_dividends_after_purchase():
+    """
+    GIVEN the weekly histories of two symbols with dividends, and lots bought before and after a dividend
+    WHEN the total returns are computed
+    THEN check that only the dividends paid after the purchase of each lot are reinvested
+    """
+    histories = {
+        'AAPL': weekly_history(['2020-01-03', '2020-01-10', '2020-01-17'], [10000, 10000, 11000], [0, 500, 0]),
+        'IBM': weekly_history(['2020-01-03', '2020-01-10'], [5000, 5000], [0, 0]),
+    }
+    lots = [(1, 'AAPL', datetime(2020, 1, 2), 10_000000, 10000),
+            (2, 'AAPL', datetime(2020, 1, 13), 10_000000, 10000),
+            (3, 'IBM', datetime(2020, 1, 3), 4_000000, 4000),
+            (4, 'MSFT', datetime(2020, 1, 3), 1_000000, 20000)]
+    total_returns = compute_total_returns(lots, histories)
+
+    first, second, third, fourth = total_returns['lots']
+    assert (first['price_return'], first['total_return']) == (10.0, 15.5)
+    assert first['value'] == 110000 and first['total_value'] == 115500
+    assert (second['price_return'], second['total_return']) == (10.0, 10.0)
+    assert (third['price_return'], third['total_return']) == (25.0, 25.0)
+    assert fourth['total_return'] is None
+
+    portfolio = total_returns['portfolio']
+    assert portfolio['cost'] == 216000
+    assert portfolio['total_value'] == 115500 + 110000 + 20000
+    assert portfolio['total_return'] == round((245500 / 216000 - 1) * 100, 2)
+
+
+def test_total_returns_without_lots():
+    """
+    GIVEN no lots
+    WHEN the total returns are computed
+    THEN check that the portfolio has no returns
+    """
+    assert compute_total_returns([], {}) == {'lots': [], 'portfolio': {'cost': 0, 'value': 0, 'total_value': 0,
+                                                                     'price_return': None, 'total_return': None}}
+
+
+def test_total_returns_vectorized():
+    """
+    GIVEN 20 years of weekly prices of 50 symbols with quarterly dividends, and many lots
+    WHEN the total returns are computed
+    THEN check that they match a loop over the weeks of each lot, quickly
+    """
+    lot_count = 10000
+    rng = np.random.default_rng(42)
+    dates = np.arange(np.datetime64('2000-01-07'), np.datetime64('2020-01-03'), np.timedelta64(7, 'D'))
+    histories = {}
+    for symbol in range(50):
+        closes = np.round(10000 * np.cumprod(1 + rng.normal(0.001, 0.02, len(dates))))
+        dividends = np.where(np.arange(len(dates)) % 13 == 0, np.round(closes * 0.005), 0)
+        histories[f'S{symbol}'] = (dates, closes, dividends)
+    purchase_dates = dates[rng.integers(0, len(dates), lot_count)].astype(datetime)
+    lots = [(lot, f'S{lot % 50}', datetime.combine(purchase_dates[lot], datetime.min.time()), 10_000000, 10000)
+            for lot in range(lot_count)]
+
+    start = time.perf_counter()
+    total_returns = compute_total_returns(lots, histories)
+    assert time.perf_counter() - start < 1.0
+
+    for lot in (0, 1, lot_count - 1):
+        _, symbol, purchase_date, shares, price = lots[lot]
+        week_dates, closes, dividends = histories[symbol]
+        growth = 1.0
+        for week in np.nonzero(week_dates > np.datetime64(purchase_date.date()))[0]:
+            growth *= 1 + dividends[week] / closes[week]
+        expected = round((shares * closes[-1] * growth / (shares * price) - 1) * 100, 2)
+        assert total_returns['lots'][lot]['total_return'] == pytest.approx(expected, abs=0.01)
@@ -0,0 +1,51 @@
+"""
+This file (test_seed.py) contains the unit tests for the seed.py file.
+"""
+from project.stocks.seed import SYMBOLS, generate_lots, random_walk, week_dates, zipf_cumulative_weights
+from datetime import date
+import pytest
+import random
+
+
+def test_zipf_cumulative_weights():
+    """
+    GIVEN the Zipf-like popularity distribution
+    WHEN the cumulative weights are calculated
+    THEN check that more popular symbols have larger weights
+    """
+    cumulative_weights = zipf_cumulative_weights(4, exponent=1.0)
+    weights = [cumulative_weights[0]] + [b - a for a, b in zip(cumulative_weights, cumulative_weights[1:])]
+    assert weights == pytest.approx([1.0, 0.5, 1 / 3, 0.25])
+
+
+def test_random_walk_is_reproducible():
+    """
+    GIVEN random generators with the same seed
+    WHEN weekly prices are generated with a random walk
+    THEN check that the prices are identical and positive
+    """
+    prices = random_walk(random.Random(7), 100.0, 520)
+    assert prices == random_walk(random.Random(7), 100.0, 520)
+    assert len(prices) == 520
+    assert min(prices) >= 1
+
+
+def test_week_dates():
+    """
+    GIVEN an end date on a Wednesday
+    WHEN the dates of the last three weeks are calculated
+    THEN check that they are the Fridays before the end date, oldest first
+    """
+    assert week_dates(3, date(2020, 7, 29)) == [date(2020, 7, 10), date(2020, 7, 17), date(2020, 7, 24)]
+
+
+def test_generate_lots_popular_symbols():
+    """
+    GIVEN many users with generated stock lots
+    WHEN the symbols of the lots are counted
+    THEN check that the most popular symbol is held much more often than a less popular one
+    """
+    lots = generate_lots(random.Random(1), list(range(1, 201)), 10)
+    symbols = [lot['stock_symbol'] for lot in lots]
+    assert symbols.count(SYMBOLS[0]) > 5 * symbols.count(SYMBOLS[50])
+    assert all(lot['current_price'] == 0 for lot in lots)
@@ -0,0 +1,49 @@
+"""
+This file (test_stream.py) contains the unit tests for the stream.py file.
+"""
+from project.stocks.stream import PriceBroadcaster, StreamLimiter
+
+
+def test_broadcaster_fans_out_to_subscribed_symbols():
+    """
+    GIVEN a price broadcaster with two subscriptions
+    WHEN prices are published
+    THEN check that each subscription only receives the prices of its symbols
+    """
+    broadcaster = PriceBroadcaster()
+    first = broadcaster.subscribe(['AAPL', 'MSFT'])
+    second = broadcaster.subscribe(['MSFT'])
+    broadcaster.publish({'AAPL': 17512, 'MSFT': 41023, 'IBM': 19001})
+    assert first.get(timeout=0) == {'AAPL': 17512, 'MSFT': 41023}
+    assert second.get(timeout=0) == {'MSFT': 41023}
+    assert first.get(timeout=0) == {}
+
+
+def test_subscription_coalesces_prices():
+    """
+    GIVEN a subscription that has not been read
+    WHEN prices of the same symbol are published several times
+    THEN check that only the latest price of the symbol is buffered
+    """
+    broadcaster = PriceBroadcaster()
+    subscription = broadcaster.subscribe(['AAPL'])
+    for price in (17500, 17510, 17520):
+        broadcaster.publish({'AAPL': price})
+    assert subscription.pending == {'AAPL': 17520}
+    broadcaster.unsubscribe(subscription)
+    broadcaster.publish({'AAPL': 17530})
+    assert subscription.get(timeout=0) == {'AAPL': 17520}
+
+
+def test_stream_limiter():
+    """
+    GIVEN a stream limiter of two streams
+    WHEN streams are opened and closed
+    THEN check that a stream can only be opened while less than two streams are open
+    """
+    limiter = StreamLimiter(2)
+    assert limiter.acquire() and limiter.acquire()
+    assert not limiter.acquire()
+    limiter.release()
+    assert limiter.acquire()
+    assert limiter.open_streams == 2
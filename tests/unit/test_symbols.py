@@ -0,0 +1,93 @@
+"""
+This file (test_symbols.py) contains the unit tests for the symbols.py file.
+"""
+from project.stocks.symbols import SymbolIndex, read_listing_file, write_symbol_index
+import pytest
+
+
+LISTINGS = [('A', 'Agilent Technologies, Inc.'), ('AAPL', 'Apple Inc.'), ('APP', 'AppLovin Corporation'),
+            ('MSFT', 'Microsoft Corporation')]
+
+
+def test_read_listing_file_nasdaq_format(tmp_path):
+    """
+    GIVEN a '|'-delimited listing file (like the NASDAQ listings) with extra columns and a trailer row
+    WHEN the listing file is read
+    THEN check that the symbols and security names are returned, sorted by symbol
+    """
+    path = tmp_path / 'nasdaqlisted.txt'
+    path.write_text('Symbol|Security Name|Market Category\n'
+                    'MSFT|Microsoft Corporation - Common Stock|Q\n'
+                    'AAPL|Apple Inc. - Common Stock|Q\n'
+                    'File Creation Time: 0718202519:01|||\n')
+    assert read_listing_file(str(path)) == [('AAPL', 'Apple Inc. - Common Stock'),
+                                            ('MSFT', 'Microsoft Corporation - Common Stock')]
+
+
+def test_read_listing_file_missing_column(tmp_path):
+    """
+    GIVEN a listing file without a name column
+    WHEN the listing file is read
+    THEN check that a ValueError is raised
+    """
+    path = tmp_path / 'symbols.csv'
+    path.write_text('symbol,exchange\nAAPL,NASDAQ\n')
+    with pytest.raises(ValueError):
+        read_listing_file(str(path))
+
+
+def test_search_symbols_before_names():
+    """
+    GIVEN a symbol index of listings
+    WHEN prefixes of symbols and of words of company names are searched
+    THEN check that the symbol matches are returned before the name matches, without duplicates
+    """
+    symbol_index = SymbolIndex.from_listings(LISTINGS)
+    assert [listing['symbol'] for listing in symbol_index.search('a')] == ['A', 'AAPL', 'APP']
+    assert symbol_index.search('app') == [{'symbol': 'APP', 'name': 'AppLovin Corporation'},
+                                          {'symbol': 'AAPL', 'name': 'Apple Inc.'}]
+    assert [listing['symbol'] for listing in symbol_index.search(' corp ')] == ['APP', 'MSFT']
+    assert [listing['symbol'] for listing in symbol_index.search('a', limit=2)] == ['A', 'AAPL']
+    assert symbol_index.search('xyz') == []
+    assert symbol_index.search('') == []
+
+
+def test_symbol_index_contains():
+    """
+    GIVEN a symbol index of listings
+    WHEN listed and unlisted symbols are checked
+    THEN check that only the listed symbols are in the index
+    """
+    symbol_index = SymbolIndex.from_listings(LISTINGS)
+    assert len(symbol_index) == 4
+    assert 'AAPL' in symbol_index
+    assert 'APPL' not in symbol_index
+    assert 'AAPL' not in SymbolIndex()
+
+
+def test_write_and_map_symbol_index(tmp_path):
+    """
+    GIVEN a listing file
+    WHEN the symbol index is written to a file and mapped into memory
+    THEN check that the mapped index returns the same results as the index built in memory
+    """
+    listing_path = tmp_path / 'symbols.csv'
+    listing_path.write_text('symbol,name\n' + ''.join(f'{symbol},"{name}"\n' for symbol, name in LISTINGS))
+    index_path = str(tmp_path / 'symbols.idx')
+    assert write_symbol_index(str(listing_path), index_path) == 4
+
+    mapped_index = SymbolIndex.from_file(index_path)
+    assert mapped_index.search('a') == SymbolIndex.from_listings(LISTINGS).search('a')
+    assert 'MSFT' in mapped_index
+
+
+def test_map_invalid_symbol_index(tmp_path):
+    """
+    GIVEN a file that is not a symbol index
+    WHEN the file is mapped as a symbol index
+    THEN check that a ValueError is raised
+    """
+    path = tmp_path / 'symbols.idx'
+    path.write_bytes(b'not a symbol index file')
+    with pytest.raises(ValueError):
+        SymbolIndex.from_file(str(path))
@@ -0,0 +1,201 @@
+"""
+This file (test_timeseries.py) contains the unit tests for the timeseries.py file.
+"""
+from datetime import datetime, timedelta
+from project import database
+from project.market_data import DAILY, INTRADAY, WEEKLY
+from project.models import PriceBar, PriceHistory
+from project.stocks import timeseries
+from project.stocks.timeseries import get_price_series, pick_resolution, read_bars, store_bars
+import pytest
+import requests
+
+
+@pytest.fixture(scope='function')
+def app(test_client):
+    with test_client.application.app_context():
+        yield test_client.application
+        database.session.rollback()
+    
+
+def last_week(weekday: int, hour: int, minute: int) -> datetime:
+    """Date and time of a day of the previous week (Monday = 0)."""
+    today = datetime.now().replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return today - timedelta(days=today.weekday() + 7 - weekday)
+
+
+def test_pick_resolution(app):
+    """
+    GIVEN the chart ranges
+    WHEN the resolution of each range is picked with at least 20 points
+    THEN check that the coarsest resolution with enough points is used
+    """
+    assert pick_resolution(timedelta(days=1), 20) == INTRADAY
+    assert pick_resolution(timedelta(weeks=1), 20) == INTRADAY
+    assert pick_resolution(timedelta(days=31), 20) == DAILY
+    assert pick_resolution(timedelta(days=92), 20) == DAILY
+    assert pick_resolution(timedelta(days=366), 20) == WEEKLY
+    assert pick_resolution(None, 20) == WEEKLY
+
+
+def test_store_bars_rolls_up_intraday_bars(app, monkeypatch):
+    """
+    GIVEN intraday bars of a stock for the Monday and Tuesday of the previous week
+    WHEN the bars are stored (twice)
+    THEN check that the daily and weekly bars are rolled up and the bars are only stored once
+    """
+    monkeypatch.setitem(app.config, 'PRICE_BARS_INTRADAY_RETENTION_DAYS', 30)
+    bars = [(last_week(0, 9, 30), 10000), (last_week(0, 15, 55), 10100),
+            (last_week(1, 9, 30), 10200), (last_week(1, 15, 55), 9900)]
+    assert store_bars('TSRU', INTRADAY, bars) == 4
+    # Only the latest bar is stored again, as it may have been stored before its period was over
+    assert store_bars('TSRU', INTRADAY, bars) == 1
+    assert read_bars('TSRU', INTRADAY) == bars
+
+    monday = last_week(0, 0, 0)
+    assert read_bars('TSRU', DAILY) == [(monday, 10100), (monday + timedelta(days=1), 9900)]
+    assert read_bars('TSRU', WEEKLY) == [(monday + timedelta(days=1), 9900)]
+
+    # A new bar on Wednesday only recomputes the Wednesday and the week
+    assert store_bars('TSRU', INTRADAY, [(last_week(2, 10, 0), 9800)]) == 1
+    assert read_bars('TSRU', DAILY)[-1] == (monday + timedelta(days=2), 9800)
+    assert read_bars('TSRU', WEEKLY) == [(monday + timedelta(days=2), 9800)]
+
+
+def test_store_bars_prunes_expired_bars(app):
+    """
+    GIVEN daily bars of a stock from 1000 days ago and from the previous week
+    WHEN the bars are stored with the default retention of 730 days
+    THEN check that only the recent daily bar is kept
+    """
+    old_day = datetime.combine(datetime.now().date() - timedelta(days=1000), datetime.min.time())
+    recent_day = last_week(4, 0, 0)
+    store_bars('TSPR', DAILY, [(old_day, 5000), (recent_day, 6000)])
+    assert read_bars('TSPR', DAILY) == [(recent_day, 6000)]
+    query = database.select(database.func.count(PriceBar.id)).where(PriceBar.stock_symbol == 'TSPR')
+    assert database.session.execute(query).scalar() == 1
+
+
+def test_get_price_series_downloads_once(app, monkeypatch):
+    """
+    GIVEN a stock without any stored prices and an Alpha Vantage API that returns daily prices
+    WHEN the 1M price series is retrieved twice
+    THEN check that the daily prices are downloaded once and the last month of prices is returned
+    """
+    calls = []
+
+    class MockDailyResponse(object):
+        status_code = 200
+
+        def json(self):
+            days = [datetime.now().date() - timedelta(days=day) for day in range(1, 60)]
+            return {'Time Series (Daily)': {day.isoformat(): {'4. close': '100.0000'} for day in days}}
+
+    def mock_get(url, timeout=None):
+        calls.append(url)
+        return MockDailyResponse()
+
+    monkeypatch.setattr(requests, 'get', mock_get)
+    monkeypatch.setattr(timeseries, '_last_downloads', {})
+    for _ in range(2):
+        resolution, bars = get_price_series('TSGP', '1M')
+        assert resolution == DAILY
+        assert len(bars) == 32
+        assert bars[-1][1] == 1000000
+    assert len(calls) == 1
+    assert 'function=TIME_SERIES_DAILY' in calls[0]
+
+
+def test_roll_up_keeps_weeks_without_daily_bars(app):
+    """
+    GIVEN weekly bars of a stock for three weeks
+    WHEN daily bars for only the first of those weeks are stored
+    THEN check that only the first week is recomputed and the other weekly bars are kept
+    """
+    friday = last_week(4, 0, 0)
+    store_bars('TSKP', WEEKLY, [(friday - timedelta(weeks=2), 1000), (friday - timedelta(weeks=1), 1100),
+                                (friday, 1200)])
+    store_bars('TSKP', DAILY, [(friday - timedelta(weeks=2, days=1), 990)])
+    assert read_bars('TSKP', WEEKLY) == [(friday - timedelta(weeks=2, days=1), 990),
+                                         (friday - timedelta(weeks=1), 1100), (friday, 1200)]
+
+
+def test_store_bars_keeps_weekly_dividends(app):
+    """
+    GIVEN weekly bars of a stock with a dividend in the previous week
+    WHEN a daily bar of the previous week is stored (so the week is rolled up from the daily bars)
+    THEN check that the close of the week is replaced and its dividend is kept
+    """
+    friday = last_week(4, 0, 0)
+    assert store_bars('TSRD', WEEKLY, [(friday - timedelta(weeks=1), 10000), (friday, 10500)], {friday: 25}) == 2
+    assert store_bars('TSRD', DAILY, [(last_week(3, 0, 0), 10700)]) == 1
+
+    query = (database.select(PriceHistory.date, PriceHistory.close, PriceHistory.dividend)
+             .where(PriceHistory.stock_symbol == 'TSRD').order_by(PriceHistory.date))
+    assert database.session.execute(query).all() == [((friday - timedelta(weeks=1)).date(), 10000, 0),
+                                                     (last_week(3, 0, 0).date(), 10700, 25)]
+
+
+def test_store_bars_updates_dividends_of_stored_weeks(app):
+    """
+    GIVEN weekly bars of a stock that were stored without dividends
+    WHEN the weekly bars are downloaded again with the dividends of the stored weeks
+    THEN check that the dividends of the stored weeks are updated, without storing the weeks again
+    """
+    friday = last_week(4, 0, 0)
+    bars = [(friday - timedelta(weeks=2), 10000), (friday - timedelta(weeks=1), 10200), (friday, 10500)]
+    store_bars('TSUD', WEEKLY, bars)
+    assert store_bars('TSUD', WEEKLY, bars, {friday - timedelta(weeks=2): 25, friday: 30}) == 1
+
+    query = (database.select(PriceHistory.date, PriceHistory.dividend)
+             .where(PriceHistory.stock_symbol == 'TSUD').order_by(PriceHistory.date))
+    assert database.session.execute(query).all() == [((friday - timedelta(weeks=2)).date(), 25),
+                                                     ((friday - timedelta(weeks=1)).date(), 0),
+                                                     (friday.date(), 30)]
+
+
+def test_insert_bars_skips_existing_bars(app):
+    """
+    GIVEN weekly and daily bars of a stock that are already stored
+    WHEN the same bars are inserted again (as by two workers that downloaded them concurrently)
+    THEN check that the bars are not duplicated and that no error is raised
+    """
+    friday = last_week(4, 0, 0)
+    for _ in range(2):
+        timeseries.insert_bars('TSIB', WEEKLY, [(friday, 10000)])
+        timeseries.insert_bars('TSIB', DAILY, [(friday, 10000)])
+    assert read_bars('TSIB', WEEKLY) == [(friday, 10000)]
+    assert read_bars('TSIB', DAILY) == [(friday, 10000)]
+
+
+def test_store_bars_replaces_partial_week(app):
+    """
+    GIVEN weekly bars of a stock where the latest week was stored on its Wednesday, before the week was over
+    WHEN the weekly bars are downloaded again after the week is over (with the bar of the week on its Friday)
+    THEN check that the partial bar of the week is replaced by the final bar, and that the week (and its
+         dividend) is stored once
+    """
+    friday = last_week(4, 0, 0)
+    store_bars('TSPW', WEEKLY, [(friday - timedelta(weeks=1), 10000), (last_week(2, 0, 0), 10300)],
+               {last_week(2, 0, 0): 25})
+    assert store_bars('TSPW', WEEKLY, [(friday - timedelta(weeks=1), 10000), (friday, 10500)], {friday: 25}) == 1
+    assert read_bars('TSPW', WEEKLY) == [(friday - timedelta(weeks=1), 10000), (friday, 10500)]
+    query = (database.select(PriceHistory.dividend).where(PriceHistory.stock_symbol == 'TSPW')
+             .order_by(PriceHistory.date))
+    assert database.session.execute(query).scalars().all() == [0, 25]
+
+
+def test_store_bars_replaces_partial_day(app, monkeypatch):
+    """
+    GIVEN a daily bar of a stock rolled up from the intraday bars of the morning of the previous Monday
+    WHEN the daily bars are downloaded after the day is over
+    THEN check that the daily bar (and the weekly bar) of the Monday are replaced by the final close
+    """
+    monkeypatch.setitem(app.config, 'PRICE_BARS_INTRADAY_RETENTION_DAYS', 30)
+    monday = last_week(0, 0, 0)
+    store_bars('TSPD', INTRADAY, [(last_week(0, 9, 30), 10000), (last_week(0, 11, 0), 10100)])
+    assert read_bars('TSPD', DAILY) == [(monday, 10100)]
+
+    assert store_bars('TSPD', DAILY, [(monday - timedelta(days=3), 9500), (monday, 10400)]) == 1
+    assert read_bars('TSPD', DAILY) == [(monday, 10400)]
+    assert read_bars('TSPD', WEEKLY) == [(monday, 10400)]